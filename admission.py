@@ -0,0 +1,171 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from config import (
+    BROWSER_MAX_CONCURRENT,
+    BROWSER_MIN_FREE_MEMORY_MB,
+    BROWSER_MAX_QUEUE,
+    BROWSER_ADMISSION_TIMEOUT,
+)
+
+# Set by background jobs: they wait for a slot instead of being turned away
+_patient = contextvars.ContextVar("admission_patient", default=False)
+
+
+class BrowserQueueFull(Exception):
+    """Raised when no browser slot can be granted; carries a Retry-After hint in seconds"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class AdmissionController:
+    """
+    FIFO admission for headless browsers, capped by a slot count and by free system memory.
+
+    Waiters are served strictly in arrival order. Impatient callers (API requests)
+    are rejected once the queue is full or their wait times out; patient callers
+    (background jobs) always queue and wait.
+    """
+
+    def __init__(self, max_concurrent, min_free_memory_mb=0, max_queue=0, timeout=None, memory_probe=available_memory_mb):
+        self.max_concurrent = max_concurrent
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._memory_probe = memory_probe
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._active = 0
+        self._waits = deque(maxlen=500)
+        self._holds = deque(maxlen=100)
+        self._stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "memory_deferrals": 0}
+
+    def _memory_ok(self):
+        if not self.min_free_memory_mb:
+            return True
+        free = self._memory_probe()
+        return free is None or free >= self.min_free_memory_mb
+
+    def _retry_after(self, position):
+        holds = list(self._holds)
+        avg_hold = sum(holds) / len(holds) if holds else 30.0
+        return max(1, int(avg_hold * (position + 1) / max(1, self.max_concurrent)))
+
+    def acquire(self, timeout=None, patient=None, cancel_token=None):
+        """Block until a slot is granted; returns the seconds spent waiting. A cancelled token aborts the wait"""
+        patient = _patient.get() if patient is None else patient
+        timeout = self.timeout if timeout is None and not patient else timeout
+        ticket = object()
+        started = time.monotonic()
+
+        with self._cond:
+            if not patient and self.max_queue and len(self._queue) >= self.max_queue:
+                self._stats["rejected_queue_full"] += 1
+                raise BrowserQueueFull(
+                    f"Browser queue is full ({len(self._queue)} waiting, {self._active} running)",
+                    retry_after=self._retry_after(len(self._queue)),
+                )
+            self._queue.append(ticket)
+            try:
+                while True:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    if self._queue[0] is ticket and self._active < self.max_concurrent:
+                        # Never block the only browser on memory: that would stall forever
+                        if self._active == 0 or self._memory_ok():
+                            break
+                        self._stats["memory_deferrals"] += 1
+                    remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                    if remaining is not None and remaining <= 0:
+                        self._stats["rejected_timeout"] += 1
+                        raise BrowserQueueFull(
+                            f"Timed out after {timeout:.0f}s waiting for a browser slot",
+                            retry_after=self._retry_after(self._queue.index(ticket)),
+                        )
+                    # Memory is re-checked at least once a second while waiting
+                    self._cond.wait(1.0 if remaining is None else min(1.0, remaining))
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            self._active += 1
+            self._waits.append(waited)
+            self._stats["admitted"] += 1
+            return waited
+
+    def release(self, held_seconds=None):
+        """Return a slot; held_seconds feeds the Retry-After estimate"""
+        with self._cond:
+            if self._active > 0:
+                self._active -= 1
+            if held_seconds is not None:
+                self._holds.append(held_seconds)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout=None, patient=None):
+        self.acquire(timeout=timeout, patient=patient)
+        granted_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - granted_at)
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            result = dict(self._stats)
+            result.update({
+                "active": self._active,
+                "queued": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "available_memory_mb": self._memory_probe(),
+                "min_free_memory_mb": self.min_free_memory_mb,
+            })
+        if waits:
+            result["wait_seconds"] = {
+                "count": len(waits),
+                "avg": sum(waits) / len(waits),
+                "p50": waits[len(waits) // 2],
+                "p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))],
+                "max": waits[-1],
+            }
+        else:
+            result["wait_seconds"] = {"count": 0}
+        return result
+
+
+@contextmanager
+def patient_admission():
+    """Run the enclosed work as a background job that queues for browsers instead of failing fast"""
+    token = _patient.set(True)
+    try:
+        yield
+    finally:
+        _patient.reset(token)
+
+
+browser_admission = AdmissionController(
+    BROWSER_MAX_CONCURRENT,
+    min_free_memory_mb=BROWSER_MIN_FREE_MEMORY_MB,
+    max_queue=BROWSER_MAX_QUEUE,
+    timeout=BROWSER_ADMISSION_TIMEOUT,
+)
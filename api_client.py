@@ -1,44 +1,48 @@
-import time
 import urllib.parse
 import requests
 from config import API_BASE
+from log import get_logger
+
+logger = get_logger(__name__)
 
 
 def search_anime(sm, query: str, max_retries=3):
-    """Search for anime with retry logic for better reliability"""
+    """
+    Search for anime with retry logic for better reliability
+
+    Failed attempts are reported to the rate limiter by sm.get, which holds the next
+    attempt back for the host's cooldown (doubling per consecutive failure).
+    """
     q = urllib.parse.quote_plus(query)
     url = f"{API_BASE}?m=search&q={q}"
     
     for attempt in range(max_retries):
         try:
-            print(f"🔍 Search attempt {attempt + 1}/{max_retries} for '{query}'...")
+            logger.debug("🔍 Search attempt %s/%s for '%s'...", attempt + 1, max_retries, query)
             r = sm.get(url, timeout=30)  # Increased timeout
             r.raise_for_status()
             data = r.json()
             results = data.get("data", [])
-            print(f"✅ Search successful! Found {len(results)} results")
+            logger.info("✅ Search successful! Found %s results", len(results))
             return results
             
         except requests.exceptions.ConnectTimeout as e:
-            print(f"⚠️ Connection timeout (attempt {attempt + 1}/{max_retries}): {e}")
+            logger.warning("⚠️ Connection timeout (attempt %s/%s): %s", attempt + 1, max_retries, e)
             if attempt == max_retries - 1:
                 raise Exception(f"Failed to connect to animepahe.ru after {max_retries} attempts. The site may be temporarily unavailable.")
-            time.sleep(2 ** attempt)  # Exponential backoff
             
         except requests.exceptions.ConnectionError as e:
-            print(f"⚠️ Connection error (attempt {attempt + 1}/{max_retries}): {e}")
+            logger.warning("⚠️ Connection error (attempt %s/%s): %s", attempt + 1, max_retries, e)
             if attempt == max_retries - 1:
                 raise Exception(f"Cannot connect to animepahe.ru. Please check your internet connection or try again later.")
-            time.sleep(2 ** attempt)
             
         except requests.exceptions.RequestException as e:
-            print(f"⚠️ Request error (attempt {attempt + 1}/{max_retries}): {e}")
+            logger.warning("⚠️ Request error (attempt %s/%s): %s", attempt + 1, max_retries, e)
             if attempt == max_retries - 1:
                 raise Exception(f"API request failed: {str(e)}")
-            time.sleep(2 ** attempt)
             
         except Exception as e:
-            print(f"❌ Unexpected error during search: {e}")
+            logger.error("❌ Unexpected error during search: %s", e)
             raise
     
     return []
@@ -49,22 +53,50 @@ def get_all_episodes(sm, anime_session: str):
     page = 1
     while True:
         url = f"{API_BASE}?m=release&id={anime_session}&sort=episode_asc&page={page}"
-        print(f"📄 Fetching page {page} -> {url}")
+        logger.debug("📄 Fetching page %s -> %s", page, url)
         r = sm.get(url, timeout=30)
         if r.status_code != 200:
-            print(f"⚠️ page {page} -> HTTP {r.status_code}; stopping.")
+            logger.warning("⚠️ page %s -> HTTP %s; stopping.", page, r.status_code)
             break
         data = r.json()
         chunk = data.get("data", [])
         if not chunk:
             break
-        print(f"   Retrieved {len(chunk)} episodes on page {page}")
+        logger.debug("   Retrieved %s episodes on page %s", len(chunk), page)
         episodes.extend(chunk)
         last_page = data.get("last_page")
         if last_page and page >= int(last_page):
             break
         page += 1
-        time.sleep(0.75)
     return episodes
 
 
+def fetch_new_episodes(sm, anime_session: str, after_episode=None, after_session: str = None):
+    """
+    Episodes released after a known one, oldest first.
+
+    Walks the release list newest first and stops at the first episode that is not newer
+    than after_episode (or is after_session), so a check costs one page when nothing is new.
+    With no cursor only the newest episode is returned, to start tracking from.
+    """
+    new = []
+    page = 1
+    while True:
+        url = f"{API_BASE}?m=release&id={anime_session}&sort=episode_desc&page={page}"
+        r = sm.get(url, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+        chunk = data.get("data", [])
+        for episode in chunk:
+            if after_episode is None and after_session is None:
+                return [episode]
+            if episode.get("session") == after_session or (
+                    after_episode is not None and float(episode["episode"]) <= float(after_episode)):
+                return new[::-1]
+            new.append(episode)
+        last_page = data.get("last_page")
+        if not chunk or not last_page or page >= int(last_page):
+            return new[::-1]
+        page += 1
+
+
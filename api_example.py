@@ -65,6 +65,29 @@ def check_download_status(task_id: str):
         print(f"Status check failed: {response.text}")
         return None
 
+def stream_download_progress(task_id: str):
+    """Yield progress events for a task as the server pushes them (Server-Sent Events)"""
+    with requests.get(f"{BASE_URL}/download/{task_id}/events", stream=True, timeout=(10, 60)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data: "):
+                yield json.loads(line[len("data: "):])
+
+def format_progress(status: dict) -> str:
+    """One status line: stage, overall progress, and bytes/rate/ETA when known"""
+    line = f"Status: {status['status']} | Progress: {status.get('progress', 0):.1f}% | Episode: {status.get('current_episode', 'N/A')}"
+    if status.get('stage'):
+        line += f" | {status['stage']}"
+    if status.get('segment'):
+        line += f" seg {status['segment']}/{status.get('segments_total')}"
+    if status.get('bytes_done'):
+        line += f" {status['bytes_done'] / 1024 / 1024:.1f}MB"
+    if status.get('rate'):
+        line += f" @ {status['rate'] / 1024 / 1024:.2f}MB/s"
+    if status.get('eta') is not None:
+        line += f" ETA {status['eta']:.0f}s"
+    return line
+
 def list_downloads():
     """List all download tasks"""
     response = requests.get(f"{BASE_URL}/downloads")
@@ -151,21 +174,28 @@ if __name__ == "__main__":
         task_id = download_result['task_id']
         print(f"✅ Download started! Task ID: {task_id}")
         
-        # Monitor progress
+        # Monitor progress: the server pushes updates, so there is no polling loop
         print("\n📊 Monitoring download progress...")
-        while True:
-            status = check_download_status(task_id)
-            if status:
-                print(f"\rStatus: {status['status']} | Progress: {status['progress']:.1f}% | Episode: {status.get('current_episode', 'N/A')}", end="", flush=True)
-                
-                if status['status'] in ['completed', 'failed']:
-                    print()  # New line
-                    if status['status'] == 'completed':
-                        print("🎉 All downloads completed!")
-                    else:
-                        print(f"❌ Download failed: {status.get('error_message', 'Unknown error')}")
-                    break
-            
+        status = None
+        try:
+            for status in stream_download_progress(task_id):
+                print(f"\r{format_progress(status):<110}", end="", flush=True)
+        except requests.RequestException as e:
+            print(f"\n⚠️ Progress stream unavailable ({e}), polling instead")
+
+        # Older servers have no event stream, and a dropped stream may end early: poll until done
+        while status is None or status['status'] not in ['completed', 'failed', 'cancelled']:
             time.sleep(2)  # Check every 2 seconds
+            status = check_download_status(task_id) or status
+            if status:
+                print(f"\r{format_progress(status):<110}", end="", flush=True)
+
+        print()  # New line
+        if status and status['status'] == 'completed':
+            print("🎉 All downloads completed!")
+        elif status and status['status'] == 'cancelled':
+            print("🛑 Download cancelled")
+        else:
+            print(f"❌ Download failed: {(status or {}).get('error_message', 'Unknown error')}")
     else:
         print("❌ Failed to start download")
@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import fnmatch
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from config import (
+    BANDWIDTH_GLOBAL_LIMIT,
+    BANDWIDTH_HOST_LIMITS,
+    BANDWIDTH_DEFAULT_HOST_LIMIT,
+    BANDWIDTH_BURST_SECONDS,
+    BANDWIDTH_LIMITS_PATH,
+)
+
+# Job whose transfers run in the current context (set by the worker around each job)
+_current_job = contextvars.ContextVar("bandwidth_job", default=None)
+
+
+class TokenBucket:
+    """Refills at `rate` bytes/s up to a burst; may go into debt so a large chunk never stalls forever"""
+
+    def __init__(self, rate, burst_seconds=BANDWIDTH_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        self.rate = rate or 0
+        self.capacity = self.rate * self.burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def ready(self, now):
+        if not self.rate:
+            return True
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens > 0
+
+    def take(self, nbytes):
+        if self.rate:
+            self.tokens -= nbytes
+
+    def seconds_until_ready(self):
+        return 0.0 if not self.rate or self.tokens > 0 else -self.tokens / self.rate
+
+
+class _Meter:
+    """Bytes transferred and a smoothed rate, for utilization stats"""
+
+    def __init__(self):
+        self.total = 0
+        self.rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+
+    def add(self, nbytes, now):
+        self.total += nbytes
+        self._window_bytes += nbytes
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.rate = 0.5 * self.rate + 0.5 * (self._window_bytes / elapsed)
+            self._window_start = now
+            self._window_bytes = 0
+
+    def current(self, now):
+        # Nothing for a few seconds means idle, not "still at the last rate"
+        return self.rate if now - self._window_start < 3 else 0.0
+
+
+class _JobShare:
+    def __init__(self, weight, priority, vtime):
+        self.weight = max(weight, 0.01)
+        self.priority = priority
+        self.vtime = vtime
+        self.meter = _Meter()
+        self.refs = 0
+
+
+class _Waiter:
+    def __init__(self, share, key, nbytes, start, seq):
+        self.share = share
+        self.key = key
+        self.nbytes = nbytes
+        self.start = start
+        self.finish = start + nbytes / share.weight
+        self.seq = seq
+        self.granted = False
+
+
+class _Throttle:
+    """Per-transfer handle that batches small chunks into one scheduler call per batch_bytes"""
+
+    def __init__(self, scheduler, host, cancel_token, batch_bytes):
+        self.scheduler = scheduler
+        self.host = host
+        self.cancel_token = cancel_token
+        self.batch_bytes = batch_bytes
+        self._pending = 0
+
+    def consume(self, nbytes):
+        """Account for nbytes just received; blocks (pausing the read) while over the limits"""
+        self._pending += nbytes
+        if self._pending >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            pending, self._pending = self._pending, 0
+            self.scheduler.acquire(pending, self.host, self.cancel_token)
+
+
+class BandwidthScheduler:
+    """
+    Token-bucket bandwidth scheduler shared by every transfer in the process.
+
+    A transfer proceeds only while both the global bucket and its host's bucket have
+    tokens. When they are short, waiting jobs are served by priority (lower first),
+    then by weighted fair queuing, so a job with weight 2 gets twice the bytes of a
+    job with weight 1. Limits can be changed at runtime; they are saved to
+    limits_path so other worker processes pick them up.
+    """
+
+    def __init__(self, global_limit=BANDWIDTH_GLOBAL_LIMIT, host_limits=None,
+                 default_host_limit=BANDWIDTH_DEFAULT_HOST_LIMIT, burst_seconds=BANDWIDTH_BURST_SECONDS,
+                 limits_path=None):
+        self._cond = threading.Condition()
+        self._global = TokenBucket(global_limit, burst_seconds)
+        self._host_limits = dict(host_limits or {})
+        self._default_host_limit = default_host_limit
+        self._job_overrides = {}
+        self._buckets = {}
+        self._global_meter = _Meter()
+        self._host_meters = {}
+        self._jobs = {}
+        self._anonymous = _JobShare(1.0, 0, 0.0)
+        self._waiters = []
+        self._seq = 0
+        self._vclock = 0.0
+        self._stats = {"throttled_waits": 0, "wait_seconds": 0.0}
+        self.limits_path = limits_path
+        self._limits_mtime = None
+        self._limits_checked = 0.0
+
+    # ---- limits -------------------------------------------------------------
+
+    def limits(self):
+        with self._cond:
+            return {
+                "global_limit": self._global.rate,
+                "host_limits": dict(self._host_limits),
+                "default_host_limit": self._default_host_limit,
+                "jobs": {job_id: dict(o) for job_id, o in self._job_overrides.items()},
+            }
+
+    def set_limits(self, global_limit=None, host_limits=None, default_host_limit=None, jobs=None, persist=True):
+        """Change any of the limits (bytes/s, 0 = unlimited); None leaves a limit as it is"""
+        with self._cond:
+            if global_limit is not None:
+                self._global.set_rate(global_limit)
+            if host_limits is not None:
+                self._host_limits = dict(host_limits)
+            if default_host_limit is not None:
+                self._default_host_limit = default_host_limit
+            if host_limits is not None or default_host_limit is not None:
+                self._buckets.clear()
+            if jobs is not None:
+                self._job_overrides = {job_id: dict(o) for job_id, o in jobs.items()}
+                for job_id, override in self._job_overrides.items():
+                    if job_id in self._jobs:
+                        self._apply_override(self._jobs[job_id], override)
+            self._cond.notify_all()
+        limits = self.limits()
+        if persist and self.limits_path:
+            tmp_path = f"{self.limits_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(limits, f, indent=2)
+            os.replace(tmp_path, self.limits_path)
+            self._limits_mtime = os.path.getmtime(self.limits_path)
+        return limits
+
+    def set_job(self, job_id, weight=None, priority=None):
+        """Change a job's weight or priority, now and for the rest of its run"""
+        jobs = self.limits()["jobs"]
+        override = jobs.pop(job_id, {})
+        if weight is not None:
+            override["weight"] = weight
+        if priority is not None:
+            override["priority"] = priority
+        jobs[job_id] = override
+        # Overrides outlive their jobs in the limits file; keep only the most recent ones
+        return self.set_limits(jobs=dict(list(jobs.items())[-200:]))
+
+    def _apply_override(self, share, override):
+        if "weight" in override:
+            share.weight = max(override["weight"], 0.01)
+        if "priority" in override:
+            share.priority = override["priority"]
+
+    def _reload_limits(self):
+        """Pick up limits saved by another process, checking the file at most every 2s"""
+        now = time.monotonic()
+        if not self.limits_path or now - self._limits_checked < 2:
+            return
+        self._limits_checked = now
+        try:
+            mtime = os.path.getmtime(self.limits_path)
+            if mtime == self._limits_mtime:
+                return
+            with open(self.limits_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._limits_mtime = mtime
+        self.set_limits(data.get("global_limit"), data.get("host_limits"), data.get("default_host_limit"),
+                        data.get("jobs"), persist=False)
+
+    # ---- jobs ---------------------------------------------------------------
+
+    @contextmanager
+    def job(self, job_id, weight=1.0, priority=0):
+        """Count transfers in this block against job_id, with its weight and priority"""
+        with self._cond:
+            share = self._jobs.get(job_id)
+            if share is None:
+                # Start at the current virtual time: an idle job gets no saved-up credit
+                share = self._jobs[job_id] = _JobShare(weight, priority, self._vclock)
+                self._apply_override(share, self._job_overrides.get(job_id, {}))
+            share.refs += 1
+        token = _current_job.set(job_id)
+        try:
+            yield share
+        finally:
+            _current_job.reset(token)
+            with self._cond:
+                share.refs -= 1
+                if share.refs <= 0:
+                    self._jobs.pop(job_id, None)
+
+    # ---- transfers ----------------------------------------------------------
+
+    def throttle(self, url, cancel_token=None, batch_bytes=64 * 1024):
+        """Handle for one transfer from url; call consume(len(chunk)) for every chunk received"""
+        return _Throttle(self, urlparse(url).hostname or "", cancel_token, batch_bytes)
+
+    def _bucket_key(self, host):
+        for pattern in self._host_limits:
+            if fnmatch.fnmatch(host, pattern):
+                return pattern
+        return host
+
+    def _host_bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate = self._host_limits.get(key, self._default_host_limit)
+            bucket = self._buckets[key] = TokenBucket(rate, self._global.burst_seconds)
+        return bucket
+
+    def _dispatch(self, now):
+        """Grant every waiter the buckets allow, in priority/fair order; returns seconds until worth retrying"""
+        self._waiters.sort(key=lambda w: (w.share.priority, w.finish, w.seq))
+        retry_in = 0.5
+        for waiter in list(self._waiters):
+            bucket = self._host_bucket(waiter.key)
+            if not bucket.ready(now):
+                # Only this host is over its cap; waiters for other hosts may still go
+                retry_in = min(retry_in, bucket.seconds_until_ready())
+                continue
+            if not self._global.ready(now):
+                retry_in = min(retry_in, self._global.seconds_until_ready())
+                break
+            bucket.take(waiter.nbytes)
+            self._global.take(waiter.nbytes)
+            waiter.granted = True
+            self._waiters.remove(waiter)
+            waiter.share.vtime = waiter.finish
+            self._vclock = max(self._vclock, waiter.start)
+            self._global_meter.add(waiter.nbytes, now)
+            self._host_meters.setdefault(waiter.key, _Meter()).add(waiter.nbytes, now)
+            waiter.share.meter.add(waiter.nbytes, now)
+            self._cond.notify_all()
+        return max(retry_in, 0.001)
+
+    def acquire(self, nbytes, host="", cancel_token=None):
+        """Block until nbytes from host fit within the limits; returns the seconds waited"""
+        self._reload_limits()
+        started = time.monotonic()
+        with self._cond:
+            share = self._jobs.get(_current_job.get(), self._anonymous)
+            self._seq += 1
+            start = max(share.vtime, self._vclock)
+            waiter = _Waiter(share, self._bucket_key(host), nbytes, start, self._seq)
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    retry_in = self._dispatch(time.monotonic())
+                    if waiter.granted:
+                        break
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    self._cond.wait(retry_in)
+            finally:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self._stats["throttled_waits"] += 1
+                self._stats["wait_seconds"] += waited
+        return waited
+
+    def stats(self):
+        """Live utilization: rate against limit globally, per host and per job"""
+        self._reload_limits()
+        limits = self.limits()
+        with self._cond:
+            now = time.monotonic()
+
+            def usage(meter, limit):
+                rate = meter.current(now)
+                return {
+                    "rate": round(rate),
+                    "bytes": meter.total,
+                    "limit": limit,
+                    "utilization": round(rate / limit, 3) if limit else None,
+                }
+
+            return {
+                "limits": limits,
+                "global": usage(self._global_meter, self._global.rate),
+                "hosts": {
+                    key: usage(meter, self._host_bucket(key).rate) for key, meter in self._host_meters.items()
+                },
+                "jobs": {
+                    job_id: dict(usage(share.meter, None), weight=share.weight, priority=share.priority)
+                    for job_id, share in self._jobs.items()
+                },
+                "waiting": len(self._waiters),
+                "throttled_waits": self._stats["throttled_waits"],
+                "wait_seconds": round(self._stats["wait_seconds"], 2),
+            }
+
+
+bandwidth_scheduler = BandwidthScheduler(
+    host_limits=BANDWIDTH_HOST_LIMITS,
+    limits_path=BANDWIDTH_LIMITS_PATH,
+)
@@ -3,6 +3,8 @@ from api_client import search_anime, get_all_episodes
 from scraper import scrape_download_links
 from resolver import resolve_download_info, resolve_download_url
 from transfer import download_with_progress, advanced_download_with_progress
+from library_index import get_library_index
+from prefetch import Prefetcher
 
 
 def main():
@@ -66,32 +68,49 @@ def main():
         print(f"Available languages for {q_choice}p:", ", ".join(available_langs))
         lang_choice = input(f"Enter language [{available_langs[0]}]: ").strip().lower() or available_langs[0]
 
+    library = get_library_index()
+    pending_eps = []
     for e in chosen_eps:
-        print(f"\n🎬 Episode {e['episode']}")
-        links = scrape_download_links(anime_session, e["session"])
+        entry = library.lookup(anime_session, e["episode"], q_choice, lang_choice)
+        if entry:
+            print(f"⏭️ Episode {e['episode']} already downloaded: {entry['path']}")
+        else:
+            pending_eps.append(e)
+
+    probed_links = {first_ep["session"]: links}
 
+    def resolve_episode(e):
+        """Browser work for one episode: its links, then the chosen link's download info"""
+        links = probed_links.pop(e["session"], None) or scrape_download_links(anime_session, e["session"])
         raw_url = links.get(f"{q_choice}_{lang_choice}")
-        if not raw_url:
-            print(f"⚠️ {q_choice}p {lang_choice.upper()} not available for this episode.")
-            print("Available:", ", ".join(links.keys()))
-            continue
-
-        # Use the new advanced download system
-        download_info = resolve_download_info(raw_url)
-        if not download_info:
-            print("⚠️ Could not resolve download information.")
-            continue
-
-        # Use extracted filename or fallback to custom format
-        if not download_info.get('filename'):
-            download_info['filename'] = f"{selected['title']} - Ep{e['episode']}"
-
-        # Download with the advanced function
-        success = advanced_download_with_progress(download_info)
-        if success:
-            print(f"✅ Episode {e['episode']} downloaded successfully")
-        else:
-            print(f"❌ Failed to download Episode {e['episode']}")
+        return links, resolve_download_info(raw_url) if raw_url else None
+
+    # The next episode is scraped and resolved while the current one downloads
+    with Prefetcher(resolve_episode, pending_eps, key=lambda e: e["session"]) as prefetcher:
+        for e in pending_eps:
+            print(f"\n🎬 Episode {e['episode']}")
+            links, download_info = prefetcher.get(e)
+
+            if not links.get(f"{q_choice}_{lang_choice}"):
+                print(f"⚠️ {q_choice}p {lang_choice.upper()} not available for this episode.")
+                print("Available:", ", ".join(links.keys()))
+                continue
+
+            if not download_info:
+                print("⚠️ Could not resolve download information.")
+                continue
+
+            # Use extracted filename or fallback to custom format
+            if not download_info.get('filename'):
+                download_info['filename'] = f"{selected['title']} - Ep{e['episode']}"
+
+            # Download with the advanced function
+            success = advanced_download_with_progress(download_info)
+            if success:
+                library.record(anime_session, e["episode"], q_choice, lang_choice, download_info['filename'])
+                print(f"✅ Episode {e['episode']} downloaded successfully")
+            else:
+                print(f"❌ Failed to download Episode {e['episode']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks of the scrape, resolve and download paths.
+
+Runs get_all_episodes, both scrapers, resolve_download_info, advanced_download_with_progress
+and the HLS download against fake_site.py (recorded pages, configurable latency and
+bandwidth) with the fake browser, and writes the timings as JSON:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --only transfer,hls --repeat 5 --latency 0.05 --bandwidth 8M
+    python benchmark.py --baseline bench.json   # exits 1 if a case got slower than the baseline
+
+Each case runs --repeat times; its median is what --baseline compares. Everything the
+run writes (task store, rate limiter, downloads) goes to a temporary directory.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from fake_site import FakeSite, ANIME_SESSION, EPISODE_SESSION, parse_rate
+
+CASES = ["session", "episodes", "scrape_links", "scrape_m3u8", "resolve", "transfer", "hls", "hls_remux"]
+LINK_ID = "Nb2vS"  # the 1080p entry of the recorded download menu
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class Bench:
+    """The benchmark cases; each returns extra numbers to report (items, bytes, ...)"""
+
+    def __init__(self, site, workdir):
+        self.site = site
+        self.workdir = workdir
+        self.runs = 0
+        self._sm = None
+
+    def sm(self):
+        if self._sm is None:
+            from session_mgr import SessionManager
+            self._sm = SessionManager()
+        return self._sm
+
+    def _dir(self):
+        self.runs += 1
+        path = os.path.join(self.workdir, f"run_{self.runs}")
+        os.makedirs(path)
+        return path
+
+    def prepare_episodes(self):
+        self.sm()
+
+    def case_session(self):
+        from session_mgr import SessionManager
+        sm = SessionManager()
+        assert any(name.startswith("__ddg") for name in sm.session.cookies.keys()), "no DDoS-Guard cookie"
+        return {}
+
+    def case_episodes(self):
+        from api_client import get_all_episodes
+        episodes = get_all_episodes(self.sm(), ANIME_SESSION)
+        assert episodes, "no episodes"
+        return {"items": len(episodes)}
+
+    def case_scrape_links(self):
+        from scraper import scrape_download_links
+        links = scrape_download_links(ANIME_SESSION, EPISODE_SESSION)
+        assert links, "no download links"
+        return {"items": len(links)}
+
+    def case_scrape_m3u8(self):
+        from scraper import scrape_m3u8_variants
+        variants = scrape_m3u8_variants(ANIME_SESSION, EPISODE_SESSION, use_cache=False)
+        assert variants, "no variants"
+        return {"items": len(variants)}
+
+    def case_resolve(self):
+        from resolver import resolve_download_info
+        info = resolve_download_info(f"{self.site.url}/pahe.win/{LINK_ID}")
+        assert info and info["url"].endswith(f"/kwik.si/d/{LINK_ID}"), f"resolved to {info}"
+        return {}
+
+    def case_transfer(self):
+        from transfer import advanced_download_with_progress
+        directory = self._dir()
+        info = {"url": f"{self.site.url}/kwik.si/d/{LINK_ID}", "form_data": {"_token": "bench"},
+                "cookies": {}, "headers": {}, "filename": "episode.mp4"}
+        assert advanced_download_with_progress(info, directory), "download failed"
+        with open(os.path.join(directory, "episode.mp4"), "rb") as f:
+            assert f.read() == self.site.video, "downloaded bytes differ"
+        return {"bytes": len(self.site.video)}
+
+    def _hls(self, remux):
+        from hls import load_media_playlist, new_segment_state, download_hls_segments, remux_hls
+        directory = self._dir()
+        raw_file = os.path.join(directory, "episode_raw.ts")
+        segment_urls, key = load_media_playlist(f"{self.site.url}/hls/1080_jpn/index.m3u8")
+        download_hls_segments(segment_urls, raw_file, key, new_segment_state())
+        with open(raw_file, "rb") as f:
+            assert f.read() == self.site.hls_plaintext, "decrypted segments differ"
+        if remux:
+            remux_hls(raw_file, os.path.join(directory, "episode.mp4"))
+        return {"bytes": sum(len(s) for s in self.site.segments), "items": len(segment_urls)}
+
+    def case_hls(self):
+        return self._hls(remux=False)
+
+    def case_hls_remux(self):
+        return self._hls(remux=True)
+
+    def skip_reason(self, case):
+        if case == "hls_remux" and not shutil.which("ffmpeg"):
+            return "ffmpeg not found"
+        return None
+
+
+def run_case(bench, case, repeat):
+    reason = bench.skip_reason(case)
+    if reason:
+        return {"status": "skipped", "reason": reason}
+    prepare = getattr(bench, f"prepare_{case}", None)
+    seconds, extra = [], {}
+    requests_before = bench.site.request_counts()
+    try:
+        if prepare:
+            prepare()
+            requests_before = bench.site.request_counts()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            extra = getattr(bench, f"case_{case}")() or {}
+            seconds.append(time.perf_counter() - started)
+    except Exception as e:
+        return {"status": "failed", "error": f"{type(e).__name__}: {e}", "seconds": seconds}
+    after = bench.site.request_counts()
+    requests = {route: (n - requests_before.get(route, 0)) / repeat
+                for route, n in after.items() if n != requests_before.get(route, 0)}
+    result = {
+        "status": "ok",
+        "seconds": [round(s, 4) for s in seconds],
+        "min": round(min(seconds), 4),
+        "median": round(statistics.median(seconds), 4),
+        "mean": round(statistics.mean(seconds), 4),
+        "max": round(max(seconds), 4),
+        "requests_per_run": requests,
+    }
+    result.update(extra)
+    if extra.get("bytes"):
+        result["throughput_mb_s"] = round(extra["bytes"] / statistics.median(seconds) / 1024 / 1024, 2)
+    return result
+
+
+def compare(baseline, current, tolerance=0.25):
+    """Cases whose median is more than tolerance slower than in baseline"""
+    regressions = []
+    for case, result in current["results"].items():
+        before = baseline.get("results", {}).get(case)
+        if not before or before.get("status") != "ok":
+            continue
+        if result.get("status") != "ok":
+            regressions.append({"case": case, "baseline": before["median"], "current": None,
+                                "error": result.get("error") or result.get("reason")})
+            continue
+        if result["median"] > before["median"] * (1 + tolerance):
+            regressions.append({"case": case, "baseline": before["median"], "current": result["median"],
+                                "ratio": round(result["median"] / before["median"], 2)})
+    return regressions
+
+
+def run_benchmarks(cases=CASES, repeat=3, latency=0.02, bandwidth=None, video_size=8 * 1024 * 1024,
+                   segment_size=512 * 1024, browser="fake"):
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    site = FakeSite(latency=latency, bandwidth=bandwidth, video_size=video_size, segment_size=segment_size).start()
+    # Must be set before config is imported
+    os.environ["BASE_ORIGIN"] = site.url
+    os.environ["BROWSER_BACKEND"] = browser
+    os.environ["TASK_STORE_PATH"] = os.path.join(workdir, "benchmark.db")
+    os.environ.setdefault("TQDM_DISABLE", "1")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from config import BASE_ORIGIN
+    assert BASE_ORIGIN == site.url, "config was imported before the fake site started"
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "browser": browser,
+            "repeat": repeat,
+            "latency": latency,
+            "bandwidth": bandwidth,
+            "video_size": video_size,
+            "segment_size": segment_size,
+        },
+        "results": {},
+    }
+    bench = Bench(site, workdir)
+    try:
+        for case in cases:
+            print(f"⏱️ {case}...", file=sys.stderr)
+            report["results"][case] = run_case(bench, case, repeat)
+    finally:
+        site.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_summary(report, regressions=()):
+    slower = {r["case"] for r in regressions}
+    print(f"\n{'case':<14}{'status':<9}{'median s':>10}{'min s':>9}{'max s':>9}{'MB/s':>8}", file=sys.stderr)
+    for case, result in report["results"].items():
+        if result["status"] != "ok":
+            print(f"{case:<14}{result['status']:<9} {result.get('error') or result.get('reason')}", file=sys.stderr)
+            continue
+        mark = "  ⚠️ slower" if case in slower else ""
+        print(f"{case:<14}{'ok':<9}{result['median']:>10.3f}{result['min']:>9.3f}{result['max']:>9.3f}"
+              f"{result.get('throughput_mb_s', ''):>8}{mark}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrape, resolve and download paths offline")
+    parser.add_argument("--only", help=f"Comma-separated cases ({', '.join(CASES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds before each fake-site response")
+    parser.add_argument("--bandwidth", help="Per-connection cap of the fake site, e.g. 8M (bytes/s)")
+    parser.add_argument("--video-size", default="8M", help="Size of the kwik download")
+    parser.add_argument("--segment-size", default="512K", help="Size of each HLS segment")
+    parser.add_argument("--browser", default="fake", choices=["fake", "chrome"],
+                        help="Drive the scrapers with the fake browser or a real Chrome")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    cases = args.only.split(",") if args.only else CASES
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(cases, repeat=args.repeat, latency=args.latency, bandwidth=parse_rate(args.bandwidth),
+                            video_size=parse_rate(args.video_size), segment_size=parse_rate(args.segment_size),
+                            browser=args.browser)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print_summary(report, regressions)
+
+    failed = [case for case, result in report["results"].items() if result["status"] == "failed"]
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 import time
 import random
 import uuid
-import tempfile
 import os
 import threading
+import json
+import shutil
+import functools
+import re
+import signal
+import atexit
+import weakref
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -14,7 +20,27 @@ from selenium.common.exceptions import (
     ElementClickInterceptedException,
     TimeoutException,
 )
-from config import AD_BLOCK_PATTERNS, BROWSER_MAX_RETRIES, BROWSER_CREATION_DELAY, BROWSER_CLEANUP_DELAY, BROWSER_RETRY_DELAY
+from admission import browser_admission
+from metrics import BROWSER_LAUNCH_SECONDS, BROWSER_LAUNCH_FAILURES
+from config import (
+    AD_BLOCK_PATTERNS,
+    BROWSER_MAX_RETRIES,
+    BROWSER_CREATION_DELAY,
+    BROWSER_CLEANUP_DELAY,
+    BROWSER_RETRY_DELAY,
+    BROWSER_BACKEND,
+    RESOURCE_BLOCK_CATEGORIES,
+    RESOURCE_BLOCK_PROFILES,
+    RESOURCE_BLOCK_STATS,
+    RESOURCE_BLOCK_ESTIMATED_BYTES,
+    CHROME_PROFILE_ROOT,
+    CHROME_PROFILE_TEMPLATE_DIR,
+    BROWSER_REAPER_INTERVAL,
+    BROWSER_REAPER_GRACE,
+)
+from log import get_logger
+
+logger = get_logger(__name__)
 
 try:
     import undetected_chromedriver as uc  # type: ignore
@@ -25,89 +51,232 @@ except Exception:
 # Global lock to prevent multiple browser instances from being created simultaneously
 _browser_lock = threading.Lock()
 
-def create_stealth_driver(headless=True, max_retries=None):
+# Requests blocked/loaded by the resource profiles, summed over all drivers
+_resource_stats = {
+    "drivers": 0,
+    "requests_blocked": 0,
+    "requests_loaded": 0,
+    "bytes_loaded": 0,
+    "bytes_saved_estimate": 0,
+    "blocked_by_type": {},
+}
+_resource_stats_lock = threading.Lock()
+
+
+# Launch arguments shared by the UC and plain Chrome paths
+_BASE_CHROME_ARGS = (
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--window-size=1366,768",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-plugins",
+    # Add additional options to prevent conflicts
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-features=TranslateUI",
+    "--disable-ipc-flooding-protection",
+    # Skip first-run work the profile template already covers
+    "--no-first-run",
+    "--no-default-browser-check",
+)
+
+# Patched undetected-chromedriver binary, resolved once per process
+_uc_patcher = None
+_uc_driver_path = None
+
+_profile_template_ready = False
+
+# Drivers that have not been shut down, keyed by profile dir
+_live_drivers = {}
+_registry_lock = threading.Lock()
+_reaper_stats = {"runs": 0, "leaked_drivers": 0, "reaped_dirs": 0, "killed_processes": 0}
+_reaper_thread = None
+_reaper_stop = threading.Event()
+_PROFILE_DIR_RE = re.compile(r"chrome_user_data_(\d+)_[0-9a-f]{8}$")
+
+# Launch timings per backend ("uc" or "chrome")
+_startup_stats = {"launches": 0, "failures": 0, "by_backend": {}}
+_startup_stats_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _chrome_launch_args(headless, resource_profile):
+    """Launch arguments for a (headless, resource_profile) combination, built once"""
+    args = ["--headless=new"] if headless else []
+    args.extend(_BASE_CHROME_ARGS)
+    profile = RESOURCE_BLOCK_PROFILES.get(resource_profile) if resource_profile else None
+    if profile and "images" in profile["block"]:
+        # --disable-images is ignored by current Chrome; this setting is honored
+        args.append("--blink-settings=imagesEnabled=false")
+    return tuple(args)
+
+
+def _build_chrome_options(options_cls, headless, user_data_dir, resource_profile, plain_chrome):
+    """Fresh options object from the cached argument list (UC refuses reused options)"""
+    opts = options_cls()
+    for arg in _chrome_launch_args(headless, resource_profile):
+        opts.add_argument(arg)
+    opts.add_argument(f"--user-data-dir={user_data_dir}")
+    if resource_profile in RESOURCE_BLOCK_PROFILES and RESOURCE_BLOCK_STATS:
+        opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if plain_chrome:
+        opts.add_experimental_option("excludeSwitches", ["enable-automation"])
+        opts.add_experimental_option("useAutomationExtension", False)
+    return opts
+
+
+def _get_uc_driver_path():
+    """Patch the undetected-chromedriver binary once and reuse it for every launch"""
+    global _uc_patcher, _uc_driver_path
+    if _uc_driver_path is None:
+        try:
+            patcher = uc.Patcher()
+            patcher.auto()
+            # Keep the patcher alive: it deletes its binary when garbage collected
+            _uc_patcher = patcher
+            _uc_driver_path = patcher.executable_path
+            logger.info("🔧 Cached patched chromedriver: %s", _uc_driver_path)
+        except Exception as e:
+            logger.warning("⚠️ Could not pre-patch chromedriver, UC will patch per launch: %s", e)
+            _uc_driver_path = ""
+    return _uc_driver_path or None
+
+
+def _ensure_profile_template():
+    """Build the seed profile that every instance's user data dir is cloned from"""
+    global _profile_template_ready
+    if _profile_template_ready:
+        return CHROME_PROFILE_TEMPLATE_DIR
+    default_dir = os.path.join(CHROME_PROFILE_TEMPLATE_DIR, "Default")
+    os.makedirs(default_dir, exist_ok=True)
+    seed_files = {
+        os.path.join(CHROME_PROFILE_TEMPLATE_DIR, "First Run"): "",
+        os.path.join(CHROME_PROFILE_TEMPLATE_DIR, "Local State"): json.dumps({
+            "browser": {"enabled_labs_experiments": []},
+            "user_experience_metrics": {"reporting_enabled": False},
+        }),
+        os.path.join(default_dir, "Preferences"): json.dumps({
+            "browser": {"has_seen_welcome_page": True, "check_default_browser": False},
+            "profile": {"exit_type": "Normal", "exited_cleanly": True},
+            "credentials_enable_service": False,
+            "translate": {"enabled": False},
+            "safebrowsing": {"enabled": False},
+        }),
+    }
+    for path, content in seed_files.items():
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+    _profile_template_ready = True
+    return CHROME_PROFILE_TEMPLATE_DIR
+
+
+def _clone_profile_template(user_data_dir):
+    """Create an instance's user data dir from the template, or empty if that fails"""
+    try:
+        shutil.copytree(_ensure_profile_template(), user_data_dir)
+    except Exception as e:
+        logger.warning("⚠️ Profile template clone failed, starting with an empty profile: %s", e)
+        os.makedirs(user_data_dir, exist_ok=True)
+
+
+def _record_startup(backend, seconds, failed=False):
+    with _startup_stats_lock:
+        if failed:
+            _startup_stats["failures"] += 1
+        else:
+            _startup_stats["launches"] += 1
+        stats = _startup_stats["by_backend"].setdefault(
+            backend, {"launches": 0, "failures": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": None}
+        )
+        if failed:
+            stats["failures"] += 1
+            return
+        stats["launches"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats["last_seconds"] = seconds
+
+
+def get_browser_startup_stats():
+    """How long Chrome launches have taken per backend since startup"""
+    with _startup_stats_lock:
+        result = {"launches": _startup_stats["launches"], "failures": _startup_stats["failures"], "by_backend": {}}
+        for backend, stats in _startup_stats["by_backend"].items():
+            entry = dict(stats)
+            entry["avg_seconds"] = stats["total_seconds"] / stats["launches"] if stats["launches"] else None
+            result["by_backend"][backend] = entry
+    return result
+
+
+def _launch(backend, launch_fn):
+    started = time.perf_counter()
+    try:
+        driver = launch_fn()
+    except Exception:
+        _record_startup(backend, time.perf_counter() - started, failed=True)
+        BROWSER_LAUNCH_FAILURES.inc(backend=backend)
+        raise
+    elapsed = time.perf_counter() - started
+    _record_startup(backend, elapsed)
+    BROWSER_LAUNCH_SECONDS.observe(elapsed, backend=backend)
+    logger.info("🚀 Chrome (%s) started in %.2fs", backend, elapsed)
+    return driver
+
+
+def create_stealth_driver(headless=True, max_retries=None, resource_profile="scrape", cancel_token=None):
+    """Create a stealth Chrome driver with unique user data directory to avoid conflicts"""
     if max_retries is None:
         max_retries = BROWSER_MAX_RETRIES
-    """Create a stealth Chrome driver with unique user data directory to avoid conflicts"""
-    
+
+    _ensure_reaper()
+
+    # Wait for a slot (count and memory capped); raises BrowserQueueFull for impatient callers
+    browser_admission.acquire(cancel_token=cancel_token)
+    try:
+        return _launch_with_retries(headless, max_retries, resource_profile)
+    except BaseException:
+        browser_admission.release()
+        raise
+
+
+def _launch_with_retries(headless, max_retries, resource_profile):
     with _browser_lock:  # Ensure only one browser instance is created at a time
         for attempt in range(max_retries):
+            user_data_dir = None
             try:
-                # Create unique user data directory for this browser instance
+                # Unique user data directory per instance; the owner PID lets the reaper spot orphans
                 unique_id = str(uuid.uuid4())[:8]
-                temp_dir = tempfile.gettempdir()
-                user_data_dir = os.path.join(temp_dir, f"chrome_user_data_{unique_id}")
+                user_data_dir = os.path.normpath(
+                    os.path.join(CHROME_PROFILE_ROOT, f"chrome_user_data_{os.getpid()}_{unique_id}")
+                )
+                _register_profile(user_data_dir)
+                _clone_profile_template(user_data_dir)
                 
-                print(f"🌐 Creating browser instance with unique user data dir: {user_data_dir}")
+                logger.debug("🌐 Creating browser instance with unique user data dir: %s", user_data_dir)
                 
-                if HAS_UC:
-                    opts = uc.ChromeOptions()
-                    if headless:
-                        opts.add_argument("--headless=new")
-                    opts.add_argument("--no-sandbox")
-                    opts.add_argument("--disable-dev-shm-usage")
-                    opts.add_argument("--disable-blink-features=AutomationControlled")
-                    opts.add_argument("--window-size=1366,768")
-                    opts.add_argument(f"--user-data-dir={user_data_dir}")
-                    opts.add_argument("--disable-gpu")
-                    opts.add_argument("--disable-extensions")
-                    opts.add_argument("--disable-plugins")
-                    opts.add_argument("--disable-images")  # Speed up loading
-                    # Add additional options to prevent conflicts
-                    opts.add_argument("--disable-background-timer-throttling")
-                    opts.add_argument("--disable-backgrounding-occluded-windows")
-                    opts.add_argument("--disable-renderer-backgrounding")
-                    opts.add_argument("--disable-features=TranslateUI")
-                    opts.add_argument("--disable-ipc-flooding-protection")
-                    
+                if BROWSER_BACKEND == "fake":
+                    from fake_browser import FakeDriver
+                    driver = _launch("fake", lambda: FakeDriver(resource_profile=resource_profile))
+                elif HAS_UC:
+                    opts = _build_chrome_options(uc.ChromeOptions, headless, user_data_dir, resource_profile, plain_chrome=False)
+                    driver_path = _get_uc_driver_path()
                     try:
-                        driver = uc.Chrome(options=opts)
+                        if driver_path:
+                            driver = _launch("uc", lambda: uc.Chrome(options=opts, driver_executable_path=driver_path))
+                        else:
+                            driver = _launch("uc", lambda: uc.Chrome(options=opts))
                     except Exception as e:
-                        print(f"⚠️ UC Chrome failed: {e}, falling back to regular Chrome")
+                        logger.warning("⚠️ UC Chrome failed: %s, falling back to regular Chrome", e)
                         # Fallback to regular Chrome if UC fails
-                        opts = Options()
-                        if headless:
-                            opts.add_argument("--headless=new")
-                        opts.add_argument("--no-sandbox")
-                        opts.add_argument("--disable-dev-shm-usage")
-                        opts.add_argument("--disable-blink-features=AutomationControlled")
-                        opts.add_argument("--window-size=1366,768")
-                        opts.add_argument(f"--user-data-dir={user_data_dir}")
-                        opts.add_argument("--disable-gpu")
-                        opts.add_argument("--disable-extensions")
-                        opts.add_argument("--disable-plugins")
-                        opts.add_argument("--disable-images")
-                        # Add additional options to prevent conflicts
-                        opts.add_argument("--disable-background-timer-throttling")
-                        opts.add_argument("--disable-backgrounding-occluded-windows")
-                        opts.add_argument("--disable-renderer-backgrounding")
-                        opts.add_argument("--disable-features=TranslateUI")
-                        opts.add_argument("--disable-ipc-flooding-protection")
-                        opts.add_experimental_option("excludeSwitches", ["enable-automation"])
-                        opts.add_experimental_option("useAutomationExtension", False)
-                        driver = webdriver.Chrome(options=opts)
+                        opts = _build_chrome_options(Options, headless, user_data_dir, resource_profile, plain_chrome=True)
+                        driver = _launch("chrome", lambda: webdriver.Chrome(options=opts))
                 else:
-                    opts = Options()
-                    if headless:
-                        opts.add_argument("--headless=new")
-                    opts.add_argument("--no-sandbox")
-                    opts.add_argument("--disable-dev-shm-usage")
-                    opts.add_argument("--disable-blink-features=AutomationControlled")
-                    opts.add_argument("--window-size=1366,768")
-                    opts.add_argument(f"--user-data-dir={user_data_dir}")
-                    opts.add_argument("--disable-gpu")
-                    opts.add_argument("--disable-extensions")
-                    opts.add_argument("--disable-plugins")
-                    opts.add_argument("--disable-images")  # Speed up loading
-                    # Add additional options to prevent conflicts
-                    opts.add_argument("--disable-background-timer-throttling")
-                    opts.add_argument("--disable-backgrounding-occluded-windows")
-                    opts.add_argument("--disable-renderer-backgrounding")
-                    opts.add_argument("--disable-features=TranslateUI")
-                    opts.add_argument("--disable-ipc-flooding-protection")
-                    opts.add_experimental_option("excludeSwitches", ["enable-automation"])
-                    opts.add_experimental_option("useAutomationExtension", False)
-                    driver = webdriver.Chrome(options=opts)
+                    opts = _build_chrome_options(Options, headless, user_data_dir, resource_profile, plain_chrome=True)
+                    driver = _launch("chrome", lambda: webdriver.Chrome(options=opts))
                 
                 try:
                     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
@@ -116,6 +285,9 @@ def create_stealth_driver(headless=True, max_retries=None):
                 
                 # Store the user data directory path for cleanup
                 setattr(driver, '_user_data_dir', user_data_dir)
+                setattr(driver, '_resource_profile', resource_profile)
+                _register_driver(driver, user_data_dir)
+                apply_resource_profile(driver, resource_profile)
                 
                 # Add a small delay to ensure the browser is fully initialized
                 time.sleep(BROWSER_CREATION_DELAY)
@@ -123,22 +295,103 @@ def create_stealth_driver(headless=True, max_retries=None):
                 return driver
                 
             except Exception as e:
-                print(f"⚠️ Browser creation attempt {attempt + 1} failed: {e}")
+                logger.warning("⚠️ Browser creation attempt %s failed: %s", attempt + 1, e)
+                if user_data_dir:
+                    _remove_profile_dir(user_data_dir)
+                    _unregister(user_data_dir)
                 if attempt < max_retries - 1:
-                    print(f"⏳ Retrying in {BROWSER_RETRY_DELAY} seconds...")
+                    logger.info("⏳ Retrying in %s seconds...", BROWSER_RETRY_DELAY)
                     time.sleep(BROWSER_RETRY_DELAY)
                 else:
                     raise Exception(f"Failed to create browser instance after {max_retries} attempts: {e}")
 
 
+def resource_block_patterns(resource_profile, include_ads=True):
+    """Blocked URL patterns for a profile: those of its categories (ads only if include_ads)"""
+    profile = RESOURCE_BLOCK_PROFILES.get(resource_profile)
+    if not profile:
+        return list(AD_BLOCK_PATTERNS) if include_ads else []
+    patterns = []
+    for category in profile["block"]:
+        if category == "ads" and not include_ads:
+            continue
+        for pattern in RESOURCE_BLOCK_CATEGORIES.get(category, []):
+            if pattern not in patterns:
+                patterns.append(pattern)
+    return patterns
+
+
+def apply_resource_profile(driver, resource_profile, include_ads=True):
+    """Install a resource-blocking profile on a live driver"""
+    if not resource_profile:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": resource_block_patterns(resource_profile, include_ads)})
+    except Exception as e:
+        logger.warning("⚠️ Could not apply resource profile '%s': %s", resource_profile, e)
+
+
 def set_adblock(driver, enabled: bool):
+    resource_profile = getattr(driver, '_resource_profile', None)
     try:
         driver.execute_cdp_cmd("Network.enable", {})
-        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": AD_BLOCK_PATTERNS if enabled else []})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": resource_block_patterns(resource_profile, enabled)})
     except Exception:
         pass
 
 
+def collect_resource_stats(driver):
+    """Fold the driver's performance log into the blocked/loaded request counters"""
+    if not RESOURCE_BLOCK_STATS or not getattr(driver, '_resource_profile', None):
+        return
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return
+
+    blocked = 0
+    loaded = 0
+    bytes_loaded = 0
+    bytes_saved = 0
+    blocked_by_type = {}
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except Exception:
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.loadingFailed" and params.get("blockedReason"):
+            resource_type = params.get("type") or "Other"
+            blocked += 1
+            blocked_by_type[resource_type] = blocked_by_type.get(resource_type, 0) + 1
+            bytes_saved += RESOURCE_BLOCK_ESTIMATED_BYTES.get(resource_type, RESOURCE_BLOCK_ESTIMATED_BYTES["Other"])
+        elif method == "Network.loadingFinished":
+            loaded += 1
+            bytes_loaded += int(params.get("encodedDataLength") or 0)
+
+    with _resource_stats_lock:
+        _resource_stats["drivers"] += 1
+        _resource_stats["requests_blocked"] += blocked
+        _resource_stats["requests_loaded"] += loaded
+        _resource_stats["bytes_loaded"] += bytes_loaded
+        _resource_stats["bytes_saved_estimate"] += bytes_saved
+        for resource_type, count in blocked_by_type.items():
+            _resource_stats["blocked_by_type"][resource_type] = _resource_stats["blocked_by_type"].get(resource_type, 0) + count
+
+    if blocked:
+        logger.info("🚫 Blocked %s requests (~%.1fMB saved), loaded %.1fMB", blocked, bytes_saved / 1024 / 1024, bytes_loaded / 1024 / 1024)
+
+
+def get_resource_block_stats():
+    """Totals of requests and bytes saved by resource blocking since startup"""
+    with _resource_stats_lock:
+        stats = dict(_resource_stats)
+        stats["blocked_by_type"] = dict(_resource_stats["blocked_by_type"])
+    return stats
+
+
 def close_new_tabs_and_return(driver, base_handle: str):
     try:
         handles = driver.window_handles
@@ -154,19 +407,276 @@ def close_new_tabs_and_return(driver, base_handle: str):
         pass
 
 
+def _remove_profile_dir(user_data_dir):
+    if user_data_dir and os.path.exists(user_data_dir):
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+        return not os.path.exists(user_data_dir)
+    return False
+
+
+def _driver_pids(driver):
+    """chromedriver and Chrome PIDs of a driver, where they can be found"""
+    pids = []
+    try:
+        pids.append(driver.service.process.pid)
+    except Exception:
+        pass
+    browser_pid = getattr(driver, 'browser_pid', None)  # set by undetected-chromedriver
+    if browser_pid:
+        pids.append(browser_pid)
+    return pids
+
+
+def _mark_leaked(key):
+    # weakref callback: the driver object was dropped without shutdown_driver(). The cyclic
+    # GC can run it while this very thread holds _registry_lock, so it must not take the
+    # lock; a dict lookup and an item assignment are atomic on their own
+    entry = _live_drivers.get(key)
+    if entry:
+        entry["leaked"] = True
+
+
+def _register_profile(user_data_dir):
+    """Track a profile dir before Chrome starts so a failed launch is still reaped"""
+    with _registry_lock:
+        _live_drivers[user_data_dir] = {
+            "ref": None,
+            "pids": [],
+            "user_data_dir": user_data_dir,
+            "created_at": time.time(),
+            "admitted_at": None,
+            "leaked": False,
+        }
+
+
+def _register_driver(driver, user_data_dir):
+    with _registry_lock:
+        entry = _live_drivers.get(user_data_dir)
+        if entry is None:
+            return
+        entry["ref"] = weakref.ref(driver, lambda _ref, key=user_data_dir: _mark_leaked(key))
+        entry["pids"] = _driver_pids(driver)
+        # The driver now owns the admission slot taken in create_stealth_driver
+        entry["admitted_at"] = time.monotonic()
+
+
+def _release_slot(entry):
+    if entry and entry.get("admitted_at") is not None:
+        browser_admission.release(time.monotonic() - entry["admitted_at"])
+        entry["admitted_at"] = None
+
+
+def _unregister(user_data_dir):
+    with _registry_lock:
+        entry = _live_drivers.pop(user_data_dir, None)
+    _release_slot(entry)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _kill_pid(pid):
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        return False
+    deadline = time.time() + 3
+    while time.time() < deadline and _pid_alive(pid):
+        time.sleep(0.1)
+    if _pid_alive(pid):
+        try:
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+    return True
+
+
+def _chrome_processes_by_profile():
+    """Map chrome_user_data_* dirs to the PIDs started with them (Linux /proc only)"""
+    if not os.path.isdir("/proc"):
+        return None
+    result = {}
+    prefix = b"--user-data-dir="
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                args = f.read().split(b"\0")
+        except OSError:
+            continue
+        for arg in args:
+            if arg.startswith(prefix):
+                path = os.path.normpath(arg[len(prefix):].decode("utf-8", "ignore"))
+                if os.path.basename(path).startswith("chrome_user_data_"):
+                    result.setdefault(path, []).append(int(name))
+                break
+    return result
+
+
+def _profile_is_orphaned(user_data_dir, live_dirs, processes):
+    match = _PROFILE_DIR_RE.match(os.path.basename(user_data_dir))
+    if match:
+        owner = int(match.group(1))
+        if owner == os.getpid():
+            return user_data_dir not in live_dirs
+        return not _pid_alive(owner)
+    # Profiles named before owner PIDs were recorded: reap once idle and old enough
+    try:
+        age = time.time() - os.path.getmtime(user_data_dir)
+    except OSError:
+        return False
+    if processes is not None and processes.get(user_data_dir):
+        return False
+    return age > BROWSER_REAPER_GRACE
+
+
+def reap_orphaned_browsers():
+    """Kill Chrome left behind by crashed or abandoned drivers and delete their profile dirs"""
+    reaped_dirs = 0
+    killed = 0
+
+    # Drivers garbage collected without shutdown_driver(), or whose chromedriver died
+    with _registry_lock:
+        leaked = [
+            entry for entry in _live_drivers.values()
+            if entry["leaked"] or (entry["pids"] and not _pid_alive(entry["pids"][0]))
+        ]
+        for entry in leaked:
+            _live_drivers.pop(entry["user_data_dir"], None)
+    for entry in leaked:
+        _release_slot(entry)
+        for pid in entry["pids"]:
+            if _pid_alive(pid) and _kill_pid(pid):
+                killed += 1
+        if _remove_profile_dir(entry["user_data_dir"]):
+            reaped_dirs += 1
+
+    # Profile dirs on disk that no live driver owns. List them before snapshotting the
+    # registry: a profile is registered before its dir is created, so any dir listed
+    # here that belongs to a launch in progress is already in live_dirs
+    try:
+        names = os.listdir(CHROME_PROFILE_ROOT)
+    except OSError:
+        names = []
+    processes = _chrome_processes_by_profile()
+    with _registry_lock:
+        live_dirs = set(_live_drivers.keys())
+    for name in names:
+        if not name.startswith("chrome_user_data_"):
+            continue
+        user_data_dir = os.path.normpath(os.path.join(CHROME_PROFILE_ROOT, name))
+        if user_data_dir in live_dirs or not _profile_is_orphaned(user_data_dir, live_dirs, processes):
+            continue
+        for pid in (processes or {}).get(user_data_dir, []):
+            if _kill_pid(pid):
+                killed += 1
+        if _remove_profile_dir(user_data_dir):
+            reaped_dirs += 1
+
+    with _registry_lock:
+        _reaper_stats["runs"] += 1
+        _reaper_stats["leaked_drivers"] += len(leaked)
+        _reaper_stats["reaped_dirs"] += reaped_dirs
+        _reaper_stats["killed_processes"] += killed
+    if leaked or reaped_dirs or killed:
+        logger.info("🧟 Reaped %s leaked drivers, %s profile dirs, %s Chrome processes", len(leaked), reaped_dirs, killed)
+    return {"leaked_drivers": len(leaked), "reaped_dirs": reaped_dirs, "killed_processes": killed}
+
+
+def _reaper_loop():
+    while not _reaper_stop.wait(BROWSER_REAPER_INTERVAL):
+        try:
+            reap_orphaned_browsers()
+        except Exception as e:
+            logger.warning("⚠️ Browser reaper failed: %s", e)
+
+
+def _ensure_reaper():
+    """Start the background reaper once per process, after a first sweep of old leftovers"""
+    global _reaper_thread
+    if _reaper_thread is not None:
+        return
+    try:
+        reap_orphaned_browsers()
+    except Exception as e:
+        logger.warning("⚠️ Initial browser reap failed: %s", e)
+    _reaper_thread = threading.Thread(target=_reaper_loop, name="browser-reaper", daemon=True)
+    _reaper_thread.start()
+    atexit.register(shutdown_all_drivers)
+
+
+def shutdown_all_drivers():
+    """Quit every tracked driver and remove its profile dir (runs at process exit)"""
+    _reaper_stop.set()
+    with _registry_lock:
+        entries = list(_live_drivers.values())
+        _live_drivers.clear()
+    for entry in entries:
+        driver = entry["ref"]() if entry["ref"] else None
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        for pid in entry["pids"]:
+            if _pid_alive(pid):
+                _kill_pid(pid)
+        _remove_profile_dir(entry["user_data_dir"])
+
+
+def get_browser_registry_stats():
+    """Live driver count and totals of leaked instances cleaned up by the reaper"""
+    with _registry_lock:
+        stats = dict(_reaper_stats)
+        stats["live_drivers"] = len(_live_drivers)
+        stats["oldest_driver_seconds"] = (
+            time.time() - min(e["created_at"] for e in _live_drivers.values()) if _live_drivers else None
+        )
+    return stats
+
+
+def shutdown_driver(driver):
+    """Quit a driver and remove its profile dir, even if quitting fails"""
+    if driver is None:
+        return
+    collect_resource_stats(driver)
+    user_data_dir = getattr(driver, '_user_data_dir', None)
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning("⚠️ Error closing driver: %s", e)
+        for pid in _driver_pids(driver):
+            if _pid_alive(pid):
+                _kill_pid(pid)
+    finally:
+        if _remove_profile_dir(user_data_dir):
+            logger.debug("🧹 Cleaned up browser data directory: %s", user_data_dir)
+        if user_data_dir:
+            _unregister(user_data_dir)
+
+
 def cleanup_browser_data(driver):
     """Clean up temporary user data directory after browser closes"""
+    collect_resource_stats(driver)
     try:
         if hasattr(driver, '_user_data_dir'):
             user_data_dir = getattr(driver, '_user_data_dir')
             if user_data_dir and os.path.exists(user_data_dir):
-                import shutil
                 # Add a small delay to ensure Chrome has fully released the directory
                 time.sleep(BROWSER_CLEANUP_DELAY)
                 shutil.rmtree(user_data_dir, ignore_errors=True)
-                print(f"🧹 Cleaned up browser data directory: {user_data_dir}")
+                logger.debug("🧹 Cleaned up browser data directory: %s", user_data_dir)
+            _unregister(user_data_dir)
     except Exception as e:
-        print(f"⚠️ Failed to cleanup browser data: {e}")
+        logger.warning("⚠️ Failed to cleanup browser data: %s", e)
 
 def guarded_click(driver, element, max_retries: int = 3):
     base = driver.current_window_handle
@@ -0,0 +1,134 @@
+import time
+import threading
+from contextlib import contextmanager
+from config import CANCEL_POLL_INTERVAL
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class Cancelled(Exception):
+    """Raised inside a job once its task has been cancelled"""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag for one job.
+
+    Loops call raise_if_cancelled() or sleep(); blocking resources (a browser, an HTTP
+    response, ffmpeg) are registered with on_cancel() and are closed by a watcher thread
+    within poll_interval of the cancel being noticed. `check` is polled to notice cancels
+    made from another process. A token without `check` is only cancelled by cancel().
+    """
+
+    def __init__(self, check=None, poll_interval=CANCEL_POLL_INTERVAL):
+        self._check = check
+        self.poll_interval = poll_interval
+        self._event = threading.Event()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_id = 0
+        self._last_poll = 0.0
+        self._watcher = None
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("⚠️ Error releasing resource on cancel: %s", e)
+
+    @property
+    def cancelled(self):
+        """True once cancelled; polls `check` at most once per poll_interval, so it is cheap in hot loops"""
+        if self._event.is_set():
+            return True
+        if self._check is not None:
+            now = time.monotonic()
+            if now - self._last_poll >= self.poll_interval:
+                self._last_poll = now
+                try:
+                    if self._check():
+                        self.cancel()
+                except Exception as e:
+                    logger.warning("⚠️ Could not check cancellation: %s", e)
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise Cancelled("Task was cancelled")
+
+    def task_cancelled(self):
+        """
+        True if the task itself was cancelled, not just this job stopped (e.g. its lease was
+        lost to another worker, which carries on with the same files). Reads `check` afresh;
+        a token without `check` is only ever cancelled on purpose.
+        """
+        if self._check is None:
+            return self._event.is_set()
+        try:
+            return bool(self._check())
+        except Exception as e:
+            logger.warning("⚠️ Could not check cancellation: %s", e)
+            return False
+
+    def sleep(self, seconds):
+        """time.sleep that raises Cancelled as soon as the token is cancelled"""
+        deadline = time.monotonic() + seconds
+        while True:
+            self.raise_if_cancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._event.wait(min(remaining, self.poll_interval))
+
+    def register(self, callback):
+        """Call callback() (e.g. driver.quit, process.kill) on cancel; returns a function that unregisters it"""
+        self.raise_if_cancelled()
+        with self._lock:
+            key = self._next_id
+            self._next_id += 1
+            self._callbacks[key] = callback
+            if self._check is not None and self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="cancel-watcher", daemon=True)
+                self._watcher.start()
+
+        def unregister():
+            with self._lock:
+                self._callbacks.pop(key, None)
+        return unregister
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """register() for the duration of a with block"""
+        unregister = self.register(callback)
+        try:
+            yield
+        finally:
+            unregister()
+
+    def _watch(self):
+        while not self._closed.wait(self.poll_interval):
+            with self._lock:
+                watching = bool(self._callbacks)
+            if watching and self.cancelled:
+                return
+
+    def close(self):
+        """Stop the watcher thread once the job is over"""
+        self._closed.set()
+
+
+def task_cancel_token(store, task_id, poll_interval=CANCEL_POLL_INTERVAL):
+    """Token that trips when the task's status in the store becomes "cancelled" (e.g. via DELETE /download/{id})"""
+    def check():
+        task = store.get(task_id)
+        return task is not None and task.get("status") == "cancelled"
+    return CancelToken(check=check, poll_interval=poll_interval)
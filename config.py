@@ -1,4 +1,8 @@
-BASE_ORIGIN = "https://animepahe.ru"
+import os
+import tempfile
+
+# Point at a stand-in server (see fake_site.py) to run benchmark.py and loadtest.py offline
+BASE_ORIGIN = os.getenv("BASE_ORIGIN", "https://animepahe.ru").rstrip("/")
 API_BASE = f"{BASE_ORIGIN}/api"
 
 # Network-level adblock URL patterns toggled via Chrome DevTools Protocol
@@ -23,5 +27,230 @@ BROWSER_MAX_RETRIES = 3
 BROWSER_CREATION_DELAY = 0.5
 BROWSER_CLEANUP_DELAY = 0.5
 BROWSER_RETRY_DELAY = 2
+# "chrome" (undetected-chromedriver when installed, else plain Chrome) or "fake", which
+# replays pages from BASE_ORIGIN without a browser (fake_browser.py; benchmarks and load tests)
+BROWSER_BACKEND = os.getenv("BROWSER_BACKEND", "chrome")
+
+# Seconds a recorded resolution menu (all m3u8 variants of an episode) is reused
+M3U8_VARIANT_CACHE_TTL = 1800
+
+# Resource blocking applied to every scrape driver through Network.setBlockedURLs.
+# Categories are URL patterns; profiles pick categories per flow. The patterns cannot
+# make exceptions, so anything a flow needs must simply not match its categories.
+RESOURCE_BLOCK_CATEGORIES = {
+    "images": ["*.png", "*.png?*", "*.jpg", "*.jpg?*", "*.jpeg", "*.jpeg?*", "*.gif", "*.gif?*",
+               "*.webp", "*.webp?*", "*.svg", "*.svg?*", "*.ico", "*.ico?*"],
+    # animepahe's image CDN (posters, snapshots); the DDoS-Guard check image on the
+    # site's own host (/.well-known/ddos-guard/...) does not match
+    "site_images": ["*://i.animepahe.*/*"],
+    "fonts": ["*.woff", "*.woff?*", "*.woff2", "*.woff2?*", "*.ttf", "*.ttf?*", "*.otf", "*.eot"],
+    "media": ["*.mp4", "*.mp4?*", "*.webm", "*.ts", "*.ts?*", "*.m4s", "*.mp3", "*.aac"],
+    "analytics": [
+        "*://*.google-analytics.com/*",
+        "*://*.googletagmanager.com/*",
+        "*://*.hotjar.com/*",
+        "*://*.scorecardresearch.com/*",
+        "*://mc.yandex.ru/*",
+        "*://*.cloudflareinsights.com/*",
+        "*://*.disqus.com/*",
+    ],
+    "ads": AD_BLOCK_PATTERNS,
+}
+
+RESOURCE_BLOCK_PROFILES = {
+    # animepahe play pages: only the DOM menus are read; a DDoS-Guard challenge
+    # must still be able to load its check image, so only the image CDN is blocked
+    "scrape": {"block": ["site_images", "fonts", "media", "analytics", "ads"]},
+    # DDoS-Guard cookie warm-up: the challenge loads its own check image
+    "session": {"block": ["site_images", "fonts", "media", "analytics", "ads"]},
+    # animepahe player: the .m3u8 playlists match no category; the segments are dropped
+    "player": {"block": ["site_images", "fonts", "media", "analytics", "ads"]},
+    # kwik: no challenge, so every image goes; the countdown script and the final
+    # .mp4 redirect match no category and load
+    "kwik": {"block": ["images", "fonts", "analytics", "ads"]},
+}
+
+# Record blocked/loaded requests from the performance log to report savings
+RESOURCE_BLOCK_STATS = True
+
+# Typical transfer size per blocked resource type, used to estimate bytes saved
+RESOURCE_BLOCK_ESTIMATED_BYTES = {
+    "Image": 40 * 1024,
+    "Font": 60 * 1024,
+    "Media": 512 * 1024,
+    "Script": 80 * 1024,
+    "Stylesheet": 30 * 1024,
+    "Other": 16 * 1024,
+}
+
+# Where per-instance Chrome profiles live; point at a tmpfs mount (e.g. /dev/shm) to keep them in RAM
+CHROME_PROFILE_ROOT = os.getenv("CHROME_PROFILE_ROOT") or tempfile.gettempdir()
+# Seed profile cloned into every instance's user data dir
+CHROME_PROFILE_TEMPLATE_DIR = os.path.join(CHROME_PROFILE_ROOT, "chrome_profile_template")
+
+# Orphaned Chrome reaper: sweep interval, and minimum age before an unowned legacy profile dir is removed
+BROWSER_REAPER_INTERVAL = 60
+BROWSER_REAPER_GRACE = 15 * 60
+
+# Browser admission control: concurrent Chrome cap, free memory needed to start another,
+# how many callers may queue before API requests get 429, and how long they may wait
+BROWSER_MAX_CONCURRENT = int(os.getenv("BROWSER_MAX_CONCURRENT", "2"))
+BROWSER_MIN_FREE_MEMORY_MB = int(os.getenv("BROWSER_MIN_FREE_MEMORY_MB", "400"))
+BROWSER_MAX_QUEUE = int(os.getenv("BROWSER_MAX_QUEUE", "8"))
+BROWSER_ADMISSION_TIMEOUT = 120
+
+# Download task store: "sqlite" (shared by every worker using the same file) or "memory"
+TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "sqlite")
+TASK_STORE_PATH = os.getenv("TASK_STORE_PATH") or (
+    os.path.join(tempfile.gettempdir(), "download_tasks.db") if os.getenv("VERCEL") else "download_tasks.db"
+)
+# Finished tasks are kept this long, and at most this many of them
+TASK_RETENTION_SECONDS = 7 * 24 * 3600
+TASK_RETENTION_MAX = 1000
+
+# Persistent job queue (same SQLite file as the task store by default) and its workers
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH") or TASK_STORE_PATH
+# A worker must heartbeat within this many seconds or its job is handed to another worker
+JOB_LEASE_SECONDS = 120
+JOB_POLL_INTERVAL = 2
+JOB_MAX_ATTEMPTS = 3
+# Jobs each `python worker.py` process runs at once
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+# Jobs the API process runs itself; set to 0 when dedicated worker processes are deployed
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", "1"))
+
+# How often a running job re-reads its task status to notice a cancel request
+CANCEL_POLL_INTERVAL = 2
+
+# Progress events: how often a job publishes them and writes them to the task store,
+# the fastest rate a streaming client receives them, how often the API picks up
+# progress written by other worker processes, and the SSE keepalive period
+PROGRESS_PUBLISH_INTERVAL = 0.25
+PROGRESS_PERSIST_INTERVAL = 2
+PROGRESS_STREAM_INTERVAL = 0.5
+PROGRESS_STORE_POLL_INTERVAL = 1
+PROGRESS_KEEPALIVE = 15
+
+# Bandwidth scheduler (bytes per second, 0 = unlimited): cap on all downloads in a process,
+# caps per host (keys may be fnmatch patterns such as "*.kwik.si"; hosts matching one pattern
+# share its cap), and the cap for any other single host. Adjustable at runtime via /admin/bandwidth
+BANDWIDTH_GLOBAL_LIMIT = int(os.getenv("BANDWIDTH_GLOBAL_LIMIT", "0"))
+BANDWIDTH_HOST_LIMITS = {}
+BANDWIDTH_DEFAULT_HOST_LIMIT = int(os.getenv("BANDWIDTH_DEFAULT_HOST_LIMIT", "0"))
+# Seconds of traffic a bucket may save up and send as a burst
+BANDWIDTH_BURST_SECONDS = 1.0
+# Runtime limits are saved here so every worker process picks them up
+BANDWIDTH_LIMITS_PATH = os.getenv("BANDWIDTH_LIMITS_PATH") or os.path.splitext(TASK_STORE_PATH)[0] + "_bandwidth.json"
+
+# Required in the X-Admin-Token header of the /admin and /debug endpoints, which are
+# refused while it is unset; with it set, ?profile=1 also needs the header
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Adaptive request pacing for the site's API, play pages and kwik, shared by all processes
+# through SQLite (same file as the task store by default). Rates are requests per second:
+# each healthy response adds RATE_LIMIT_INCREASE, a 429/403/5xx or DDoS-Guard page multiplies
+# the rate by RATE_LIMIT_DECREASE and pauses the host for a cooldown that doubles per failure
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH") or TASK_STORE_PATH
+RATE_LIMIT_HOSTS = ["animepahe.*", "*.animepahe.*", "kwik.*", "*.kwik.*"]
+RATE_LIMIT_INITIAL = 2.0
+RATE_LIMIT_MIN = 0.2
+RATE_LIMIT_MAX = 8.0
+RATE_LIMIT_INCREASE = 0.25
+RATE_LIMIT_DECREASE = 0.5
+RATE_LIMIT_COOLDOWN = 2
+RATE_LIMIT_MAX_COOLDOWN = 60
+# Times SessionManager.get retries a throttled response (after the limiter's cooldown)
+RATE_LIMIT_RETRIES = 2
+
+# Resumable direct downloads: each file gets a <file>.manifest.json with a CRC32 per block of
+# this many bytes, saved at most this often while downloading
+DOWNLOAD_MANIFEST_BLOCK_SIZE = 1024 * 1024
+DOWNLOAD_MANIFEST_SAVE_INTERVAL = 2
+
+# Direct downloads report progress after every TRANSFER_PROGRESS_BYTES or
+# TRANSFER_PROGRESS_INTERVAL seconds, whichever comes first, rather than per chunk
+TRANSFER_PROGRESS_BYTES = 256 * 1024
+TRANSFER_PROGRESS_INTERVAL = 0.5
+
+# Index of downloaded episodes, consulted before any browser work (same SQLite file as the
+# task store by default)
+LIBRARY_INDEX_PATH = os.getenv("LIBRARY_INDEX_PATH") or TASK_STORE_PATH
+
+# Airing-show watcher (same SQLite file as the task store by default). Each watched show is
+# polled every poll interval (at least WATCH_MIN_INTERVAL, +/- WATCH_JITTER as a fraction);
+# due shows are checked every WATCH_TICK seconds, WATCH_CONCURRENCY at a time, and a show being
+# polled is held for WATCH_CLAIM_SECONDS so other processes skip it
+WATCH_STORE_PATH = os.getenv("WATCH_STORE_PATH") or TASK_STORE_PATH
+WATCH_POLL_INTERVAL = 3600
+WATCH_MIN_INTERVAL = 300
+WATCH_JITTER = 0.1
+WATCH_CONCURRENCY = 2
+WATCH_TICK = 30
+WATCH_CLAIM_SECONDS = 600
+# New-episode downloads queue behind downloads someone asked for
+WATCH_PRIORITY = 5
+# Run the watcher inside the API process; set to 0 when `python watcher.py` runs separately
+EMBEDDED_WATCHER = int(os.getenv("EMBEDDED_WATCHER", "1"))
+
+# batch.py resolves this many upcoming episodes while the current one downloads; resolved
+# download links older than PREFETCH_TTL seconds are resolved again before use
+PREFETCH_LOOKAHEAD = 1
+PREFETCH_TTL = 600
+
+# Master playlists: the variant to download is the tallest one up to the episode's quality,
+# limited to HLS_PREFERRED_CODEC (e.g. "avc1") and HLS_MAX_BANDWIDTH bits/s (0 = no cap)
+# when set; a download request's "codec" and "max_bandwidth" override these
+HLS_PREFERRED_CODEC = os.getenv("HLS_PREFERRED_CODEC") or None
+HLS_MAX_BANDWIDTH = int(os.getenv("HLS_MAX_BANDWIDTH", "0"))
+
+# HLS downloads keep <raw file>.checkpoint.json with the offset, length and CRC32 of every
+# segment written (saved at most every DOWNLOAD_MANIFEST_SAVE_INTERVAL seconds), so retries
+# and restarts resume at the first missing segment. A failing segment is tried this many times
+HLS_SEGMENT_ATTEMPTS = int(os.getenv("HLS_SEGMENT_ATTEMPTS", "4"))
+
+# Sliced M3U8 downloads (always used on Vercel): each POST /download-m3u8/step downloads at
+# most this many segments or runs this long, saves its cursor and returns a continuation token.
+# Cursors live in the task store's backend unless HLS_SLICE_STORE_BACKEND says otherwise
+HLS_SLICE_STORE_BACKEND = os.getenv("HLS_SLICE_STORE_BACKEND") or TASK_STORE_BACKEND
+HLS_SLICE_STORE_PATH = os.getenv("HLS_SLICE_STORE_PATH") or TASK_STORE_PATH
+HLS_SLICE_MAX_SEGMENTS = int(os.getenv("HLS_SLICE_MAX_SEGMENTS", "200"))
+HLS_SLICE_SECONDS = float(os.getenv("HLS_SLICE_SECONDS", "45"))
+# A step that dies without saving its cursor blocks its token for this long
+HLS_SLICE_LEASE_SECONDS = 120
+# Failed steps of one episode are retried this many times before the episode is skipped
+HLS_SLICE_MAX_ATTEMPTS = 3
+# Have each step POST the next one to this deployment itself, so no client has to drive the job
+HLS_SLICE_SELF_INVOKE = int(os.getenv("HLS_SLICE_SELF_INVOKE", "0"))
+# Where self-invoked steps are sent; defaults to this Vercel deployment
+HLS_SLICE_STEP_URL = os.getenv("HLS_SLICE_STEP_URL") or (
+    f"https://{os.getenv('VERCEL_URL')}/download-m3u8/step" if os.getenv("VERCEL_URL") else "http://127.0.0.1:8000/download-m3u8/step"
+)
+
+# The API checks every EVENT_LOOP_LAG_INTERVAL seconds how late its event loop runs (GET /metrics)
+EVENT_LOOP_LAG_INTERVAL = 0.25
+
+# `python worker.py` serves its own /metrics on this port (0 = off); the API serves GET /metrics
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+# Tracing spans: appended as OTLP/JSON lines to TRACE_EXPORT_PATH when set; per-stage
+# totals are written to the task (GET /download/{task_id}) at most every TRACE_FLUSH_INTERVAL seconds
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_FLUSH_INTERVAL = 2
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "anime-downloader")
 
+# Opt-in profiling: API calls with ?profile=1 (or an X-Profile: 1 header) and downloads
+# started with "profile": true are sampled every PROFILE_SAMPLE_INTERVAL seconds; the newest
+# PROFILE_KEEP profiles are kept in PROFILE_STORE_PATH for GET /debug/profiles/{id}
+PROFILE_STORE_PATH = os.getenv("PROFILE_STORE_PATH") or TASK_STORE_PATH
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_KEEP = 50
 
+# Logging: records below LOG_LEVEL (DEBUG, INFO, WARNING, ERROR) are never formatted.
+# LOG_FORMAT is "text" or "json" (one object per line, with task_id and trace_id).
+# Records wait in a queue of LOG_QUEUE_SIZE for the writer thread and are dropped when it
+# is full; high-frequency messages (segment progress, retries) are logged at most once per
+# LOG_SAMPLE_INTERVAL seconds each
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = 10000
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "5"))
@@ -0,0 +1,358 @@
+"""
+A Chrome stand-in for benchmarks and load tests (BROWSER_BACKEND=fake).
+
+FakeDriver speaks the part of the Selenium WebDriver API the scrapers and the resolver
+use: it fetches pages over HTTP (keeping cookies), parses them into elements, and
+answers find_element(s) for ids, tag and class names, simple CSS selectors and the
+few XPath forms in use. Clicking a link navigates to it, and clicking a Bootstrap
+dropdown toggle shows its menu; scripts on the page are not run. It is created through
+browser.create_stealth_driver like Chrome, so admission, registry and reaping are the
+real ones and only the browser itself is missing.
+"""
+
+import re
+import itertools
+import http.cookiejar
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, WebDriverException, InvalidSelectorException
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_HIDDEN_TAGS = {"head", "script", "style", "title", "meta", "link", "template"}
+_URL_ATTRIBUTES = {"href", "src", "action"}
+_ids = itertools.count(1)
+
+
+class FakeElement:
+    def __init__(self, driver, tag, attrs, parent=None):
+        self._driver = driver
+        self.tag_name = tag
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.children = []
+        self.id = f"fake-{next(_ids)}"
+
+    # ---- tree ----------------------------------------------------------------
+
+    def _elements(self):
+        for child in self.children:
+            if isinstance(child, FakeElement):
+                yield child
+                yield from child._elements()
+
+    def _ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def _text(self):
+        parts = []
+        for child in self.children:
+            if isinstance(child, FakeElement):
+                if child.tag_name not in _HIDDEN_TAGS:
+                    parts.append(child._text())
+            else:
+                parts.append(child)
+        return " ".join(" ".join(parts).split())
+
+    @property
+    def classes(self):
+        return (self.attrs.get("class") or "").split()
+
+    # ---- WebElement API --------------------------------------------------------
+
+    @property
+    def text(self):
+        # As in Chrome, hidden elements have no rendered text
+        return self._text() if self.is_displayed() else ""
+
+    def get_attribute(self, name):
+        self._driver._check()
+        value = self.attrs.get(name)
+        if value is not None and name in _URL_ATTRIBUTES:
+            return urljoin(self._driver.current_url, value)
+        return value
+
+    get_dom_attribute = get_attribute
+
+    def is_displayed(self):
+        for node in itertools.chain([self], self._ancestors()):
+            style = (node.attrs.get("style") or "").replace(" ", "")
+            if node.tag_name in _HIDDEN_TAGS or "hidden" in node.attrs or "display:none" in style:
+                return False
+            if node.tag_name == "input" and node.attrs.get("type") == "hidden":
+                return False
+            if "dropdown-menu" in node.classes and "show" not in node.classes:
+                return False
+        return True
+
+    def is_enabled(self):
+        return "disabled" not in self.attrs
+
+    def click(self):
+        self._driver._check()
+        if self.attrs.get("data-toggle") == "dropdown":
+            menus = [e for e in self.parent._elements() if "dropdown-menu" in e.classes] if self.parent else []
+            for menu in menus[:1]:
+                menu.attrs["class"] = " ".join(menu.classes + ["show"])
+            return
+        link = self if self.tag_name == "a" else next((a for a in self._ancestors() if a.tag_name == "a"), None)
+        if link is not None and link.attrs.get("href") and not link.attrs["href"].startswith("#"):
+            if link.attrs.get("target") == "_blank":
+                self._driver._open_tab()
+            else:
+                self._driver.get(link.get_attribute("href"))
+            return
+        if self.tag_name == "button" and self.attrs.get("type") == "submit":
+            form = next((a for a in self._ancestors() if a.tag_name == "form"), None)
+            if form is not None:
+                self._driver.get(form.get_attribute("action"))
+
+    def find_element(self, by=By.ID, value=None):
+        return _first(self.find_elements(by, value), by, value)
+
+    def find_elements(self, by=By.ID, value=None):
+        self._driver._check()
+        return _find(self, by, value)
+
+    def __repr__(self):
+        return f"<FakeElement {self.tag_name} {self.attrs}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self, driver):
+        super().__init__(convert_charrefs=True)
+        self.root = FakeElement(driver, "#document", {})
+        self._stack = [self.root]
+        self._driver = driver
+
+    def handle_starttag(self, tag, attrs):
+        element = FakeElement(self._driver, tag, [(k, v if v is not None else "") for k, v in attrs], self._stack[-1])
+        self._stack[-1].children.append(element)
+        if tag not in _VOID_TAGS:
+            self._stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self._stack) - 1, 0, -1):
+            if self._stack[depth].tag_name == tag:
+                del self._stack[depth:]
+                return
+
+    def handle_data(self, data):
+        self._stack[-1].children.append(data)
+
+
+# ---- selectors -----------------------------------------------------------------
+
+_COMPOUND = re.compile(r"""(?P<tag>[a-zA-Z][\w-]*|\*)?(?P<rest>(?:\#[\w-]+|\.[\w-]+|\[[^\]]+\])*)$""")
+_PART = re.compile(r"""\#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)|\[(?P<attr>[\w-]+)\s*(?:(?P<op>[*^$~]?=)\s*["']?(?P<val>[^"'\]]*)["']?)?\]""")
+
+
+def _compile_compound(selector):
+    match = _COMPOUND.match(selector)
+    if not match:
+        raise InvalidSelectorException(f"unsupported selector {selector!r}")
+    tag = match.group("tag")
+    checks = []
+    for part in _PART.finditer(match.group("rest")):
+        if part.group("id"):
+            checks.append(lambda e, v=part.group("id"): e.attrs.get("id") == v)
+        elif part.group("cls"):
+            checks.append(lambda e, v=part.group("cls"): v in e.classes)
+        else:
+            name, op, val = part.group("attr"), part.group("op"), part.group("val")
+            checks.append(lambda e, n=name, o=op, v=val: _attr_matches(e.attrs.get(n), o, v))
+
+    def matches(element):
+        if tag and tag != "*" and element.tag_name != tag.lower():
+            return False
+        return all(check(element) for check in checks)
+    return matches
+
+
+def _attr_matches(actual, op, expected):
+    if actual is None:
+        return False
+    if op is None:
+        return True
+    return {
+        "=": actual == expected,
+        "*=": expected in actual,
+        "^=": actual.startswith(expected),
+        "$=": actual.endswith(expected),
+        "~=": expected in actual.split(),
+    }[op]
+
+
+def _css(scope, selector):
+    found = []
+    for group in selector.split(","):
+        compounds = [_compile_compound(c) for c in group.split()]
+        for element in scope._elements():
+            if not compounds[-1](element):
+                continue
+            # Descendant combinators, matched right to left against the ancestors
+            remaining = compounds[:-1]
+            for ancestor in element._ancestors():
+                if not remaining:
+                    break
+                if remaining[-1](ancestor):
+                    remaining.pop()
+            if not remaining and element not in found:
+                found.append(element)
+    return found
+
+
+def _xpath(scope, expression):
+    match = re.fullmatch(r"\./ancestor::(\w+)", expression)
+    if match:
+        ancestor = next((a for a in scope._ancestors() if a.tag_name == match.group(1)), None)
+        return [ancestor] if ancestor is not None else []
+    match = re.fullmatch(r"\.?((?://\w+)+)", expression)
+    if match:
+        return _css(scope, " ".join(match.group(1).strip("/").split("//")))
+    raise InvalidSelectorException(f"unsupported XPath {expression!r}")
+
+
+def _find(scope, by, value):
+    if by == By.ID:
+        return _css(scope, f"#{value}")
+    if by == By.CLASS_NAME:
+        return _css(scope, f".{value}")
+    if by == By.TAG_NAME:
+        return _css(scope, value)
+    if by == By.NAME:
+        return _css(scope, f"[name='{value}']")
+    if by == By.CSS_SELECTOR:
+        return _css(scope, value)
+    if by == By.XPATH:
+        return _xpath(scope, value)
+    raise InvalidSelectorException(f"unsupported locator strategy {by!r}")
+
+
+def _first(elements, by, value):
+    if not elements:
+        raise NoSuchElementException(f"no element for {by}={value!r}")
+    return elements[0]
+
+
+class _SwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        self._driver._check()
+        if handle in self._driver.window_handles:
+            self._driver.current_window_handle = handle
+
+    def default_content(self):
+        pass
+
+
+class FakeDriver:
+    """Enough of selenium.webdriver.Chrome to drive the scrapers against fake_site"""
+
+    def __init__(self, resource_profile=None, timeout=30):
+        self.timeout = timeout
+        self.current_url = "about:blank"
+        self.page_source = "<html><head></head><body></body></html>"
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = _SwitchTo(self)
+        self.blocked_urls = []
+        self.pages_loaded = 0
+        self._cookies = http.cookiejar.CookieJar()
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self._cookies))
+        self._opener.addheaders = [("User-Agent", USER_AGENT)]
+        self._closed = False
+        self._document = _TreeBuilder(self).root
+
+    def _check(self):
+        if self._closed:
+            raise WebDriverException("invalid session id")
+
+    def _open_tab(self):
+        self.window_handles.append(f"tab-{len(self.window_handles)}")
+
+    # ---- navigation ------------------------------------------------------------
+
+    def get(self, url):
+        self._check()
+        try:
+            with self._opener.open(url, timeout=self.timeout) as response:
+                body, self.current_url = response.read(), response.geturl()
+        except urllib.error.HTTPError as e:
+            # Chrome shows the error page rather than raising
+            body, self.current_url = e.read(), url
+        except (urllib.error.URLError, OSError) as e:
+            raise WebDriverException(f"net::ERR_CONNECTION_FAILED at {url}: {e}")
+        self._check()  # quit while the page was loading
+        self.page_source = body.decode("utf-8", errors="replace")
+        builder = _TreeBuilder(self)
+        builder.feed(self.page_source)
+        builder.close()
+        self._document = builder.root
+        self.pages_loaded += 1
+
+    @property
+    def title(self):
+        titles = _css(self._document, "title")
+        return titles[0]._text() if titles else ""
+
+    def find_element(self, by=By.ID, value=None):
+        return _first(self.find_elements(by, value), by, value)
+
+    def find_elements(self, by=By.ID, value=None):
+        self._check()
+        return _find(self._document, by, value)
+
+    def execute_script(self, script, *args):
+        self._check()
+        script = script.strip()
+        if "navigator.userAgent" in script:
+            return USER_AGENT
+        if script.startswith("arguments[0].click()") and args:
+            args[0].click()
+        elif script.startswith("arguments[0].remove()") and args:
+            element = args[0]
+            if element.parent is not None:
+                element.parent.children.remove(element)
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        self._check()
+        if cmd == "Network.setBlockedURLs":
+            self.blocked_urls = list(params.get("urls", []))
+        return {}
+
+    def get_log(self, log_type):
+        return []
+
+    def get_cookies(self):
+        self._check()
+        return [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path} for c in self._cookies]
+
+    def set_page_load_timeout(self, seconds):
+        self.timeout = seconds
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def close(self):
+        self._check()
+        if self.current_window_handle in self.window_handles and len(self.window_handles) > 1:
+            self.window_handles.remove(self.current_window_handle)
+
+    def quit(self):
+        self._closed = True
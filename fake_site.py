@@ -0,0 +1,277 @@
+"""
+Local stand-in for animepahe, pahe.win and kwik, for benchmarks and load tests.
+
+Replays the recorded pages in fixtures/: the home page (with the DDoS-Guard cookie),
+search and release JSON, play pages, pahe.win redirects, kwik download pages, and an
+AES-128 HLS playlist with its key, plus a master playlist of four variants of it
+(/hls/<name>/master.m3u8). Episode files and TS segments are generated at
+start-up (deterministic bytes; segments are one CBC stream over the episode, as the
+downloader expects). Every response waits `latency` seconds before its first byte and
+bodies are sent at most `bandwidth` bytes/s per connection, so a run can look like a
+fast LAN or a slow site.
+
+The other hosts are served under paths named after them (/pahe.win/..., /kwik.si/...),
+so code that recognises kwik by "kwik.si" in the URL behaves as it does live. Run
+`python fake_site.py` to browse it, or start it from code:
+
+    with FakeSite(latency=0.05) as site:
+        os.environ["BASE_ORIGIN"] = site.url
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Crypto.Cipher import AES
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Episode the home page and the benchmarks point at
+ANIME_SESSION = "5f3bd1ae-0c2a-5a8d-63e4-2b9d1f0f7c41"
+EPISODE_SESSION = "f56865fef7726a425116631e69a89fd76357b5ba56e4fcd4e1fe70e8242b666e"
+
+
+def _fixture(name, mode="r"):
+    with open(os.path.join(FIXTURES_DIR, name), mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+
+def _payload(size, seed):
+    """size deterministic bytes (MPEG-TS sync bytes every 188, like a real stream)"""
+    block = hashlib.sha256(seed.encode()).digest() * 6
+    packet = b"\x47" + block[:187]
+    return (packet * (size // 188 + 1))[:size]
+
+
+class FakeSite:
+    def __init__(self, latency=0.0, bandwidth=None, video_size=4 * 1024 * 1024,
+                 segment_size=188 * 1024, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.video_size = video_size
+        self.host = host
+        self.port = port
+        self.server = None
+        self.requests = {}
+        self._lock = threading.Lock()
+
+        self.release_pages = [json.loads(_fixture(f"release_{n}.json"))
+                              for n in range(1, 100) if os.path.exists(os.path.join(FIXTURES_DIR, f"release_{n}.json"))]
+        self.playlist = _fixture("index.m3u8")
+        self.key = _fixture("hls.key", "rb")
+        segment_count = len(re.findall(r"^seg\d+\.ts$", self.playlist, re.M))
+        segment_size -= segment_size % 16
+        plain = _payload(segment_size * segment_count, "hls")
+        encrypted = AES.new(self.key, AES.MODE_CBC, iv=self.key).encrypt(plain)
+        self.segments = [encrypted[n * segment_size:(n + 1) * segment_size] for n in range(segment_count)]
+        self.hls_plaintext = plain
+        self.video = _payload(video_size, "video")
+        self.video_etag = '"%s"' % hashlib.md5(self.video).hexdigest()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}"
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def request_counts(self):
+        with self._lock:
+            return dict(self.requests)
+
+    def start(self):
+        site = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.site = site
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-site", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- pages ---------------------------------------------------------------
+
+    def page(self, name, **values):
+        html = _fixture(name)
+        for key, value in dict(values, base=self.url).items():
+            html = html.replace("{{%s}}" % key, value)
+        return html
+
+    def release(self, query):
+        """A release page, re-sorted and re-paged from the recorded ones"""
+        episodes = [e for page in self.release_pages for e in page["data"]]
+        if query.get("sort", ["episode_asc"])[0] == "episode_desc":
+            episodes.reverse()
+        per_page = self.release_pages[0]["per_page"]
+        last_page = max(1, -(-len(episodes) // per_page))
+        page = int(query.get("page", ["1"])[0])
+        data = episodes[(page - 1) * per_page:page * per_page]
+        return {"total": len(episodes), "per_page": per_page, "current_page": page, "last_page": last_page,
+                "from": data[0]["episode"] if data else None, "to": data[-1]["episode"] if data else None,
+                "data": data}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    site = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        bandwidth = self.site.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        chunk = max(1024, int(bandwidth / 20))
+        started = time.perf_counter()
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            ahead = (offset + chunk) / bandwidth - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        path, query = parts.path, parse_qs(parts.query)
+        site = self.site
+        if site.latency:
+            time.sleep(site.latency)
+
+        if path == "/":
+            site.count("home")
+            return self._send(200, site.page("home.html"),
+                              headers={"Set-Cookie": "__ddg1_=fakeddg1; Path=/; HttpOnly"})
+        if path == "/api":
+            method = query.get("m", [""])[0]
+            site.count(f"api.{method}")
+            if method == "search":
+                return self._send(200, _fixture("search.json"), "application/json")
+            if method == "release":
+                return self._send(200, json.dumps(site.release(query)), "application/json")
+            return self._send(404, "{}", "application/json")
+        match = re.fullmatch(r"/play/([^/]+)/([^/]+)", path)
+        if match:
+            site.count("play")
+            return self._send(200, site.page("play.html", anime_session=match.group(1), episode_session=match.group(2)))
+        match = re.fullmatch(r"/pahe\.win/(\w+)", path)
+        if match:
+            site.count("pahe.win")
+            return self._send(200, site.page("pahe_win.html", link_id=match.group(1)))
+        match = re.fullmatch(r"/kwik\.si/f/(\w+)", path)
+        if match:
+            site.count("kwik.page")
+            return self._send(200, site.page("kwik.html", link_id=match.group(1)),
+                              headers={"Set-Cookie": "kwik_session=fakekwik; Path=/"})
+        match = re.fullmatch(r"/kwik\.si/d/(\w+)", path)
+        if match and self.command == "POST":
+            site.count("kwik.download")
+            return self._send_video()
+        match = re.fullmatch(r"/hls/(\w+)/(master\.m3u8|index\.m3u8|key|seg(\d+)\.ts)", path)
+        if match:
+            if match.group(2) == "master.m3u8":
+                site.count("hls.master")
+                return self._send(200, site.page("master.m3u8"), "application/vnd.apple.mpegurl")
+            if match.group(2) == "index.m3u8":
+                site.count("hls.playlist")
+                return self._send(200, site.playlist, "application/vnd.apple.mpegurl")
+            if match.group(2) == "key":
+                site.count("hls.key")
+                return self._send(200, site.key, "application/octet-stream")
+            number = int(match.group(3))
+            if number < len(site.segments):
+                site.count("hls.segment")
+                return self._send(200, site.segments[number], "video/mp2t")
+        site.count("not_found")
+        self._send(404, "Not Found", "text/plain")
+
+    def _send_video(self):
+        site = self.site
+        video = site.video
+        headers = {"ETag": site.video_etag, "Accept-Ranges": "bytes",
+                   "Content-Disposition": 'attachment; filename="AnimePahe_Frieren_-_01_1080p_SubsPlease.mp4"'}
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            if start >= len(video):
+                return self._send(416, b"", "video/mp4", {"Content-Range": f"bytes */{len(video)}"})
+            headers["Content-Range"] = f"bytes {start}-{len(video) - 1}/{len(video)}"
+            return self._send(206, video[start:], "video/mp4", headers)
+        self._send(200, video, "video/mp4", headers)
+
+    def do_GET(self):
+        try:
+            self._route()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.do_GET()
+
+    do_HEAD = do_GET
+
+
+def parse_rate(value):
+    """'512K', '5M' or a plain number of bytes/s"""
+    if not value:
+        return None
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recorded animepahe/kwik fixtures locally")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--bandwidth", help="per-connection cap, e.g. 2M (bytes/s)")
+    args = parser.parse_args()
+
+    site = FakeSite(latency=args.latency, bandwidth=parse_rate(args.bandwidth), port=args.port).start()
+    print(f"🎭 Fake site on {site.url}")
+    print(f"   BASE_ORIGIN={site.url} BROWSER_BACKEND=fake python main.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+import os
+import re
+import json
+import time
+import zlib
+import subprocess
+from urllib.parse import urljoin, urlsplit
+import requests
+import m3u8
+from Crypto.Cipher import AES
+from cancellation import CancelToken, Cancelled
+from bandwidth import bandwidth_scheduler
+from tracing import traced
+from metrics import (
+    DOWNLOAD_BYTES, TRANSFER_THROUGHPUT, HLS_SEGMENT_SECONDS, HLS_SEGMENT_FAILURES, FFMPEG_SECONDS
+)
+from config import HLS_PREFERRED_CODEC, HLS_MAX_BANDWIDTH, HLS_SEGMENT_ATTEMPTS, DOWNLOAD_MANIFEST_SAVE_INTERVAL
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+def _resolve_uri(m3u8_url, uri):
+    # urljoin also handles the "../" and "/root" URIs master playlists tend to use
+    return urljoin(m3u8_url, uri)
+
+
+def _fetch_segment(url, cancel_token):
+    """Download one segment in chunks, paced by the bandwidth scheduler"""
+    throttle = bandwidth_scheduler.throttle(url, cancel_token)
+    chunks = []
+    started = time.perf_counter()
+    try:
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                throttle.consume(len(chunk))
+        throttle.flush()
+    except Cancelled:
+        raise
+    except Exception:
+        HLS_SEGMENT_FAILURES.inc()
+        raise
+    finally:
+        DOWNLOAD_BYTES.inc(sum(len(c) for c in chunks), kind="hls")
+    HLS_SEGMENT_SECONDS.observe(time.perf_counter() - started)
+    return b"".join(chunks)
+
+
+def _run_ffmpeg(cmd, cancel_token):
+    """subprocess.run(cmd, check=True) that kills ffmpeg if the token is cancelled"""
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    started = time.perf_counter()
+    outcome = "cancelled"
+    try:
+        while True:
+            try:
+                _, stderr = process.communicate(timeout=1)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_token.cancelled:
+                    raise Cancelled("Task was cancelled")
+        outcome = "ok" if process.returncode == 0 else "failed"
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+        FFMPEG_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+
+
+def quality_height(quality):
+    """1080 for "1080", "1080p" or "1080_eng"; None if there is no number"""
+    match = re.match(r"\d+", str(quality or ""))
+    return int(match.group()) if match else None
+
+
+def variant_preferences(episode_info):
+    """select_variant arguments for an entry of an m3u8 links file: its quality, then the configured defaults"""
+    return {
+        "max_height": quality_height(episode_info.get("quality")),
+        "codec": episode_info.get("codec") or HLS_PREFERRED_CODEC,
+        "max_bandwidth": episode_info.get("max_bandwidth") or HLS_MAX_BANDWIDTH or None,
+    }
+
+
+def _height(variant):
+    resolution = variant.stream_info.resolution
+    return resolution[1] if resolution else 0
+
+
+def _bandwidth(variant):
+    return variant.stream_info.bandwidth or 0
+
+
+def _has_codec(variant, codec):
+    return any(c.strip().lower().startswith(codec.lower()) for c in (variant.stream_info.codecs or "").split(","))
+
+
+def select_variant(variants, max_height=None, codec=None, max_bandwidth=None):
+    """
+    The variant of a master playlist to download, or None if there are none.
+
+    codec (e.g. "avc1") keeps only matching variants, unless none match. max_bandwidth
+    (bits/s) is a hard cap: above it only the leanest variant is left. Of the rest, the
+    tallest not above max_height wins (the shortest, if all are taller), and among
+    equally tall ones the lowest bandwidth, so no more bytes are fetched than the quality needs.
+    """
+    candidates = list(variants)
+    if codec:
+        matching = [v for v in candidates if _has_codec(v, codec)]
+        if not matching:
+            logger.warning("⚠️ No %s variant in the master playlist, choosing among all codecs", codec)
+        candidates = matching or candidates
+    # Audio-only renditions have no resolution
+    candidates = [v for v in candidates if v.stream_info.resolution] or candidates
+    if not candidates:
+        return None
+    if max_bandwidth:
+        candidates = ([v for v in candidates if _bandwidth(v) <= max_bandwidth]
+                      or [min(candidates, key=_bandwidth)])
+    if max_height:
+        fitting = [v for v in candidates if _height(v) <= max_height]
+        candidates = fitting or [v for v in candidates if _height(v) == min(map(_height, candidates))]
+    tallest = max(map(_height, candidates))
+    return min((v for v in candidates if _height(v) == tallest), key=_bandwidth)
+
+
+def describe_variant(variant, master_url, count):
+    info = variant.stream_info
+    return {
+        "uri": _resolve_uri(master_url, variant.uri),
+        "bandwidth": info.bandwidth,
+        "resolution": "x".join(map(str, info.resolution)) if info.resolution else None,
+        "codecs": info.codecs,
+        "variants": count,
+    }
+
+
+@traced("hls.playlist")
+def load_media_playlist(m3u8_url, max_height=None, codec=None, max_bandwidth=None, on_variant=None):
+    """
+    Segment URLs of an HLS playlist and its AES-128 key (None if unencrypted).
+
+    A master playlist is first narrowed to one variant with select_variant; on_variant(info)
+    is told which one (uri, bandwidth, resolution, codecs, number of variants).
+    """
+    playlist = m3u8.load(m3u8_url)
+    if playlist.is_variant:
+        variant = select_variant(playlist.playlists, max_height=max_height, codec=codec, max_bandwidth=max_bandwidth)
+        if variant is None:
+            raise ValueError(f"Master playlist {m3u8_url} lists no variants")
+        info = describe_variant(variant, m3u8_url, len(playlist.playlists))
+        logger.info("🎚️ Picked variant %s (%s bps, %s) of %s", info["resolution"], info["bandwidth"],
+                    info["codecs"], info["variants"])
+        if on_variant:
+            on_variant(info)
+        m3u8_url = info["uri"]
+        playlist = m3u8.load(m3u8_url)
+    logger.info("✅ Playlist loaded with %s segments", len(playlist.segments))
+
+    key = None
+    if playlist.keys and len(playlist.keys) > 0 and playlist.keys[0] is not None:
+        key_uri = playlist.keys[0].uri
+        if key_uri is not None:
+            key = requests.get(_resolve_uri(m3u8_url, key_uri)).content
+            logger.info("🔑 Downloaded decryption key (%s bytes)", len(key))
+
+    return [_resolve_uri(m3u8_url, segment.uri) for segment in playlist.segments], key
+
+
+def new_segment_state():
+    """Where download_hls_segments resumes: next segment, bytes written so far, cipher IV (hex)"""
+    return {"segment": 0, "offset": 0, "iv": None}
+
+
+def raw_file_holds(raw_file, state):
+    """False if raw_file is missing or shorter than the bytes state says were written (another instance, a recycled /tmp)"""
+    return not state["offset"] or (os.path.exists(raw_file) and os.path.getsize(raw_file) >= state["offset"])
+
+
+def _playlist_id(segment_urls, key):
+    # Query strings are left out: CDN tokens change between runs, the segments do not
+    paths = "\n".join(urlsplit(url).path for url in segment_urls)
+    return f"{zlib.crc32(paths.encode(), zlib.crc32(key or b'')):08x}"
+
+
+class SegmentCheckpoint:
+    """
+    Sidecar record of an HLS download (<raw_file>.checkpoint.json): the offset, length and
+    CRC32 of every segment written to raw_file, and the cipher IV after it. Only segments
+    that still match are trusted, so a retry or a restart resumes at the first missing or
+    damaged one. A checkpoint of another playlist (or key) is ignored.
+    """
+
+    def __init__(self, raw_file, playlist_id, save_interval=DOWNLOAD_MANIFEST_SAVE_INTERVAL):
+        self.raw_file = raw_file
+        self.path = raw_file + ".checkpoint.json"
+        self.playlist_id = playlist_id
+        self.save_interval = save_interval
+        self.segments = []  # [offset, length, crc32, iv after the segment] per segment written
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def load(cls, raw_file, segment_urls, key, **kwargs):
+        """The checkpoint of raw_file, cut back to the segments that verify (empty if there is none)"""
+        checkpoint = cls(raw_file, _playlist_id(segment_urls, key), **kwargs)
+        try:
+            with open(checkpoint.path, "r") as f:
+                data = json.load(f)
+            if data["playlist"] == checkpoint.playlist_id:
+                checkpoint.segments = [[int(offset), int(length), int(crc, 16), iv]
+                                       for offset, length, crc, iv in data["segments"]]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("⚠️ Ignoring unreadable checkpoint %s: %s", checkpoint.path, e)
+            checkpoint.segments = []
+        if checkpoint.segments:
+            checkpoint.verify()
+        return checkpoint
+
+    def state(self):
+        """A download_hls_segments state that resumes after the last recorded segment"""
+        if not self.segments:
+            return new_segment_state()
+        offset, length, _, iv = self.segments[-1]
+        return {"segment": len(self.segments), "offset": offset + length, "iv": iv}
+
+    def record(self, index, offset, data, iv):
+        """Account for segment index, just written to raw_file at offset (decrypted)"""
+        del self.segments[index:]
+        self.segments.append([offset, len(data), zlib.crc32(data), iv])
+
+    def verify(self):
+        """
+        Re-read raw_file and keep only the segments up to the first one that no longer matches;
+        bytes after the last segment are cut off. Returns True if every recorded segment matched.
+        """
+        good, end = 0, 0
+        try:
+            with open(self.raw_file, "r+b") as f:
+                for offset, length, crc, _ in self.segments:
+                    f.seek(offset)
+                    data = f.read(length)
+                    if offset != end or len(data) != length or zlib.crc32(data) != crc:
+                        break
+                    good, end = good + 1, end + length
+                f.truncate(end)
+        except FileNotFoundError:
+            pass
+        if good == len(self.segments):
+            return True
+        logger.warning("⚠️ %s: segment %s does not match its checkpoint; downloading again from it",
+                       os.path.basename(self.raw_file), good)
+        del self.segments[good:]
+        self.save()
+        return False
+
+    def maybe_save(self, file):
+        """Save the checkpoint (after flushing file) if save_interval has passed since the last save"""
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            file.flush()
+            self.save()
+
+    def save(self):
+        data = {
+            "playlist": self.playlist_id,
+            "segments": [[offset, length, f"{crc:08x}", iv] for offset, length, crc, iv in self.segments],
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self._saved_at = time.monotonic()
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@traced("hls.segments")
+def download_hls_segments(segment_urls, raw_file, key, state, should_stop=None, on_segment=None, cancel_token=None,
+                          checkpoint=None):
+    """
+    Download and decrypt segments from state["segment"] on, writing them to raw_file at state["offset"].
+
+    state is updated after every segment, so a caller can save it and resume later (even in
+    another process) from the same point; anything written past state["offset"] by an
+    interrupted run is truncated away, and a raw_file missing or shorter than state["offset"]
+    restarts the stream at segment 0. Segments are decrypted as one AES-CBC stream, so
+    state["iv"] carries the last ciphertext block over. Stops early once should_stop() is true.
+    Every segment written is recorded in checkpoint (a SegmentCheckpoint), if given.
+    """
+    cancel_token = cancel_token or CancelToken()
+    if not raw_file_holds(raw_file, state):
+        # Writing at the offset would pad the stream with zeros, so start it over
+        logger.warning("⚠️ %s is missing or shorter than %s bytes; restarting at segment 1",
+                       os.path.basename(raw_file), state["offset"])
+        state.update(new_segment_state())
+    cipher = None
+    if key is not None:
+        iv = bytes.fromhex(state["iv"]) if state["iv"] else key  # IV might differ, check playlist
+        cipher = AES.new(key, AES.MODE_CBC, iv=iv)
+
+    total = len(segment_urls)
+    started = time.perf_counter()
+    received = 0
+    with open(raw_file, "r+b" if state["offset"] else "wb") as f:
+        f.seek(state["offset"])
+        f.truncate()
+        try:
+            while state["segment"] < total:
+                cancel_token.raise_if_cancelled()
+                seg_data = _fetch_segment(segment_urls[state["segment"]], cancel_token)
+
+                # Decrypt only if cipher is available
+                plain = cipher.decrypt(seg_data) if cipher is not None else seg_data
+                f.write(plain)
+
+                received += len(seg_data)
+                state["segment"] += 1
+                state["offset"] = f.tell()
+                if cipher is not None:
+                    state["iv"] = seg_data[-16:].hex()
+                if checkpoint is not None:
+                    checkpoint.record(state["segment"] - 1, state["offset"] - len(plain), plain, state["iv"])
+                    checkpoint.maybe_save(f)
+                if on_segment:
+                    on_segment(state["segment"], total, len(seg_data))
+                if should_stop and should_stop():
+                    break
+        finally:
+            if checkpoint is not None:
+                f.flush()
+                checkpoint.save()
+    if received:
+        TRANSFER_THROUGHPUT.observe(received / max(time.perf_counter() - started, 1e-6), kind="hls")
+    return state
+
+
+def _download_verified(segment_urls, raw_file, key, checkpoint, label, on_segment, cancel_token):
+    """
+    Download the segments checkpoint does not have yet. A failed segment is tried again, up to
+    HLS_SEGMENT_ATTEMPTS times, without refetching the ones before it; then raw_file is checked
+    against the checkpoint and anything from the first damaged segment on is downloaded again.
+    """
+    total = len(segment_urls)
+    failed_at, failures, rewinds = None, 0, 0
+    state = checkpoint.state()
+    while True:
+        try:
+            download_hls_segments(segment_urls, raw_file, key, state, on_segment=on_segment,
+                                  cancel_token=cancel_token, checkpoint=checkpoint)
+        except Cancelled:
+            raise
+        except Exception as e:
+            failures = failures + 1 if state["segment"] == failed_at else 1
+            failed_at = state["segment"]
+            if failures >= HLS_SEGMENT_ATTEMPTS:
+                raise
+            logger.warning("⚠️ Segment %s/%s of %s failed (%s); retrying from it", state["segment"] + 1, total, label, e)
+            cancel_token.sleep(2 ** (failures - 1))
+            continue
+
+        # Verification pass: remux only a stream whose every segment matches its checksum
+        if checkpoint.verify() and len(checkpoint.segments) == total:
+            return
+        rewinds += 1
+        if rewinds >= HLS_SEGMENT_ATTEMPTS:
+            raise RuntimeError(f"{label}: downloaded segments keep failing verification")
+        state = checkpoint.state()
+
+
+@traced("hls.remux")
+def remux_hls(raw_file, final_file, label="episode", cancel_token=None):
+    """Re-encode a downloaded transport stream into a clean MP4 and remove the raw file"""
+    logger.info("🎞️ Re-encoding %s to MP4...", label)
+    ffmpeg_cmd = [
+        "ffmpeg", "-y", "-i", raw_file,
+        "-c:v", "libx264", "-c:a", "aac",
+        "-preset", "fast", "-crf", "23",
+        final_file
+    ]
+    _run_ffmpeg(ffmpeg_cmd, cancel_token or CancelToken())
+    logger.info("✅ Re-encoding done for %s. Final video saved as %s", label, final_file)
+
+    # Clean up raw file
+    if os.path.exists(raw_file):
+        os.remove(raw_file)
+        logger.debug("🧹 Cleaned up raw file: %s", raw_file)
+    return final_file
+
+
+def download_hls_episode(m3u8_url, raw_file, final_file, label="episode", on_segment=None, on_stage=None,
+                         cancel_token=None, on_variant=None, **preferences):
+    """
+    Fetch an HLS playlist, download and decrypt its segments into raw_file, then re-encode to final_file.
+
+    on_segment(done, total, segment_bytes) is called after every segment and on_stage(name)
+    when downloading and remuxing start, so the caller can report progress. For a master
+    playlist, preferences (max_height, codec, max_bandwidth) pick the variant, reported to on_variant.
+    Segments are checkpointed as they arrive: a failed segment is retried from where it stopped, and
+    if the episode still fails, calling again resumes at the first missing segment.
+    Raises Cancelled between segments, or kills ffmpeg, once cancel_token is cancelled.
+    """
+    cancel_token = cancel_token or CancelToken()
+
+    # Fetch the m3u8 playlist and its decryption key
+    logger.info("📥 Fetching M3U8 playlist for %s...", label)
+    segment_urls, key = load_media_playlist(m3u8_url, on_variant=on_variant, **preferences)
+    checkpoint = SegmentCheckpoint.load(raw_file, segment_urls, key)
+
+    try:
+        # Download and decrypt segments, picking up where an earlier attempt stopped
+        if checkpoint.segments:
+            logger.info("⏩ Resuming %s at segment %s/%s", label, len(checkpoint.segments) + 1, len(segment_urls))
+        else:
+            logger.info("📦 Downloading and decrypting segments to %s...", raw_file)
+        if on_stage:
+            on_stage("downloading")
+        _download_verified(segment_urls, raw_file, key, checkpoint, label, on_segment, cancel_token)
+        logger.info("✅ Download complete for %s. Raw file saved as %s", label, raw_file)
+
+        # Re-encode with ffmpeg into clean MP4
+        if on_stage:
+            on_stage("remuxing")
+        remux_hls(raw_file, final_file, label=label, cancel_token=cancel_token)
+        checkpoint.delete()
+    except Cancelled:
+        if not cancel_token.task_cancelled():
+            # A lost lease: the worker that took the job over resumes from these same files
+            logger.info("🛑 Stopped %s; its files are left to the job's new owner", label)
+            raise
+        # A cancelled episode is not resumed, so don't leave a partial stream on disk
+        for path in (raw_file, final_file, checkpoint.path):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info("🛑 Cancelled %s", label)
+        raise
+
+    return final_file
@@ -0,0 +1,225 @@
+"""
+Sliced M3U8 downloads for deployments that kill long requests (Vercel).
+
+A sliced job keeps its cursor in the slice store instead of running start to finish:
+every step downloads a bounded number of segments, saves where it got to (episode,
+segment, bytes written, cipher IV) and hands back a continuation token for the next
+step. Remuxing an episode gets a step of its own. Any process sharing the store and
+the download directory can run the next step.
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+from hls import (
+    load_media_playlist, new_segment_state, download_hls_segments, remux_hls, variant_preferences, raw_file_holds
+)
+from slice_store import get_slice_store
+from task_store import get_task_store
+from library_index import get_library_index
+from cancellation import Cancelled, task_cancel_token
+from progress import ProgressReporter
+from metrics import HLS_SLICE_RETRIES
+from tracing import span
+from config import HLS_SLICE_MAX_SEGMENTS, HLS_SLICE_SECONDS, HLS_SLICE_MAX_ATTEMPTS
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+def start_sliced_download(task_id: str, m3u8_data: Dict[str, Dict[str, Any]], episodes: List[int],
+                          download_directory: str, store=None) -> str:
+    """Save the cursor of a new sliced M3U8 job; returns the token of its first step"""
+    os.makedirs(download_directory, exist_ok=True)
+    return (store or get_slice_store()).create(task_id, {
+        "m3u8_data": {str(ep): m3u8_data[str(ep)] for ep in episodes},
+        "episodes": episodes,
+        "download_directory": download_directory,
+        "index": 0,
+        "current": None,
+        "attempts": 0,
+    })
+
+
+def _open_episode(cursor, library):
+    """Cursor entry for the next episode, or None if it is skipped"""
+    episode_num = cursor["episodes"][cursor["index"]]
+    episode_info = cursor["m3u8_data"][str(episode_num)]
+    m3u8_url = episode_info.get("m3u8_url")
+    if not m3u8_url:
+        logger.warning("⚠️ No M3U8 URL found for episode %s, skipping", episode_num)
+        return None
+
+    library_key = None
+    if episode_info.get("anime_session") and episode_info.get("quality"):
+        library_key = [episode_info["anime_session"], episode_num, episode_info["quality"],
+                       episode_info.get("language") or ""]
+        entry = library.lookup(*library_key)
+        if entry:
+            logger.info("⏭️ Episode %s already downloaded: %s", episode_num, entry['path'])
+            return None
+
+    logger.info("📥 Fetching M3U8 playlist for episode %s...", episode_num)
+    variant = []
+    segment_urls, key = load_media_playlist(m3u8_url, on_variant=variant.append, **variant_preferences(episode_info))
+    directory = cursor["download_directory"]
+    return {
+        "episode": episode_num,
+        "segment_urls": segment_urls,
+        "key": key.hex() if key is not None else None,
+        "state": new_segment_state(),
+        "raw_file": os.path.join(directory, f"episode_{episode_num}_raw.ts"),
+        "final_file": os.path.join(directory, f"episode_{episode_num}_final.mp4"),
+        "library_key": library_key,
+        "received": 0,
+        "variant": variant[0] if variant else None,
+    }
+
+
+def _next_episode(cursor):
+    cursor["index"] += 1
+    cursor["current"] = None
+    cursor["attempts"] = 0
+
+
+def run_slice(token: str, max_segments: int = HLS_SLICE_MAX_SEGMENTS, max_seconds: float = HLS_SLICE_SECONDS,
+              store=None, tasks=None) -> Dict[str, Any]:
+    """
+    Run one step of a sliced job and save its cursor.
+
+    Raises StaleContinuation for a used or unknown token and SliceBusy while another step
+    holds the cursor. The result carries the next continuation token (None once the job has
+    finished or was cancelled) and where the job got to.
+    """
+    with span("hls.slice", task_id=token.rpartition(".")[0]):
+        return _run_slice(token, max_segments, max_seconds, store, tasks)
+
+
+def _run_slice(token, max_segments, max_seconds, store, tasks):
+    store = store or get_slice_store()
+    tasks = tasks or get_task_store()
+    cursor = store.claim(token)
+    task_id = token.rpartition(".")[0]
+    reporter = ProgressReporter(task_id, tasks)
+    cancel_token = task_cancel_token(tasks, task_id)
+    library = get_library_index()
+    episodes = cursor["episodes"]
+    deadline = time.monotonic() + max_seconds
+    downloaded = [0]
+    error = None
+
+    def out_of_budget():
+        return downloaded[0] >= max_segments or time.monotonic() >= deadline
+
+    try:
+        cancel_token.raise_if_cancelled()
+        reporter.update(force=True, status="running")
+        while cursor["index"] < len(episodes) and not out_of_budget():
+            i = cursor["index"]
+            current = cursor["current"]
+            try:
+                if current is None:
+                    reporter.update(force=True, current_episode=episodes[i])
+                    current = cursor["current"] = _open_episode(cursor, library)
+                    if current is None:
+                        _next_episode(cursor)
+                        reporter.update(force=True, progress=cursor["index"] / len(episodes) * 100)
+                    else:
+                        if current["variant"]:
+                            cursor.setdefault("variants", {})[str(episodes[i])] = current["variant"]
+                            reporter.update(force=True, hls_variants=cursor["variants"])
+                        reporter.stage("downloading")
+                    continue
+
+                state = current["state"]
+                if not raw_file_holds(current["raw_file"], state):
+                    # The last step ran on another instance, or /tmp was recycled since
+                    logger.warning("⚠️ Raw file of episode %s is missing or cut short; downloading it again",
+                                   current['episode'])
+                    state = current["state"] = new_segment_state()
+                    current["received"] = 0
+                total = len(current["segment_urls"])
+                if state["segment"] < total:
+                    def on_segment(done, total, segment_bytes, i=i, current=current):
+                        downloaded[0] += 1
+                        current["received"] += segment_bytes
+                        reporter.bytes(current["received"], int(current["received"] / done * total),
+                                       segment=done, segments_total=total,
+                                       progress=(i + done / total) / len(episodes) * 100)
+
+                    download_hls_segments(
+                        current["segment_urls"], current["raw_file"],
+                        bytes.fromhex(current["key"]) if current["key"] else None, state,
+                        should_stop=out_of_budget, on_segment=on_segment, cancel_token=cancel_token,
+                    )
+                    continue
+
+                # Remuxing takes a step of its own so it never starts on a nearly spent budget
+                if downloaded[0]:
+                    break
+                reporter.stage("remuxing")
+                remux_hls(current["raw_file"], current["final_file"], label=f"episode {current['episode']}",
+                          cancel_token=cancel_token)
+                if current["library_key"]:
+                    library.record(*current["library_key"], current["final_file"])
+                logger.info("🎉 Episode %s completed successfully", current['episode'])
+                _next_episode(cursor)
+                reporter.update(force=True, progress=cursor["index"] / len(episodes) * 100)
+                # A remux may have used most of the time; leave the next episode to the next step
+                break
+
+            except Cancelled:
+                raise
+
+            except Exception as e:
+                # The segments written so far are kept; the step is retried from the saved cursor
+                error = f"Episode {episodes[i]}: {e}"
+                cursor["attempts"] += 1
+                if cursor["attempts"] >= HLS_SLICE_MAX_ATTEMPTS:
+                    HLS_SLICE_RETRIES.inc(outcome="skipped")
+                    logger.error("❌ Failed to process episode %s after %s attempts: %s", episodes[i], cursor['attempts'], e)
+                    # Continue with next episode instead of failing the whole task
+                    if current and os.path.exists(current["raw_file"]):
+                        os.remove(current["raw_file"])
+                    _next_episode(cursor)
+                else:
+                    HLS_SLICE_RETRIES.inc(outcome="retry")
+                    logger.warning("⚠️ Step failed for episode %s (attempt %s): %s", episodes[i], cursor['attempts'], e)
+                break
+
+        if cursor["index"] >= len(episodes):
+            store.delete(task_id)
+            reporter.finish("completed", stage="done", progress=100.0, completed_at=datetime.now().isoformat(),
+                            continuation_token=None)
+            logger.info("✅ All M3U8 episodes downloaded and processed for task %s", task_id)
+            next_token = None
+        else:
+            next_token = store.advance(token, cursor)
+            reporter.update(force=True, continuation_token=next_token)
+
+    except Cancelled:
+        current = cursor["current"]
+        # Nothing of a cancelled job is resumed, so don't leave a partial stream on disk
+        for path in ((current["raw_file"], current["final_file"]) if current else ()):
+            if os.path.exists(path):
+                os.remove(path)
+        store.delete(task_id)
+        reporter.update(force=True, rate=None, eta=None, continuation_token=None)
+        logger.info("🛑 Sliced M3U8 task %s cancelled", task_id)
+        next_token = None
+
+    finally:
+        cancel_token.close()
+
+    current = cursor["current"] or {}
+    return {
+        "task_id": task_id,
+        "status": (tasks.get(task_id) or {}).get("status"),
+        "continuation_token": next_token,
+        "episode": current.get("episode"),
+        "segment": current.get("state", {}).get("segment"),
+        "segments_total": len(current["segment_urls"]) if "segment_urls" in current else None,
+        "segments_downloaded": downloaded[0],
+        "error": error,
+    }
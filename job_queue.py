@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from config import JOB_QUEUE_PATH, JOB_MAX_ATTEMPTS
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class SQLiteJobQueue:
+    """
+    Persistent job queue in an SQLite file, shared by the API and any number of worker processes.
+
+    A worker claims a job by taking a lease; it must heartbeat to keep it. Jobs whose
+    lease runs out (the worker died or hung) are handed to the next claimer until
+    max_attempts is reached, after which they are marked failed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id        TEXT PRIMARY KEY,
+                kind          TEXT NOT NULL,
+                payload       TEXT NOT NULL,
+                status        TEXT NOT NULL,
+                priority      INTEGER NOT NULL DEFAULT 0,
+                attempts      INTEGER NOT NULL DEFAULT 0,
+                max_attempts  INTEGER NOT NULL,
+                lease_owner   TEXT,
+                lease_expires REAL,
+                created_ts    REAL NOT NULL,
+                updated_ts    REAL NOT NULL,
+                error         TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority, created_ts);
+            CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires);
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None,
+                priority: int = 0, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+        """Add a job; lower priority numbers run first. Returns the job id"""
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (job_id, kind, payload, status, priority, max_attempts, created_ts, updated_ts) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), priority, max_attempts, now, now),
+        )
+        return job_id
+
+    def claim(self, owner: str, lease_seconds: float, kinds: Optional[List[str]] = None,
+              job_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Lease the next runnable job (or a specific one) to owner; None if nothing is runnable"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            query = (
+                "SELECT * FROM jobs WHERE "
+                "(status = 'queued' OR (status = 'running' AND lease_expires < ? AND attempts < max_attempts))"
+            )
+            params: list = [now]
+            if job_id:
+                query += " AND job_id = ?"
+                params.append(job_id)
+            if kinds:
+                query += f" AND kind IN ({','.join('?' for _ in kinds)})"
+                params.extend(kinds)
+            query += " ORDER BY priority, created_ts LIMIT 1"
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            if row["status"] == "running":
+                logger.info("♻️ Re-queuing job %s abandoned by %s", row['job_id'], row['lease_owner'])
+            conn.execute(
+                "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_ts = ? WHERE job_id = ?",
+                (owner, now + lease_seconds, now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = self._row(row)
+        job.update(status="running", lease_owner=owner, attempts=job["attempts"] + 1)
+        return job
+
+    def fail_abandoned(self) -> List[str]:
+        """Fail jobs whose lease expired with no attempts left; returns their ids so the tasks can be marked too"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now,),
+            ).fetchall()
+            job_ids = [row["job_id"] for row in rows]
+            if job_ids:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker lost the job too many times', "
+                    "lease_owner = NULL, lease_expires = NULL, updated_ts = ? "
+                    f"WHERE job_id IN ({','.join('?' for _ in job_ids)})",
+                    [now] + job_ids,
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_ids
+
+    def heartbeat(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """Extend a lease; False means the job is no longer ours (expired and re-claimed, or cancelled)"""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_expires = ?, updated_ts = ? WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+            (now + lease_seconds, now, job_id, owner),
+        )
+        return cur.rowcount > 0
+
+    def complete(self, job_id: str, owner: str) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL, updated_ts = ? "
+            "WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+            (time.time(), job_id, owner),
+        )
+
+    def fail(self, job_id: str, owner: str, error: str) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL, updated_ts = ? "
+            "WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+            (error, time.time(), job_id, owner),
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not finished; a running worker notices on its next heartbeat"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'cancelled', updated_ts = ? WHERE job_id = ? AND status IN ('queued', 'running')",
+            (time.time(), job_id),
+        )
+        return cur.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def depth(self) -> Dict[str, int]:
+        """Job counts per status"""
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def purge_finished(self, max_age_seconds: float) -> int:
+        cur = self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated_ts < ?",
+            (time.time() - max_age_seconds,),
+        )
+        return cur.rowcount
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> SQLiteJobQueue:
+    """The process-wide job queue at JOB_QUEUE_PATH"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SQLiteJobQueue(JOB_QUEUE_PATH)
+        return _queue
@@ -0,0 +1,228 @@
+import os
+from datetime import datetime
+from typing import List, Dict, Any
+from scraper import scrape_download_links
+from resolver import resolve_download_info
+from transfer import advanced_download_with_progress
+from hls import download_hls_episode, variant_preferences
+from task_store import get_task_store
+from admission import patient_admission
+from cancellation import CancelToken, Cancelled
+from progress import ProgressReporter
+from library_index import get_library_index
+from log import get_logger, log_sampled
+
+logger = get_logger(__name__)
+
+tasks = get_task_store()
+
+
+@patient_admission()
+def download_episodes_job(
+    task_id: str,
+    anime_session: str,
+    episodes: List[Dict[str, Any]],
+    quality: str,
+    language: str,
+    download_directory: str,
+    cancel_token: CancelToken = None
+):
+    """Job: scrape, resolve and download episodes"""
+    cancel_token = cancel_token or CancelToken()
+    reporter = ProgressReporter(task_id, tasks)
+    reporter.update(force=True, status="running")
+    library = get_library_index()
+
+    try:
+        # Ensure download directory exists
+        os.makedirs(download_directory, exist_ok=True)
+
+        for i, episode in enumerate(episodes):
+            cancel_token.raise_if_cancelled()
+            entry = library.lookup(anime_session, episode["episode"], quality, language)
+            if entry:
+                logger.info("⏭️ Episode %s already downloaded: %s", episode['episode'], entry['path'])
+                reporter.update(force=True, current_episode=episode["episode"], progress=((i + 1) / len(episodes)) * 100)
+                continue
+
+            reporter.stage("scraping", current_episode=episode["episode"], progress=(i / len(episodes)) * 100)
+
+            logger.info("🎬 Processing Episode %s", episode['episode'])
+
+            # Get download links with retry for browser conflicts
+            links = {}
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                try:
+                    links = scrape_download_links(anime_session, episode["session"], cancel_token=cancel_token)
+                    if links:
+                        break
+                    else:
+                        logger.warning("⚠️ No links found on attempt %s/%s", attempt + 1, max_attempts)
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    logger.warning("⚠️ Scraping failed on attempt %s/%s: %s", attempt + 1, max_attempts, e)
+                    if "user data directory" in str(e).lower() or "session not created" in str(e).lower():
+                        logger.info("🔧 Browser conflict detected, retrying with delay...")
+                        cancel_token.sleep(2 ** attempt)  # Exponential backoff
+                    if attempt == max_attempts - 1:
+                        logger.error("❌ Failed to get download links for episode %s after %s attempts", episode['episode'], max_attempts)
+                        continue
+
+            raw_url = links.get(f"{quality}_{language}")
+
+            if not raw_url:
+                logger.warning("⚠️ %sp %s not available for episode %s", quality, language.upper(), episode['episode'])
+                continue
+
+            # Resolve download info
+            reporter.stage("resolving")
+            download_info = resolve_download_info(raw_url, cancel_token=cancel_token)
+            if not download_info:
+                logger.warning("⚠️ Could not resolve download info for episode %s", episode['episode'])
+                continue
+
+            # Set filename if not extracted
+            if not download_info.get('filename'):
+                download_info['filename'] = f"Episode_{episode['episode']}"
+
+            # Download episode
+            def on_bytes(done, total, i=i):
+                fraction = done / total if total else 0
+                reporter.bytes(done, total, progress=(i + fraction) / len(episodes) * 100)
+
+            reporter.stage("downloading")
+            success = advanced_download_with_progress(
+                download_info, download_directory, cancel_token=cancel_token, on_progress=on_bytes
+            )
+            if success:
+                library.record(anime_session, episode["episode"], quality, language,
+                               os.path.join(download_directory, download_info['filename']))
+            else:
+                logger.error("❌ Failed to download episode %s", episode['episode'])
+
+        # Mark task as completed
+        reporter.finish("completed", stage="done", progress=100.0, completed_at=datetime.now().isoformat())
+        logger.info("✅ All episodes downloaded for task %s", task_id)
+
+    except Cancelled:
+        # Publishes the store's status; a lost lease must not mark the task cancelled
+        reporter.update(force=True, rate=None, eta=None)
+        logger.info("🛑 Download task %s cancelled", task_id)
+
+    except Exception as e:
+        reporter.finish("failed", stage="failed", error_message=str(e))
+        logger.error("❌ Download task %s failed: %s", task_id, e)
+
+
+@patient_admission()
+def download_episodes_m3u8_job(
+    task_id: str,
+    m3u8_data: Dict[str, Dict[str, Any]],
+    episodes: List[int],
+    download_directory: str,
+    cancel_token: CancelToken = None
+):
+    """Job: download episodes using .m3u8 links"""
+    cancel_token = cancel_token or CancelToken()
+    reporter = ProgressReporter(task_id, tasks)
+    reporter.update(force=True, status="running")
+    library = get_library_index()
+    variants = {}
+
+    try:
+        # Ensure download directory exists
+        os.makedirs(download_directory, exist_ok=True)
+
+        for i, episode_num in enumerate(episodes):
+            cancel_token.raise_if_cancelled()
+            reporter.update(force=True, current_episode=episode_num)
+            episode_key = str(episode_num)
+
+            if episode_key not in m3u8_data:
+                logger.warning("⚠️ Episode %s not found in M3U8 data, skipping", episode_num)
+                continue
+
+            episode_info = m3u8_data[episode_key]
+            m3u8_url = episode_info.get("m3u8_url")
+
+            if not m3u8_url:
+                logger.warning("⚠️ No M3U8 URL found for episode %s, skipping", episode_num)
+                continue
+
+            # Hand-written link files may lack these; such episodes are not indexed
+            library_key = None
+            if episode_info.get("anime_session") and episode_info.get("quality"):
+                library_key = (episode_info["anime_session"], episode_num, episode_info["quality"],
+                               episode_info.get("language") or "")
+                entry = library.lookup(*library_key)
+                if entry:
+                    logger.info("⏭️ Episode %s already downloaded: %s", episode_num, entry['path'])
+                    reporter.update(force=True, progress=((i + 1) / len(episodes)) * 100)
+                    continue
+
+            logger.info("🎬 Processing Episode %s - %s", episode_num, m3u8_url)
+
+            received = [0]
+
+            def on_segment(done, total, segment_bytes, i=i, episode_num=episode_num):
+                received[0] += segment_bytes
+                # Total size is unknown up front; extrapolate from the average segment so far
+                reporter.bytes(received[0], int(received[0] / done * total), segment=done, segments_total=total,
+                               progress=(i + done / total) / len(episodes) * 100)
+                log_sampled(logger, ("segments", episode_num), "📊 Episode %s: Segment %s/%s downloaded",
+                            episode_num, done, total)
+
+            def on_variant(info, episode_num=episode_num):
+                variants[str(episode_num)] = info
+                reporter.update(force=True, hls_variants=dict(variants))
+
+            final_file = os.path.join(download_directory, f"episode_{episode_num}_final.mp4")
+            try:
+                download_hls_episode(
+                    m3u8_url,
+                    os.path.join(download_directory, f"episode_{episode_num}_raw.ts"),
+                    final_file,
+                    label=f"episode {episode_num}",
+                    on_segment=on_segment,
+                    on_stage=reporter.stage,
+                    cancel_token=cancel_token,
+                    on_variant=on_variant,
+                    **variant_preferences(episode_info),
+                )
+
+                if library_key:
+                    library.record(*library_key, final_file)
+
+                # Update progress
+                reporter.update(force=True, progress=((i + 1) / len(episodes)) * 100)
+                logger.info("🎉 Episode %s completed successfully", episode_num)
+
+            except Cancelled:
+                raise
+
+            except Exception as e:
+                logger.error("❌ Failed to process episode %s: %s", episode_num, e)
+                # Continue with next episode instead of failing the whole task
+                continue
+
+        # Mark task as completed
+        reporter.finish("completed", stage="done", progress=100.0, completed_at=datetime.now().isoformat())
+        logger.info("✅ All M3U8 episodes downloaded and processed for task %s", task_id)
+
+    except Cancelled:
+        # Publishes the store's status; a lost lease must not mark the task cancelled
+        reporter.update(force=True, rate=None, eta=None)
+        logger.info("🛑 M3U8 download task %s cancelled", task_id)
+
+    except Exception as e:
+        reporter.finish("failed", stage="failed", error_message=str(e))
+        logger.error("❌ M3U8 download task %s failed: %s", task_id, e)
+
+
+# Job kind -> handler; called with task_id, the job payload as keyword arguments, and cancel_token
+JOB_HANDLERS = {
+    "download": download_episodes_job,
+    "download_m3u8": download_episodes_m3u8_job,
+}
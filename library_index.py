@@ -0,0 +1,135 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from config import LIBRARY_INDEX_PATH
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return "sha256:" + digest.hexdigest()
+
+
+class LibraryIndex:
+    """
+    Episodes already downloaded: (anime_session, episode, quality, language) -> file path,
+    size, checksum and mtime, in an SQLite file shared by every process.
+
+    Jobs look an episode up before any browser work and record it after each success,
+    so re-running a season only fetches what is missing. An entry counts only while its
+    file is still there with the recorded size; a changed mtime triggers a checksum check.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS library (
+                anime_session TEXT NOT NULL,
+                episode       TEXT NOT NULL,
+                quality       TEXT NOT NULL,
+                language      TEXT NOT NULL,
+                path          TEXT NOT NULL,
+                size          INTEGER NOT NULL,
+                checksum      TEXT NOT NULL,
+                mtime         REAL NOT NULL,
+                recorded_ts   REAL NOT NULL,
+                PRIMARY KEY (anime_session, episode, quality, language)
+            );
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(anime_session, episode, quality, language):
+        return anime_session, str(episode), str(quality), str(language).lower()
+
+    def lookup(self, anime_session: str, episode, quality, language) -> Optional[Dict[str, Any]]:
+        """The entry for an episode if its file is still intact; stale entries are dropped"""
+        key = self._key(anime_session, episode, quality, language)
+        row = self._conn().execute(
+            "SELECT * FROM library WHERE anime_session = ? AND episode = ? AND quality = ? AND language = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        try:
+            stat = os.stat(entry["path"])
+        except OSError:
+            stat = None
+        if stat is None or stat.st_size != entry["size"]:
+            self.remove(*key)
+            return None
+        if abs(stat.st_mtime - entry["mtime"]) >= 1:
+            # Touched since it was recorded: only a checksum can tell whether it changed
+            if file_checksum(entry["path"]) != entry["checksum"]:
+                self.remove(*key)
+                return None
+            entry["mtime"] = stat.st_mtime
+            self._conn().execute(
+                "UPDATE library SET mtime = ? WHERE anime_session = ? AND episode = ? AND quality = ? AND language = ?",
+                (stat.st_mtime, *key),
+            )
+        return entry
+
+    def record(self, anime_session: str, episode, quality, language, path: str) -> Dict[str, Any]:
+        """Add or replace an episode's entry after its file is complete"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = dict(zip(("anime_session", "episode", "quality", "language"),
+                         self._key(anime_session, episode, quality, language)))
+        entry.update(path=path, size=stat.st_size, checksum=file_checksum(path), mtime=stat.st_mtime,
+                     recorded_ts=time.time())
+        self._conn().execute(
+            "INSERT OR REPLACE INTO library (anime_session, episode, quality, language, path, size, checksum, "
+            "mtime, recorded_ts) VALUES (:anime_session, :episode, :quality, :language, :path, :size, :checksum, "
+            ":mtime, :recorded_ts)",
+            entry,
+        )
+        return entry
+
+    def remove(self, anime_session: str, episode, quality, language) -> bool:
+        cur = self._conn().execute(
+            "DELETE FROM library WHERE anime_session = ? AND episode = ? AND quality = ? AND language = ?",
+            self._key(anime_session, episode, quality, language),
+        )
+        return cur.rowcount > 0
+
+    def entries(self, anime_session: Optional[str] = None) -> List[Dict[str, Any]]:
+        if anime_session is None:
+            rows = self._conn().execute("SELECT * FROM library ORDER BY anime_session, episode")
+        else:
+            rows = self._conn().execute(
+                "SELECT * FROM library WHERE anime_session = ? ORDER BY episode", (anime_session,)
+            )
+        return [dict(row) for row in rows]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_library_index() -> LibraryIndex:
+    """The process-wide library index at LIBRARY_INDEX_PATH"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LibraryIndex(LIBRARY_INDEX_PATH)
+        return _index
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Load test of the API: how much concurrent traffic one instance sustains.
+
+Starts fake_site.py and `uvicorn main:app` against it with the fake browser, then runs
+stages of increasing concurrency. In each stage that many clients loop over a weighted
+mix of /search, /episodes, /qualities and download jobs (POST /download, then polling
+until the job finishes) for --stage-seconds, and the stage reports per endpoint the
+p50/p95/p99 latency, error rate and throughput, plus the server's peak browser count,
+peak RSS and event-loop lag (from the event_loop_lag_seconds histogram on /metrics):
+
+    python loadtest.py --output load.json
+    python loadtest.py --stages 1,4,16,32 --stage-seconds 20 --mix search=1,qualities=1
+    python loadtest.py --baseline load.json   # exits 1 if capacity dropped
+
+The ramp stops early once a stage's error rate or p95 passes the limits (--max-error-rate,
+--max-p95), and "capacity" is the highest concurrency each endpoint held within them.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import platform
+import itertools
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+import requests
+from fake_site import FakeSite, ANIME_SESSION, EPISODE_SESSION, parse_rate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ["search", "episodes", "qualities", "download"]
+DEFAULT_MIX = "search=4,episodes=4,qualities=2,download=1"
+FINISHED = {"completed", "failed", "cancelled"}
+# Variants on the recorded play page, rotated with the episode number so the library index
+# doesn't answer repeat downloads from disk
+VARIANTS = [("360", "jpn"), ("720", "jpn"), ("1080", "jpn"), ("720", "eng"), ("1080", "eng")]
+EPISODE_COUNT = 64
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def parse_mix(text):
+    """'search=4,download=1' -> {"search": 4.0, "download": 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r}")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def weighted_cycle(mix, offset=0):
+    """Endpoint names in proportion to their weights, spread evenly (smooth weighted round-robin)"""
+    total = sum(mix.values())
+    credit = dict.fromkeys(mix, 0.0)
+    for turn in itertools.count():
+        for name, weight in mix.items():
+            credit[name] += weight
+        name = max(credit, key=credit.get)
+        credit[name] -= total
+        if turn >= offset:
+            yield name
+
+
+def parse_histogram(text, name):
+    """Cumulative buckets, sum and count of a histogram in Prometheus text format"""
+    buckets, total, count = [], 0.0, 0.0
+    for line in text.splitlines():
+        if line.startswith(f"{name}_bucket{{"):
+            le = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets.append((float("inf") if le == "+Inf" else float(le), float(line.rsplit(" ", 1)[1])))
+        elif line.startswith(f"{name}_sum "):
+            total = float(line.rsplit(" ", 1)[1])
+        elif line.startswith(f"{name}_count "):
+            count = float(line.rsplit(" ", 1)[1])
+    return {"buckets": buckets, "sum": total, "count": count}
+
+
+def histogram_delta(before, after):
+    """Observations made between two readings of the same histogram"""
+    previous = dict(before["buckets"])
+    return {"buckets": [(le, n - previous.get(le, 0)) for le, n in after["buckets"]],
+            "sum": after["sum"] - before["sum"], "count": after["count"] - before["count"]}
+
+
+def histogram_quantile(histogram, q):
+    """Upper bound of the bucket holding the q-quantile (0-1), like PromQL's, without interpolating"""
+    if not histogram["count"]:
+        return None
+    target = q * histogram["count"]
+    finite = [le for le, _ in histogram["buckets"] if le != float("inf")]
+    for le, n in histogram["buckets"]:
+        if n >= target:
+            return le if le != float("inf") else (finite[-1] if finite else None)
+    return None
+
+
+def read_rss_mb(pid):
+    """Resident memory of a process in MB, from /proc (None where that isn't available)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """`uvicorn main:app` in a subprocess, pointed at the fake site"""
+
+    def __init__(self, site_url, workdir, browser="fake", workers=1, port=None):
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(workdir, "server.log")
+        self.env = dict(
+            os.environ,
+            BASE_ORIGIN=site_url,
+            BROWSER_BACKEND=browser,
+            TASK_STORE_PATH=os.path.join(workdir, "loadtest.db"),
+            EMBEDDED_WORKERS=str(workers),
+            EMBEDDED_WATCHER="0",
+            TQDM_DISABLE="1",
+            LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+        )
+        self.process = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def start(self, timeout=60):
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=HERE, env=self.env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}; see {self.log_path}")
+            try:
+                if requests.get(f"{self.url}/health", timeout=2).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"server did not come up within {timeout}s; see {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.process:
+            self._log.close()
+
+
+class Client:
+    """One simulated user; runs the requests of the mix and records their outcome"""
+
+    def __init__(self, base_url, workdir, job_timeout=120, poll_interval=0.25):
+        self.base_url = base_url
+        self.workdir = workdir
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.http = requests.Session()
+
+    def _post(self, path, body, timeout=120):
+        response = self.http.post(f"{self.base_url}{path}", json=body, timeout=timeout)
+        return response.status_code, response
+
+    def search(self):
+        return self._post("/search", {"query": "frieren"})[0]
+
+    def episodes(self):
+        return self._post("/episodes", {"anime_session": ANIME_SESSION})[0]
+
+    def qualities(self):
+        return self._post("/qualities", {"anime_session": ANIME_SESSION, "episode_session": EPISODE_SESSION})[0]
+
+    def download(self, sequence):
+        """Submit a one-episode job and wait for it; returns (job status, submit status, seconds to submit)"""
+        quality, language = VARIANTS[sequence % len(VARIANTS)]
+        directory = os.path.join(self.workdir, f"job_{sequence}")
+        started = time.perf_counter()
+        status, response = self._post("/download", {
+            "anime_session": ANIME_SESSION, "episodes": [sequence % EPISODE_COUNT + 1],
+            "quality": quality, "language": language, "download_directory": directory,
+        })
+        accepted = time.perf_counter() - started
+        if status != 200:
+            return status, status, accepted
+        task_id = response.json()["task_id"]
+        deadline = time.time() + self.job_timeout
+        try:
+            while time.time() < deadline:
+                task = self.http.get(f"{self.base_url}/download/{task_id}", timeout=30).json()
+                if task["status"] in FINISHED:
+                    return (200 if task["status"] == "completed" else task["status"]), status, accepted
+                time.sleep(self.poll_interval)
+            return "timeout", status, accepted
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class Sampler(threading.Thread):
+    """Polls the server for browser count and RSS while a stage runs"""
+
+    def __init__(self, base_url, pid=None, interval=0.5):
+        super().__init__(name="loadtest-sampler", daemon=True)
+        self.base_url = base_url
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        http = requests.Session()
+        while not self._done.is_set():
+            sample = {"rss_mb": read_rss_mb(self.pid) if self.pid else None}
+            try:
+                stats = http.get(f"{self.base_url}/browser/stats", timeout=10).json()
+                sample["browsers"] = stats["registry"]["live_drivers"]
+                sample["browser_slots_active"] = stats["admission"]["active"]
+                sample["browser_queue"] = stats["admission"]["queued"]
+            except (requests.RequestException, ValueError, KeyError):
+                pass
+            self.samples.append(sample)
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def peak(self, key):
+        values = [s[key] for s in self.samples if s.get(key) is not None]
+        return max(values) if values else None
+
+
+def _read_loop_lag(base_url):
+    try:
+        return parse_histogram(requests.get(f"{base_url}/metrics", timeout=10).text, "event_loop_lag_seconds")
+    except requests.RequestException:
+        return None
+
+
+def _summarize(calls, seconds):
+    latencies = [c["seconds"] for c in calls]
+    errors = [c for c in calls if c["status"] != 200]
+    statuses = {}
+    for call in errors:
+        statuses[str(call["status"])] = statuses.get(str(call["status"]), 0) + 1
+    ok = [c["seconds"] for c in calls if c["status"] == 200]
+    return {
+        "requests": len(calls),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(calls), 4) if calls else 0.0,
+        "error_statuses": statuses,
+        "throughput_rps": round(len(calls) / seconds, 3) if seconds else None,
+        "p50": _round(percentile(ok, 50)),
+        "p95": _round(percentile(ok, 95)),
+        "p99": _round(percentile(ok, 99)),
+        "max": _round(max(ok) if ok else None),
+    }
+
+
+def _round(value, digits=4):
+    return round(value, digits) if value is not None else None
+
+
+def run_stage(base_url, pid, concurrency, seconds, mix, workdir, job_timeout, counter):
+    """concurrency clients loop over the mix for seconds; in-flight calls are waited for"""
+    calls = []
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def user(n):
+        client = Client(base_url, workdir, job_timeout=job_timeout)
+        picks = weighted_cycle(mix, offset=n)
+        while time.time() < deadline:
+            name = next(picks)
+            started = time.perf_counter()
+            try:
+                if name == "download":
+                    with lock:
+                        sequence = next(counter)
+                    status, submitted, accepted = client.download(sequence)
+                else:
+                    status, submitted, accepted = getattr(client, name)(), None, None
+            except requests.RequestException as e:
+                status, submitted, accepted = type(e).__name__, None, None
+            elapsed = time.perf_counter() - started
+            with lock:
+                calls.append({"endpoint": name, "status": status, "seconds": elapsed})
+                if accepted is not None:
+                    calls.append({"endpoint": "download_submit", "status": submitted, "seconds": accepted})
+
+    lag_before = _read_loop_lag(base_url)
+    sampler = Sampler(base_url, pid)
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+    lag_after = _read_loop_lag(base_url)
+
+    endpoints = {}
+    for name in [n for n in ENDPOINTS if n in mix] + (["download_submit"] if "download" in mix else []):
+        endpoints[name] = _summarize([c for c in calls if c["endpoint"] == name], elapsed)
+    stage = {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "endpoints": endpoints,
+        "total": _summarize(calls, elapsed),
+        "peak_browsers": sampler.peak("browsers"),
+        "peak_browser_queue": sampler.peak("browser_queue"),
+        "peak_rss_mb": _round(sampler.peak("rss_mb"), 1),
+    }
+    if lag_before and lag_after:
+        lag = histogram_delta(lag_before, lag_after)
+        stage["event_loop_lag"] = {
+            "samples": int(lag["count"]),
+            "mean": _round(lag["sum"] / lag["count"]) if lag["count"] else None,
+            "p99_le": histogram_quantile(lag, 0.99),
+        }
+    return stage
+
+
+def saturated(stage, max_error_rate, max_p95):
+    """Whether any endpoint in the stage broke the error-rate or p95 limit"""
+    for name, result in stage["endpoints"].items():
+        if result["requests"] and result["error_rate"] > max_error_rate:
+            return True
+        if name in ("search", "episodes", "qualities") and result["p95"] is not None and result["p95"] > max_p95:
+            return True
+    return False
+
+
+def capacity(stages, max_error_rate, max_p95):
+    """Per endpoint, the highest concurrency whose stage stayed within the limits"""
+    result = {}
+    for stage in stages:
+        for name, summary in stage["endpoints"].items():
+            if not summary["requests"]:
+                continue
+            within = summary["error_rate"] <= max_error_rate and (
+                name not in ("search", "episodes", "qualities") or summary["p95"] is None or summary["p95"] <= max_p95)
+            if within:
+                result[name] = max(result.get(name, 0), stage["concurrency"])
+            else:
+                result.setdefault(name, 0)
+    return result
+
+
+def compare(baseline, current, tolerance=0.25):
+    """Endpoints whose capacity dropped, or whose p95 at a shared concurrency grew by more than tolerance"""
+    regressions = []
+    for name, before in baseline.get("capacity", {}).items():
+        now = current["capacity"].get(name)
+        if now is not None and now < before:
+            regressions.append({"endpoint": name, "capacity": now, "baseline_capacity": before})
+    earlier = {s["concurrency"]: s for s in baseline.get("stages", [])}
+    for stage in current["stages"]:
+        before = earlier.get(stage["concurrency"])
+        if not before:
+            continue
+        for name, result in stage["endpoints"].items():
+            old = before["endpoints"].get(name, {}).get("p95")
+            if old and result["p95"] and result["p95"] > old * (1 + tolerance):
+                regressions.append({"endpoint": name, "concurrency": stage["concurrency"], "p95": result["p95"],
+                                    "baseline_p95": old, "ratio": round(result["p95"] / old, 2)})
+    return regressions
+
+
+def run_loadtest(stages=(1, 2, 4, 8, 16), stage_seconds=10, mix=None, latency=0.02, bandwidth=None,
+                 video_size=4 * 1024 * 1024, browser="fake", workers=1, url=None, pid=None,
+                 max_error_rate=0.01, max_p95=5.0, job_timeout=120):
+    mix = mix or parse_mix(DEFAULT_MIX)
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    site = server = None
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "browser": browser if not url else None,
+            "embedded_workers": workers if not url else None,
+            "target": url or "spawned",
+            "stage_seconds": stage_seconds,
+            "mix": mix,
+            "latency": latency,
+            "bandwidth": bandwidth,
+            "video_size": video_size,
+            "max_error_rate": max_error_rate,
+            "max_p95": max_p95,
+        },
+        "stages": [],
+    }
+    try:
+        if not url:
+            site = FakeSite(latency=latency, bandwidth=bandwidth, video_size=video_size).start()
+            server = Server(site.url, workdir, browser=browser, workers=workers).start()
+            url, pid = server.url, server.pid
+        # Warm up: the first request bootstraps the upstream session and imports the scrapers
+        warmup = Client(url, workdir)
+        for name in [n for n in ("search", "episodes", "qualities") if n in mix]:
+            getattr(warmup, name)()
+
+        counter = itertools.count()
+        for concurrency in stages:
+            print(f"🔥 {concurrency} concurrent clients for {stage_seconds}s...", file=sys.stderr)
+            stage = run_stage(url, pid, concurrency, stage_seconds, mix, workdir, job_timeout, counter)
+            report["stages"].append(stage)
+            if saturated(stage, max_error_rate, max_p95):
+                print(f"🛑 Limits exceeded at {concurrency} clients; stopping the ramp", file=sys.stderr)
+                break
+    finally:
+        if server:
+            server.stop()
+        if site:
+            site.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    report["capacity"] = capacity(report["stages"], max_error_rate, max_p95)
+    return report
+
+
+def print_summary(report, regressions=()):
+    print(f"\n{'clients':>7} {'endpoint':<16}{'req':>6}{'err%':>7}{'rps':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}",
+          file=sys.stderr)
+    for stage in report["stages"]:
+        for name, r in stage["endpoints"].items():
+            cells = [f"{r[k]:>8.3f}" if r[k] is not None else f"{'-':>8}" for k in ("p50", "p95", "p99")]
+            print(f"{stage['concurrency']:>7} {name:<16}{r['requests']:>6}{r['error_rate'] * 100:>7.1f}"
+                  f"{r['throughput_rps'] or 0:>8.2f}{''.join(cells)}", file=sys.stderr)
+        lag = stage.get("event_loop_lag") or {}
+        print(f"{'':>7} browsers peak {stage['peak_browsers']}, queue peak {stage['peak_browser_queue']}, "
+              f"RSS peak {stage['peak_rss_mb']} MB, loop lag mean {lag.get('mean')}s p99 ≤{lag.get('p99_le')}s",
+              file=sys.stderr)
+    print(f"\n📈 Capacity (clients within limits): {report['capacity']}", file=sys.stderr)
+    for r in regressions:
+        print(f"⚠️ Regression: {r}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent load on the API against the fake site")
+    parser.add_argument("--stages", default="1,2,4,8,16", help="Comma-separated client counts to ramp through")
+    parser.add_argument("--stage-seconds", type=float, default=10, help="How long each stage sends requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds before each fake-site response")
+    parser.add_argument("--bandwidth", help="Per-connection cap of the fake site, e.g. 8M (bytes/s)")
+    parser.add_argument("--video-size", default="4M", help="Size of each episode download")
+    parser.add_argument("--browser", default="fake", choices=["fake", "chrome"],
+                        help="Browser backend of the spawned server")
+    parser.add_argument("--workers", type=int, default=1, help="EMBEDDED_WORKERS of the spawned server")
+    parser.add_argument("--url", help="Load an already running instance instead of spawning one")
+    parser.add_argument("--pid", type=int, help="Process id of --url, to sample its RSS")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate that ends the ramp")
+    parser.add_argument("--max-p95", type=float, default=5.0, help="p95 seconds of /search, /episodes or "
+                                                                   "/qualities that ends the ramp")
+    parser.add_argument("--job-timeout", type=float, default=120, help="Seconds to wait for a download job")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 growth against the baseline")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+        stages = [int(n) for n in args.stages.split(",")]
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = run_loadtest(stages, stage_seconds=args.stage_seconds, mix=mix, latency=args.latency,
+                          bandwidth=parse_rate(args.bandwidth), video_size=parse_rate(args.video_size),
+                          browser=args.browser, workers=args.workers, url=args.url, pid=args.pid,
+                          max_error_rate=args.max_error_rate, max_p95=args.max_p95, job_timeout=args.job_timeout)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print_summary(report, regressions)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Structured, non-blocking logging for the API, the worker and the downloaders.
+
+Modules log through get_logger(__name__) with %-style arguments, so a message below
+LOG_LEVEL costs one level check and is never formatted. Records go onto a bounded queue
+and a listener thread writes them to stdout: a log call never waits for stdout, and when
+the queue is full the record is dropped and counted instead. Every record carries the
+task_id and trace_id of the current tracing span, so one download's lines can be found
+with a single filter. LOG_FORMAT=json writes one JSON object per line.
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+import tracing
+from config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLE_INTERVAL
+
+_configure_lock = threading.Lock()
+_loggers = set()
+_handler = None
+_writer = None
+_listener = None
+
+
+class _ContextFilter(logging.Filter):
+    """Tags the record with the current span's task and trace, in the logging thread"""
+
+    def filter(self, record):
+        span = tracing.current_span()
+        if not hasattr(record, "task_id"):
+            record.task_id = span.task_id if span else None
+        record.trace_id = span.trace_id if span else None
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """Enqueues without blocking; a full queue drops the record and counts it"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+        self.addFilter(_ContextFilter())
+
+    def prepare(self, record):
+        # Merge the arguments now (they may change once we return) and leave the rest of
+        # the formatting to the writer thread
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _StdoutHandler(logging.StreamHandler):
+    def emit(self, record):
+        self.stream = sys.stdout  # whatever stdout is now (tests and servers redirect it)
+        super().emit(record)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        task = f" [{record.task_id}]" if getattr(record, "task_id", None) else ""
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}{task}: {record.getMessage()}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "task_id": getattr(record, "task_id", None),
+            "trace_id": getattr(record, "trace_id", None),
+            "thread": record.threadName,
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def set_format(fmt):
+    """Switch the output between "text" and "json" """
+    configure_logging()
+    _writer.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+
+def set_level(level):
+    """Change the level of every logger made by get_logger"""
+    for name in list(_loggers):
+        logging.getLogger(name).setLevel(level)
+
+
+def configure_logging():
+    """Attach the queue handler to the root logger and start the writer thread (once)"""
+    global _handler, _writer, _listener
+    with _configure_lock:
+        if _handler is not None:
+            return
+        _writer = _StdoutHandler()
+        _writer.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        _handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        # Our loggers carry LOG_LEVEL; the root stays at WARNING so libraries stay quiet
+        logging.getLogger().addHandler(_handler)
+        _listener = QueueListener(_handler.queue, _writer)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    configure_logging()
+    logger = logging.getLogger(name)
+    if name not in _loggers:
+        logger.setLevel(LOG_LEVEL)
+        _loggers.add(name)
+    return logger
+
+
+def flush():
+    """Wait until every queued record has been written"""
+    if _handler is not None:
+        _handler.queue.join()
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+class _Sampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """(should log, records suppressed since the last one logged for key)"""
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._seen[key] = (last, suppressed + 1)
+                return False, 0
+            if len(self._seen) > 1000:
+                self._seen.clear()
+            self._seen[key] = (now, 0)
+            return True, suppressed
+
+
+_sampler = _Sampler(LOG_SAMPLE_INTERVAL)
+
+
+def log_sampled(logger, key, msg, *args, level=logging.INFO):
+    """Log at most once per LOG_SAMPLE_INTERVAL seconds per key, noting how many were skipped"""
+    if not logger.isEnabledFor(level):
+        return
+    allowed, suppressed = _sampler.allow(key)
+    if not allowed:
+        return
+    if suppressed:
+        msg, args = msg + " (+%d similar)", args + (suppressed,)
+    logger.log(level, msg, *args, stacklevel=2)
@@ -10,6 +10,7 @@ from typing import List, Dict
 from m3u8_scraper import M3U8Scraper
 from api_client import search_anime, get_all_episodes
 from session_mgr import SessionManager
+from config import BASE_ORIGIN
 
 
 def get_episode_urls(anime_session: str, episode_numbers: List[int] = None) -> List[str]:
@@ -41,7 +42,7 @@ def get_episode_urls(anime_session: str, episode_numbers: List[int] = None) -> L
         # Build episode URLs
         episode_urls = []
         for episode in episodes:
-            url = f"https://animepahe.ru/play/{anime_session}/{episode['session']}"
+            url = f"{BASE_ORIGIN}/play/{anime_session}/{episode['session']}"
             episode_urls.append(url)
         
         print(f"✅ Found {len(episode_urls)} episode URLs")
@@ -7,7 +7,12 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from browser import create_stealth_driver, guarded_click, cleanup_browser_data
+from admission import BrowserQueueFull
+from browser import create_stealth_driver, guarded_click, shutdown_driver
+from rate_limiter import load_page
+from log import get_logger
+
+logger = get_logger(__name__)
 
 
 class M3U8Scraper:
@@ -28,10 +33,7 @@ class M3U8Scraper:
         """Clean up browser resources"""
         if self.driver:
             try:
-                cleanup_browser_data(self.driver)
-                self.driver.quit()
-            except Exception as e:
-                print(f"⚠️ Error closing driver: {e}")
+                shutdown_driver(self.driver)
             finally:
                 self.driver = None
     
@@ -45,14 +47,14 @@ class M3U8Scraper:
         Returns:
             Dictionary mapping quality_language to .m3u8 URL
         """
-        print(f"🌐 Scraping .m3u8 links from: {episode_url}")
+        logger.info("🌐 Scraping .m3u8 links from: %s", episode_url)
         
         for attempt in range(self.max_retries):
             try:
                 if not self.driver:
-                    self.driver = create_stealth_driver(headless=self.headless)
+                    self.driver = create_stealth_driver(headless=self.headless, resource_profile="player")
                 
-                self.driver.get(episode_url)
+                load_page(self.driver, episode_url)
                 
                 # Wait for page to load
                 WebDriverWait(self.driver, 15).until(
@@ -66,17 +68,17 @@ class M3U8Scraper:
                 )
                 
                 if not click_to_load_elements:
-                    print("⚠️ No 'Click to load' elements found")
+                    logger.warning("⚠️ No 'Click to load' elements found")
                     return {}
                 
-                print(f"🔍 Found {len(click_to_load_elements)} 'Click to load' elements")
+                logger.info("🔍 Found %s 'Click to load' elements", len(click_to_load_elements))
                 
                 m3u8_links = {}
                 
                 # Process each "Click to load" element
                 for i, element in enumerate(click_to_load_elements):
                     try:
-                        print(f"🖱️ Clicking element {i+1}/{len(click_to_load_elements)}")
+                        logger.debug("🖱️ Clicking element %s/%s", i+1, len(click_to_load_elements))
                         
                         # Scroll element into view
                         self.driver.execute_script(
@@ -91,7 +93,7 @@ class M3U8Scraper:
                         try:
                             element.click()
                         except Exception as e:
-                            print(f"⚠️ Direct click failed, trying guarded click: {e}")
+                            logger.warning("⚠️ Direct click failed, trying guarded click: %s", e)
                             guarded_click(self.driver, element, max_retries=3)
                         
                         # Wait for content to load (look for video player or iframe)
@@ -101,34 +103,37 @@ class M3U8Scraper:
                         video_sources = self._extract_video_sources()
                         
                         if video_sources:
-                            print(f"✅ Found video sources for element {i+1}")
+                            logger.info("✅ Found video sources for element %s", i+1)
                             m3u8_links.update(video_sources)
                         else:
-                            print(f"⚠️ No video sources found for element {i+1}")
+                            logger.warning("⚠️ No video sources found for element %s", i+1)
                             
                     except Exception as e:
-                        print(f"⚠️ Error processing element {i+1}: {e}")
+                        logger.warning("⚠️ Error processing element %s: %s", i+1, e)
                         continue
                 
                 if m3u8_links:
-                    print(f"✅ Successfully extracted {len(m3u8_links)} .m3u8 links")
+                    logger.info("✅ Successfully extracted %s .m3u8 links", len(m3u8_links))
                     return m3u8_links
                 else:
-                    print(f"⚠️ No .m3u8 links found on attempt {attempt + 1}")
+                    logger.warning("⚠️ No .m3u8 links found on attempt %s", attempt + 1)
                     
+            except BrowserQueueFull:
+                raise
+
             except TimeoutException as ex:
-                print(f"⚠️ Timeout on attempt {attempt + 1}: {ex}")
+                logger.warning("⚠️ Timeout on attempt %s: %s", attempt + 1, ex)
                 if attempt == self.max_retries - 1:
                     raise Exception(f"Page load timeout after {self.max_retries} attempts")
                     
             except Exception as ex:
-                print(f"⚠️ Error on attempt {attempt + 1}: {ex}")
+                logger.warning("⚠️ Error on attempt %s: %s", attempt + 1, ex)
                 if attempt == self.max_retries - 1:
                     raise Exception(f"Failed to scrape .m3u8 links: {str(ex)}")
             
             # Wait before retry
             if attempt < self.max_retries - 1:
-                print(f"⏳ Waiting before retry...")
+                logger.debug("⏳ Waiting before retry...")
                 time.sleep(2 ** attempt + 1)
         
         return {}
@@ -143,7 +148,7 @@ class M3U8Scraper:
         sources = {}
         
         if not self.driver:
-            print("⚠️ No driver available")
+            logger.warning("⚠️ No driver available")
             return sources
         
         try:
@@ -181,7 +186,7 @@ class M3U8Scraper:
                         self.driver.switch_to.default_content()
                         
                 except Exception as e:
-                    print(f"⚠️ Error processing iframe: {e}")
+                    logger.warning("⚠️ Error processing iframe: %s", e)
                     # Make sure we're back in main context
                     try:
                         self.driver.switch_to.default_content()
@@ -209,7 +214,7 @@ class M3U8Scraper:
                         sources[f"data_attr_{attr}"] = value
             
         except Exception as e:
-            print(f"⚠️ Error extracting video sources: {e}")
+            logger.warning("⚠️ Error extracting video sources: %s", e)
         
         return sources
     
@@ -226,17 +231,13 @@ class M3U8Scraper:
         results = {}
         
         for i, url in enumerate(episode_urls):
-            print(f"\n📺 Processing episode {i+1}/{len(episode_urls)}")
+            logger.info("📺 Processing episode %s/%s", i+1, len(episode_urls))
             try:
                 episode_links = self.scrape_episode_m3u8_links(url)
                 results[url] = episode_links
-                
-                # Small delay between episodes to avoid overwhelming the server
-                if i < len(episode_urls) - 1:
-                    time.sleep(2)
                     
             except Exception as e:
-                print(f"❌ Failed to scrape episode {i+1}: {e}")
+                logger.error("❌ Failed to scrape episode %s: %s", i+1, e)
                 results[url] = {}
         
         return results
@@ -246,9 +247,9 @@ class M3U8Scraper:
         try:
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(results, f, indent=2, ensure_ascii=False)
-            print(f"💾 Results saved to {filename}")
+            logger.info("💾 Results saved to %s", filename)
         except Exception as e:
-            print(f"❌ Error saving results: {e}")
+            logger.error("❌ Error saving results: %s", e)
 
 
 def main():
@@ -1,13 +1,22 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import asyncio
 import os
 import uuid
+import sys
 import json
+import hmac
+import importlib
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
+from log import get_logger, dropped_records
+
+logger = get_logger(__name__)
 
 # Check if running on Vercel
 IS_VERCEL = os.getenv("VERCEL_ENV") == "production" or os.getenv("VERCEL") == "1" or os.getenv("VERCEL_URL") is not None
@@ -18,20 +27,61 @@ try:
     from mangum import Mangum
     MANGUM_AVAILABLE = True
 except ImportError:
-    print("Warning: mangum not available, but required for Vercel deployment")
+    logger.warning("Warning: mangum not available, but required for Vercel deployment")
+
+# Only light modules are imported here. Selenium, requests and the download stack load on
+# first use (see _load), so cold starts and /health do not pay for them
+from task_store import get_task_store, maybe_compact
+from job_queue import get_job_queue
+from progress import progress_bus, is_finished
+from bandwidth import bandwidth_scheduler
+from rate_limiter import get_rate_limiter
+from admission import BrowserQueueFull, browser_admission
+from watcher import ShowWatcher
+from slice_store import StaleContinuation, SliceBusy
+import metrics
+import profiling
+from config import (
+    EMBEDDED_WORKERS, EMBEDDED_WATCHER, ADMIN_TOKEN, WATCH_POLL_INTERVAL, HLS_SLICE_SELF_INVOKE, HLS_SLICE_STEP_URL,
+    EVENT_LOOP_LAG_INTERVAL
+)
 
-from session_mgr import SessionManager
-from api_client import search_anime, get_all_episodes
-from scraper import scrape_download_links, scrape_m3u8_links, scrape_multiple_episodes_m3u8, save_m3u8_results
-from resolver import resolve_download_info
-from transfer import advanced_download_with_progress
+# Worker running queued download jobs inside this process (None when dedicated workers are used)
+embedded_worker = None
+
+async def _watch_event_loop_lag(interval=EVENT_LOOP_LAG_INTERVAL):
+    """Record how much later than asked the loop wakes us: time spent in blocking code"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        metrics.EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global embedded_worker
+    lag_watcher = asyncio.create_task(_watch_event_loop_lag())
+    if EMBEDDED_WORKERS > 0 and not IS_VERCEL:
+        from worker import Worker
+        embedded_worker = Worker(concurrency=EMBEDDED_WORKERS)
+        embedded_worker.start()
+    if EMBEDDED_WATCHER and not IS_VERCEL:
+        show_watcher.start()
+    yield
+    lag_watcher.cancel()
+    show_watcher.stop(timeout=5)
+    if embedded_worker is not None:
+        # Don't hold up shutdown for long downloads; their leases expire and another worker resumes them
+        embedded_worker.stop(timeout=5)
+        embedded_worker = None
 
 app = FastAPI(
     title="Anime Batch Downloader API",
     description="API service for downloading anime episodes from AnimePagehe",
     version="1.0.0",
     docs_url="/docs" if not IS_VERCEL else None,  # Disable docs in production for security
-    redoc_url="/redoc" if not IS_VERCEL else None
+    redoc_url="/redoc" if not IS_VERCEL else None,
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -52,19 +102,41 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
+# ?profile=1 / X-Profile: 1 runs a request under the sampling profiler (GET /debug/profiles/{id})
+app.add_middleware(profiling.ProfilingMiddleware, admin_token=ADMIN_TOKEN)
 
 # Global session manager - initialized lazily to avoid startup issues
 sm = None
+_sm_lock = threading.Lock()
+
+def _load(module_name):
+    """Import a heavy subsystem (Selenium scraping, the site API client) on first use; call via run_in_threadpool"""
+    return importlib.import_module(module_name)
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """starlette's run_in_threadpool; the call is sampled too when the request is being profiled"""
+    return await _run_in_threadpool(profiling.bind(func), *args, **kwargs)
 
 def get_session_manager():
     """Get or create session manager"""
     global sm
-    if sm is None:
-        sm = SessionManager()
+    with _sm_lock:
+        if sm is None:
+            from session_mgr import SessionManager
+            sm = SessionManager()
     return sm
 
-# In-memory storage for download tasks (in production, use Redis or database)
-download_tasks = {}
+# Download task records live in the shared task store (SQLite by default) so every worker sees them
+tasks = get_task_store()
+# Download jobs are queued here and run by worker processes (or the embedded worker)
+job_queue = get_job_queue()
+# Airing shows polled for new episodes, which are queued as download jobs
+show_watcher = ShowWatcher(session_factory=get_session_manager)
+
+metrics.JOB_QUEUE_DEPTH.set_function(lambda: {(status,): n for status, n in job_queue.depth().items()})
+metrics.BROWSER_SLOTS.set_function(lambda: {
+    (state,): value for state, value in browser_admission.stats().items() if state in ("active", "queued", "max_concurrent")
+})
 
 class SearchRequest(BaseModel):
     query: str
@@ -92,27 +164,89 @@ class QualityRequest(BaseModel):
     anime_session: str
     episode_session: str
 
+class M3U8LinksRequest(EpisodesRequest):
+    variants: Optional[List[str]] = None  # e.g. ["720_eng", "1080_jpn"]; overrides quality/language
+
+class M3U8SingleRequest(QualityRequest):
+    variants: Optional[List[str]] = None  # e.g. ["720_eng", "1080_jpn"]; overrides quality/language
+
 class DownloadRequest(BaseModel):
     anime_session: str
     episodes: List[int]  # List of episode numbers
     quality: str = "720"
     language: str = "eng"
     download_directory: str = "./"
+    priority: int = 0  # Lower runs first and gets bandwidth first
+    bandwidth_weight: float = 1.0  # Share of bandwidth relative to other jobs of the same priority
+    profile: bool = False  # Sample the job with the profiler; see GET /debug/profiles/{id}
 
 class DownloadRequestM3U8(BaseModel):
     m3u8_file: str  # Path to the JSON file containing m3u8 links
     episodes: Optional[List[int]] = None  # Optional: specific episodes to download
     download_directory: str = "./"
+    priority: int = 0
+    bandwidth_weight: float = 1.0
+    profile: bool = False
+    codec: Optional[str] = None  # For master playlists: prefer this codec, e.g. "avc1"
+    max_bandwidth: Optional[int] = None  # For master playlists: skip variants above this many bits/s
+    sliced: bool = False  # Run as resumable steps (POST /download-m3u8/step); always on for Vercel
+
+class SliceStepRequest(BaseModel):
+    continuation_token: str
+    max_segments: Optional[int] = None  # Segments to download in this step; default HLS_SLICE_MAX_SEGMENTS
+
+class WatchRequest(BaseModel):
+    anime_session: str
+    title: Optional[str] = None
+    quality: str = "720"
+    language: str = "eng"
+    download_directory: str = "./"
+    poll_interval: int = WATCH_POLL_INTERVAL  # Seconds between checks for new episodes
+    since_episode: Optional[float] = None  # Download episodes after this one; default: only future ones
+
+class BandwidthLimits(BaseModel):
+    # Bytes per second, 0 = unlimited; omitted fields are left unchanged
+    global_limit: Optional[int] = None
+    host_limits: Optional[Dict[str, int]] = None
+    default_host_limit: Optional[int] = None
+
+class JobBandwidth(BaseModel):
+    weight: Optional[float] = None
+    priority: Optional[int] = None
 
 class DownloadTask(BaseModel):
     task_id: str
-    status: str  # "pending", "running", "completed", "failed"
+    status: str  # "pending", "running", "completed", "failed", "cancelled"
     progress: float
     current_episode: Optional[int] = None
     total_episodes: int
     created_at: datetime
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
+    # Live progress of the current episode
+    stage: Optional[str] = None  # "scraping", "resolving", "downloading", "remuxing", "done", "failed"
+    bytes_done: Optional[int] = None
+    bytes_total: Optional[int] = None
+    rate: Optional[float] = None  # bytes per second
+    eta: Optional[float] = None  # seconds
+    segment: Optional[int] = None
+    segments_total: Optional[int] = None
+    continuation_token: Optional[str] = None  # Next step of a sliced M3U8 download
+    # Time spent per traced stage ("scrape.page_load", "resolve.redirect_wait", "transfer", ...):
+    # {"count": n, "total_seconds": s, "max_seconds": s}
+    stage_timings: Optional[Dict[str, Dict[str, float]]] = None
+    profile_id: Optional[str] = None  # Set while a job started with "profile": true runs
+    # Variant picked from each episode's master playlist (uri, bandwidth, resolution, codecs, variants)
+    hls_variants: Optional[Dict[str, Dict[str, Any]]] = None
+
+@app.exception_handler(BrowserQueueFull)
+async def browser_queue_full_handler(request: Request, exc: BrowserQueueFull):
+    """All browser slots are busy and the wait queue is full"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Server is busy: {exc}. Please retry later.", "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.get("/")
 async def root():
@@ -133,42 +267,57 @@ async def root():
             "GET /m3u8-files",
             "GET /m3u8-files/{filename}",
             "POST /download-m3u8",
+            "POST /download-m3u8/step",
             "GET /download/{task_id}",
-            "GET /downloads"
+            "GET /downloads",
+            "GET /browser/stats",
+            "GET /metrics"
         ]
     }
 
 @app.get("/health")
 async def health_check():
-    """Simple health check endpoint"""
+    """Simple health check endpoint; never loads Selenium or the download stack"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "vercel": IS_VERCEL,
         "vercel_url": os.getenv("VERCEL_URL"),
-        "mangum_available": MANGUM_AVAILABLE
+        "mangum_available": MANGUM_AVAILABLE,
+        "selenium_loaded": "selenium" in sys.modules,
+        "log_records_dropped": dropped_records()
+    }
+
+@app.get("/browser/stats")
+async def browser_stats():
+    """Headless browser launch timings, live/leaked instances and resource-blocking savings"""
+    browser = await run_in_threadpool(_load, "browser")
+    return {
+        "startup": browser.get_browser_startup_stats(),
+        "registry": browser.get_browser_registry_stats(),
+        "admission": browser_admission.stats(),
+        "resource_blocking": browser.get_resource_block_stats()
     }
 
 @app.post("/search", response_model=List[SearchResult])
 async def search_anime_endpoint(request: SearchRequest):
     """Search for anime by name"""
     try:
+        api_client = await run_in_threadpool(_load, "api_client")
         # Get session manager in a thread-safe way
-        session_manager = get_session_manager()
-        results = search_anime(session_manager, request.query)
+        session_manager = await run_in_threadpool(get_session_manager)
+        results = await run_in_threadpool(api_client.search_anime, session_manager, request.query)
         if not results:
             raise HTTPException(status_code=404, detail="No anime found for your search query. Try different keywords.")
         
         return [SearchResult(**result) for result in results]
         
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+    except (HTTPException, BrowserQueueFull):
+        # Re-raise HTTP exceptions and busy signals as-is
         raise
         
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ Search endpoint error: {error_details}")
+        logger.exception("❌ Search endpoint error")
         
         # Provide more user-friendly error messages
         error_msg = str(e)
@@ -189,25 +338,27 @@ async def search_anime_endpoint(request: SearchRequest):
 async def get_episodes_endpoint(request: EpisodesRequest):
     """Get all episodes for a specific anime"""
     try:
-        session_manager = get_session_manager()
-        episodes = get_all_episodes(session_manager, request.anime_session)
+        api_client = await run_in_threadpool(_load, "api_client")
+        session_manager = await run_in_threadpool(get_session_manager)
+        episodes = await run_in_threadpool(api_client.get_all_episodes, session_manager, request.anime_session)
         if not episodes:
             raise HTTPException(status_code=404, detail="No episodes found")
         
         return [Episode(**ep) for ep in episodes]
+    except (HTTPException, BrowserQueueFull):
+        raise
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ Episodes endpoint error: {error_details}")
+        logger.exception("❌ Episodes endpoint error")
         raise HTTPException(status_code=500, detail=f"Failed to get episodes: {str(e)}")
 
 @app.post("/qualities")
 async def get_qualities_endpoint(request: QualityRequest):
     """Get available qualities and languages for a specific episode"""
     try:
-        print(f"🔍 Fetching qualities for anime: {request.anime_session}, episode: {request.episode_session}")
+        scraper = await run_in_threadpool(_load, "scraper")
+        logger.info("🔍 Fetching qualities for anime: %s, episode: %s", request.anime_session, request.episode_session)
         
-        links = scrape_download_links(request.anime_session, request.episode_session)
+        links = await run_in_threadpool(scraper.scrape_download_links, request.anime_session, request.episode_session)
         if not links:
             raise HTTPException(
                 status_code=404, 
@@ -224,20 +375,18 @@ async def get_qualities_endpoint(request: QualityRequest):
                 if language not in qualities[quality]:
                     qualities[quality].append(language)
         
-        print(f"✅ Found {len(links)} download links with {len(qualities)} quality options")
+        logger.info("✅ Found %s download links with %s quality options", len(links), len(qualities))
         return {
             "available_qualities": qualities,
             "raw_links": links
         }
         
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+    except (HTTPException, BrowserQueueFull):
+        # Re-raise HTTP exceptions and busy signals as-is
         raise
         
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ Qualities endpoint error: {error_details}")
+        logger.exception("❌ Qualities endpoint error")
         
         # Provide more user-friendly error messages
         error_msg = str(e)
@@ -263,22 +412,59 @@ async def get_qualities_endpoint(request: QualityRequest):
             )
 
 @app.post("/m3u8-links")
-async def get_m3u8_links_endpoint(request: EpisodesRequest, quality: str = "720", language: str = "eng"):
+async def get_m3u8_links_endpoint(request: M3U8LinksRequest, quality: str = "720", language: str = "eng"):
     """Get .m3u8 links for all episodes of an anime after clicking 'Click to load'"""
     try:
-        print(f"🎬 Getting .m3u8 links for anime: {request.anime_session}, quality: {quality}p, language: {language}")
+        api_client = await run_in_threadpool(_load, "api_client")
+        scraper = await run_in_threadpool(_load, "scraper")
+        wanted = request.variants or [f"{quality}_{language}"]
+        logger.info("🎬 Getting .m3u8 links for anime: %s, variants: %s", request.anime_session, ', '.join(wanted))
 
         # Get all episodes first
-        session_manager = get_session_manager()
-        episodes = get_all_episodes(session_manager, request.anime_session)
+        session_manager = await run_in_threadpool(get_session_manager)
+        episodes = await run_in_threadpool(api_client.get_all_episodes, session_manager, request.anime_session)
         if not episodes:
             raise HTTPException(status_code=404, detail="No episodes found")
 
         # Extract episode sessions
         episode_sessions = [ep["session"] for ep in episodes]
 
+        if request.variants:
+            # One browser visit per episode answers every requested variant
+            variant_results = await run_in_threadpool(
+                scraper.scrape_multiple_episodes_m3u8_variants,
+                request.anime_session,
+                episode_sessions,
+                request.variants
+            )
+            variant_results = {key: data for key, data in variant_results.items() if data}
+            if not variant_results:
+                raise HTTPException(
+                    status_code=404,
+                    detail="No .m3u8 links found for the requested variants. The episodes may not be available or the site structure may have changed."
+                )
+
+            # Save one JSON file per variant so each can be fed to /download-m3u8
+            json_files = {}
+            for variant_key, data in variant_results.items():
+                variant_quality, variant_language = variant_key.split("_", 1)
+                filename = f"m3u8_links_{request.anime_session}_{variant_quality}p_{variant_language}.json"
+                scraper.save_m3u8_results(data, filename)
+                json_files[variant_key] = filename
+
+            logger.info("✅ Successfully extracted .m3u8 links for %s variants", len(variant_results))
+            return {
+                "anime_session": request.anime_session,
+                "variants": list(variant_results.keys()),
+                "total_episodes": len(episodes),
+                "m3u8_links_found": {key: len(data) for key, data in variant_results.items()},
+                "m3u8_data": variant_results,
+                "json_files": json_files
+            }
+
         # Scrape m3u8 links for all episodes
-        m3u8_results = scrape_multiple_episodes_m3u8(
+        m3u8_results = await run_in_threadpool(
+            scraper.scrape_multiple_episodes_m3u8,
             request.anime_session,
             episode_sessions,
             quality=quality,
@@ -293,9 +479,9 @@ async def get_m3u8_links_endpoint(request: EpisodesRequest, quality: str = "720"
 
         # Save results to JSON file
         filename = f"m3u8_links_{request.anime_session}_{quality}p_{language}.json"
-        save_m3u8_results(m3u8_results, filename)
+        scraper.save_m3u8_results(m3u8_results, filename)
 
-        print(f"✅ Successfully extracted {len(m3u8_results)} .m3u8 links")
+        logger.info("✅ Successfully extracted %s .m3u8 links", len(m3u8_results))
         return {
             "anime_session": request.anime_session,
             "quality": quality,
@@ -306,14 +492,12 @@ async def get_m3u8_links_endpoint(request: EpisodesRequest, quality: str = "720"
             "json_file": filename
         }
 
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+    except (HTTPException, BrowserQueueFull):
+        # Re-raise HTTP exceptions and busy signals as-is
         raise
 
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ M3U8 links endpoint error: {error_details}")
+        logger.exception("❌ M3U8 links endpoint error")
 
         # Provide more user-friendly error messages
         error_msg = str(e)
@@ -339,13 +523,38 @@ async def get_m3u8_links_endpoint(request: EpisodesRequest, quality: str = "720"
             )
 
 @app.post("/m3u8-single")
-async def get_single_m3u8_link_endpoint(request: QualityRequest, quality: str = "720", language: str = "eng"):
+async def get_single_m3u8_link_endpoint(request: M3U8SingleRequest, quality: str = "720", language: str = "eng"):
     """Get .m3u8 link for a single episode"""
     try:
-        print(f"🎬 Getting .m3u8 link for anime: {request.anime_session}, episode: {request.episode_session}, quality: {quality}p, language: {language}")
+        scraper = await run_in_threadpool(_load, "scraper")
+        if request.variants:
+            logger.info("🎬 Getting .m3u8 links for anime: %s, episode: %s, variants: %s", request.anime_session, request.episode_session, ', '.join(request.variants))
+
+            m3u8_variants = await run_in_threadpool(
+                scraper.scrape_m3u8_links_for_variants,
+                request.anime_session,
+                request.episode_session,
+                request.variants
+            )
+            if not m3u8_variants:
+                raise HTTPException(
+                    status_code=404,
+                    detail="None of the requested variants were found for this episode."
+                )
+
+            logger.info("✅ Successfully extracted %s .m3u8 links", len(m3u8_variants))
+            return {
+                "anime_session": request.anime_session,
+                "episode_session": request.episode_session,
+                "variants": list(m3u8_variants.keys()),
+                "m3u8_data": m3u8_variants
+            }
+
+        logger.info("🎬 Getting .m3u8 link for anime: %s, episode: %s, quality: %sp, language: %s", request.anime_session, request.episode_session, quality, language)
 
         # Scrape m3u8 link for the episode
-        m3u8_data = scrape_m3u8_links(
+        m3u8_data = await run_in_threadpool(
+            scraper.scrape_m3u8_links,
             request.anime_session,
             request.episode_session,
             quality=quality,
@@ -358,7 +567,7 @@ async def get_single_m3u8_link_endpoint(request: QualityRequest, quality: str =
                 detail="No .m3u8 link found for this episode. The episode may not be available or the site structure may have changed."
             )
 
-        print(f"✅ Successfully extracted .m3u8 link")
+        logger.info("✅ Successfully extracted .m3u8 link")
         return {
             "anime_session": request.anime_session,
             "episode_session": request.episode_session,
@@ -367,14 +576,12 @@ async def get_single_m3u8_link_endpoint(request: QualityRequest, quality: str =
             "m3u8_data": m3u8_data
         }
 
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+    except (HTTPException, BrowserQueueFull):
+        # Re-raise HTTP exceptions and busy signals as-is
         raise
 
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ Single M3U8 link endpoint error: {error_details}")
+        logger.exception("❌ Single M3U8 link endpoint error")
 
         raise HTTPException(
             status_code=500,
@@ -414,7 +621,7 @@ async def get_m3u8_file(filename: str):
         raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
 
 @app.post("/download")
-async def start_download_endpoint(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def start_download_endpoint(request: DownloadRequest):
     """Start downloading episodes"""
     try:
         if IS_VERCEL:
@@ -425,12 +632,14 @@ async def start_download_endpoint(request: DownloadRequest, background_tasks: Ba
                 "vercel": True
             }
 
+        api_client = await run_in_threadpool(_load, "api_client")
+
         # Generate unique task ID
         task_id = str(uuid.uuid4())
 
         # Get episodes for the anime
-        session_manager = get_session_manager()
-        all_episodes = get_all_episodes(session_manager, request.anime_session)
+        session_manager = await run_in_threadpool(get_session_manager)
+        all_episodes = await run_in_threadpool(api_client.get_all_episodes, session_manager, request.anime_session)
         selected_episodes = [ep for ep in all_episodes if ep["episode"] in request.episodes]
 
         if not selected_episodes:
@@ -444,36 +653,33 @@ async def start_download_endpoint(request: DownloadRequest, background_tasks: Ba
             total_episodes=len(selected_episodes),
             created_at=datetime.now()
         )
-        download_tasks[task_id] = task
+        tasks.create(task.model_dump(mode="json"))
+        maybe_compact()
 
-        # Start download in background
-        background_tasks.add_task(
-            download_episodes_background,
-            task_id,
-            request.anime_session,
-            selected_episodes,
-            request.quality,
-            request.language,
-            request.download_directory
-        )
+        # Queue the download for a worker
+        job_queue.enqueue("download", {
+            "anime_session": request.anime_session,
+            "episodes": selected_episodes,
+            "quality": request.quality,
+            "language": request.language,
+            "download_directory": request.download_directory,
+            "bandwidth_weight": request.bandwidth_weight,
+            **({"profile": True} if request.profile else {}),
+        }, job_id=task_id, priority=request.priority)
 
-        return {"task_id": task_id, "message": f"Download started for {len(selected_episodes)} episodes"}
+        return {"task_id": task_id, "message": f"Download queued for {len(selected_episodes)} episodes"}
+
+    except (HTTPException, BrowserQueueFull):
+        raise
 
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ Download endpoint error: {error_details}")
+        logger.exception("❌ Download endpoint error")
         raise HTTPException(status_code=500, detail=f"Failed to start download: {str(e)}")
 
 @app.post("/download-m3u8")
 async def start_m3u8_download_endpoint(request: DownloadRequestM3U8, background_tasks: BackgroundTasks):
     """Start downloading episodes using .m3u8 links from JSON file"""
     try:
-        if IS_VERCEL:
-            # On Vercel, provide information about limitations but still allow the operation
-            # since M3U8 processing can be done within time limits for small batches
-            print("⚠️ Running on Vercel - M3U8 downloads may be limited by execution time")
-
         # Validate m3u8 file exists
         if not os.path.exists(request.m3u8_file):
             raise HTTPException(status_code=404, detail=f"M3U8 file '{request.m3u8_file}' not found")
@@ -501,15 +707,15 @@ async def start_m3u8_download_endpoint(request: DownloadRequestM3U8, background_
                 missing_episodes.append(ep_num)
 
         if missing_episodes:
-            print(f"⚠️ Episodes {missing_episodes} not found in M3U8 file, skipping")
+            logger.warning("⚠️ Episodes %s not found in M3U8 file, skipping", missing_episodes)
 
         if not valid_episodes:
             raise HTTPException(status_code=400, detail="No valid episodes found in M3U8 file")
 
-        # On Vercel, limit the number of episodes to prevent timeout
-        if IS_VERCEL and len(valid_episodes) > 2:
-            print(f"⚠️ Limiting to 2 episodes on Vercel to prevent timeout (requested: {len(valid_episodes)})")
-            valid_episodes = valid_episodes[:2]
+        # Variant preferences travel with each episode, to the job or to the sliced cursor
+        overrides = {k: v for k, v in (("codec", request.codec), ("max_bandwidth", request.max_bandwidth)) if v}
+        if overrides:
+            m3u8_data = {ep: dict(info, **overrides) for ep, info in m3u8_data.items()}
 
         # Generate unique task ID
         task_id = str(uuid.uuid4())
@@ -522,270 +728,263 @@ async def start_m3u8_download_endpoint(request: DownloadRequestM3U8, background_
             total_episodes=len(valid_episodes),
             created_at=datetime.now()
         )
-        download_tasks[task_id] = task
-
-        # For Vercel, we might want to handle downloads differently
-        if IS_VERCEL:
-            # On Vercel, we could return the task info and let client poll for status
-            # But for now, we'll still try background processing
-            background_tasks.add_task(
-                download_episodes_m3u8_background,
-                task_id,
-                m3u8_data,
-                valid_episodes,
-                request.download_directory
-            )
-        else:
-            # Normal background processing for dedicated servers
-            background_tasks.add_task(
-                download_episodes_m3u8_background,
-                task_id,
-                m3u8_data,
-                valid_episodes,
-                request.download_directory
+        tasks.create(task.model_dump(mode="json"))
+        maybe_compact()
+
+        if request.sliced or IS_VERCEL:
+            # Nothing outlives a Vercel invocation, so the job runs as bounded steps that save a cursor
+            hls_slices = await run_in_threadpool(_load, "hls_slices")
+            token = await run_in_threadpool(
+                hls_slices.start_sliced_download, task_id, m3u8_data, valid_episodes, request.download_directory
             )
+            tasks.update(task_id, continuation_token=token)
+            if HLS_SLICE_SELF_INVOKE:
+                background_tasks.add_task(_invoke_step, token)
+            return {
+                "task_id": task_id,
+                "message": f"Sliced M3U8 download created for {len(valid_episodes)} episodes; "
+                           f"POST the continuation token to /download-m3u8/step until it is null",
+                "vercel": IS_VERCEL,
+                "continuation_token": token,
+                "self_invoking": bool(HLS_SLICE_SELF_INVOKE)
+            }
 
-        response_message = f"M3U8 download started for {len(valid_episodes)} episodes"
-        if IS_VERCEL:
-            response_message += " (Vercel deployment - limited by serverless constraints)"
+        # Queue the download for a worker
+        job_queue.enqueue("download_m3u8", {
+            "m3u8_data": m3u8_data,
+            "episodes": valid_episodes,
+            "download_directory": request.download_directory,
+            "bandwidth_weight": request.bandwidth_weight,
+            **({"profile": True} if request.profile else {}),
+        }, job_id=task_id, priority=request.priority)
 
         return {
             "task_id": task_id,
-            "message": response_message,
+            "message": f"M3U8 download started for {len(valid_episodes)} episodes",
             "vercel": IS_VERCEL,
-            "episode_limit": 2 if IS_VERCEL else None
+            "continuation_token": None
         }
 
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+    except (HTTPException, BrowserQueueFull):
+        # Re-raise HTTP exceptions and busy signals as-is
         raise
 
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ M3U8 download endpoint error: {error_details}")
+        logger.exception("❌ M3U8 download endpoint error")
         raise HTTPException(status_code=500, detail=f"Failed to start M3U8 download: {str(e)}")
 
+def _invoke_step(token):
+    """POST the next step to this deployment without waiting for it (self-driving sliced jobs)"""
+    import urllib.request
+    body = json.dumps({"continuation_token": token}).encode()
+    req = urllib.request.Request(HLS_SLICE_STEP_URL, data=body, headers={"Content-Type": "application/json"})
+    try:
+        urllib.request.urlopen(req, timeout=2).close()
+    except Exception as e:
+        # Timing out is expected: the step keeps running after we stop waiting for its response
+        if "timed out" not in str(e):
+            logger.warning("⚠️ Could not start the next step of a sliced download: %s", e)
+
+@app.post("/download-m3u8/step")
+async def run_m3u8_step(request: SliceStepRequest, background_tasks: BackgroundTasks):
+    """Run the next bounded slice of a sliced M3U8 download; returns the token for the step after it"""
+    hls_slices = await run_in_threadpool(_load, "hls_slices")
+    kwargs = {"max_segments": max(request.max_segments, 1)} if request.max_segments else {}
+    try:
+        result = await run_in_threadpool(hls_slices.run_slice, request.continuation_token, **kwargs)
+    except StaleContinuation as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SliceBusy as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    if result["continuation_token"] and HLS_SLICE_SELF_INVOKE:
+        background_tasks.add_task(_invoke_step, result["continuation_token"])
+    return result
+
 @app.get("/download/{task_id}")
 async def get_download_status(task_id: str):
     """Get download task status and progress"""
-    if task_id not in download_tasks:
+    task = tasks.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Download task not found")
     
-    return download_tasks[task_id]
+    return DownloadTask(**task)
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/download/{task_id}/events")
+async def stream_download_progress(task_id: str, request: Request):
+    """Stream a task's progress as Server-Sent Events until it finishes (replaces polling /download/{task_id})"""
+    since = progress_bus.version
+    task = tasks.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Download task not found")
+
+    async def events():
+        snapshot = dict(task, **(progress_bus.snapshot(task_id) or {}))
+        yield _sse("progress", snapshot)
+        if is_finished(snapshot):
+            return
+        async for changed in progress_bus.stream(task_id=task_id, since=since):
+            if await request.is_disconnected():
+                break
+            if not changed:
+                yield ": keepalive\n\n"
+                continue
+            snapshot.update(changed[-1])
+            yield _sse("progress", snapshot)
+            if is_finished(snapshot):
+                break
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+@app.get("/downloads/stream")
+async def stream_all_progress(request: Request):
+    """Firehose of progress events for every task, as Server-Sent Events (for dashboards)"""
+    async def events():
+        async for changed in progress_bus.stream(since=progress_bus.version):
+            if await request.is_disconnected():
+                break
+            if not changed:
+                yield ": keepalive\n\n"
+            for snapshot in changed:
+                yield _sse("progress", snapshot)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
 
 @app.get("/downloads")
-async def list_download_tasks():
-    """List all download tasks"""
-    return {"tasks": list(download_tasks.values())}
+async def list_download_tasks(status: Optional[str] = None, limit: int = 50, offset: int = 0):
+    """List download tasks, newest first, one page at a time"""
+    limit = max(1, min(limit, 500))
+    offset = max(0, offset)
+    page, total = tasks.list(status=status, limit=limit, offset=offset)
+    return {
+        "tasks": [DownloadTask(**t) for t in page],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None
+    }
 
 @app.delete("/download/{task_id}")
 async def cancel_download_task(task_id: str):
     """Cancel a download task (if possible)"""
-    if task_id not in download_tasks:
+    task = tasks.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Download task not found")
     
-    task = download_tasks[task_id]
-    if task.status in ["completed", "failed"]:
-        raise HTTPException(status_code=400, detail=f"Cannot cancel {task.status} task")
+    if task["status"] in ["completed", "failed"]:
+        raise HTTPException(status_code=400, detail=f"Cannot cancel {task['status']} task")
     
-    task.status = "cancelled"
+    tasks.update(task_id, status="cancelled")
+    job_queue.cancel(task_id)
+    progress_bus.publish(task_id, status="cancelled")
     return {"message": "Download task cancelled"}
 
-async def download_episodes_background(
-    task_id: str,
-    anime_session: str,
-    episodes: List[Dict[str, Any]],
-    quality: str,
-    language: str,
-    download_directory: str
-):
-    """Background task to download episodes"""
-    task = download_tasks[task_id]
-    task.status = "running"
-    
-    try:
-        for i, episode in enumerate(episodes):
-            task.current_episode = episode["episode"]
-            task.progress = (i / len(episodes)) * 100
-            
-            print(f"🎬 Processing Episode {episode['episode']}")
-            
-            # Get download links with retry for browser conflicts
-            links = {}
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    links = scrape_download_links(anime_session, episode["session"])
-                    if links:
-                        break
-                    else:
-                        print(f"⚠️ No links found on attempt {attempt + 1}/{max_attempts}")
-                except Exception as e:
-                    print(f"⚠️ Scraping failed on attempt {attempt + 1}/{max_attempts}: {e}")
-                    if "user data directory" in str(e).lower() or "session not created" in str(e).lower():
-                        print("🔧 Browser conflict detected, retrying with delay...")
-                        import time
-                        time.sleep(2 ** attempt)  # Exponential backoff
-                    if attempt == max_attempts - 1:
-                        print(f"❌ Failed to get download links for episode {episode['episode']} after {max_attempts} attempts")
-                        continue
-            
-            raw_url = links.get(f"{quality}_{language}")
-            
-            if not raw_url:
-                print(f"⚠️ {quality}p {language.upper()} not available for episode {episode['episode']}")
-                continue
-            
-            # Resolve download info
-            download_info = resolve_download_info(raw_url)
-            if not download_info:
-                print(f"⚠️ Could not resolve download info for episode {episode['episode']}")
-                continue
-            
-            # Set filename if not extracted
-            if not download_info.get('filename'):
-                download_info['filename'] = f"Episode_{episode['episode']}"
-            
-            # Download episode
-            success = advanced_download_with_progress(download_info, download_directory)
-            if not success:
-                print(f"❌ Failed to download episode {episode['episode']}")
-        
-        # Mark task as completed
-        task.status = "completed"
-        task.progress = 100.0
-        task.completed_at = datetime.now()
-        print(f"✅ All episodes downloaded for task {task_id}")
-        
-    except Exception as e:
-        task.status = "failed"
-        task.error_message = str(e)
-        print(f"❌ Download task {task_id} failed: {e}")
-
-async def download_episodes_m3u8_background(
-    task_id: str,
-    m3u8_data: Dict[str, Dict[str, Any]],
-    episodes: List[int],
-    download_directory: str
-):
-    """Background task to download episodes using .m3u8 links"""
-    import requests
-    import m3u8
-    from Crypto.Cipher import AES
-    import subprocess
-    import tempfile
-    import shutil
-
-    task = download_tasks[task_id]
-    task.status = "running"
+def _require_admin(request: Request):
+    # Without a configured token there is nothing to check against, so the endpoints stay shut
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/bandwidth")
+async def get_bandwidth(request: Request):
+    """Bandwidth limits and live utilization (global, per host, per running job in this process)"""
+    _require_admin(request)
+    return bandwidth_scheduler.stats()
+
+@app.put("/admin/bandwidth")
+async def update_bandwidth_limits(limits: BandwidthLimits, request: Request):
+    """Change bandwidth limits at runtime; worker processes pick them up within seconds"""
+    _require_admin(request)
+    return bandwidth_scheduler.set_limits(
+        global_limit=limits.global_limit,
+        host_limits=limits.host_limits,
+        default_host_limit=limits.default_host_limit
+    )
+
+@app.put("/admin/bandwidth/jobs/{task_id}")
+async def update_job_bandwidth(task_id: str, settings: JobBandwidth, request: Request):
+    """Change a running download's bandwidth weight or priority"""
+    _require_admin(request)
+    if tasks.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Download task not found")
+    return bandwidth_scheduler.set_job(task_id, weight=settings.weight, priority=settings.priority)
 
+@app.post("/watch")
+async def watch_show(request: WatchRequest):
+    """Watch an airing show: its new episodes are downloaded as they are released"""
     try:
-        # Ensure download directory exists
-        os.makedirs(download_directory, exist_ok=True)
-
-        for i, episode_num in enumerate(episodes):
-            task.current_episode = episode_num
-            episode_key = str(episode_num)
-
-            if episode_key not in m3u8_data:
-                print(f"⚠️ Episode {episode_num} not found in M3U8 data, skipping")
-                continue
-
-            episode_info = m3u8_data[episode_key]
-            m3u8_url = episode_info.get("m3u8_url")
-
-            if not m3u8_url:
-                print(f"⚠️ No M3U8 URL found for episode {episode_num}, skipping")
-                continue
-
-            print(f"🎬 Processing Episode {episode_num} - {m3u8_url}")
-
-            try:
-                # Step 1: Fetch the m3u8 playlist
-                print(f"📥 Fetching M3U8 playlist for episode {episode_num}...")
-                playlist = m3u8.load(m3u8_url)
-                print(f"✅ Playlist loaded with {len(playlist.segments)} segments")
-
-                # Step 2: Get the key URI and download the key
-                key = None
-                if playlist.keys and len(playlist.keys) > 0 and playlist.keys[0] is not None:
-                    key_uri = playlist.keys[0].uri
-                    if key_uri is not None:
-                        key_url = key_uri if key_uri.startswith("http") else os.path.join(os.path.dirname(m3u8_url), key_uri)
-                        key = requests.get(key_url).content
-                        print(f"🔑 Downloaded decryption key ({len(key)} bytes)")
-
-                # Step 3: Prepare AES decryptor
-                cipher = None
-                if key is not None:
-                    cipher = AES.new(key, AES.MODE_CBC, iv=key)  # IV might differ, check playlist
-                    print("🔐 AES cipher ready for decryption")
-
-                # Step 4: Download and decrypt segments
-                raw_file = os.path.join(download_directory, f"episode_{episode_num}_raw.ts")
-                final_file = os.path.join(download_directory, f"episode_{episode_num}_final.mp4")
-
-                print(f"📦 Downloading and decrypting segments to {raw_file}...")
-                with open(raw_file, "wb") as f:
-                    for seg_idx, segment in enumerate(playlist.segments):
-                        seg_url = segment.uri if segment.uri.startswith("http") else os.path.join(os.path.dirname(m3u8_url), segment.uri)
-                        seg_data = requests.get(seg_url).content
-
-                        # Decrypt only if cipher is available
-                        if cipher is not None:
-                            decrypted = cipher.decrypt(seg_data)
-                        else:
-                            decrypted = seg_data  # Use raw data if no encryption
-
-                        f.write(decrypted)
-
-                        # Update progress for this segment
-                        segment_progress = (seg_idx + 1) / len(playlist.segments)
-                        episode_progress = (i / len(episodes)) + (segment_progress / len(episodes))
-                        task.progress = episode_progress * 100
-
-                        if seg_idx % 10 == 0:  # Update every 10 segments
-                            print(f"📊 Episode {episode_num}: Segment {seg_idx + 1}/{len(playlist.segments)} downloaded")
-
-                print(f"✅ Download complete for episode {episode_num}. Raw file saved as {raw_file}")
-
-                # Step 5: Re-encode with ffmpeg into clean MP4
-                print(f"🎞️ Re-encoding episode {episode_num} to MP4...")
-                ffmpeg_cmd = [
-                    "ffmpeg", "-y", "-i", raw_file,
-                    "-c:v", "libx264", "-c:a", "aac",
-                    "-preset", "fast", "-crf", "23",
-                    final_file
-                ]
-
-                result = subprocess.run(ffmpeg_cmd, check=True, capture_output=True, text=True)
-                print(f"✅ Re-encoding done for episode {episode_num}. Final video saved as {final_file}")
-
-                # Clean up raw file
-                if os.path.exists(raw_file):
-                    os.remove(raw_file)
-                    print(f"🧹 Cleaned up raw file: {raw_file}")
-
-                # Update progress
-                task.progress = ((i + 1) / len(episodes)) * 100
-                print(f"🎉 Episode {episode_num} completed successfully")
-
-            except Exception as e:
-                print(f"❌ Failed to process episode {episode_num}: {e}")
-                # Continue with next episode instead of failing the whole task
-                continue
-
-        # Mark task as completed
-        task.status = "completed"
-        task.progress = 100.0
-        task.completed_at = datetime.now()
-        print(f"✅ All M3U8 episodes downloaded and processed for task {task_id}")
-
+        return await run_in_threadpool(
+            show_watcher.watch,
+            request.anime_session,
+            quality=request.quality,
+            language=request.language,
+            download_directory=request.download_directory,
+            poll_interval=request.poll_interval,
+            since_episode=request.since_episode,
+            title=request.title
+        )
+    except BrowserQueueFull:
+        raise
     except Exception as e:
-        task.status = "failed"
-        task.error_message = str(e)
-        print(f"❌ M3U8 download task {task_id} failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Failed to read the show's releases: {str(e)}")
+
+@app.get("/watch")
+async def list_watched_shows():
+    """Watched shows with their newest seen episode and next check time"""
+    return {"shows": await run_in_threadpool(show_watcher.shows)}
+
+@app.post("/watch/{anime_session}/poll")
+async def poll_watched_show(anime_session: str):
+    """Check a watched show for new episodes now"""
+    if await run_in_threadpool(show_watcher.get, anime_session) is None:
+        raise HTTPException(status_code=404, detail="Show is not watched")
+    task_id = await run_in_threadpool(show_watcher.poll_now, anime_session)
+    return {"show": await run_in_threadpool(show_watcher.get, anime_session), "task_id": task_id}
+
+@app.delete("/watch/{anime_session}")
+async def unwatch_show(anime_session: str):
+    if not await run_in_threadpool(show_watcher.unwatch, anime_session):
+        raise HTTPException(status_code=404, detail="Show is not watched")
+    return {"message": "Show is no longer watched"}
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """Job queue depth by status, what the embedded worker is running, and request pacing per host"""
+    return {
+        "queue": job_queue.depth(),
+        "progress_streams": progress_bus.stats(),
+        "rate_limits": get_rate_limiter().stats(),
+        "watcher": show_watcher.stats(),
+        "embedded_worker": embedded_worker.stats() if embedded_worker is not None else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Counters and histograms of the hot paths in the Prometheus text format (this process only)"""
+    body = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiles")
+async def list_profiles(request: Request, limit: int = 50):
+    """The newest stored profiles, without their samples"""
+    _require_admin(request)
+    return await run_in_threadpool(profiling.get_profile_store().list, limit)
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "json"):
+    """A stored profile: per-function sample counts, or folded stacks with ?format=folded"""
+    _require_admin(request)
+    profile = await run_in_threadpool(profiling.get_profile_store().get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return PlainTextResponse(profile["folded"])
+    return profile
 
 # Vercel serverless function handler
 if IS_VERCEL and MANGUM_AVAILABLE:
@@ -794,9 +993,9 @@ if IS_VERCEL and MANGUM_AVAILABLE:
         handler = Mangum(app, lifespan="off")
 
         # Test the handler to make sure it works
-        print("✅ Vercel handler initialized successfully")
+        logger.info("✅ Vercel handler initialized successfully")
     except Exception as e:
-        print(f"❌ Failed to initialize Vercel handler: {e}")
+        logger.error("❌ Failed to initialize Vercel handler: %s", e)
         handler = None
 else:
     handler = None
@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import time
+import zlib
+from config import DOWNLOAD_MANIFEST_BLOCK_SIZE, DOWNLOAD_MANIFEST_SAVE_INTERVAL
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class ManifestMismatch(Exception):
+    """The server's response or the file on disk does not match what the manifest recorded"""
+
+
+def parse_content_range(value):
+    """(start, end, total) from 'bytes start-end/total' (total None for '*'); None if malformed"""
+    match = re.match(r"\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$", value or "")
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == "*" else int(total)
+
+
+class DownloadManifest:
+    """
+    Sidecar record of a direct download (<file>.manifest.json), used to resume it safely.
+
+    Holds the server's length and validators (ETag/Last-Modified) and a CRC32 per block
+    of the file written so far. Only bytes covered by the manifest are trusted on resume:
+    anything after them, or from the first block whose checksum no longer matches, is cut
+    off and fetched again. A finished download is recognised by its size and mtime
+    without reading it.
+    """
+
+    def __init__(self, path, block_size=DOWNLOAD_MANIFEST_BLOCK_SIZE,
+                 save_interval=DOWNLOAD_MANIFEST_SAVE_INTERVAL):
+        self.path = path
+        self.manifest_path = path + ".manifest.json"
+        self.block_size = block_size
+        self.save_interval = save_interval
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the download starts again from byte 0"""
+        self.length = None
+        self.etag = None
+        self.last_modified = None
+        self.blocks = []  # CRC32 of each full block
+        self.size = 0
+        self.complete = False
+        self.completed_mtime = None
+        self._crc = 0  # running CRC32 of the block being written
+        self._trusted = True
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """The manifest for the download at path (empty if there is none or it is unreadable)"""
+        manifest = cls(path, **kwargs)
+        try:
+            with open(manifest.manifest_path, "r") as f:
+                data = json.load(f)
+            manifest.block_size = int(data["block_size"])
+            manifest.length = data.get("length")
+            manifest.etag = data.get("etag")
+            manifest.last_modified = data.get("last_modified")
+            manifest.complete = bool(data.get("complete"))
+            manifest.completed_mtime = data.get("completed_mtime")
+            manifest.size = int(data["size"])
+            manifest.blocks = [int(crc, 16) for crc in data["blocks"]]
+        except FileNotFoundError:
+            # A partial file from before manifests existed is adopted as it is
+            manifest._trusted = not os.path.exists(path)
+            return manifest
+        except (OSError, ValueError, KeyError, TypeError):
+            manifest.reset()
+            manifest._trusted = False
+            return manifest
+        if manifest.size % manifest.block_size:
+            # The last block is partial; its CRC continues as more bytes arrive
+            manifest._crc = manifest.blocks.pop()
+        manifest._trusted = False  # written by an earlier run; the file may have changed since
+        return manifest
+
+    def is_complete(self):
+        """True if the download finished and the file is untouched since (no data is read)"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (
+            self.complete
+            and stat.st_size == self.size
+            and (self.length is None or self.size == self.length)
+            and self.completed_mtime is not None
+            and abs(stat.st_mtime - self.completed_mtime) < 1
+        )
+
+    def prepare(self):
+        """Cut the file back to the bytes the manifest vouches for; returns where to resume"""
+        if not os.path.exists(self.path):
+            self.reset()
+            return 0
+        if not self._trusted or os.path.getsize(self.path) < self.size:
+            self._verify()
+        if os.path.getsize(self.path) != self.size:
+            with open(self.path, "r+b") as f:
+                f.truncate(self.size)
+        return self.size
+
+    def _verify(self):
+        """Re-checksum the file block by block and keep the longest matching prefix"""
+        expected = self.blocks + ([self._crc] if self.size % self.block_size else [])
+        adopt = not os.path.exists(self.manifest_path)
+        good_blocks, crc, size = [], 0, 0
+        with open(self.path, "rb") as f:
+            index = 0
+            while adopt or index < len(expected):
+                data = f.read(self.block_size)
+                if not data:
+                    break
+                if not adopt:
+                    want = min(self.block_size, self.size - index * self.block_size)
+                    if len(data) < want:
+                        break
+                    data = data[:want]
+                    if zlib.crc32(data) != expected[index]:
+                        logger.warning("⚠️ %s: block %s is corrupt; resuming from byte %s", os.path.basename(self.path), index, size)
+                        break
+                size += len(data)
+                if len(data) == self.block_size:
+                    good_blocks.append(zlib.crc32(data))
+                else:
+                    crc = zlib.crc32(data)
+                    break
+                index += 1
+        if size != self.size or adopt:
+            self.complete = False
+        self.blocks, self._crc, self.size = good_blocks, crc, size
+        self._trusted = True
+
+    def begin(self, response, offset):
+        """
+        Check a response to a request for bytes from offset and record its length and
+        validators; returns the offset its body starts at (0 when the server sent the
+        whole file). Raises ManifestMismatch if the body cannot be used.
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 206:
+            content_range = parse_content_range(response.headers.get("Content-Range"))
+            if content_range is None or content_range[0] != offset:
+                self.reset()
+                raise ManifestMismatch(f"server answered a resume from byte {offset} with "
+                                       f"Content-Range {response.headers.get('Content-Range')!r}")
+            total = content_range[2]
+            changed = (
+                (self.length is not None and total is not None and total != self.length)
+                or (self.etag and etag and etag != self.etag)
+                or (self.last_modified and last_modified and last_modified != self.last_modified)
+            )
+            if changed:
+                self.reset()
+                raise ManifestMismatch("file changed on the server since the partial download")
+            self.length = total if total is not None else self.length
+        else:
+            # Full body: the server ignored the Range, or the file changed (If-Range)
+            if offset:
+                logger.warning("⚠️ Server sent the whole file instead of resuming at byte %s; starting over", offset)
+            self.reset()
+            length = int(response.headers.get("Content-Length") or 0)
+            self.length = length or None
+            offset = 0
+        self.etag = etag or self.etag
+        self.last_modified = last_modified or self.last_modified
+        self.save()
+        return offset
+
+    def resume_headers(self, offset):
+        """Range (and If-Range, so a changed file comes back whole) for resuming at offset"""
+        if not offset:
+            return {}
+        headers = {"Range": f"bytes={offset}-"}
+        if self.etag and not self.etag.startswith("W/"):
+            headers["If-Range"] = self.etag
+        elif self.last_modified:
+            headers["If-Range"] = self.last_modified
+        return headers
+
+    def add(self, chunk):
+        """Account for a chunk just appended to the file"""
+        while chunk:
+            room = self.block_size - self.size % self.block_size
+            part, chunk = chunk[:room], chunk[room:]
+            self._crc = zlib.crc32(part, self._crc)
+            self.size += len(part)
+            if self.size % self.block_size == 0:
+                self.blocks.append(self._crc)
+                self._crc = 0
+
+    def checkpoint(self, file):
+        """Save the manifest (after flushing file) if save_interval has passed since the last save"""
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            file.flush()
+            self.save()
+
+    def finish(self):
+        """Mark the download complete; raises ManifestMismatch if the size is not the expected one"""
+        if self.length is not None and self.size != self.length:
+            size = self.size
+            if size > self.length:
+                self.reset()
+            self.save()
+            raise ManifestMismatch(f"downloaded {size} bytes, expected {self.length}")
+        self.complete = True
+        self.completed_mtime = os.path.getmtime(self.path)
+        self.save()
+
+    def save(self):
+        blocks = self.blocks + ([self._crc] if self.size % self.block_size else [])
+        data = {
+            "length": self.length,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "block_size": self.block_size,
+            "size": self.size,
+            "blocks": [f"{crc:08x}" for crc in blocks],
+            "complete": self.complete,
+            "completed_mtime": self.completed_mtime,
+        }
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._saved_at = time.monotonic()
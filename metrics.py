@@ -0,0 +1,270 @@
+"""
+In-process metrics in the Prometheus text format, served by GET /metrics.
+
+Counters, gauges and histograms keep one small lock each and do a dict lookup plus an
+addition per record, so they are cheap enough for per-segment and per-step use. Every
+process keeps its own values: the API serves the embedded worker's, and a dedicated
+worker serves its own with `python worker.py --metrics-port 9101`.
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tracing import record_span
+from log import get_logger
+
+logger = get_logger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+THROUGHPUT_BUCKETS = tuple(64 * 1024 * 2 ** n for n in range(11))  # 64KB/s .. 64MB/s
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _samples(self):
+        with self._lock:
+            return [(key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A total that only goes up (requests, failures, bytes)"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A current value; set directly or read from a function when scraped"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn):
+        """fn() returns {label values tuple: value}; it is called on every scrape"""
+        self._function = fn
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+        try:
+            return sorted((tuple(str(v) for v in key), value) for key, value in self._function().items())
+        except Exception as e:
+            logger.warning("⚠️ Metric %s unavailable: %s", self.name, e)
+            return []
+
+
+class Histogram(_Metric):
+    """Distribution of observations (durations, sizes) in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took, whether or not it raised"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            samples = [(key, list(s[0]), s[1], s[2]) for key, s in sorted(self._values.items())]
+        for key, counts, total, count in samples:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = (("le", _format_value(bound if bound == float("inf") else float(bound))),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class StepTimer:
+    """
+    Times consecutive steps of one operation: lap(step) records the time since the
+    previous lap (or since creation) under label step, and with span_prefix also as a
+    tracing span named "<span_prefix>.<step>" under the current span.
+    """
+
+    def __init__(self, histogram, span_prefix=None, **labels):
+        self.histogram = histogram
+        self.span_prefix = span_prefix
+        self.labels = labels
+        self._last = time.perf_counter()
+        self._last_ns = time.time_ns()
+
+    def lap(self, step):
+        now, now_ns = time.perf_counter(), time.time_ns()
+        elapsed = now - self._last
+        self.histogram.observe(elapsed, step=step, **self.labels)
+        if self.span_prefix:
+            record_span(f"{self.span_prefix}.{step}", self._last_ns, now_ns)
+        self._last, self._last_ns = now, now_ns
+        return elapsed
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve render() on its own port from a daemon thread (for processes without the API)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("📈 Metrics on http://%s:%s/metrics", host, server.server_address[1])
+    return server
+
+
+# ---- metrics of the hot paths -----------------------------------------------
+
+BROWSER_LAUNCH_SECONDS = Histogram(
+    "browser_launch_seconds", "Chrome launch time by backend (uc or chrome)", ["backend"])
+BROWSER_LAUNCH_FAILURES = Counter(
+    "browser_launch_failures_total", "Chrome launches that raised, by backend", ["backend"])
+
+DDOS_REFRESHES = Counter(
+    "ddos_refreshes_total", "Cookie refreshes through Selenium, by trigger (ddos or forbidden)", ["reason"])
+DDOS_REFRESH_SECONDS = Histogram(
+    "ddos_refresh_seconds", "Time to pass DDoS-Guard and copy its cookies")
+
+SITE_API_SECONDS = Histogram(
+    "site_api_seconds", "Site API request latency by endpoint (search, release), including refreshes and retries",
+    ["endpoint"])
+SITE_API_REQUESTS = Counter(
+    "site_api_requests_total", "Site API requests by endpoint and final HTTP status", ["endpoint", "status"])
+
+SCRAPE_STEP_SECONDS = Histogram(
+    "scrape_step_seconds", "Time per step of scraping an episode's download links", ["step"])
+RESOLVE_STEP_SECONDS = Histogram(
+    "resolve_step_seconds", "Time per step of resolving a kwik link to a download request", ["step"])
+BROWSER_JOBS = Counter(
+    "browser_jobs_total", "Scrape and resolve runs by kind and outcome", ["kind", "outcome"])
+
+DOWNLOAD_BYTES = Counter(
+    "download_bytes_total", "Bytes received by direct (kwik) and HLS downloads", ["kind"])
+TRANSFER_SECONDS = Histogram(
+    "transfer_seconds", "Duration of one direct download attempt", ["outcome"])
+TRANSFER_THROUGHPUT = Histogram(
+    "transfer_throughput_bytes_per_second", "Average throughput of one direct download attempt or HLS episode",
+    ["kind"], buckets=THROUGHPUT_BUCKETS)
+TRANSFER_RETRIES = Counter(
+    "transfer_retries_total", "Direct download attempts that were retried, by reason", ["reason"])
+
+HLS_SEGMENT_SECONDS = Histogram(
+    "hls_segment_seconds", "Time to fetch one HLS segment")
+HLS_SEGMENT_FAILURES = Counter(
+    "hls_segment_failures_total", "HLS segment fetches that raised")
+HLS_SLICE_RETRIES = Counter(
+    "hls_slice_retries_total", "Sliced M3U8 steps that failed and will be retried (or skipped the episode)",
+    ["outcome"])
+
+FFMPEG_SECONDS = Histogram(
+    "ffmpeg_seconds", "ffmpeg remux duration by outcome (ok, failed, cancelled)", ["outcome"])
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the API's event loop woke a sleeping task, i.e. time it spent blocked",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth", "Jobs in the persistent queue by status", ["status"])
+BROWSER_SLOTS = Gauge(
+    "browser_slots", "Browser admission: active slots, queued waiters and the slot limit", ["state"])
@@ -0,0 +1,77 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import PREFETCH_LOOKAHEAD, PREFETCH_TTL
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class Prefetcher:
+    """
+    Runs fn(item) for the next `lookahead` items in the background while the caller works
+    on the current one, and hands each result over when get() asks for it.
+
+    Results older than ttl seconds are computed again (resolved download links expire),
+    as are prefetches that raised, so a prefetch never makes get() worse than calling
+    fn directly.
+    """
+
+    def __init__(self, fn, items, key=None, lookahead=PREFETCH_LOOKAHEAD, ttl=PREFETCH_TTL):
+        self.fn = fn
+        self.items = list(items)
+        self.key = key or (lambda item: item)
+        self.lookahead = lookahead
+        self.ttl = ttl
+        self._positions = {self.key(item): n for n, item in enumerate(self.items)}
+        self._executor = ThreadPoolExecutor(max_workers=max(lookahead, 1), thread_name_prefix="prefetch")
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._stats = {"ready": 0, "waited": 0, "missed": 0, "expired": 0, "failed": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _timed(self, item):
+        result = self.fn(item)
+        return time.monotonic(), result
+
+    def _prefetch_after(self, position):
+        with self._lock:
+            for item in self.items[position + 1:position + 1 + self.lookahead]:
+                key = self.key(item)
+                if key not in self._futures:
+                    self._futures[key] = self._executor.submit(self._timed, item)
+
+    def get(self, item):
+        """fn(item), from the prefetch if one is ready or running; starts prefetching the items after it"""
+        key = self.key(item)
+        with self._lock:
+            future = self._futures.pop(key, None)
+        # Start on the following items first so they run while this one is awaited and used
+        self._prefetch_after(self._positions.get(key, len(self.items)))
+
+        if future is None or future.cancelled():
+            self._stats["missed"] += 1
+            return self.fn(item)
+        self._stats["ready" if future.done() else "waited"] += 1
+        try:
+            finished_at, result = future.result()
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.warning("⚠️ Prefetch failed (%s); retrying now", e)
+            return self.fn(item)
+        if time.monotonic() - finished_at > self.ttl:
+            self._stats["expired"] += 1
+            return self.fn(item)
+        return result
+
+    def close(self):
+        """Drop prefetches that have not started; running ones finish in the background"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return dict(self._stats)
@@ -0,0 +1,299 @@
+"""
+Opt-in sampling profiler for single API calls and download tasks.
+
+A profile covers the threads doing one piece of work: the job thread of a download task
+(profile=true on POST /download or /download-m3u8), or the threadpool calls of an API
+request sent with ?profile=1 or an X-Profile: 1 header. While at least one profile
+runs, a sampler thread reads those threads' stacks every PROFILE_SAMPLE_INTERVAL
+seconds; with none running there is no sampler and no hook anywhere, so profiling
+costs nothing when off. Finished profiles are stored in PROFILE_STORE_PATH and served
+by GET /debug/profiles/{id}, as a per-function summary or as folded stacks for
+flamegraph.pl and speedscope.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from config import PROFILE_STORE_PATH, PROFILE_SAMPLE_INTERVAL, PROFILE_KEEP
+from log import get_logger
+
+logger = get_logger(__name__)
+
+_active = contextvars.ContextVar("active_profile", default=None)
+MAX_DEPTH = 128
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stack samples of the threads working on one request or task"""
+
+    def __init__(self, kind, target, interval=PROFILE_SAMPLE_INTERVAL):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.target = target
+        self.interval = interval
+        self.started = time.time()
+        self.ended = None
+        self.samples = 0
+        self.stacks = Counter()
+        self._threads = Counter()
+        self._lock = threading.Lock()
+
+    def attach(self, ident):
+        with self._lock:
+            self._threads[ident] += 1
+
+    def detach(self, ident):
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def sample(self, frames):
+        with self._lock:
+            if self.ended:
+                return
+            for ident in self._threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[tuple(reversed(stack))] += 1
+                    self.samples += 1
+
+    def stop(self):
+        with self._lock:
+            self.ended = time.time()
+
+    def folded(self):
+        """Collapsed stacks ("root;caller;callee count"), the input of flamegraph.pl and speedscope"""
+        lines = [";".join(_label(code) for code in stack) + f" {count}" for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def functions(self, limit=50):
+        """Sample counts per function: self (at the top of the stack) and total (anywhere on it)"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        samples = self.samples or 1
+        return [{
+            "function": _label(code),
+            "self_samples": own[code],
+            "total_samples": count,
+            "self_percent": round(100 * own[code] / samples, 1),
+            "total_percent": round(100 * count / samples, 1),
+        } for code, count in total.most_common(limit)]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "target": self.target,
+            "started_at": self.started,
+            "seconds": round((self.ended or time.time()) - self.started, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            "functions": self.functions(),
+            "folded": self.folded(),
+        }
+
+
+class _Sampler:
+    """One thread sampling every running profile; it exits when the last profile ends"""
+
+    def __init__(self):
+        self._profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile):
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+                interval = min(p.interval for p in profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+            del frames
+            time.sleep(interval)
+
+
+_sampler = _Sampler()
+
+
+@contextmanager
+def profile(kind, target, store=None, this_thread=True):
+    """
+    Profile work bound to this context (see bind) until the block exits, then store the result.
+    this_thread=False leaves out the calling thread, e.g. an event loop serving other requests too.
+    """
+    prof = Profile(kind, target)
+    ident = threading.get_ident()
+    if this_thread:
+        prof.attach(ident)
+    token = _active.set(prof)
+    _sampler.add(prof)
+    try:
+        yield prof
+    finally:
+        _sampler.remove(prof)
+        _active.reset(token)
+        prof.stop()
+        try:
+            (store or get_profile_store()).save(prof)
+            logger.info("🔬 Profile %s of %s %s: %s samples in %.1fs", prof.id, kind, target, prof.samples,
+                        prof.ended - prof.started)
+        except Exception as e:
+            logger.warning("⚠️ Could not store profile %s: %s", prof.id, e)
+
+
+def current_profile():
+    return _active.get()
+
+
+def bind(fn):
+    """fn, counted in the current profile when it runs on another thread; fn itself when nothing is profiled"""
+    prof = _active.get()
+    if prof is None:
+        return fn
+
+    def profiled(*args, **kwargs):
+        ident = threading.get_ident()
+        prof.attach(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.detach(ident)
+    return profiled
+
+
+def _wants_profile(scope):
+    if b"profile=1" in scope.get("query_string", b"").split(b"&"):
+        return True
+    return any(name == b"x-profile" and value in (b"1", b"true") for name, value in scope.get("headers", ()))
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: requests with ?profile=1 or X-Profile: 1 run under a profile whose id
+    comes back in the X-Profile-Id header. With ADMIN_TOKEN set, the request also needs a
+    matching X-Admin-Token; other requests pass straight through.
+    """
+
+    def __init__(self, app, admin_token=None):
+        self.app = app
+        self.admin_token = admin_token.encode() if admin_token else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            return await self.app(scope, receive, send)
+        if self.admin_token and dict(scope.get("headers", ())).get(b"x-admin-token") != self.admin_token:
+            return await self.app(scope, receive, send)
+
+        # Only the threadpool calls are sampled (main binds them): the loop thread is shared
+        with profile("request", f"{scope['method']} {scope['path']}", this_thread=False) as prof:
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", prof.id.encode())]
+                await send(message)
+            await self.app(scope, receive, send_with_id)
+
+
+class ProfileStore:
+    """Finished profiles in an SQLite file shared by the API and the workers; the newest `keep` are kept"""
+
+    def __init__(self, path, keep=PROFILE_KEEP):
+        self.path = path
+        self.keep = keep
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                profile_id TEXT PRIMARY KEY,
+                kind       TEXT NOT NULL,
+                target     TEXT NOT NULL,
+                created_ts REAL NOT NULL,
+                seconds    REAL NOT NULL,
+                samples    INTEGER NOT NULL,
+                data       TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_profiles_created ON profiles (created_ts);
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def save(self, prof):
+        data = prof.to_dict()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO profiles (profile_id, kind, target, created_ts, seconds, samples, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (prof.id, prof.kind, prof.target, prof.started, data["seconds"], prof.samples, json.dumps(data)),
+        )
+        conn.execute(
+            "DELETE FROM profiles WHERE profile_id NOT IN "
+            "(SELECT profile_id FROM profiles ORDER BY created_ts DESC LIMIT ?)", (self.keep,)
+        )
+
+    def get(self, profile_id):
+        row = self._conn().execute("SELECT data FROM profiles WHERE profile_id = ?", (profile_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def list(self, limit=50):
+        rows = self._conn().execute(
+            "SELECT profile_id, kind, target, created_ts, seconds, samples FROM profiles "
+            "ORDER BY created_ts DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [{"id": r["profile_id"], "kind": r["kind"], "target": r["target"], "started_at": r["created_ts"],
+                 "seconds": r["seconds"], "samples": r["samples"]} for r in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store():
+    """The process-wide profile store at PROFILE_STORE_PATH"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore(PROFILE_STORE_PATH)
+        return _store
@@ -0,0 +1,221 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from task_store import get_task_store, FINISHED_STATUSES
+from config import (
+    PROGRESS_PUBLISH_INTERVAL,
+    PROGRESS_PERSIST_INTERVAL,
+    PROGRESS_STREAM_INTERVAL,
+    PROGRESS_STORE_POLL_INTERVAL,
+    PROGRESS_KEEPALIVE,
+)
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Subscriber:
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # event loop already closed
+
+
+class ProgressBus:
+    """
+    In-process pub/sub of the latest progress snapshot per task.
+
+    Publishers (job threads) merge fields into a task's snapshot; subscribers (SSE
+    streams on the event loop) are woken and read whatever changed since they last
+    looked, so a slow client skips intermediate states instead of queueing them.
+    """
+
+    def __init__(self, max_tasks=1000):
+        self.max_tasks = max_tasks
+        self._lock = threading.Lock()
+        self._latest = OrderedDict()  # task_id -> (version, snapshot, last in-process publish or None)
+        self._version = 0
+        self._subscribers = set()
+        self._bridge = None
+        self._stats = {"published": 0, "delivered": 0}
+
+    @property
+    def version(self):
+        return self._version
+
+    def publish(self, task_id, **fields):
+        self._publish(task_id, fields, local=True)
+
+    def _publish(self, task_id, fields, local):
+        with self._lock:
+            previous = self._latest.get(task_id)
+            local_at = time.monotonic() if local else (previous[2] if previous else None)
+            if not local and local_at is not None and time.monotonic() - local_at < 2 * PROGRESS_PERSIST_INTERVAL + 1:
+                # A job in this process reports it directly; the store copy lags behind
+                return
+            snapshot = dict(previous[1]) if previous else {"task_id": task_id}
+            snapshot.update(fields)
+            if previous and snapshot == previous[1]:
+                return
+            self._version += 1
+            self._latest[task_id] = (self._version, snapshot, local_at)
+            self._latest.move_to_end(task_id)
+            while len(self._latest) > self.max_tasks:
+                self._latest.popitem(last=False)
+            self._stats["published"] += 1
+            subscribers = [s for s in self._subscribers if s.task_id in (None, task_id)]
+        for subscriber in subscribers:
+            subscriber.notify()
+
+    def snapshot(self, task_id):
+        with self._lock:
+            entry = self._latest.get(task_id)
+            return dict(entry[1]) if entry else None
+
+    def changes_since(self, version, task_id=None):
+        """(latest version, snapshots changed after version, oldest first)"""
+        with self._lock:
+            if task_id is not None:
+                entry = self._latest.get(task_id)
+                changed = [entry] if entry and entry[0] > version else []
+            else:
+                changed = [entry for entry in self._latest.values() if entry[0] > version]
+            changed.sort(key=lambda entry: entry[0])
+            self._stats["delivered"] += len(changed)
+            return self._version, [dict(entry[1]) for entry in changed]
+
+    async def stream(self, task_id=None, since=0, min_interval=PROGRESS_STREAM_INTERVAL, keepalive=PROGRESS_KEEPALIVE):
+        """
+        Yield lists of changed snapshots (all tasks, or one), at most once per min_interval.
+        An empty list is yielded after keepalive seconds without changes.
+        """
+        subscriber = _Subscriber(task_id)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        self._ensure_bridge()
+        version = since
+        try:
+            while True:
+                subscriber.event.clear()
+                version, changed = self.changes_since(version, task_id)
+                if changed:
+                    yield changed
+                    # Bounds the event rate per client; changes meanwhile are coalesced
+                    await asyncio.sleep(min_interval)
+                    continue
+                try:
+                    await asyncio.wait_for(subscriber.event.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield []
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def _ensure_bridge(self):
+        with self._lock:
+            if self._bridge is None:
+                self._bridge = threading.Thread(target=self._bridge_loop, name="progress-bridge", daemon=True)
+                self._bridge.start()
+
+    def _bridge_loop(self):
+        """Republish progress that worker processes wrote to the shared task store"""
+        store = get_task_store()
+        since = time.time()
+        while True:
+            time.sleep(PROGRESS_STORE_POLL_INTERVAL)
+            with self._lock:
+                if not self._subscribers:
+                    since = time.time()
+                    continue
+            try:
+                for updated_ts, task in store.updated_since(since):
+                    since = max(since, updated_ts)
+                    self._publish(task["task_id"], task, local=False)
+            except Exception as e:
+                logger.warning("⚠️ Progress bridge could not read the task store: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._subscribers), tracked_tasks=len(self._latest))
+
+
+progress_bus = ProgressBus()
+
+
+class ProgressReporter:
+    """
+    Progress of one job: stage, bytes done, transfer rate, ETA and HLS segment.
+
+    Every change is published to the bus (at most every publish_interval) and written
+    to the task store (at most every persist_interval); stage and status changes go
+    out immediately.
+    """
+
+    def __init__(self, task_id, store=None, bus=progress_bus,
+                 publish_interval=PROGRESS_PUBLISH_INTERVAL, persist_interval=PROGRESS_PERSIST_INTERVAL):
+        self.task_id = task_id
+        self.store = store or get_task_store()
+        self.bus = bus
+        self.publish_interval = publish_interval
+        self.persist_interval = persist_interval
+        self._pending = {}
+        self._unpersisted = {}
+        self._last_publish = 0.0
+        self._last_persist = 0.0
+        self._rate = None
+        self._rate_sample = None
+        self._lock = threading.Lock()
+
+    def update(self, force=False, **fields):
+        with self._lock:
+            self._pending.update(fields)
+            self._unpersisted.update(fields)
+            now = time.monotonic()
+            if force or now - self._last_persist >= self.persist_interval:
+                fields, self._unpersisted = self._unpersisted, {}
+                self._last_persist = now
+                record = self.store.update(self.task_id, **fields)
+                if record is not None:
+                    # The store has the final say on status (a cancel is never overwritten)
+                    self._pending["status"] = record.get("status")
+            if force or now - self._last_publish >= self.publish_interval:
+                fields, self._pending = self._pending, {}
+                self._last_publish = now
+                self.bus.publish(self.task_id, **fields)
+
+    def stage(self, stage, **fields):
+        """Enter a new stage (scraping, resolving, downloading, remuxing, ...); resets byte counters"""
+        with self._lock:
+            self._rate = None
+            self._rate_sample = None
+        self.update(force=True, stage=stage, bytes_done=0, bytes_total=None, rate=None, eta=None,
+                    segment=None, segments_total=None, **fields)
+
+    def bytes(self, done, total=None, **fields):
+        """Record bytes transferred so far in this stage; derives a smoothed rate and an ETA"""
+        now = time.monotonic()
+        with self._lock:
+            if self._rate_sample is None:
+                self._rate_sample = (now, done)
+            elif now - self._rate_sample[0] >= 0.5:
+                sample_rate = (done - self._rate_sample[1]) / (now - self._rate_sample[0])
+                self._rate = sample_rate if self._rate is None else 0.7 * self._rate + 0.3 * sample_rate
+                self._rate_sample = (now, done)
+            rate = self._rate
+        eta = (total - done) / rate if rate and total else None
+        self.update(bytes_done=done, bytes_total=total, rate=round(rate) if rate is not None else None,
+                    eta=round(eta, 1) if eta is not None else None, **fields)
+
+    def finish(self, status, **fields):
+        self.update(force=True, status=status, rate=None, eta=None, **fields)
+
+
+def is_finished(snapshot):
+    return snapshot.get("status") in FINISHED_STATUSES
@@ -0,0 +1,208 @@
+import os
+import time
+import fnmatch
+import sqlite3
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from config import (
+    RATE_LIMIT_PATH,
+    RATE_LIMIT_HOSTS,
+    RATE_LIMIT_INITIAL,
+    RATE_LIMIT_MIN,
+    RATE_LIMIT_MAX,
+    RATE_LIMIT_INCREASE,
+    RATE_LIMIT_DECREASE,
+    RATE_LIMIT_COOLDOWN,
+    RATE_LIMIT_MAX_COOLDOWN,
+)
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Responses that mean the site wants us to slow down
+THROTTLE_STATUSES = {403, 429, 500, 502, 503, 504}
+
+
+def looks_blocked(text):
+    """True if an HTML body is a DDoS-Guard challenge instead of the page we asked for"""
+    head = (text or "")[:1000].lower()
+    return "ddos-guard" in head or "js-challenge" in head
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date); None if absent or unparseable"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostRateLimiter:
+    """
+    Request pacing per host with additive-increase/multiplicative-decrease.
+
+    Each host has a request rate. Every healthy response raises it by `increase` (up to
+    max_rate); a 429/403/5xx or a DDoS-Guard page multiplies it by `decrease` and pauses
+    the host for a cooldown that doubles with each consecutive failure (or for the
+    server's Retry-After). Rates and the next free request slot live in SQLite, so all
+    threads and processes sharing the file pace together.
+    """
+
+    def __init__(self, path, hosts=RATE_LIMIT_HOSTS, initial_rate=RATE_LIMIT_INITIAL,
+                 min_rate=RATE_LIMIT_MIN, max_rate=RATE_LIMIT_MAX, increase=RATE_LIMIT_INCREASE,
+                 decrease=RATE_LIMIT_DECREASE, cooldown=RATE_LIMIT_COOLDOWN,
+                 max_cooldown=RATE_LIMIT_MAX_COOLDOWN):
+        self.path = path
+        self.hosts = list(hosts)
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS host_rates (
+                host       TEXT PRIMARY KEY,
+                rate       REAL NOT NULL,
+                next_ts    REAL NOT NULL,
+                failures   INTEGER NOT NULL DEFAULT 0,
+                updated_ts REAL NOT NULL
+            );
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def host_for(self, url):
+        """The host a URL is paced under, or None if its host is not rate limited"""
+        host = (urlparse(url).hostname or "").lower()
+        if host and any(fnmatch.fnmatch(host, pattern) for pattern in self.hosts):
+            return host
+        return None
+
+    def _update(self, host, change):
+        """Apply change(rate, next_ts, failures, now) -> (rate, next_ts, failures) atomically; returns its result"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT rate, next_ts, failures FROM host_rates WHERE host = ?", (host,)).fetchone()
+            current = (row["rate"], row["next_ts"], row["failures"]) if row else (self.initial_rate, now, 0)
+            rate, next_ts, failures = change(*current, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO host_rates (host, rate, next_ts, failures, updated_ts) VALUES (?, ?, ?, ?, ?)",
+                (host, rate, next_ts, failures, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rate, next_ts, failures, now
+
+    def wait(self, url, cancel_token=None):
+        """Block until url's host has a free request slot and take it; returns the seconds waited"""
+        host = self.host_for(url)
+        if host is None:
+            return 0.0
+
+        slot = {}
+
+        def reserve(rate, next_ts, failures, now):
+            slot["delay"] = max(next_ts - now, 0.0)
+            return rate, max(now, next_ts) + 1.0 / rate, failures
+
+        self._update(host, reserve)
+        delay = slot["delay"]
+        if delay > 0:
+            if cancel_token is not None:
+                cancel_token.sleep(delay)
+            else:
+                time.sleep(delay)
+        return delay
+
+    def record(self, url, status=None, blocked=False, retry_after=None):
+        """Feed back how a request went; returns True if it was a throttling response"""
+        host = self.host_for(url)
+        throttled = blocked or status in THROTTLE_STATUSES
+        if host is None:
+            return throttled
+
+        if throttled:
+            def change(rate, next_ts, failures, now):
+                failures += 1
+                pause = retry_after if retry_after is not None else self.cooldown * 2 ** (failures - 1)
+                pause = min(pause, self.max_cooldown)
+                return max(rate * self.decrease, self.min_rate), max(next_ts, now + pause), failures
+        else:
+            def change(rate, next_ts, failures, now):
+                return min(rate + self.increase, self.max_rate), next_ts, 0
+
+        rate, _, failures, _ = self._update(host, change)
+        if throttled:
+            logger.info("🐢 %s pushed back (status %s); pacing at %.2f req/s, failure streak %s", host, status, rate, failures)
+        return throttled
+
+    def record_response(self, url, response):
+        """record() for a requests.Response; returns True if it was a throttling response"""
+        content_type = response.headers.get("Content-Type", "")
+        blocked = "application/json" not in content_type and looks_blocked(response.text)
+        return self.record(url, response.status_code, blocked,
+                           parse_retry_after(response.headers.get("Retry-After")))
+
+    def stats(self):
+        """Current rate, failure streak and seconds until the next free slot, per host"""
+        now = time.time()
+        return {
+            row["host"]: {
+                "rate": round(row["rate"], 3),
+                "failures": row["failures"],
+                "next_slot_in": round(max(row["next_ts"] - now, 0.0), 2),
+            }
+            for row in self._conn().execute("SELECT host, rate, next_ts, failures FROM host_rates ORDER BY host")
+        }
+
+
+def load_page(driver, url, cancel_token=None, limiter=None):
+    """driver.get(url), paced by the rate limiter, recording whether the site pushed back"""
+    limiter = limiter or get_rate_limiter()
+    limiter.wait(url, cancel_token)
+    try:
+        driver.get(url)
+    except Exception:
+        # Page load timeouts are the browser's way of seeing a struggling site
+        limiter.record(url, blocked=True)
+        raise
+    limiter.record(url, blocked=looks_blocked(driver.page_source))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """The process-wide rate limiter at RATE_LIMIT_PATH"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = HostRateLimiter(RATE_LIMIT_PATH)
+        return _limiter
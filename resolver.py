@@ -9,7 +9,15 @@ from browser import (
     create_stealth_driver,
     set_adblock,
     guarded_click,
+    shutdown_driver,
 )
+from cancellation import CancelToken, Cancelled
+from rate_limiter import load_page
+from metrics import StepTimer, RESOLVE_STEP_SECONDS, BROWSER_JOBS
+from tracing import traced
+from log import get_logger
+
+logger = get_logger(__name__)
 
 
 def _remove_ads_and_overlays(driver):
@@ -39,12 +47,17 @@ def _remove_ads_and_overlays(driver):
             continue
 
 
-def resolve_download_info(intermediate_url):
+@traced("resolve")
+def resolve_download_info(intermediate_url, cancel_token=None):
     """
     Resolve download information including URL, form data, cookies, and filename.
     Returns a dict with all necessary info for downloading.
+    Raises Cancelled if cancel_token is cancelled; the browser is quit straight away.
     """
-    driver = create_stealth_driver(headless=True)
+    cancel_token = cancel_token or CancelToken()
+    steps = StepTimer(RESOLVE_STEP_SECONDS, span_prefix="resolve")
+    driver = create_stealth_driver(headless=True, resource_profile="kwik", cancel_token=cancel_token)
+    steps.lap("browser")
     download_info = {
         'url': None,
         'form_data': {},
@@ -53,10 +66,14 @@ def resolve_download_info(intermediate_url):
         'filename': None
     }
     
+    unregister = lambda: None
     try:
-        print("🌐 Navigating to intermediate URL...")
+        # Quitting the browser on cancel aborts whatever wait is in progress
+        unregister = cancel_token.register(driver.quit)
+        logger.info("🌐 Navigating to intermediate URL...")
         set_adblock(driver, True)
-        driver.get(intermediate_url)
+        load_page(driver, intermediate_url, cancel_token)
+        steps.lap("page_load")
 
         # Continue button handling with improved logic
         try:
@@ -70,9 +87,11 @@ def resolve_download_info(intermediate_url):
             # Wait for the "Continue" button to load and be visible
             continue_button_locator = (By.CLASS_NAME, "redirect")
             WebDriverWait(driver, 60).until(EC.visibility_of_element_located(continue_button_locator))
+            steps.lap("redirect_wait")
 
             # Wait an additional 6 seconds before attempting to click the "Continue" button
-            sleep(6)
+            cancel_token.sleep(6)
+            steps.lap("redirect_delay")
 
             # Retry clicking the continue button a few times if necessary
             for _ in range(3):
@@ -80,25 +99,30 @@ def resolve_download_info(intermediate_url):
                     WebDriverWait(driver, 10).until(EC.element_to_be_clickable(continue_button_locator))
                     continue_button = driver.find_element(*continue_button_locator)
                     driver.execute_script("arguments[0].click();", continue_button)
-                    print("✅ Continue button clicked successfully")
+                    logger.info("✅ Continue button clicked successfully")
                     break  # Exit loop if click is successful
                 except ElementClickInterceptedException:
-                    print("Click was intercepted, trying again...")
+                    logger.debug("Click was intercepted, trying again...")
                     sleep(2)
+        except Cancelled:
+            raise
         except Exception as e:
-            print("⚠️ Continue handling error:", e)
+            logger.warning("⚠️ Continue handling error: %s", e)
+        steps.lap("continue")
 
         # Progress by URL/domain heuristics
         deadline = time.time() + 30
         while time.time() < deadline:
+            cancel_token.raise_if_cancelled()
             current_url = driver.current_url
             if "/d/" in current_url or current_url.endswith(".mp4"):
                 download_info['url'] = current_url
-                print("✅ Direct download URL reached:", current_url)
+                logger.info("✅ Direct download URL reached: %s", current_url)
                 break
             if "kwik.si" in current_url:
                 break
             time.sleep(0.5)
+        steps.lap("navigate")
 
         # Extract episode title for filename
         try:
@@ -108,12 +132,13 @@ def resolve_download_info(intermediate_url):
             episode_title = title_element.text.strip()
             filename = episode_title.replace(" ", "_")
             download_info['filename'] = filename
-            print(f"📝 Episode title extracted: {episode_title}")
+            logger.info("📝 Episode title extracted: %s", episode_title)
         except Exception as e:
-            print(f"⚠️ Could not extract episode title: {e}")
+            logger.warning("⚠️ Could not extract episode title: %s", e)
+        steps.lap("title")
 
         # Extract download URL and form data
-        print("🔍 Extracting download information...")
+        logger.info("🔍 Extracting download information...")
         set_adblock(driver, False)
         time.sleep(1.0)
         
@@ -129,10 +154,10 @@ def resolve_download_info(intermediate_url):
                 
                 if download_url and "http" in download_url:
                     download_info['url'] = download_url
-                    print(f"✅ Download URL extracted: {download_url}")
+                    logger.info("✅ Download URL extracted: %s", download_url)
                     break
             except ElementClickInterceptedException as e:
-                print(f"Attempt {attempt + 1} failed due to element click interception: {e}")
+                logger.debug("Attempt %s failed due to element click interception: %s", attempt + 1, e)
                 sleep(2)
 
         if not download_info['url']:
@@ -158,14 +183,22 @@ def resolve_download_info(intermediate_url):
             'Content-Type': 'application/x-www-form-urlencoded'
         }
 
-        print("✅ Download information successfully extracted")
+        steps.lap("form")
+        logger.info("✅ Download information successfully extracted")
+        BROWSER_JOBS.inc(kind="resolve", outcome="ok")
         return download_info
 
+    except Cancelled:
+        raise
     except Exception as e:
-        print(f"⚠️ Error resolving download info: {e}")
+        # A browser quit by a cancel surfaces here as a WebDriver error
+        cancel_token.raise_if_cancelled()
+        logger.warning("⚠️ Error resolving download info: %s", e)
+        BROWSER_JOBS.inc(kind="resolve", outcome="failed")
         return None
     finally:
-        driver.quit()
+        unregister()
+        shutdown_driver(driver)
 
 
 def resolve_download_url(intermediate_url):
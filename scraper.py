@@ -1,119 +1,231 @@
 import re
 import time
 import json
+import threading
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from browser import create_stealth_driver, guarded_click, cleanup_browser_data
+from admission import BrowserQueueFull
+from cancellation import CancelToken, Cancelled
+from browser import create_stealth_driver, guarded_click, shutdown_driver
+from rate_limiter import load_page
+from metrics import StepTimer, SCRAPE_STEP_SECONDS, BROWSER_JOBS
+from tracing import traced
+from config import BASE_ORIGIN, M3U8_VARIANT_CACHE_TTL
+from log import get_logger
 
+logger = get_logger(__name__)
 
-def scrape_download_links(anime_session, episode_session, max_retries=2):
+# Resolution menus recorded per (anime_session, episode_session) as (stored_at, variants)
+_m3u8_variant_cache = {}
+_m3u8_variant_lock = threading.Lock()
+
+
+@traced("scrape")
+def scrape_download_links(anime_session, episode_session, max_retries=2, cancel_token=None):
     """Scrape download links with retry logic and better error handling"""
-    url = f"https://animepahe.ru/play/{anime_session}/{episode_session}"
+    url = f"{BASE_ORIGIN}/play/{anime_session}/{episode_session}"
+    cancel_token = cancel_token or CancelToken()
     
     for attempt in range(max_retries):
         driver = None
         try:
-            print(f"🌐 Scraping attempt {attempt + 1}/{max_retries} for {url}")
-            driver = create_stealth_driver(headless=True)
-            driver.get(url)
-            
-            # Wait for page to load
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Look for download button
-            download_button = WebDriverWait(driver, 20).until(
-                EC.element_to_be_clickable((By.ID, "downloadMenu"))
-            )
-            
-            # Click download button
-            try:
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_button)
-                download_button.click()
-            except Exception as e:
-                print(f"⚠️ Direct click failed, trying guarded click: {e}")
-                guarded_click(driver, download_button, max_retries=3)
-            
-            # Wait for dropdown to appear
-            dropdown = WebDriverWait(driver, 20).until(
-                EC.visibility_of_element_located((By.ID, "pickDownload"))
-            )
-            
-            # Extract download links
-            anchors = dropdown.find_elements(By.TAG_NAME, "a")
-            links = {}
-            
-            for a in anchors:
-                href = a.get_attribute("href")
-                text = a.text.strip()
-                match = re.search(r"(\d{3,4})p", text)
-                if href and match:
-                    quality = match.group(1)
-                    if "eng" in text.lower():
-                        lang = "eng"
-                    elif "chi" in text.lower():
-                        lang = "chi"
-                    else:
-                        lang = "jpn"
-                    links[f"{quality}_{lang}"] = href
+            logger.debug("🌐 Scraping attempt %s/%s for %s", attempt + 1, max_retries, url)
+            steps = StepTimer(SCRAPE_STEP_SECONDS, span_prefix="scrape")
+            driver = create_stealth_driver(headless=True, cancel_token=cancel_token)
+            steps.lap("browser")
+            # Quitting the browser on cancel aborts any wait below
+            with cancel_token.on_cancel(driver.quit):
+                load_page(driver, url, cancel_token)
+                steps.lap("page_load")
+                
+                # Wait for page to load
+                WebDriverWait(driver, 15).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+                
+                # Look for download button
+                download_button = WebDriverWait(driver, 20).until(
+                    EC.element_to_be_clickable((By.ID, "downloadMenu"))
+                )
+                steps.lap("download_menu")
+                
+                # Click download button
+                try:
+                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_button)
+                    download_button.click()
+                except Exception as e:
+                    logger.warning("⚠️ Direct click failed, trying guarded click: %s", e)
+                    guarded_click(driver, download_button, max_retries=3)
+                
+                # Wait for dropdown to appear
+                dropdown = WebDriverWait(driver, 20).until(
+                    EC.visibility_of_element_located((By.ID, "pickDownload"))
+                )
+                steps.lap("dropdown")
+                
+                # Extract download links
+                anchors = dropdown.find_elements(By.TAG_NAME, "a")
+                links = {}
+                
+                for a in anchors:
+                    href = a.get_attribute("href")
+                    text = a.text.strip()
+                    match = re.search(r"(\d{3,4})p", text)
+                    if href and match:
+                        quality = match.group(1)
+                        if "eng" in text.lower():
+                            lang = "eng"
+                        elif "chi" in text.lower():
+                            lang = "chi"
+                        else:
+                            lang = "jpn"
+                        links[f"{quality}_{lang}"] = href
+                steps.lap("extract")
             
             if links:
-                print(f"✅ Successfully scraped {len(links)} download links")
+                logger.info("✅ Successfully scraped %s download links", len(links))
+                BROWSER_JOBS.inc(kind="scrape", outcome="ok")
                 return links
             else:
-                print(f"⚠️ No download links found on attempt {attempt + 1}")
+                logger.warning("⚠️ No download links found on attempt %s", attempt + 1)
                 
+        except (BrowserQueueFull, Cancelled):
+            raise
+
         except TimeoutException as ex:
-            print(f"⚠️ Timeout on attempt {attempt + 1}: {ex}")
+            cancel_token.raise_if_cancelled()
+            logger.warning("⚠️ Timeout on attempt %s: %s", attempt + 1, ex)
             if attempt == max_retries - 1:
+                BROWSER_JOBS.inc(kind="scrape", outcome="failed")
                 raise Exception(f"Page load timeout after {max_retries} attempts. The episode may not be available.")
                 
         except Exception as ex:
-            print(f"⚠️ Error on attempt {attempt + 1}: {ex}")
+            # A browser quit by a cancel surfaces here as a WebDriver error
+            cancel_token.raise_if_cancelled()
+            logger.warning("⚠️ Error on attempt %s: %s", attempt + 1, ex)
             if attempt == max_retries - 1:
+                BROWSER_JOBS.inc(kind="scrape", outcome="failed")
                 raise Exception(f"Failed to scrape download links: {str(ex)}")
                 
         finally:
-            if driver:
-                try:
-                    cleanup_browser_data(driver)  # Clean up temp directory first
-                    driver.quit()
-                except Exception as e:
-                    print(f"⚠️ Error closing driver: {e}")
+            shutdown_driver(driver)
         
         # Wait before retry
         if attempt < max_retries - 1:
-            print(f"⏳ Waiting before retry...")
-            time.sleep(2 ** attempt + 1)  # Exponential backoff + 1 second minimum
+            logger.debug("⏳ Waiting before retry...")
+            cancel_token.sleep(2 ** attempt + 1)  # Exponential backoff + 1 second minimum
     
+    BROWSER_JOBS.inc(kind="scrape", outcome="empty")
     return {}
 
 
-def scrape_m3u8_links(anime_session, episode_session, quality="720", language="eng", max_retries=3):
+def parse_variant_key(variant_key):
+    """Split a '720_eng' style variant key into (quality, language)"""
+    quality, _, language = variant_key.partition("_")
+    return quality.rstrip("p"), (language or "jpn").lower()
+
+
+def _read_resolution_menu(driver):
+    """Record every entry of the player's resolution menu"""
+    resolution_menu = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "resolutionMenu"))
+    )
+    variants = []
+    for button in resolution_menu.find_elements(By.CSS_SELECTOR, "button.dropdown-item"):
+        variants.append({
+            "quality": button.get_attribute("data-resolution"),
+            "language": button.get_attribute("data-audio"),
+            "fansub": button.get_attribute("data-fansub"),
+            "m3u8_url": button.get_attribute("data-src"),
+            "active": "active" in (button.get_attribute("class") or ""),
+        })
+    return variants
+
+
+def get_cached_m3u8_variants(anime_session, episode_session):
+    """Return the stored resolution menu for an episode, or None if missing or expired"""
+    key = (anime_session, episode_session)
+    with _m3u8_variant_lock:
+        entry = _m3u8_variant_cache.get(key)
+        if not entry:
+            return None
+        stored_at, variants = entry
+        if time.time() - stored_at > M3U8_VARIANT_CACHE_TTL:
+            del _m3u8_variant_cache[key]
+            return None
+        return variants
+
+
+def store_m3u8_variants(anime_session, episode_session, variants):
+    with _m3u8_variant_lock:
+        _m3u8_variant_cache[(anime_session, episode_session)] = (time.time(), variants)
+
+
+def select_m3u8_variant(variants, quality, language, fallback=True):
     """
-    Scrape .m3u8 links after clicking 'Click to load' elements and selecting quality/language
+    Pick a variant from a recorded resolution menu
 
     Args:
-        anime_session: Anime session ID
-        episode_session: Episode session ID
+        variants: Entries as returned by scrape_m3u8_variants
         quality: Desired quality (360, 720, 1080)
         language: Desired language (eng, chi, jpn)
+        fallback: Use the active (or first) entry when there is no exact match
+
+    Returns:
+        The matching variant dict, or None
+    """
+    for variant in variants:
+        if variant.get("quality") == quality and variant.get("language") == language:
+            return variant
+    if not fallback or not variants:
+        return None
+    active = [v for v in variants if v.get("active")]
+    return active[0] if active else variants[0]
+
+
+def _m3u8_result(variant, anime_session, episode_session):
+    return {
+        "m3u8_url": variant.get("m3u8_url"),
+        "quality": variant.get("quality"),
+        "language": variant.get("language"),
+        "fansub": variant.get("fansub"),
+        "episode_session": episode_session,
+        "anime_session": anime_session
+    }
+
+
+def scrape_m3u8_variants(anime_session, episode_session, max_retries=3, use_cache=True):
+    """
+    Scrape every quality/language variant of an episode in a single browser session
+
+    The full resolution menu is stored so later quality/language picks for the
+    same episode are answered without launching another browser.
+
+    Args:
+        anime_session: Anime session ID
+        episode_session: Episode session ID
         max_retries: Maximum number of retry attempts
+        use_cache: Answer from the stored menu when it is still fresh
 
     Returns:
-        Dictionary containing .m3u8 link info
+        List of variant dicts (quality, language, fansub, m3u8_url, active)
     """
-    url = f"https://animepahe.ru/play/{anime_session}/{episode_session}"
+    if use_cache:
+        cached = get_cached_m3u8_variants(anime_session, episode_session)
+        if cached is not None:
+            logger.info("♻️ Using stored resolution menu for %s (%s variants)", episode_session, len(cached))
+            return cached
+
+    url = f"{BASE_ORIGIN}/play/{anime_session}/{episode_session}"
 
     for attempt in range(max_retries):
         driver = None
         try:
-            print(f"🌐 Scraping .m3u8 links attempt {attempt + 1}/{max_retries} for {url}")
-            driver = create_stealth_driver(headless=True)
-            driver.get(url)
+            logger.debug("🌐 Scraping .m3u8 links attempt %s/%s for %s", attempt + 1, max_retries, url)
+            driver = create_stealth_driver(headless=True, resource_profile="player")
+            load_page(driver, url)
 
             # Wait for page to load
             WebDriverWait(driver, 15).until(
@@ -134,96 +246,98 @@ def scrape_m3u8_links(anime_session, episode_session, quality="720", language="e
                 try:
                     click_to_load.click()
                 except Exception as e:
-                    print(f"⚠️ Direct click failed, trying guarded click: {e}")
+                    logger.warning("⚠️ Direct click failed, trying guarded click: %s", e)
                     guarded_click(driver, click_to_load, max_retries=3)
 
-                print("✅ Clicked 'Click to load' element")
+                logger.info("✅ Clicked 'Click to load' element")
 
                 # Wait for content to load and dropdown to appear
                 time.sleep(3)
 
-                # Look for the resolution dropdown menu
-                resolution_menu = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.ID, "resolutionMenu"))
-                )
-
-                # Find the active button that matches the desired quality and language
-                active_button = None
-                dropdown_items = resolution_menu.find_elements(By.CSS_SELECTOR, "button.dropdown-item")
-
-                print(f"🔍 Looking for {quality}p {language.upper()} quality...")
-
-                for button in dropdown_items:
-                    data_resolution = button.get_attribute("data-resolution")
-                    data_audio = button.get_attribute("data-audio")
-
-                    # Check if this button matches our desired quality and language
-                    if data_resolution == quality and data_audio == language:
-                        active_button = button
-                        break
-
-                if not active_button:
-                    print(f"⚠️ No matching {quality}p {language.upper()} quality found. Available options:")
-                    for button in dropdown_items:
-                        data_resolution = button.get_attribute("data-resolution") or "unknown"
-                        data_audio = button.get_attribute("data-audio") or "unknown"
-                        data_src = button.get_attribute("data-src") or "no-src"
-                        print(f"  - {data_resolution}p {data_audio.upper()}: {data_src[:50]}...")
-
-                    # If no exact match, try to find the active one or first available
-                    active_buttons = [btn for btn in dropdown_items if "active" in (btn.get_attribute("class") or "")]
-                    if active_buttons:
-                        active_button = active_buttons[0]
-                        print(f"🔄 Using active button: {active_button.get_attribute('data-resolution')}p {active_button.get_attribute('data-audio')}")
-                    else:
-                        active_button = dropdown_items[0] if dropdown_items else None
-                        print("🔄 Using first available button")
-
-                if active_button:
-                    data_src = active_button.get_attribute("data-src")
-                    data_resolution = active_button.get_attribute("data-resolution")
-                    data_audio = active_button.get_attribute("data-audio")
-                    data_fansub = active_button.get_attribute("data-fansub")
-
-                    if data_src:
-                        print(f"✅ Found .m3u8 link: {data_resolution}p {data_audio.upper()} from {data_fansub}")
-                        return {
-                            "m3u8_url": data_src,
-                            "quality": data_resolution,
-                            "language": data_audio,
-                            "fansub": data_fansub,
-                            "episode_session": episode_session,
-                            "anime_session": anime_session
-                        }
-                    else:
-                        print("⚠️ Active button found but no data-src attribute")
-                else:
-                    print("❌ No suitable button found in dropdown")
+                variants = [v for v in _read_resolution_menu(driver) if v.get("m3u8_url")]
+                if variants:
+                    logger.info("✅ Recorded %s variants:", len(variants))
+                    for v in variants:
+                        logger.debug("  - %sp %s from %s", v['quality'], (v['language'] or 'unknown').upper(), v['fansub'])
+                    store_m3u8_variants(anime_session, episode_session, variants)
+                    return variants
+                logger.warning("⚠️ Resolution menu has no entries with a data-src attribute")
 
             except TimeoutException as e:
-                print(f"⚠️ Timeout waiting for elements: {e}")
+                logger.warning("⚠️ Timeout waiting for elements: %s", e)
             except NoSuchElementException as e:
-                print(f"⚠️ Element not found: {e}")
+                logger.warning("⚠️ Element not found: %s", e)
             except Exception as e:
-                print(f"⚠️ Error during .m3u8 scraping: {e}")
+                logger.warning("⚠️ Error during .m3u8 scraping: %s", e)
+
+        except BrowserQueueFull:
+            raise
 
         except Exception as ex:
-            print(f"⚠️ Error on attempt {attempt + 1}: {ex}")
+            logger.warning("⚠️ Error on attempt %s: %s", attempt + 1, ex)
 
         finally:
-            if driver:
-                try:
-                    cleanup_browser_data(driver)
-                    driver.quit()
-                except Exception as e:
-                    print(f"⚠️ Error closing driver: {e}")
+            shutdown_driver(driver)
 
         # Wait before retry
         if attempt < max_retries - 1:
-            print(f"⏳ Waiting before retry...")
+            logger.debug("⏳ Waiting before retry...")
             time.sleep(2 ** attempt + 1)
 
-    return {}
+    return []
+
+
+def scrape_m3u8_links(anime_session, episode_session, quality="720", language="eng", max_retries=3):
+    """
+    Scrape .m3u8 links after clicking 'Click to load' elements and selecting quality/language
+
+    Args:
+        anime_session: Anime session ID
+        episode_session: Episode session ID
+        quality: Desired quality (360, 720, 1080)
+        language: Desired language (eng, chi, jpn)
+        max_retries: Maximum number of retry attempts
+
+    Returns:
+        Dictionary containing .m3u8 link info
+    """
+    variants = scrape_m3u8_variants(anime_session, episode_session, max_retries=max_retries)
+
+    logger.info("🔍 Looking for %sp %s quality...", quality, language.upper())
+    variant = select_m3u8_variant(variants, quality, language)
+    if not variant:
+        logger.error("❌ No suitable variant found in resolution menu")
+        return {}
+    if variant.get("quality") != quality or variant.get("language") != language:
+        logger.info("🔄 No %sp %s variant, using %sp %s", quality, language.upper(), variant['quality'], (variant['language'] or 'unknown').upper())
+
+    logger.info("✅ Found .m3u8 link: %sp %s from %s", variant['quality'], (variant['language'] or 'unknown').upper(), variant['fansub'])
+    return _m3u8_result(variant, anime_session, episode_session)
+
+
+def scrape_m3u8_links_for_variants(anime_session, episode_session, variant_keys, max_retries=3):
+    """
+    Scrape .m3u8 links for several quality/language variants of one episode
+
+    Args:
+        anime_session: Anime session ID
+        episode_session: Episode session ID
+        variant_keys: Wanted variants as '720_eng' style keys
+        max_retries: Maximum number of retry attempts
+
+    Returns:
+        Dictionary mapping each found variant key to its .m3u8 link info
+    """
+    variants = scrape_m3u8_variants(anime_session, episode_session, max_retries=max_retries)
+    results = {}
+    for variant_key in variant_keys:
+        quality, language = parse_variant_key(variant_key)
+        variant = select_m3u8_variant(variants, quality, language, fallback=False)
+        if variant:
+            results[f"{quality}_{language}"] = _m3u8_result(variant, anime_session, episode_session)
+        else:
+            logger.warning("⚠️ %sp %s not available for %s", quality, language.upper(), episode_session)
+    return results
 
 
 def scrape_multiple_episodes_m3u8(anime_session, episode_sessions, quality="720", language="eng"):
@@ -243,7 +357,7 @@ def scrape_multiple_episodes_m3u8(anime_session, episode_sessions, quality="720"
     total_episodes = len(episode_sessions)
 
     for i, episode_session in enumerate(episode_sessions):
-        print(f"\n📺 Processing episode {i+1}/{total_episodes}")
+        logger.info("📺 Processing episode %s/%s", i+1, total_episodes)
 
         try:
             m3u8_data = scrape_m3u8_links(anime_session, episode_session, quality, language)
@@ -251,17 +365,49 @@ def scrape_multiple_episodes_m3u8(anime_session, episode_sessions, quality="720"
                 # Extract episode number from session or use index
                 episode_num = i + 1  # Default to sequential numbering
                 results[str(episode_num)] = m3u8_data
-                print(f"✅ Episode {episode_num}: .m3u8 link extracted")
+                logger.info("✅ Episode %s: .m3u8 link extracted", episode_num)
             else:
-                print(f"❌ Episode {i+1}: Failed to extract .m3u8 link")
+                logger.error("❌ Episode %s: Failed to extract .m3u8 link", i+1)
 
+        except BrowserQueueFull:
+            raise
         except Exception as e:
-            print(f"❌ Failed to scrape episode {i+1}: {e}")
+            logger.error("❌ Failed to scrape episode %s: %s", i+1, e)
             results[str(i+1)] = {}
 
-        # Small delay between episodes to avoid overwhelming the server
-        if i < total_episodes - 1:
-            time.sleep(2)
+    return results
+
+
+def scrape_multiple_episodes_m3u8_variants(anime_session, episode_sessions, variant_keys):
+    """
+    Scrape .m3u8 links for several quality/language variants of multiple episodes
+
+    Each episode is opened once; every wanted variant is answered from that visit.
+
+    Args:
+        anime_session: Anime session ID
+        episode_sessions: List of episode session IDs
+        variant_keys: Wanted variants as '720_eng' style keys
+
+    Returns:
+        Dictionary mapping variant key to {episode number: .m3u8 link data}
+    """
+    results = {"{}_{}".format(*parse_variant_key(k)): {} for k in variant_keys}
+    total_episodes = len(episode_sessions)
+
+    for i, episode_session in enumerate(episode_sessions):
+        logger.info("📺 Processing episode %s/%s", i+1, total_episodes)
+        episode_num = str(i + 1)
+
+        try:
+            found = scrape_m3u8_links_for_variants(anime_session, episode_session, variant_keys)
+            for variant_key, m3u8_data in found.items():
+                results[variant_key][episode_num] = m3u8_data
+            logger.info("✅ Episode %s: %s/%s variants extracted", episode_num, len(found), len(results))
+        except BrowserQueueFull:
+            raise
+        except Exception as e:
+            logger.error("❌ Failed to scrape episode %s: %s", i+1, e)
 
     return results
 
@@ -271,10 +417,10 @@ def save_m3u8_results(results, filename="m3u8_links.json"):
     try:
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=2, ensure_ascii=False)
-        print(f"💾 Results saved to {filename}")
+        logger.info("💾 Results saved to %s", filename)
         return True
     except Exception as e:
-        print(f"❌ Error saving results: {e}")
+        logger.error("❌ Error saving results: %s", e)
         return False
 
 
@@ -4,8 +4,18 @@ import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from config import BASE_ORIGIN
-from browser import create_stealth_driver, cleanup_browser_data
+from config import BASE_ORIGIN, RATE_LIMIT_RETRIES
+from browser import create_stealth_driver, shutdown_driver
+from rate_limiter import get_rate_limiter, looks_blocked
+from metrics import DDOS_REFRESHES, DDOS_REFRESH_SECONDS, SITE_API_SECONDS, SITE_API_REQUESTS
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+def _api_endpoint(url):
+    """The API method (search, release, ...) a URL calls, for metric labels"""
+    return urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).get("m", ["page"])[0]
 
 
 def looks_like_ddos_guard(resp: requests.Response) -> bool:
@@ -15,8 +25,7 @@ def looks_like_ddos_guard(resp: requests.Response) -> bool:
             return False
     except Exception:
         pass
-    text_head = (resp.text or "")[:1000].lower()
-    return "ddos-guard" in text_head or "js-challenge" in text_head
+    return looks_blocked(resp.text)
 
 
 def wait_for_ddos_clear(driver, timeout=20):
@@ -40,12 +49,13 @@ def wait_for_ddos_clear(driver, timeout=20):
 
 
 def get_requests_session_from_selenium():
-    driver = create_stealth_driver(headless=True)
-    print("🌐 Opening Animepahe…")
-    wait_for_ddos_clear(driver)
-    cookies = driver.get_cookies()
-    cleanup_browser_data(driver)  # Clean up temp directory
-    driver.quit()
+    driver = create_stealth_driver(headless=True, resource_profile="session")
+    try:
+        logger.info("🌐 Opening Animepahe…")
+        wait_for_ddos_clear(driver)
+        cookies = driver.get_cookies()
+    finally:
+        shutdown_driver(driver)
     sess = requests.Session()
     sess.headers.update({
         "User-Agent": (
@@ -67,24 +77,52 @@ class SessionManager:
     def __init__(self):
         self.session = get_requests_session_from_selenium()
 
-    def refresh_cookies(self):
-        print("🔄 Refreshing cookies via Selenium…")
-        self.session = get_requests_session_from_selenium()
+    def refresh_cookies(self, reason="ddos"):
+        logger.info("🔄 Refreshing cookies via Selenium…")
+        DDOS_REFRESHES.inc(reason=reason)
+        with DDOS_REFRESH_SECONDS.time():
+            self.session = get_requests_session_from_selenium()
 
-    def get(self, url, **kwargs):
+    def _paced_get(self, url, **kwargs):
+        """One GET through the per-host rate limiter; returns (response, throttled)"""
+        limiter = get_rate_limiter()
+        limiter.wait(url)
         try:
             r = self.session.get(url, **kwargs)
+        except (requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            limiter.record(url, blocked=True)
+            raise
+        return r, limiter.record_response(url, r)
+
+    def get(self, url, **kwargs):
+        endpoint = _api_endpoint(url)
+        with SITE_API_SECONDS.time(endpoint=endpoint):
+            try:
+                r = self._get(url, **kwargs)
+            except Exception:
+                SITE_API_REQUESTS.inc(endpoint=endpoint, status="error")
+                raise
+        SITE_API_REQUESTS.inc(endpoint=endpoint, status=r.status_code)
+        return r
+
+    def _get(self, url, **kwargs):
+        try:
+            r, throttled = self._paced_get(url, **kwargs)
             if looks_like_ddos_guard(r):
-                print("🛑 DDoS page detected. Refreshing…")
+                logger.warning("🛑 DDoS page detected. Refreshing…")
                 self.refresh_cookies()
-                r = self.session.get(url, **kwargs)
+                r, throttled = self._paced_get(url, **kwargs)
             elif r.status_code == 403:
-                print("🛑 403 Forbidden. Refreshing…")
-                self.refresh_cookies()
-                r = self.session.get(url, **kwargs)
+                logger.warning("🛑 403 Forbidden. Refreshing…")
+                self.refresh_cookies(reason="forbidden")
+                r, throttled = self._paced_get(url, **kwargs)
+            for _ in range(RATE_LIMIT_RETRIES):
+                if not throttled or r.status_code == 403 or looks_like_ddos_guard(r):
+                    break
+                # 429/5xx: the limiter has paused this host, so the retry waits out the cooldown
+                logger.info("⏳ HTTP %s from %s; retrying after cooldown…", r.status_code, url)
+                r, throttled = self._paced_get(url, **kwargs)
             return r
         except (requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            print(f"🌐 Network error: {type(e).__name__}: {str(e)}")
+            logger.warning("🌐 Network error: %s: %s", type(e).__name__, str(e))
             raise  # Re-raise the exception for the caller to handle
-
-
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+from config import HLS_SLICE_STORE_BACKEND, HLS_SLICE_STORE_PATH, HLS_SLICE_LEASE_SECONDS
+
+
+class StaleContinuation(Exception):
+    """The continuation token is unknown, already used, or its job has finished"""
+
+
+class SliceBusy(Exception):
+    """Another step of the same job is still running"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def make_token(task_id: str, step: int) -> str:
+    return f"{task_id}.{step}"
+
+
+def parse_token(token: str) -> Tuple[str, int]:
+    task_id, _, step = (token or "").rpartition(".")
+    if not task_id or not step.isdigit():
+        raise StaleContinuation("Malformed continuation token")
+    return task_id, int(step)
+
+
+class SliceStore(ABC):
+    """
+    Cursors of sliced jobs (JSON-serializable dicts keyed by task_id).
+
+    Every saved cursor gets a new step number, and the continuation token names the step
+    it continues from: a token can be used once, and a step that is still running (or died
+    less than a lease ago) holds its cursor so a retried request cannot run it twice.
+    """
+
+    @abstractmethod
+    def create(self, task_id: str, cursor: Dict[str, Any]) -> str:
+        """Store a new job's cursor; returns the first continuation token"""
+
+    @abstractmethod
+    def claim(self, token: str, lease_seconds: float = HLS_SLICE_LEASE_SECONDS) -> Dict[str, Any]:
+        """The cursor the token continues from, leased to the caller until it is advanced"""
+
+    @abstractmethod
+    def advance(self, token: str, cursor: Dict[str, Any]) -> str:
+        """Save the cursor after a step and release the lease; returns the next token"""
+
+    @abstractmethod
+    def current_token(self, task_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        ...
+
+
+class MemorySliceStore(SliceStore):
+    """Process-local store, for tests and single-process development"""
+
+    def __init__(self):
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id, cursor):
+        with self._lock:
+            self._cursors[task_id] = {"step": 0, "leased_until": 0.0, "cursor": json.loads(json.dumps(cursor))}
+        return make_token(task_id, 0)
+
+    def _check(self, token):
+        task_id, step = parse_token(token)
+        entry = self._cursors.get(task_id)
+        if entry is None or entry["step"] != step:
+            raise StaleContinuation("Continuation token is not current")
+        return task_id, entry
+
+    def claim(self, token, lease_seconds=HLS_SLICE_LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            _, entry = self._check(token)
+            if entry["leased_until"] > now:
+                raise SliceBusy("A step of this job is already running", entry["leased_until"] - now)
+            entry["leased_until"] = now + lease_seconds
+            return json.loads(json.dumps(entry["cursor"]))
+
+    def advance(self, token, cursor):
+        with self._lock:
+            task_id, entry = self._check(token)
+            entry.update(step=entry["step"] + 1, leased_until=0.0, cursor=json.loads(json.dumps(cursor)))
+            return make_token(task_id, entry["step"])
+
+    def current_token(self, task_id):
+        with self._lock:
+            entry = self._cursors.get(task_id)
+            return make_token(task_id, entry["step"]) if entry else None
+
+    def delete(self, task_id):
+        with self._lock:
+            return self._cursors.pop(task_id, None) is not None
+
+
+class SQLiteSliceStore(SliceStore):
+    """Cursors in SQLite, so any process (or serverless invocation) sharing the file can run the next step"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS slice_cursors (
+                task_id      TEXT PRIMARY KEY,
+                step         INTEGER NOT NULL,
+                leased_until REAL NOT NULL,
+                updated_ts   REAL NOT NULL,
+                cursor       TEXT NOT NULL
+            );
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def create(self, task_id, cursor):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO slice_cursors (task_id, step, leased_until, updated_ts, cursor) VALUES (?, 0, 0, ?, ?)",
+            (task_id, time.time(), json.dumps(cursor)),
+        )
+        return make_token(task_id, 0)
+
+    def _locked(self, token, apply):
+        """Run apply(conn, task_id, row) on the token's current row inside one write transaction"""
+        task_id, step = parse_token(token)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT step, leased_until, cursor FROM slice_cursors WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row is None or row[0] != step:
+                raise StaleContinuation("Continuation token is not current")
+            result = apply(conn, task_id, row)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, token, lease_seconds=HLS_SLICE_LEASE_SECONDS):
+        def apply(conn, task_id, row):
+            now = time.time()
+            if row[1] > now:
+                raise SliceBusy("A step of this job is already running", row[1] - now)
+            conn.execute("UPDATE slice_cursors SET leased_until = ? WHERE task_id = ?", (now + lease_seconds, task_id))
+            return json.loads(row[2])
+
+        return self._locked(token, apply)
+
+    def advance(self, token, cursor):
+        def apply(conn, task_id, row):
+            conn.execute(
+                "UPDATE slice_cursors SET step = ?, leased_until = 0, updated_ts = ?, cursor = ? WHERE task_id = ?",
+                (row[0] + 1, time.time(), json.dumps(cursor), task_id),
+            )
+            return make_token(task_id, row[0] + 1)
+
+        return self._locked(token, apply)
+
+    def current_token(self, task_id):
+        row = self._conn().execute("SELECT step FROM slice_cursors WHERE task_id = ?", (task_id,)).fetchone()
+        return make_token(task_id, row[0]) if row else None
+
+    def delete(self, task_id):
+        cur = self._conn().execute("DELETE FROM slice_cursors WHERE task_id = ?", (task_id,))
+        return cur.rowcount > 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_slice_store() -> SliceStore:
+    """The process-wide cursor store selected by HLS_SLICE_STORE_BACKEND"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if HLS_SLICE_STORE_BACKEND == "memory":
+                _store = MemorySliceStore()
+            else:
+                _store = SQLiteSliceStore(HLS_SLICE_STORE_PATH)
+        return _store
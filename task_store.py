@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from config import TASK_STORE_BACKEND, TASK_STORE_PATH, TASK_RETENTION_SECONDS, TASK_RETENTION_MAX
+from log import get_logger
+
+logger = get_logger(__name__)
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+def _without_status_change(task, fields):
+    if task.get("status") == "cancelled" and fields.get("status", "cancelled") != "cancelled":
+        fields = {k: v for k, v in fields.items() if k != "status"}
+    return fields
+
+
+class TaskStore(ABC):
+    """Storage for download task records (plain JSON-serializable dicts keyed by task_id)"""
+
+    @abstractmethod
+    def create(self, task: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """
+        Merge fields into a task and return the new record (None if it does not exist).
+
+        "cancelled" is final: a job finishing after the cancel cannot overwrite it.
+        """
+
+    @abstractmethod
+    def list(self, status: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Newest first; returns (page of tasks, total matching)"""
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def updated_since(self, since_ts: float, limit: int = 500) -> List[Tuple[float, Dict[str, Any]]]:
+        """(updated_ts, task) for tasks changed at or after since_ts, oldest change first"""
+
+    @abstractmethod
+    def compact(self, max_age_seconds: float = TASK_RETENTION_SECONDS, max_finished: int = TASK_RETENTION_MAX) -> int:
+        """Drop finished tasks older than max_age_seconds or beyond the newest max_finished; returns count removed"""
+
+
+class MemoryTaskStore(TaskStore):
+    """Process-local store, for tests and single-process development"""
+
+    def __init__(self):
+        self._tasks = {}
+        self._meta = {}
+        self._lock = threading.Lock()
+
+    def create(self, task):
+        with self._lock:
+            self._tasks[task["task_id"]] = dict(task)
+            now = time.time()
+            self._meta[task["task_id"]] = {"created_ts": now, "updated_ts": now, "finished_ts": None}
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            task.update(_without_status_change(task, fields))
+            self._meta[task_id]["updated_ts"] = time.time()
+            if task.get("status") in FINISHED_STATUSES and self._meta[task_id]["finished_ts"] is None:
+                self._meta[task_id]["finished_ts"] = time.time()
+            return dict(task)
+
+    def list(self, status=None, limit=50, offset=0):
+        with self._lock:
+            ids = [tid for tid in self._tasks if status is None or self._tasks[tid].get("status") == status]
+            ids.sort(key=lambda tid: self._meta[tid]["created_ts"], reverse=True)
+            return [dict(self._tasks[tid]) for tid in ids[offset:offset + limit]], len(ids)
+
+    def delete(self, task_id):
+        with self._lock:
+            self._meta.pop(task_id, None)
+            return self._tasks.pop(task_id, None) is not None
+
+    def updated_since(self, since_ts, limit=500):
+        with self._lock:
+            changed = [(meta["updated_ts"], tid) for tid, meta in self._meta.items() if meta["updated_ts"] >= since_ts]
+            changed.sort()
+            return [(ts, dict(self._tasks[tid])) for ts, tid in changed[:limit]]
+
+    def compact(self, max_age_seconds=TASK_RETENTION_SECONDS, max_finished=TASK_RETENTION_MAX):
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            finished = [tid for tid, meta in self._meta.items() if meta["finished_ts"] is not None]
+            finished.sort(key=lambda tid: self._meta[tid]["finished_ts"], reverse=True)
+            doomed = [tid for i, tid in enumerate(finished) if i >= max_finished or self._meta[tid]["finished_ts"] < cutoff]
+            for tid in doomed:
+                self._tasks.pop(tid, None)
+                self._meta.pop(tid, None)
+            return len(doomed)
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Embedded SQLite store shared by every process that opens the same file.
+
+    WAL mode lets API workers read while a download writes progress; status and
+    creation time are indexed for listing, and finished tasks are compacted away.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id     TEXT PRIMARY KEY,
+                status      TEXT NOT NULL,
+                created_ts  REAL NOT NULL,
+                updated_ts  REAL NOT NULL,
+                finished_ts REAL,
+                data        TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_ts);
+            CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_ts);
+            CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks (updated_ts);
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (finished_ts) WHERE finished_ts IS NOT NULL;
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def create(self, task):
+        now = time.time()
+        status = task.get("status", "pending")
+        self._conn().execute(
+            "INSERT INTO tasks (task_id, status, created_ts, updated_ts, finished_ts, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (task["task_id"], status, now, now, now if status in FINISHED_STATUSES else None, json.dumps(task)),
+        )
+
+    def get(self, task_id):
+        row = self._conn().execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, task_id, **fields):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data, finished_ts FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            task = json.loads(row[0])
+            task.update(_without_status_change(task, fields))
+            now = time.time()
+            status = task.get("status", "pending")
+            finished_ts = row[1] if row[1] is not None else (now if status in FINISHED_STATUSES else None)
+            conn.execute(
+                "UPDATE tasks SET status = ?, updated_ts = ?, finished_ts = ?, data = ? WHERE task_id = ?",
+                (status, now, finished_ts, json.dumps(task), task_id),
+            )
+            conn.execute("COMMIT")
+            return task
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def list(self, status=None, limit=50, offset=0):
+        conn = self._conn()
+        if status:
+            total = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()[0]
+            rows = conn.execute(
+                "SELECT data FROM tasks WHERE status = ? ORDER BY created_ts DESC LIMIT ? OFFSET ?",
+                (status, limit, offset),
+            ).fetchall()
+        else:
+            total = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            rows = conn.execute(
+                "SELECT data FROM tasks ORDER BY created_ts DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows], total
+
+    def delete(self, task_id):
+        cur = self._conn().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+        return cur.rowcount > 0
+
+    def updated_since(self, since_ts, limit=500):
+        rows = self._conn().execute(
+            "SELECT updated_ts, data FROM tasks WHERE updated_ts >= ? ORDER BY updated_ts LIMIT ?", (since_ts, limit)
+        ).fetchall()
+        return [(r[0], json.loads(r[1])) for r in rows]
+
+    def compact(self, max_age_seconds=TASK_RETENTION_SECONDS, max_finished=TASK_RETENTION_MAX):
+        conn = self._conn()
+        cutoff = time.time() - max_age_seconds
+        removed = conn.execute(
+            "DELETE FROM tasks WHERE finished_ts IS NOT NULL AND finished_ts < ?", (cutoff,)
+        ).rowcount
+        removed += conn.execute(
+            """
+            DELETE FROM tasks WHERE task_id IN (
+                SELECT task_id FROM tasks WHERE finished_ts IS NOT NULL
+                ORDER BY finished_ts DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_finished,),
+        ).rowcount
+        if removed:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+_last_compaction = 0.0
+
+
+def get_task_store() -> TaskStore:
+    """The process-wide task store selected by TASK_STORE_BACKEND"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if TASK_STORE_BACKEND == "memory":
+                _store = MemoryTaskStore()
+            else:
+                _store = SQLiteTaskStore(TASK_STORE_PATH)
+        return _store
+
+
+def maybe_compact(interval_seconds: float = 600) -> int:
+    """Compact the store at most once per interval; cheap to call on every request"""
+    global _last_compaction
+    now = time.time()
+    if now - _last_compaction < interval_seconds:
+        return 0
+    _last_compaction = now
+    try:
+        removed = get_task_store().compact()
+        if removed:
+            logger.info("🧹 Compacted %s finished download tasks", removed)
+        return removed
+    except Exception as e:
+        logger.warning("⚠️ Task store compaction failed: %s", e)
+        return 0
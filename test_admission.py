@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for browser admission control
+These tests exercise the controller directly; no browser is started
+"""
+
+import time
+import threading
+from admission import AdmissionController, BrowserQueueFull, patient_admission
+
+
+def test_caps_concurrency():
+    """No more than max_concurrent slots are granted at once"""
+    print("🧪 Testing concurrency cap...")
+
+    controller = AdmissionController(2, max_queue=10, timeout=5)
+    peak = []
+    running = [0]
+    lock = threading.Lock()
+
+    def work():
+        with controller.slot():
+            with lock:
+                running[0] += 1
+                peak.append(running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert max(peak) == 2
+    assert controller.stats()["admitted"] == 6
+    assert controller.stats()["active"] == 0
+
+    print("✅ Concurrency cap test passed")
+
+
+def test_rejects_when_queue_full():
+    """Impatient callers get BrowserQueueFull with a Retry-After hint"""
+    print("🧪 Testing queue-full rejection...")
+
+    controller = AdmissionController(1, max_queue=1, timeout=5)
+    controller.acquire()
+    waiter = threading.Thread(target=lambda: controller.acquire(timeout=2))
+    waiter.start()
+    time.sleep(0.1)
+
+    try:
+        controller.acquire()
+        assert False, "expected BrowserQueueFull"
+    except BrowserQueueFull as e:
+        assert e.retry_after >= 1
+
+    assert controller.stats()["rejected_queue_full"] == 1
+    controller.release()
+    waiter.join()
+
+    print("✅ Queue-full rejection test passed")
+
+
+def test_timeout_and_patient_callers():
+    """Impatient waits time out; patient ones ignore the queue limit"""
+    print("🧪 Testing timeouts and patient callers...")
+
+    controller = AdmissionController(1, max_queue=1, timeout=0.2)
+    controller.acquire()
+
+    try:
+        controller.acquire()
+        assert False, "expected BrowserQueueFull"
+    except BrowserQueueFull:
+        pass
+    assert controller.stats()["rejected_timeout"] == 1
+
+    granted = []
+
+    def patient_job():
+        with patient_admission():
+            controller.acquire()
+            granted.append(True)
+
+    job = threading.Thread(target=patient_job)
+    job.start()
+    time.sleep(0.4)
+    assert not granted  # still waiting, past the impatient timeout
+    controller.release()
+    job.join(2)
+    assert granted
+
+    print("✅ Timeout and patient caller test passed")
+
+
+def test_fifo_order():
+    """Waiters are admitted in arrival order"""
+    print("🧪 Testing FIFO admission...")
+
+    controller = AdmissionController(1, max_queue=10, timeout=5)
+    controller.acquire()
+    order = []
+
+    def waiter(n):
+        controller.acquire()
+        order.append(n)
+        controller.release()
+
+    threads = []
+    for n in range(4):
+        t = threading.Thread(target=waiter, args=(n,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.05)
+
+    controller.release()
+    for t in threads:
+        t.join()
+
+    assert order == [0, 1, 2, 3]
+
+    print("✅ FIFO admission test passed")
+
+
+def test_memory_gate():
+    """A second browser waits for free memory, but the first is never blocked"""
+    print("🧪 Testing memory-aware admission...")
+
+    free_mb = [100]
+    controller = AdmissionController(4, min_free_memory_mb=500, max_queue=10, timeout=5, memory_probe=lambda: free_mb[0])
+
+    controller.acquire()  # only browser: admitted despite low memory
+    granted = []
+    t = threading.Thread(target=lambda: granted.append(controller.acquire()))
+    t.start()
+    time.sleep(0.3)
+    assert not granted
+
+    free_mb[0] = 2000
+    t.join(3)
+    assert granted
+    assert controller.stats()["memory_deferrals"] >= 1
+
+    print("✅ Memory-aware admission test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting admission control tests...\n")
+
+    test_functions = [
+        test_caps_concurrency,
+        test_rejects_when_queue_full,
+        test_timeout_and_patient_callers,
+        test_fifo_order,
+        test_memory_gate,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test script for the bandwidth scheduler
+Simulated transfers call the scheduler directly; no network is used
+"""
+
+import os
+import asyncio
+import time
+import tempfile
+import threading
+from bandwidth import BandwidthScheduler
+from cancellation import CancelToken, Cancelled
+
+
+def _transfer(scheduler, url, seconds, job_id=None, weight=1.0, priority=0, chunk=16 * 1024):
+    """Pull chunks through the scheduler for `seconds`; returns bytes moved"""
+    moved = 0
+
+    def run():
+        nonlocal moved
+        throttle = scheduler.throttle(url, batch_bytes=chunk)
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            throttle.consume(chunk)
+            moved += chunk
+
+    if job_id is None:
+        run()
+    else:
+        with scheduler.job(job_id, weight=weight, priority=priority):
+            run()
+    return moved
+
+
+def _parallel(*transfers):
+    results = [None] * len(transfers)
+
+    def runner(i, fn):
+        results[i] = fn()
+
+    threads = [threading.Thread(target=runner, args=(i, fn)) for i, fn in enumerate(transfers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_global_cap():
+    """Total throughput stays near the global cap"""
+    print("🧪 Testing global cap...")
+
+    scheduler = BandwidthScheduler(global_limit=1024 * 1024, burst_seconds=0.1)
+    moved = sum(_parallel(
+        lambda: _transfer(scheduler, "http://a.example/x", 1.0),
+        lambda: _transfer(scheduler, "http://b.example/x", 1.0),
+    ))
+    assert 0.8 * 1024 * 1024 < moved < 1.4 * 1024 * 1024, moved
+
+    print("✅ Global cap test passed")
+
+
+def test_weights_share_bandwidth():
+    """A weight-3 job gets about three times the bytes of a weight-1 job"""
+    print("🧪 Testing weighted sharing...")
+
+    scheduler = BandwidthScheduler(global_limit=2 * 1024 * 1024, burst_seconds=0.05)
+    heavy, light = _parallel(
+        lambda: _transfer(scheduler, "http://cdn.example/x", 1.5, job_id="heavy", weight=3),
+        lambda: _transfer(scheduler, "http://cdn.example/y", 1.5, job_id="light", weight=1),
+    )
+    assert 2.2 < heavy / light < 4.0, heavy / light
+
+    print("✅ Weighted sharing test passed")
+
+
+def test_priority_goes_first():
+    """A lower priority number takes the bandwidth while it is waiting"""
+    print("🧪 Testing priorities...")
+
+    scheduler = BandwidthScheduler(global_limit=1024 * 1024, burst_seconds=0.05)
+    urgent, background = _parallel(
+        lambda: _transfer(scheduler, "http://cdn.example/x", 1.0, job_id="urgent", priority=0),
+        lambda: _transfer(scheduler, "http://cdn.example/y", 1.0, job_id="background", priority=5),
+    )
+    assert urgent > 4 * background, (urgent, background)
+
+    print("✅ Priority test passed")
+
+
+def test_host_caps_are_independent():
+    """A capped host is slowed without holding back other hosts"""
+    print("🧪 Testing per-host caps...")
+
+    scheduler = BandwidthScheduler(host_limits={"*.slow.example": 256 * 1024}, burst_seconds=0.1)
+    slow, fast = _parallel(
+        lambda: _transfer(scheduler, "http://vault-1.slow.example/seg.ts", 1.0),
+        lambda: _transfer(scheduler, "http://fast.example/file.mp4", 1.0),
+    )
+    assert slow < 400 * 1024, slow
+    assert fast > 10 * slow
+
+    stats = scheduler.stats()
+    assert stats["hosts"]["*.slow.example"]["limit"] == 256 * 1024
+    assert "fast.example" in stats["hosts"]
+
+    print("✅ Per-host cap test passed")
+
+
+def test_runtime_limits_reach_other_processes():
+    """Limits saved by one scheduler are loaded by another using the same file"""
+    print("🧪 Testing runtime limit changes...")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bandwidth_test_"), "limits.json")
+    api = BandwidthScheduler(limits_path=path)
+    worker = BandwidthScheduler(limits_path=path)
+
+    api.set_limits(global_limit=512 * 1024, host_limits={"*.kwik.si": 128 * 1024})
+    api.set_job("task-1", weight=4)
+    limits = worker.stats()["limits"]
+    assert limits["global_limit"] == 512 * 1024
+    assert limits["host_limits"] == {"*.kwik.si": 128 * 1024}
+
+    with worker.job("task-1"):
+        assert worker.stats()["jobs"]["task-1"]["weight"] == 4
+
+    print("✅ Runtime limit test passed")
+
+
+def test_cancel_while_throttled():
+    """A transfer waiting for bandwidth stops when its job is cancelled"""
+    print("🧪 Testing cancellation while throttled...")
+
+    scheduler = BandwidthScheduler(global_limit=1024, burst_seconds=1)
+    token = CancelToken(poll_interval=0.05)
+    scheduler.acquire(64 * 1024)  # puts the bucket ~60s into debt
+    threading.Timer(0.2, token.cancel).start()
+
+    started = time.monotonic()
+    try:
+        scheduler.acquire(1024, "a.example", cancel_token=token)
+        assert False, "expected Cancelled"
+    except Cancelled:
+        pass
+    assert time.monotonic() - started < 2
+    assert scheduler.stats()["waiting"] == 0
+
+    print("✅ Cancellation while throttled test passed")
+
+
+def test_admin_endpoints_need_a_token():
+    """/admin/bandwidth answers 403 while ADMIN_TOKEN is unset, and then only with the matching header"""
+    print("🧪 Testing the admin token...")
+
+    import main
+    from fastapi import HTTPException
+    from starlette.requests import Request
+
+    def call(headers=()):
+        request = Request({"type": "http", "headers": [(k.encode(), v.encode()) for k, v in headers]})
+        try:
+            return asyncio.run(main.get_bandwidth(request))
+        except HTTPException as e:
+            return e.status_code
+
+    saved = main.ADMIN_TOKEN
+    try:
+        main.ADMIN_TOKEN = None
+        assert call() == 403 and call([("x-admin-token", "")]) == 403
+        main.ADMIN_TOKEN = "secret"
+        assert call() == 403 and call([("x-admin-token", "wrong")]) == 403
+        assert "global" in call([("x-admin-token", "secret")])
+    finally:
+        main.ADMIN_TOKEN = saved
+
+    print("✅ Admin token test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting bandwidth scheduler tests...\n")
+
+    test_functions = [
+        test_global_cap,
+        test_weights_share_bandwidth,
+        test_priority_goes_first,
+        test_host_caps_are_independent,
+        test_runtime_limits_reach_other_processes,
+        test_cancel_while_throttled,
+        test_admin_endpoints_need_a_token,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
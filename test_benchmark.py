@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline benchmark harness
+Runs benchmark.py in a subprocess, as config must see the fake site's BASE_ORIGIN at import
+"""
+
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from benchmark import CASES, compare
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_every_case_runs_offline():
+    """Each case passes against the fake site and reports timings and request counts"""
+    print("🧪 Testing a benchmark run...")
+
+    output = os.path.join(tempfile.mkdtemp(prefix="benchmark_test_"), "bench.json")
+    env = {k: v for k, v in os.environ.items() if k not in ("BASE_ORIGIN", "TASK_STORE_PATH")}
+    process = subprocess.run(
+        [sys.executable, "benchmark.py", "--repeat", "1", "--video-size", "2M", "--segment-size", "64K",
+         "--output", output],
+        cwd=HERE, env=env, capture_output=True, text=True, timeout=300,
+    )
+    assert process.returncode == 0, process.stderr[-2000:]
+    with open(output) as f:
+        report = json.load(f)
+
+    assert list(report["results"]) == CASES
+    for case, result in report["results"].items():
+        if case == "hls_remux" and result["status"] == "skipped":
+            continue
+        assert result["status"] == "ok", (case, result)
+        assert len(result["seconds"]) == 1 and result["min"] <= result["median"] <= result["max"]
+    results = report["results"]
+    assert results["episodes"]["items"] == 64 and results["episodes"]["requests_per_run"] == {"api.release": 3}
+    assert results["scrape_links"]["items"] == 5 and results["scrape_m3u8"]["items"] == 5
+    assert results["resolve"]["requests_per_run"] == {"pahe.win": 1, "kwik.page": 1}
+    assert results["transfer"]["bytes"] == 2 * 1024 * 1024 and results["transfer"]["throughput_mb_s"] > 0
+    assert results["hls"]["requests_per_run"]["hls.segment"] == results["hls"]["items"]
+    assert report["meta"]["browser"] == "fake" and report["meta"]["latency"] == 0.02
+
+    print("✅ Benchmark run test passed")
+
+
+def test_baseline_comparison():
+    """Cases slower than the baseline by more than the tolerance, or now failing, are regressions"""
+    print("🧪 Testing baseline comparison...")
+
+    baseline = {"results": {
+        "episodes": {"status": "ok", "median": 1.0},
+        "transfer": {"status": "ok", "median": 2.0},
+        "resolve": {"status": "ok", "median": 7.5},
+        "hls_remux": {"status": "skipped", "reason": "ffmpeg not found"},
+    }}
+    current = {"results": {
+        "episodes": {"status": "ok", "median": 1.2},
+        "transfer": {"status": "ok", "median": 3.0},
+        "resolve": {"status": "failed", "error": "TimeoutException: "},
+        "hls_remux": {"status": "ok", "median": 9.0},
+        "hls": {"status": "ok", "median": 0.5},
+    }}
+
+    regressions = {r["case"]: r for r in compare(baseline, current, tolerance=0.25)}
+    assert set(regressions) == {"transfer", "resolve"}
+    assert regressions["transfer"]["ratio"] == 1.5
+    assert regressions["resolve"]["current"] is None
+    assert len(compare(baseline, current, tolerance=0.6)) == 1
+
+    print("✅ Baseline comparison test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting benchmark tests...\n")
+
+    test_functions = [
+        test_every_case_runs_offline,
+        test_baseline_comparison,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Test script for the orphaned Chrome profile reaper
+These tests only touch temporary directories; no browser is started
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import browser
+
+
+def _make_profile_root():
+    root = tempfile.mkdtemp(prefix="reaper_test_")
+    browser.CHROME_PROFILE_ROOT = root
+    return root
+
+
+def _dead_pid():
+    # Walk down from a high PID until one is not in use
+    pid = 4_000_000
+    while browser._pid_alive(pid):
+        pid -= 1
+    return pid
+
+
+def test_reaps_dirs_of_dead_owner():
+    """Profile dirs whose owning process is gone are removed"""
+    print("🧪 Testing reaping of profile dirs with a dead owner...")
+
+    original_root = browser.CHROME_PROFILE_ROOT
+    root = _make_profile_root()
+    try:
+        orphan = os.path.join(root, f"chrome_user_data_{_dead_pid()}_deadbeef")
+        os.makedirs(os.path.join(orphan, "Default"))
+
+        result = browser.reap_orphaned_browsers()
+
+        assert not os.path.exists(orphan)
+        assert result["reaped_dirs"] == 1
+    finally:
+        browser.CHROME_PROFILE_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✅ Dead owner reaping test passed")
+
+
+def test_keeps_live_and_foreign_dirs():
+    """Registered dirs, dirs of other live processes and unrelated dirs are kept"""
+    print("🧪 Testing that live profile dirs are kept...")
+
+    original_root = browser.CHROME_PROFILE_ROOT
+    root = _make_profile_root()
+    try:
+        live = os.path.normpath(os.path.join(root, f"chrome_user_data_{os.getpid()}_0000aaaa"))
+        other_process = os.path.join(root, f"chrome_user_data_{os.getppid()}_0000bbbb")
+        unrelated = os.path.join(root, "something_else")
+        for path in (live, other_process, unrelated):
+            os.makedirs(path)
+        browser._register_profile(live)
+
+        browser.reap_orphaned_browsers()
+
+        assert os.path.exists(live)
+        assert os.path.exists(other_process)
+        assert os.path.exists(unrelated)
+        assert browser.get_browser_registry_stats()["live_drivers"] >= 1
+    finally:
+        browser._unregister(live)
+        browser.CHROME_PROFILE_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✅ Live profile dir test passed")
+
+
+def test_reaps_unregistered_dir_of_this_process():
+    """A dir named for this process but no longer registered is a leak"""
+    print("🧪 Testing reaping of this process's unregistered profile dirs...")
+
+    original_root = browser.CHROME_PROFILE_ROOT
+    root = _make_profile_root()
+    try:
+        leaked = os.path.join(root, f"chrome_user_data_{os.getpid()}_0000cccc")
+        os.makedirs(leaked)
+
+        browser.reap_orphaned_browsers()
+
+        assert not os.path.exists(leaked)
+    finally:
+        browser.CHROME_PROFILE_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✅ Unregistered profile dir test passed")
+
+
+def test_legacy_dirs_need_grace_period():
+    """Old-style chrome_user_data_<uuid> dirs are only removed once stale"""
+    print("🧪 Testing grace period for legacy profile dirs...")
+
+    original_root = browser.CHROME_PROFILE_ROOT
+    root = _make_profile_root()
+    try:
+        fresh = os.path.join(root, "chrome_user_data_1234abcd")
+        stale = os.path.join(root, "chrome_user_data_5678abcd")
+        os.makedirs(fresh)
+        os.makedirs(stale)
+        old = time.time() - browser.BROWSER_REAPER_GRACE - 60
+        os.utime(stale, (old, old))
+
+        browser.reap_orphaned_browsers()
+
+        assert os.path.exists(fresh)
+        assert not os.path.exists(stale)
+    finally:
+        browser.CHROME_PROFILE_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✅ Legacy profile dir grace period test passed")
+
+
+def test_leak_callback_under_registry_lock():
+    """A driver collected while this thread holds the registry lock is marked leaked, not deadlocked"""
+    print("🧪 Testing the leak callback under the registry lock...")
+
+    original_root = browser.CHROME_PROFILE_ROOT
+    root = _make_profile_root()
+    user_data_dir = os.path.normpath(os.path.join(root, f"chrome_user_data_{os.getpid()}_0000dddd"))
+    try:
+        browser._register_profile(user_data_dir)
+        done = threading.Event()
+
+        def collect_under_lock():
+            with browser._registry_lock:
+                # What the cyclic GC does if it frees the driver inside _register_driver
+                browser._mark_leaked(user_data_dir)
+            done.set()
+
+        threading.Thread(target=collect_under_lock, daemon=True).start()
+        assert done.wait(5), "the callback deadlocked on the registry lock"
+        assert browser._live_drivers[user_data_dir]["leaked"]
+    finally:
+        browser._unregister(user_data_dir)
+        browser.CHROME_PROFILE_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✅ Leak callback test passed")
+
+
+def test_keeps_dir_registered_during_the_scan():
+    """A profile registered and cloned while the reaper lists the root is not taken for a leak"""
+    print("🧪 Testing a launch racing the reaper...")
+
+    original_root, original_listdir = browser.CHROME_PROFILE_ROOT, os.listdir
+    root = _make_profile_root()
+    launching = os.path.normpath(os.path.join(root, f"chrome_user_data_{os.getpid()}_0000eeee"))
+
+    def listdir_during_launch(path):
+        if path == root and not os.path.exists(launching):
+            # _launch_with_retries: register, then clone the template
+            browser._register_profile(launching)
+            os.makedirs(launching)
+        return original_listdir(path)
+
+    try:
+        os.listdir = listdir_during_launch
+        browser.reap_orphaned_browsers()
+        assert os.path.exists(launching)
+    finally:
+        os.listdir = original_listdir
+        browser._unregister(launching)
+        browser.CHROME_PROFILE_ROOT = original_root
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✅ Launch race test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting browser reaper tests...\n")
+
+    test_functions = [
+        test_reaps_dirs_of_dead_owner,
+        test_keeps_live_and_foreign_dirs,
+        test_reaps_unregistered_dir_of_this_process,
+        test_legacy_dirs_need_grace_period,
+        test_leak_callback_under_registry_lock,
+        test_keeps_dir_registered_during_the_scan,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the faster browser start-up: cached launch arguments, the cloned seed profile and launch timings
+Drivers use the fake backend and profiles go to temporary directories, so no Chrome is needed
+"""
+
+import os
+import asyncio
+import tempfile
+from selenium.webdriver.chrome.options import Options
+import browser
+
+
+def _use_temp_profiles():
+    saved = (browser.BROWSER_BACKEND, browser.CHROME_PROFILE_ROOT, browser.CHROME_PROFILE_TEMPLATE_DIR,
+             browser._profile_template_ready)
+    root = tempfile.mkdtemp(prefix="startup_test_")
+    browser.BROWSER_BACKEND = "fake"
+    browser.CHROME_PROFILE_ROOT = root
+    browser.CHROME_PROFILE_TEMPLATE_DIR = os.path.join(root, "template")
+    browser._profile_template_ready = False
+    return saved
+
+
+def _restore(saved):
+    (browser.BROWSER_BACKEND, browser.CHROME_PROFILE_ROOT, browser.CHROME_PROFILE_TEMPLATE_DIR,
+     browser._profile_template_ready) = saved
+
+
+def test_launch_args_are_cached():
+    """Arguments are built once per (headless, profile); each launch still gets fresh options"""
+    print("🧪 Testing cached launch arguments...")
+
+    browser._chrome_launch_args.cache_clear()
+    first = browser._chrome_launch_args(True, "scrape")
+    assert browser._chrome_launch_args(True, "scrape") is first
+    assert browser._chrome_launch_args.cache_info().hits == 1
+    assert browser._chrome_launch_args(False, "scrape") is not first
+    assert first[0] == "--headless=new" and "--headless=new" not in browser._chrome_launch_args(False, "scrape")
+
+    a = browser._build_chrome_options(Options, True, "/tmp/profile_a", "scrape", plain_chrome=True)
+    b = browser._build_chrome_options(Options, True, "/tmp/profile_b", "scrape", plain_chrome=True)
+    assert a is not b
+    assert a.arguments[:-1] == b.arguments[:-1] == list(first)
+    assert a.arguments[-1] == "--user-data-dir=/tmp/profile_a"
+    assert browser._chrome_launch_args.cache_info().misses == 2
+
+    print("✅ Cached launch arguments test passed")
+
+
+def test_profile_is_cloned_from_the_template():
+    """Every driver's user data dir is a copy of the seed profile, which is built only once"""
+    print("🧪 Testing profile cloning...")
+
+    saved = _use_temp_profiles()
+    user_data_dirs = []
+
+    def clone():
+        # One driver at a time: the admission controller caps concurrent browsers
+        driver = browser.create_stealth_driver(resource_profile="scrape")
+        try:
+            user_data_dir = driver._user_data_dir
+            user_data_dirs.append(user_data_dir)
+            assert os.path.dirname(user_data_dir) == browser.CHROME_PROFILE_ROOT
+            assert os.path.exists(os.path.join(user_data_dir, "First Run"))
+            with open(os.path.join(user_data_dir, "Default", "Preferences")) as f:
+                preferences = f.read()
+            return preferences, sorted(os.listdir(user_data_dir))
+        finally:
+            browser.shutdown_driver(driver)
+
+    try:
+        template = browser.CHROME_PROFILE_TEMPLATE_DIR
+        first, second = clone(), clone()
+        with open(os.path.join(template, "Default", "Preferences")) as f:
+            assert first[0] == second[0] == f.read()
+        assert '"exited_cleanly": true' in first[0]
+        assert user_data_dirs[0] != user_data_dirs[1]
+
+        # The template is not rebuilt: a file dropped into it shows up in the next clone
+        with open(os.path.join(template, "marker"), "w") as f:
+            f.write("seed")
+        assert "marker" in clone()[1]
+    finally:
+        _restore(saved)
+    assert not any(os.path.exists(path) for path in user_data_dirs)
+
+    print("✅ Profile cloning test passed")
+
+
+def test_stats_report_startup():
+    """GET /browser/stats reports launch counts and timings per backend"""
+    print("🧪 Testing /browser/stats...")
+
+    saved = _use_temp_profiles()
+    try:
+        import main
+        before = asyncio.run(main.browser_stats())["startup"]
+        browser.shutdown_driver(browser.create_stealth_driver(resource_profile="scrape"))
+        stats = asyncio.run(main.browser_stats())
+    finally:
+        _restore(saved)
+
+    startup = stats["startup"]
+    assert startup["launches"] == before["launches"] + 1
+    fake = startup["by_backend"]["fake"]
+    assert fake["launches"] >= 1 and fake["last_seconds"] is not None
+    assert fake["max_seconds"] >= fake["avg_seconds"] >= 0
+    assert {"registry", "admission", "resource_blocking"} <= set(stats)
+
+    print("✅ /browser/stats test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting browser startup tests...\n")
+
+    test_functions = [
+        test_launch_args_are_cached,
+        test_profile_is_cloned_from_the_template,
+        test_stats_report_startup,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Test script for cooperative cancellation of download jobs
+Uses a local HTTP server and a stand-in subprocess; no browser or ffmpeg is needed
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cancellation import CancelToken, Cancelled, task_cancel_token
+from task_store import MemoryTaskStore
+from transfer import advanced_download_with_progress
+from hls import _run_ffmpeg
+
+
+class _SlowStreamHandler(BaseHTTPRequestHandler):
+    """Streams 1KB every 50ms, forever"""
+
+    def do_POST(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(10 * 1024 * 1024))
+        self.end_headers()
+        try:
+            while True:
+                self.wfile.write(b"x" * 1024)
+                self.wfile.flush()
+                time.sleep(0.05)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def test_token_sleep_and_callbacks():
+    """sleep() stops early and registered resources are released on cancel"""
+    print("🧪 Testing cancel token...")
+
+    token = CancelToken(poll_interval=0.05)
+    released = []
+    threading.Timer(0.2, token.cancel).start()
+    started = time.monotonic()
+    try:
+        with token.on_cancel(lambda: released.append(True)):
+            token.sleep(10)
+        assert False, "expected Cancelled"
+    except Cancelled:
+        pass
+    assert time.monotonic() - started < 2
+    assert released == [True]
+
+    print("✅ Cancel token test passed")
+
+
+def test_store_status_trips_token_and_is_final():
+    """Cancelling the task in the store trips the job's token, and the job cannot overwrite it"""
+    print("🧪 Testing task status cancellation...")
+
+    store = MemoryTaskStore()
+    store.create({"task_id": "t", "status": "running"})
+    token = task_cancel_token(store, "t", poll_interval=0.05)
+    released = threading.Event()
+    unregister = token.register(released.set)
+
+    store.update("t", status="cancelled")
+    assert released.wait(2), "watcher did not notice the cancel"
+    assert token.cancelled
+    unregister()
+    token.close()
+
+    store.update("t", status="completed", progress=100.0)
+    assert store.get("t")["status"] == "cancelled"
+    assert store.get("t")["progress"] == 100.0
+
+    print("✅ Task status cancellation test passed")
+
+
+def test_download_stops_mid_stream():
+    """A streaming download stops promptly and keeps its partial file"""
+    print("🧪 Testing download cancellation...")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowStreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    directory = tempfile.mkdtemp(prefix="cancel_test_")
+    token = CancelToken(poll_interval=0.05)
+    threading.Timer(0.5, token.cancel).start()
+
+    started = time.monotonic()
+    try:
+        advanced_download_with_progress(
+            {"url": f"http://127.0.0.1:{server.server_address[1]}/file", "filename": "ep.mp4"},
+            directory,
+            cancel_token=token,
+        )
+        assert False, "expected Cancelled"
+    except Cancelled:
+        pass
+    finally:
+        server.shutdown()
+
+    assert time.monotonic() - started < 3
+    assert os.path.getsize(os.path.join(directory, "ep.mp4")) > 0
+
+    print("✅ Download cancellation test passed")
+
+
+def test_subprocess_is_killed():
+    """The re-encode subprocess is killed on cancel"""
+    print("🧪 Testing ffmpeg cancellation...")
+
+    token = CancelToken(poll_interval=0.05)
+    threading.Timer(0.3, token.cancel).start()
+    started = time.monotonic()
+    try:
+        _run_ffmpeg([sys.executable, "-c", "import time; time.sleep(30)"], token)
+        assert False, "expected Cancelled"
+    except Cancelled:
+        pass
+    assert time.monotonic() - started < 3
+
+    print("✅ ffmpeg cancellation test passed")
+
+
+def test_lost_lease_is_not_a_task_cancel():
+    """A job stopped by its worker (a lost lease) is told apart from a task cancelled in the store"""
+    print("🧪 Testing lost lease vs. task cancel...")
+
+    store = MemoryTaskStore()
+    store.create({"task_id": "t", "status": "running"})
+    token = task_cancel_token(store, "t", poll_interval=0.05)
+    token.cancel()  # what Worker._heartbeat does when the lease is gone
+    assert token.cancelled and not token.task_cancelled()
+
+    store.update("t", status="cancelled")
+    assert token.task_cancelled()
+
+    plain = CancelToken()
+    assert not plain.task_cancelled()
+    plain.cancel()
+    assert plain.task_cancelled()
+
+    print("✅ Lost lease test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting cancellation tests...\n")
+
+    test_functions = [
+        test_token_sleep_and_callbacks,
+        test_store_status_trips_token_and_is_final,
+        test_download_stops_mid_stream,
+        test_subprocess_is_killed,
+        test_lost_lease_is_not_a_task_cancel,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
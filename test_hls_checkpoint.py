@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Test script for segment checkpoints of HLS downloads
+fake_site.py serves the encrypted playlist; failures are injected around the segment fetch and
+remuxing is replaced by a file copy, so no ffmpeg is needed
+"""
+
+import os
+import shutil
+import tempfile
+import hls
+from hls import download_hls_episode, load_media_playlist, SegmentCheckpoint
+from cancellation import Cancelled, task_cancel_token
+from task_store import MemoryTaskStore
+from fake_site import FakeSite
+
+FETCH_SEGMENT = hls._fetch_segment
+
+
+def _copy_remux(raw_file, final_file, label="episode", cancel_token=None):
+    shutil.copyfile(raw_file, final_file)
+    os.remove(raw_file)
+    return final_file
+
+
+class _Flaky:
+    """hls._fetch_segment that fails for the segment numbers in fail, once each (or always)"""
+
+    def __init__(self, fail, always=False):
+        self.fail = set(fail)
+        self.always = always
+
+    def __call__(self, url, cancel_token):
+        number = int(url.rsplit("/seg", 1)[1][:-3])
+        if number in self.fail:
+            if not self.always:
+                self.fail.discard(number)
+            raise ConnectionError(f"segment {number} reset")
+        return FETCH_SEGMENT(url, cancel_token)
+
+
+def _download(site, directory, **kwargs):
+    raw_file = os.path.join(directory, "episode_1_raw.ts")
+    final_file = os.path.join(directory, "episode_1_final.mp4")
+    download_hls_episode(f"{site.url}/hls/1080_jpn/index.m3u8", raw_file, final_file, **kwargs)
+    with open(final_file, "rb") as f:
+        return f.read()
+
+
+def _run(test):
+    saved = hls.remux_hls, hls._fetch_segment, hls.HLS_SEGMENT_ATTEMPTS
+    hls.remux_hls = _copy_remux
+    try:
+        with FakeSite() as site:
+            test(site, tempfile.mkdtemp(prefix="hls_checkpoint_test_"))
+    finally:
+        hls.remux_hls, hls._fetch_segment, hls.HLS_SEGMENT_ATTEMPTS = saved
+
+
+def test_failed_segment_is_retried_in_place():
+    """A segment failing near the end is fetched again without refetching the ones before it"""
+    print("🧪 Testing a retried segment...")
+
+    def test(site, directory):
+        last = len(site.segments) - 1
+        hls._fetch_segment = _Flaky([last])
+        assert _download(site, directory) == site.hls_plaintext
+        assert site.request_counts()["hls.segment"] == len(site.segments)
+        assert sorted(os.listdir(directory)) == ["episode_1_final.mp4"]
+
+    _run(test)
+    print("✅ Retried segment test passed")
+
+
+def test_restart_resumes_at_the_first_missing_segment():
+    """An episode that gave up keeps its checkpoint; the next call fetches only what is missing"""
+    print("🧪 Testing a resumed episode...")
+
+    def test(site, directory):
+        stuck = len(site.segments) - 2
+        hls._fetch_segment = _Flaky([stuck], always=True)
+        hls.HLS_SEGMENT_ATTEMPTS = 2
+        try:
+            _download(site, directory)
+            assert False, "the download should have failed"
+        except ConnectionError:
+            pass
+        checkpoint_file = os.path.join(directory, "episode_1_raw.ts.checkpoint.json")
+        assert os.path.exists(checkpoint_file)
+
+        # A damaged byte in segment 3 is caught on resume; it is fetched again with all after it
+        raw_file = os.path.join(directory, "episode_1_raw.ts")
+        segment_urls, key = load_media_playlist(f"{site.url}/hls/1080_jpn/index.m3u8")
+        checkpoint = SegmentCheckpoint.load(raw_file, segment_urls, key)
+        assert len(checkpoint.segments) == stuck
+        with open(raw_file, "r+b") as f:
+            f.seek(checkpoint.segments[3][0] + 100)
+            f.write(b"\xff")
+
+        # The checkpoint of another playlist is not used
+        assert SegmentCheckpoint.load(raw_file, segment_urls[:-1], key).segments == []
+
+        hls._fetch_segment = _Flaky([])
+        before = site.request_counts()["hls.segment"]
+        assert _download(site, directory) == site.hls_plaintext
+        assert site.request_counts()["hls.segment"] - before == len(site.segments) - 3
+        assert not os.path.exists(checkpoint_file) and not os.path.exists(raw_file)
+
+    _run(test)
+    print("✅ Resumed episode test passed")
+
+
+def test_verification_before_remux():
+    """Damage to an already written segment is found before remuxing and repaired from that segment on"""
+    print("🧪 Testing the verification pass...")
+
+    def test(site, directory):
+        raw_file = os.path.join(directory, "episode_1_raw.ts")
+        damaged = []
+
+        def on_segment(done, total, segment_bytes):
+            if done == total and not damaged:
+                # Segment 1 goes bad on disk while the last one is being written
+                with open(raw_file, "r+b") as f:
+                    f.seek(len(site.hls_plaintext) // total + 10)
+                    f.write(b"\x00\x00")
+                damaged.append(done)
+
+        assert _download(site, directory, on_segment=on_segment) == site.hls_plaintext
+        assert damaged and site.request_counts()["hls.segment"] == 2 * len(site.segments) - 1
+
+    _run(test)
+    print("✅ Verification pass test passed")
+
+
+def test_lost_lease_keeps_the_checkpoint():
+    """A job stopped by a lost lease leaves its files to the next owner; a cancelled task removes them"""
+    print("🧪 Testing a lost lease mid-episode...")
+
+    def test(site, directory):
+        store = MemoryTaskStore()
+        store.create({"task_id": "task-1", "status": "running"})
+        raw_file = os.path.join(directory, "episode_1_raw.ts")
+        checkpoint_file = raw_file + ".checkpoint.json"
+
+        def stop_after(segments, cancel):
+            def on_segment(done, total, segment_bytes):
+                if done == segments:
+                    cancel()
+            return on_segment
+
+        # Worker._heartbeat cancels the token when another worker takes the job over
+        token = task_cancel_token(store, "task-1")
+        try:
+            _download(site, directory, cancel_token=token, on_segment=stop_after(5, token.cancel))
+            assert False, "the download should have stopped"
+        except Cancelled:
+            pass
+        assert os.path.exists(raw_file) and os.path.exists(checkpoint_file)
+
+        # The new owner picks up at segment 6
+        before = site.request_counts()["hls.segment"]
+        assert _download(site, directory, cancel_token=task_cancel_token(store, "task-1")) == site.hls_plaintext
+        assert site.request_counts()["hls.segment"] - before == len(site.segments) - 5
+        os.remove(os.path.join(directory, "episode_1_final.mp4"))
+
+        # A task cancelled by the user leaves nothing behind
+        token = task_cancel_token(store, "task-1", poll_interval=0)
+        try:
+            _download(site, directory, cancel_token=token,
+                      on_segment=stop_after(3, lambda: store.update("task-1", status="cancelled")))
+            assert False, "the download should have been cancelled"
+        except Cancelled:
+            pass
+        assert os.listdir(directory) == []
+
+    _run(test)
+    print("✅ Lost lease test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting HLS checkpoint tests...\n")
+
+    test_functions = [
+        test_failed_segment_is_retried_in_place,
+        test_restart_resumes_at_the_first_missing_segment,
+        test_verification_before_remux,
+        test_lost_lease_keeps_the_checkpoint,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for picking a variant out of an HLS master playlist
+fake_site.py serves the master playlist and the media playlists; remuxing is replaced by a file copy
+"""
+
+import os
+import shutil
+import tempfile
+from datetime import datetime
+import m3u8
+import hls
+import hls_slices
+from hls import select_variant, load_media_playlist, variant_preferences
+from hls_slices import start_sliced_download, run_slice
+from slice_store import MemorySliceStore
+from task_store import MemoryTaskStore
+from fake_site import FakeSite, FIXTURES_DIR
+
+with open(os.path.join(FIXTURES_DIR, "master.m3u8"), encoding="utf-8") as f:
+    MASTER = m3u8.loads(f.read().replace("{{base}}", "https://cdn.example"), uri="https://cdn.example/hls/multi/master.m3u8")
+
+
+def _pick(**preferences):
+    info = select_variant(MASTER.playlists, **preferences).stream_info
+    return f"{info.resolution[1]}:{info.codecs.split('.')[0]}:{info.bandwidth}"
+
+
+def _copy_remux(raw_file, final_file, label="episode", cancel_token=None):
+    shutil.copyfile(raw_file, final_file)
+    os.remove(raw_file)
+    return final_file
+
+
+def test_select_variant():
+    """Height up to the quality, then the leanest of that height; codec and bandwidth cap narrow it first"""
+    print("🧪 Testing variant selection...")
+
+    assert _pick(max_height=720) == "720:avc1:2800000"
+    # Both 1080p variants fit; the HEVC one needs fewer bytes
+    assert _pick(max_height=1080) == "1080:hvc1:3500000"
+    assert _pick() == "1080:hvc1:3500000"
+    assert _pick(max_height=1080, codec="avc1") == "1080:avc1:5000000"
+    assert _pick(max_height=1080, codec="AVC1", max_bandwidth=4000000) == "720:avc1:2800000"
+    # The cap is hard: nothing fits, so the leanest variant
+    assert _pick(max_height=1080, max_bandwidth=100000) == "360:avc1:800000"
+    # Every variant is taller than asked: the shortest
+    assert _pick(max_height=240) == "360:avc1:800000"
+    # No variant has the codec: it is ignored
+    assert _pick(max_height=1080, codec="vp09") == "1080:hvc1:3500000"
+    assert select_variant([]) is None
+
+    assert variant_preferences({"quality": "720p"})["max_height"] == 720
+    assert variant_preferences({"quality": "1080", "codec": "avc1", "max_bandwidth": 6000000}) == {
+        "max_height": 1080, "codec": "avc1", "max_bandwidth": 6000000}
+    assert variant_preferences({})["max_height"] is None
+
+    print("✅ Variant selection test passed")
+
+
+def test_master_playlist_resolves_to_segments():
+    """A master playlist URL yields the chosen variant's segments and key; media playlists are unchanged"""
+    print("🧪 Testing master playlist loading...")
+
+    with FakeSite() as site:
+        chosen = []
+        segment_urls, key = load_media_playlist(f"{site.url}/hls/multi/master.m3u8", max_height=720,
+                                                on_variant=chosen.append)
+        assert segment_urls[0] == f"{site.url}/hls/720_jpn/seg0.ts" and len(segment_urls) == len(site.segments)
+        assert key == site.key
+        assert chosen == [{"uri": f"{site.url}/hls/720_jpn/index.m3u8", "bandwidth": 2800000,
+                           "resolution": "1280x720", "codecs": "avc1.4d401f,mp4a.40.2", "variants": 4}]
+
+        # Relative ("../") and absolute variant URIs resolve against the master playlist
+        load_media_playlist(f"{site.url}/hls/multi/master.m3u8", max_height=360, on_variant=chosen.append)
+        load_media_playlist(f"{site.url}/hls/multi/master.m3u8", codec="avc1", on_variant=chosen.append)
+        assert [c["uri"] for c in chosen[1:]] == [f"{site.url}/hls/360_jpn/index.m3u8",
+                                                  f"{site.url}/hls/1080_jpn/index.m3u8"]
+
+        # A media playlist is loaded as before, and nothing reports a variant
+        segment_urls, _ = load_media_playlist(f"{site.url}/hls/1080_jpn/index.m3u8", max_height=720,
+                                              on_variant=chosen.append)
+        assert segment_urls[0] == f"{site.url}/hls/1080_jpn/seg0.ts" and len(chosen) == 3
+        assert site.request_counts()["hls.master"] == 3 and site.request_counts()["hls.playlist"] == 4
+
+    print("✅ Master playlist loading test passed")
+
+
+def test_job_records_the_variant():
+    """The M3U8 job downloads only the chosen variant and records it on the task"""
+    print("🧪 Testing the M3U8 job with a master playlist...")
+
+    import jobs
+    saved = jobs.tasks, hls.remux_hls
+    jobs.tasks, hls.remux_hls = MemoryTaskStore(), _copy_remux
+    directory = tempfile.mkdtemp(prefix="hls_master_test_")
+    try:
+        with FakeSite() as site:
+            jobs.tasks.create({"task_id": "task-1", "status": "pending", "progress": 0.0, "total_episodes": 1,
+                               "created_at": datetime.now().isoformat()})
+            m3u8_data = {"1": {"m3u8_url": f"{site.url}/hls/multi/master.m3u8", "quality": "720", "language": "jpn"}}
+            jobs.download_episodes_m3u8_job("task-1", m3u8_data, [1], directory)
+            counts = site.request_counts()
+        task = jobs.tasks.get("task-1")
+    finally:
+        jobs.tasks, hls.remux_hls = saved
+
+    assert task["status"] == "completed", task
+    assert task["hls_variants"]["1"]["resolution"] == "1280x720"
+    assert counts["hls.master"] == 1 and counts["hls.playlist"] == 1 and counts["hls.segment"] == len(site.segments)
+    with open(os.path.join(directory, "episode_1_final.mp4"), "rb") as f:
+        assert f.read() == site.hls_plaintext
+
+    print("✅ M3U8 job test passed")
+
+
+def test_sliced_download_records_the_variant():
+    """Sliced downloads pick the variant when an episode starts and keep it on the task"""
+    print("🧪 Testing a sliced download with a master playlist...")
+
+    saved = hls_slices.remux_hls
+    hls_slices.remux_hls = _copy_remux
+    store, tasks = MemorySliceStore(), MemoryTaskStore()
+    directory = tempfile.mkdtemp(prefix="hls_master_test_")
+    try:
+        with FakeSite() as site:
+            tasks.create({"task_id": "task-1", "status": "pending", "progress": 0.0, "total_episodes": 1,
+                          "created_at": datetime.now().isoformat()})
+            m3u8_data = {"1": {"m3u8_url": f"{site.url}/hls/multi/master.m3u8", "quality": "1080",
+                               "codec": "avc1"}}
+            token = start_sliced_download("task-1", m3u8_data, [1], directory, store=store)
+            while token:
+                token = run_slice(token, max_segments=6, store=store, tasks=tasks)["continuation_token"]
+    finally:
+        hls_slices.remux_hls = saved
+
+    task = tasks.get("task-1")
+    assert task["status"] == "completed"
+    assert task["hls_variants"] == {"1": {"uri": f"{site.url}/hls/1080_jpn/index.m3u8", "bandwidth": 5000000,
+                                          "resolution": "1920x1080", "codecs": "avc1.640028,mp4a.40.2",
+                                          "variants": 4}}
+
+    print("✅ Sliced download test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting HLS master playlist tests...\n")
+
+    test_functions = [
+        test_select_variant,
+        test_master_playlist_resolves_to_segments,
+        test_job_records_the_variant,
+        test_sliced_download_records_the_variant,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
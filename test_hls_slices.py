@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Test script for sliced (resumable) M3U8 downloads
+A local HTTP server serves AES-128 encrypted playlists; remuxing is replaced by a file copy, so no ffmpeg is needed
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Crypto.Cipher import AES
+import hls_slices
+from hls import download_hls_segments
+from hls_slices import start_sliced_download, run_slice
+from slice_store import SliceStore, MemorySliceStore, StaleContinuation, SliceBusy
+from task_store import MemoryTaskStore
+
+KEY = bytes(range(16))
+SEGMENTS = 7
+PLAIN = {ep: bytes([ep]) * 16 * 40 * SEGMENTS for ep in (1, 2)}
+
+
+def _encrypted_segments(plain):
+    # One CBC stream over the whole episode, cut at block boundaries, as the downloader expects
+    data = AES.new(KEY, AES.MODE_CBC, iv=KEY).encrypt(plain)
+    size = len(data) // SEGMENTS
+    return [data[n * size:(n + 1) * size] for n in range(SEGMENTS)]
+
+
+class _HLSHandler(BaseHTTPRequestHandler):
+    failures = set()  # (episode, segment) that fail once
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(self.path)
+        parts = self.path.strip("/").split("/")
+        if parts[-1] == "key":
+            body = KEY
+        elif parts[-1] == "index.m3u8":
+            lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:10", '#EXT-X-KEY:METHOD=AES-128,URI="key"']
+            for n in range(SEGMENTS):
+                lines += ["#EXTINF:10.0,", f"seg{n}.ts"]
+            body = ("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n").encode()
+        else:
+            episode, segment = int(parts[0][2:]), int(parts[-1][3:-3])
+            if (episode, segment) in self.failures:
+                self.failures.discard((episode, segment))
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = _encrypted_segments(PLAIN[episode])[segment]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _copy_remux(raw_file, final_file, label="episode", cancel_token=None):
+    shutil.copyfile(raw_file, final_file)
+    os.remove(raw_file)
+    return final_file
+
+
+def _setup():
+    _HLSHandler.failures = set()
+    _HLSHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _HLSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    m3u8_data = {str(ep): {"m3u8_url": f"{base}/ep{ep}/index.m3u8"} for ep in PLAIN}
+    hls_slices.remux_hls = _copy_remux
+
+    directory = tempfile.mkdtemp(prefix="slices_test_")
+    store, tasks = MemorySliceStore(), MemoryTaskStore()
+    tasks.create({"task_id": "task-1", "status": "pending", "progress": 0.0, "total_episodes": 2,
+                  "created_at": datetime.now().isoformat()})
+    token = start_sliced_download("task-1", m3u8_data, [1, 2], directory, store=store)
+    return server, directory, store, tasks, token
+
+
+def _final(directory, episode):
+    with open(os.path.join(directory, f"episode_{episode}_final.mp4"), "rb") as f:
+        return f.read()
+
+
+def test_steps_drive_job_to_completion():
+    """Bounded steps download, decrypt and remux every episode, then stop handing out tokens"""
+    print("🧪 Testing sliced download...")
+
+    server, directory, store, tasks, token = _setup()
+    steps = []
+    while token:
+        result = run_slice(token, max_segments=3, store=store, tasks=tasks)
+        assert result["segments_downloaded"] <= 3
+        steps.append(result)
+        token = result["continuation_token"]
+    server.shutdown()
+
+    # Per episode: 3 + 3 + 1 segments, then a step for the remux
+    assert len(steps) == 8, len(steps)
+    assert steps[-1]["status"] == "completed" and tasks.get("task-1")["continuation_token"] is None
+    assert _final(directory, 1) == PLAIN[1] and _final(directory, 2) == PLAIN[2]
+    assert store.current_token("task-1") is None
+
+    print("✅ Sliced download test passed")
+
+
+def test_tokens_are_single_use():
+    """A used token is refused, and a token whose step is still running is busy"""
+    print("🧪 Testing continuation tokens...")
+
+    server, _, store, tasks, token = _setup()
+    store.claim(token)
+    try:
+        run_slice(token, store=store, tasks=tasks)
+        assert False, "a running step's token was accepted twice"
+    except SliceBusy:
+        pass
+
+    _, _, store, tasks, token = _setup()
+    next_token = run_slice(token, max_segments=2, store=store, tasks=tasks)["continuation_token"]
+    for stale in (token, "task-1.99", "garbage"):
+        try:
+            run_slice(stale, store=store, tasks=tasks)
+            assert False, f"stale token {stale} was accepted"
+        except StaleContinuation:
+            pass
+    assert run_slice(next_token, max_segments=2, store=store, tasks=tasks)["segment"] == 4
+    server.shutdown()
+
+    print("✅ Continuation token test passed")
+
+
+def test_failed_step_resumes_from_cursor():
+    """A step that dies mid-episode is retried from the last saved segment, dropping bytes written after it"""
+    print("🧪 Testing resume after a failed step...")
+
+    server, directory, store, tasks, token = _setup()
+    _HLSHandler.failures = {(1, 4)}
+    result = run_slice(token, max_segments=10, store=store, tasks=tasks)
+    assert result["error"] and result["segment"] == 4
+
+    # Bytes past the cursor (a step killed while writing) are truncated on resume
+    with open(os.path.join(directory, "episode_1_raw.ts"), "ab") as f:
+        f.write(b"partial write")
+    token = result["continuation_token"]
+    _HLSHandler.requests = []
+    while token:
+        token = run_slice(token, max_segments=10, store=store, tasks=tasks)["continuation_token"]
+    server.shutdown()
+
+    assert _final(directory, 1) == PLAIN[1]
+    assert not any(path.endswith(("seg0.ts", "seg3.ts")) and "/ep1/" in path for path in _HLSHandler.requests)
+
+    print("✅ Resume test passed")
+
+
+def test_cancelled_job_cleans_up():
+    """The next step of a cancelled job removes its partial file and ends the job"""
+    print("🧪 Testing cancellation...")
+
+    server, directory, store, tasks, token = _setup()
+    token = run_slice(token, max_segments=2, store=store, tasks=tasks)["continuation_token"]
+    tasks.update("task-1", status="cancelled")
+    result = run_slice(token, store=store, tasks=tasks)
+    server.shutdown()
+
+    assert result["status"] == "cancelled" and result["continuation_token"] is None
+    assert not os.path.exists(os.path.join(directory, "episode_1_raw.ts"))
+    assert store.current_token("task-1") is None
+
+    print("✅ Cancellation test passed")
+
+
+def test_lost_raw_file_restarts_the_episode():
+    """A step whose raw file is gone or cut short starts the episode over instead of padding it with zeros"""
+    print("🧪 Testing a lost raw file...")
+
+    server, directory, store, tasks, token = _setup()
+    raw_file = os.path.join(directory, "episode_1_raw.ts")
+
+    # Directly: a cursor past the start of a file that does not exist
+    base = f"http://127.0.0.1:{server.server_address[1]}/ep1"
+    state = {"segment": 1, "offset": 32, "iv": "00" * 16}
+    download_hls_segments([f"{base}/seg{n}.ts" for n in range(SEGMENTS)], raw_file, KEY, state)
+    with open(raw_file, "rb") as f:
+        assert f.read() == PLAIN[1]
+    assert state["segment"] == SEGMENTS
+    os.remove(raw_file)
+
+    # Mid-episode, as if the next step ran on another instance
+    token = run_slice(token, max_segments=3, store=store, tasks=tasks)["continuation_token"]
+    os.remove(raw_file)
+    token = run_slice(token, max_segments=SEGMENTS, store=store, tasks=tasks)["continuation_token"]
+    # Every segment is in, but the file is cut short before the remux step
+    with open(raw_file, "r+b") as f:
+        f.truncate(100)
+    while token:
+        token = run_slice(token, max_segments=SEGMENTS, store=store, tasks=tasks)["continuation_token"]
+    server.shutdown()
+
+    assert _final(directory, 1) == PLAIN[1] and _final(directory, 2) == PLAIN[2]
+
+    print("✅ Lost raw file test passed")
+
+
+def test_incomplete_slice_store_fails_on_creation():
+    """A slice store backend missing a method cannot be instantiated"""
+    print("🧪 Testing an incomplete slice store...")
+
+    class PartialStore(SliceStore):
+        def create(self, task_id, cursor):
+            return "token"
+
+    try:
+        PartialStore()
+        assert False, "an incomplete backend was created"
+    except TypeError as e:
+        assert "claim" in str(e) and "advance" in str(e)
+
+    print("✅ Incomplete slice store test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting sliced download tests...\n")
+
+    test_functions = [
+        test_steps_drive_job_to_completion,
+        test_tokens_are_single_use,
+        test_failed_step_resumes_from_cursor,
+        test_cancelled_job_cleans_up,
+        test_lost_raw_file_restarts_the_episode,
+        test_incomplete_slice_store_fails_on_creation,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script for the API's cold start
+Imports main in a fresh interpreter with `python -X importtime` and checks what it loaded
+"""
+
+import os
+import re
+import sys
+import subprocess
+
+# Loaded on first use only; none of these may be imported by `import main`
+HEAVY_MODULES = [
+    "selenium", "undetected_chromedriver", "requests", "tqdm", "m3u8", "Crypto",
+    "session_mgr", "api_client", "scraper", "resolver", "browser", "transfer", "hls", "jobs",
+]
+# Cumulative import time of main, in milliseconds (FastAPI alone is a few hundred)
+IMPORT_BUDGET_MS = 1500
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run(code):
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+
+
+def _import_times(stderr):
+    """module -> cumulative microseconds, from -X importtime output"""
+    times = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+def test_main_skips_heavy_modules():
+    """Importing the API loads none of the browser, scraping or download modules"""
+    print("🧪 Testing cold-start imports...")
+
+    result = _run("import main")
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = _import_times(result.stderr)
+    loaded = sorted(m for m in HEAVY_MODULES if m in times)
+    assert not loaded, f"imported at startup: {loaded}"
+
+    main_ms = times["main"] / 1000
+    print(f"⏱️ import main: {main_ms:.0f}ms")
+    assert main_ms < IMPORT_BUDGET_MS, f"import main took {main_ms:.0f}ms (budget {IMPORT_BUDGET_MS}ms)"
+
+    print("✅ Cold-start import test passed")
+
+
+def test_health_does_not_load_selenium():
+    """/health answers without importing Selenium"""
+    print("🧪 Testing /health...")
+
+    result = _run(
+        "import sys, asyncio, main\n"
+        "health = asyncio.run(main.health_check())\n"
+        "assert health['status'] == 'healthy' and not health['selenium_loaded'], health\n"
+        "assert 'selenium' not in sys.modules\n"
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    print("✅ /health test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting import time tests...\n")
+
+    test_functions = [
+        test_main_skips_heavy_modules,
+        test_health_does_not_load_selenium,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent job queue and worker
+Uses throwaway SQLite files and stand-in job handlers; nothing is downloaded
+"""
+
+import os
+import time
+import tempfile
+import threading
+from job_queue import SQLiteJobQueue
+from task_store import SQLiteTaskStore
+from worker import Worker
+
+
+def _paths():
+    directory = tempfile.mkdtemp(prefix="job_queue_test_")
+    return os.path.join(directory, "jobs.db"), os.path.join(directory, "tasks.db")
+
+
+def test_claim_in_priority_order():
+    """Jobs are claimed once each, lowest priority number first"""
+    print("🧪 Testing claim order...")
+
+    queue = SQLiteJobQueue(_paths()[0])
+    queue.enqueue("download", {"n": 1}, job_id="low", priority=5)
+    queue.enqueue("download", {"n": 2}, job_id="high", priority=0)
+
+    first = queue.claim("w1", 60)
+    second = queue.claim("w1", 60)
+    assert first["job_id"] == "high" and first["payload"] == {"n": 2}
+    assert second["job_id"] == "low"
+    assert queue.claim("w1", 60) is None
+
+    queue.complete("high", "w1")
+    assert queue.depth() == {"done": 1, "running": 1}
+
+    print("✅ Claim order test passed")
+
+
+def test_concurrent_claims_do_not_overlap():
+    """Two processes' queues on one file never lease the same job"""
+    print("🧪 Testing concurrent claims...")
+
+    path = _paths()[0]
+    producer = SQLiteJobQueue(path)
+    for i in range(20):
+        producer.enqueue("download", {}, job_id=f"job{i}")
+
+    claimed = []
+    lock = threading.Lock()
+
+    def claim_all(owner):
+        queue = SQLiteJobQueue(path)
+        while True:
+            job = queue.claim(owner, 60)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["job_id"])
+
+    threads = [threading.Thread(target=claim_all, args=(f"w{n}",)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == sorted(f"job{i}" for i in range(20))
+
+    print("✅ Concurrent claim test passed")
+
+
+def test_expired_lease_is_requeued_then_failed():
+    """A dead worker's job goes to the next worker until attempts run out"""
+    print("🧪 Testing lease expiry...")
+
+    queue = SQLiteJobQueue(_paths()[0])
+    queue.enqueue("download", {}, job_id="j", max_attempts=2)
+
+    assert queue.claim("dead-worker", 0.05)["attempts"] == 1
+    assert queue.claim("w2", 60) is None  # lease still valid
+    time.sleep(0.1)
+
+    job = queue.claim("w2", 0.05)
+    assert job["attempts"] == 2 and job["lease_owner"] == "w2"
+    assert not queue.heartbeat("j", "dead-worker", 60)
+
+    time.sleep(0.1)
+    assert queue.claim("w3", 60) is None
+    assert queue.fail_abandoned() == ["j"]
+    assert queue.get("j")["status"] == "failed"
+
+    print("✅ Lease expiry test passed")
+
+
+def test_worker_runs_jobs_and_skips_cancelled():
+    """The worker runs queued jobs, records crashes and skips cancelled tasks"""
+    print("🧪 Testing worker...")
+
+    queue_path, store_path = _paths()
+    queue = SQLiteJobQueue(queue_path)
+    store = SQLiteTaskStore(store_path)
+    ran = []
+
+    def ok_handler(task_id, value, cancel_token=None):
+        ran.append((task_id, value))
+        store.update(task_id, status="completed")
+
+    def broken_handler(task_id, cancel_token=None):
+        raise RuntimeError("boom")
+
+    for job_id, kind, payload in [("a", "ok", {"value": 1}), ("b", "broken", {}), ("c", "ok", {"value": 3})]:
+        store.create({"task_id": job_id, "status": "pending"})
+        queue.enqueue(kind, payload, job_id=job_id)
+    store.update("c", status="cancelled")
+
+    worker = Worker(concurrency=2, lease_seconds=30, poll_interval=0.05, queue=queue, store=store,
+                    handlers={"ok": ok_handler, "broken": broken_handler})
+    worker.start()
+    deadline = time.time() + 5
+    while queue.depth().get("queued") and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+    worker.stop(timeout=2)
+
+    assert ran == [("a", 1)]
+    assert queue.get("a")["status"] == "done"
+    assert queue.get("b")["status"] == "failed" and store.get("b")["error_message"] == "boom"
+    assert queue.get("c")["status"] == "done" and store.get("c")["status"] == "cancelled"
+    assert worker.stats()["completed"] == 1 and worker.stats()["failed"] == 1
+
+    print("✅ Worker test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting job queue tests...\n")
+
+    test_functions = [
+        test_claim_in_priority_order,
+        test_concurrent_claims_do_not_overlap,
+        test_expired_lease_is_requeued_then_failed,
+        test_worker_runs_jobs_and_skips_cancelled,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script for the library index of downloaded episodes
+Uses throwaway SQLite files and small stand-in episode files
+"""
+
+import os
+import time
+import tempfile
+from library_index import LibraryIndex, file_checksum
+
+
+def _setup():
+    directory = tempfile.mkdtemp(prefix="library_test_")
+    episode = os.path.join(directory, "Show - 01.mp4")
+    with open(episode, "wb") as f:
+        f.write(b"\x00" * 4096)
+    return LibraryIndex(os.path.join(directory, "library.db")), episode
+
+
+def test_record_and_lookup():
+    """A recorded episode is found by session, number, quality and language"""
+    print("🧪 Testing record and lookup...")
+
+    library, episode = _setup()
+    entry = library.record("anime-1", 1, "720", "ENG", episode)
+    assert entry["size"] == 4096 and entry["checksum"] == file_checksum(episode)
+
+    found = library.lookup("anime-1", "1", 720, "eng")
+    assert found is not None and found["path"] == os.path.abspath(episode)
+    assert library.lookup("anime-1", 1, "1080", "eng") is None
+    assert library.lookup("anime-1", 2, "720", "eng") is None
+
+    # Another process with the same file sees it too
+    assert LibraryIndex(library.path).lookup("anime-1", 1, "720", "eng") is not None
+    assert [e["episode"] for e in library.entries("anime-1")] == ["1"]
+
+    print("✅ Record and lookup test passed")
+
+
+def test_missing_or_resized_files_are_dropped():
+    """Entries whose file is gone or has a different size stop counting as downloaded"""
+    print("🧪 Testing stale entries...")
+
+    library, episode = _setup()
+    library.record("anime-1", 1, "720", "eng", episode)
+    with open(episode, "ab") as f:
+        f.write(b"more")
+    assert library.lookup("anime-1", 1, "720", "eng") is None
+    assert library.entries() == []
+
+    library.record("anime-1", 1, "720", "eng", episode)
+    os.remove(episode)
+    assert library.lookup("anime-1", 1, "720", "eng") is None
+
+    print("✅ Stale entry test passed")
+
+
+def test_touched_files_are_checksummed():
+    """A changed mtime is accepted only if the content still matches"""
+    print("🧪 Testing touched files...")
+
+    library, episode = _setup()
+    library.record("anime-1", 1, "720", "eng", episode)
+    later = time.time() + 60
+    os.utime(episode, (later, later))
+    assert library.lookup("anime-1", 1, "720", "eng") is not None
+
+    with open(episode, "r+b") as f:
+        f.write(b"\xff")  # same size, different content
+    later += 60
+    os.utime(episode, (later, later))
+    assert library.lookup("anime-1", 1, "720", "eng") is None
+
+    print("✅ Touched file test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting library index tests...\n")
+
+    test_functions = [
+        test_record_and_lookup,
+        test_missing_or_resized_files_are_dropped,
+        test_touched_files_are_checksummed,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for the API load test
+The short ramp runs loadtest.py in a subprocess, which spawns the server against the fake site
+"""
+
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from loadtest import percentile, parse_histogram, histogram_delta, histogram_quantile, capacity, compare
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_short_ramp():
+    """Each stage reports latency percentiles, errors, browsers, RSS and event-loop lag per endpoint"""
+    print("🧪 Testing a short load ramp...")
+
+    output = os.path.join(tempfile.mkdtemp(prefix="loadtest_test_"), "load.json")
+    env = {k: v for k, v in os.environ.items() if k not in ("BASE_ORIGIN", "TASK_STORE_PATH")}
+    process = subprocess.run(
+        [sys.executable, "loadtest.py", "--stages", "1,3", "--stage-seconds", "2",
+         "--mix", "search=1,episodes=1,qualities=1", "--output", output],
+        cwd=HERE, env=env, capture_output=True, text=True, timeout=300,
+    )
+    assert process.returncode == 0, process.stderr[-2000:]
+    with open(output) as f:
+        report = json.load(f)
+
+    assert [stage["concurrency"] for stage in report["stages"]] == [1, 3]
+    for stage in report["stages"]:
+        assert set(stage["endpoints"]) == {"search", "episodes", "qualities"}
+        for name, result in stage["endpoints"].items():
+            assert result["requests"] > 0 and result["error_rate"] == 0, (name, result)
+            assert result["p50"] <= result["p95"] <= result["p99"] <= result["max"]
+        assert stage["peak_browsers"] >= 1 and stage["peak_rss_mb"] > 0
+        assert stage["event_loop_lag"]["samples"] > 0 and stage["event_loop_lag"]["p99_le"] is not None
+    assert report["capacity"] == {"search": 3, "episodes": 3, "qualities": 3}
+
+    print("✅ Short load ramp test passed")
+
+
+def test_percentiles_and_lag_histogram():
+    """Nearest-rank percentiles, and the lag quantile read from two /metrics scrapes"""
+    print("🧪 Testing percentile helpers...")
+
+    values = [0.1 * n for n in range(1, 101)]
+    assert percentile(values, 50) == values[49] and percentile(values, 99) == values[98]
+    assert percentile([3.0], 95) == 3.0 and percentile([], 50) is None
+
+    def scrape(counts, total):
+        lines = [f'event_loop_lag_seconds_bucket{{le="{le}"}} {n}' for le, n in zip(["0.01", "0.1", "1.0"], counts)]
+        lines += [f'event_loop_lag_seconds_bucket{{le="+Inf"}} {counts[-1]}',
+                  f"event_loop_lag_seconds_count {counts[-1]}", f"event_loop_lag_seconds_sum {total}"]
+        return parse_histogram("\n".join(lines), "event_loop_lag_seconds")
+
+    before = scrape([10.0, 10.0, 10.0], 0.02)
+    after = scrape([90.0, 108.0, 110.0], 2.52)
+    lag = histogram_delta(before, after)
+    assert lag["count"] == 100 and abs(lag["sum"] - 2.5) < 1e-9
+    assert histogram_quantile(lag, 0.5) == 0.01
+    assert histogram_quantile(lag, 0.99) == 1.0
+    assert histogram_quantile(histogram_delta(after, after), 0.99) is None
+
+    print("✅ Percentile helper test passed")
+
+
+def test_capacity_and_regressions():
+    """Capacity is the last stage within limits; a lower capacity or slower p95 is a regression"""
+    print("🧪 Testing capacity and baseline comparison...")
+
+    def stage(concurrency, p95, error_rate=0.0):
+        return {"concurrency": concurrency, "endpoints": {
+            "search": {"requests": 10, "error_rate": 0.0, "p95": 0.1},
+            "qualities": {"requests": 10, "error_rate": error_rate, "p95": p95},
+        }}
+
+    current = {"stages": [stage(1, 0.5), stage(4, 2.0), stage(8, 9.0), stage(16, 3.0, error_rate=0.2)]}
+    current["capacity"] = capacity(current["stages"], max_error_rate=0.01, max_p95=5.0)
+    assert current["capacity"] == {"search": 16, "qualities": 4}
+
+    baseline = {"stages": [stage(1, 0.5), stage(4, 1.0)], "capacity": {"search": 16, "qualities": 8}}
+    regressions = compare(baseline, current, tolerance=0.25)
+    assert {"endpoint": "qualities", "capacity": 4, "baseline_capacity": 8} in regressions
+    assert [r for r in regressions if r.get("concurrency") == 4] == [
+        {"endpoint": "qualities", "concurrency": 4, "p95": 2.0, "baseline_p95": 1.0, "ratio": 2.0}]
+    assert len(regressions) == 2
+
+    print("✅ Capacity and comparison test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting load test tests...\n")
+
+    test_functions = [
+        test_short_ramp,
+        test_percentiles_and_lag_histogram,
+        test_capacity_and_regressions,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
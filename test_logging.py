@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for the queued, structured logger
+Output is captured by redirecting stdout around log.flush()
+"""
+
+import io
+import json
+import time
+import queue
+import logging
+import contextlib
+import log
+import tracing
+from log import get_logger, log_sampled
+
+
+def _capture(fn):
+    """Run fn and return the JSON lines the writer thread printed for it"""
+    out = io.StringIO()
+    log.set_format("json")
+    try:
+        with contextlib.redirect_stdout(out):
+            fn()
+            log.flush()
+    finally:
+        log.set_format(log.LOG_FORMAT)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_records_carry_the_task():
+    """Records inside a span get its task_id and trace_id; records outside get none"""
+    print("🧪 Testing task correlation...")
+
+    logger = get_logger("test_logging.correlation")
+
+    def run():
+        logger.info("📥 outside")
+        with tracing.tracer.span("job", task_id="task-42") as job:
+            logger.warning("⚠️ retry %s of %s", 1, 3)
+            run.trace_id = job.trace_id
+        logger.info("📥 tagged by hand", extra={"task_id": "task-7"})
+
+    lines = _capture(run)
+    assert [line["message"] for line in lines] == ["📥 outside", "⚠️ retry 1 of 3", "📥 tagged by hand"]
+    assert lines[0]["task_id"] is None and lines[0]["trace_id"] is None
+    assert lines[1]["task_id"] == "task-42" and lines[1]["trace_id"] == run.trace_id
+    assert lines[1]["level"] == "WARNING" and lines[1]["logger"] == "test_logging.correlation"
+    assert lines[2]["task_id"] == "task-7"
+
+    print("✅ Task correlation test passed")
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """With the writer stalled, log calls return immediately and the overflow is counted"""
+    print("🧪 Testing queue overflow...")
+
+    handler = log._QueueHandler(queue.Queue(5))  # nothing drains this queue
+    logger = logging.getLogger("test_logging.overflow")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        started = time.perf_counter()
+        for n in range(1000):
+            logger.warning("⚠️ record %s", n)
+        elapsed = time.perf_counter() - started
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.queue.qsize() == 5 and handler.dropped == 995
+    assert elapsed < 1, elapsed
+    assert handler.queue.get_nowait().getMessage() == "⚠️ record 0"
+
+    print("✅ Queue overflow test passed")
+
+
+def test_sampling():
+    """A sampled key logs once per interval and then reports how many it skipped"""
+    print("🧪 Testing sampling...")
+
+    logger = get_logger("test_logging.sampling")
+    # A fresh sampler: downloads run by earlier tests may have sampled the same keys
+    saved = log._sampler
+    log._sampler = log._Sampler(0.2)
+
+    def run():
+        for done in range(1, 51):
+            log_sampled(logger, ("segments", 1), "📊 Segment %s/%s", done, 100)
+        log_sampled(logger, ("segments", 2), "📊 Segment %s/%s", 1, 100)  # other keys are separate
+        time.sleep(0.25)
+        log_sampled(logger, ("segments", 1), "📊 Segment %s/%s", 51, 100)
+
+    try:
+        lines = _capture(run)
+    finally:
+        log._sampler = saved
+    assert [line["message"] for line in lines] == [
+        "📊 Segment 1/100", "📊 Segment 1/100", "📊 Segment 51/100 (+49 similar)"]
+
+    print("✅ Sampling test passed")
+
+
+def test_disabled_levels_are_cheap():
+    """Debug calls below the level are neither formatted nor queued"""
+    print("🧪 Testing disabled levels...")
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("formatted a disabled record")
+
+    logger = get_logger("test_logging.disabled")
+    logger.setLevel(logging.INFO)
+    before = log._handler.queue.qsize() + log.dropped_records()
+    started = time.perf_counter()
+    for _ in range(100000):
+        logger.debug("🔍 segment %s", Expensive())
+        log_sampled(logger, "hot", "📊 %s", Expensive(), level=logging.DEBUG)
+    elapsed = time.perf_counter() - started
+    assert elapsed < 1, elapsed
+    assert log._handler.queue.qsize() + log.dropped_records() <= before
+
+    print("✅ Disabled level test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting logging tests...\n")
+
+    test_functions = [
+        test_records_carry_the_task,
+        test_full_queue_drops_instead_of_blocking,
+        test_sampling,
+        test_disabled_levels_are_cheap,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test script for recording and selecting m3u8 quality/language variants
+These tests run without a browser by working on recorded resolution menus
+"""
+
+import scraper
+from scraper import (
+    parse_variant_key,
+    select_m3u8_variant,
+    store_m3u8_variants,
+    get_cached_m3u8_variants,
+    scrape_m3u8_links_for_variants,
+)
+
+
+SAMPLE_VARIANTS = [
+    {"quality": "360", "language": "jpn", "fansub": "SubsPlease", "m3u8_url": "https://example.com/360.m3u8", "active": False},
+    {"quality": "720", "language": "jpn", "fansub": "SubsPlease", "m3u8_url": "https://example.com/720.m3u8", "active": True},
+    {"quality": "1080", "language": "jpn", "fansub": "SubsPlease", "m3u8_url": "https://example.com/1080.m3u8", "active": False},
+    {"quality": "720", "language": "eng", "fansub": "Dub", "m3u8_url": "https://example.com/720eng.m3u8", "active": False},
+]
+
+
+def test_parse_variant_key():
+    """Test parsing of '720_eng' style keys"""
+    print("🧪 Testing variant key parsing...")
+
+    assert parse_variant_key("720_eng") == ("720", "eng")
+    assert parse_variant_key("1080p_JPN") == ("1080", "jpn")
+    assert parse_variant_key("360") == ("360", "jpn")
+
+    print("✅ Variant key parsing test passed")
+
+
+def test_select_m3u8_variant():
+    """Test exact matches and the active/first fallback"""
+    print("🧪 Testing variant selection...")
+
+    assert select_m3u8_variant(SAMPLE_VARIANTS, "720", "eng")["fansub"] == "Dub"
+    assert select_m3u8_variant(SAMPLE_VARIANTS, "1080", "jpn")["m3u8_url"].endswith("1080.m3u8")
+
+    # No exact match falls back to the active entry, unless disabled
+    assert select_m3u8_variant(SAMPLE_VARIANTS, "1080", "eng")["quality"] == "720"
+    assert select_m3u8_variant(SAMPLE_VARIANTS, "1080", "eng", fallback=False) is None
+    assert select_m3u8_variant([], "720", "eng") is None
+
+    print("✅ Variant selection test passed")
+
+
+def test_variant_cache_answers_later_picks():
+    """Test that stored resolution menus answer several picks without a browser"""
+    print("🧪 Testing stored resolution menu...")
+
+    store_m3u8_variants("anime_a", "ep_1", SAMPLE_VARIANTS)
+    assert get_cached_m3u8_variants("anime_a", "ep_1") == SAMPLE_VARIANTS
+    assert get_cached_m3u8_variants("anime_a", "ep_2") is None
+
+    results = scrape_m3u8_links_for_variants("anime_a", "ep_1", ["720_eng", "1080_jpn", "1080_eng"])
+    assert set(results.keys()) == {"720_eng", "1080_jpn"}
+    assert results["720_eng"]["m3u8_url"] == "https://example.com/720eng.m3u8"
+    assert results["1080_jpn"]["episode_session"] == "ep_1"
+
+    print("✅ Stored resolution menu test passed")
+
+
+def test_variant_cache_expiry():
+    """Test that expired menus are dropped"""
+    print("🧪 Testing stored resolution menu expiry...")
+
+    store_m3u8_variants("anime_b", "ep_1", SAMPLE_VARIANTS)
+    key = ("anime_b", "ep_1")
+    stored_at, variants = scraper._m3u8_variant_cache[key]
+    scraper._m3u8_variant_cache[key] = (stored_at - scraper.M3U8_VARIANT_CACHE_TTL - 1, variants)
+
+    assert get_cached_m3u8_variants("anime_b", "ep_1") is None
+    assert key not in scraper._m3u8_variant_cache
+
+    print("✅ Stored resolution menu expiry test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting m3u8 variant tests...\n")
+
+    test_functions = [
+        test_parse_variant_key,
+        test_select_m3u8_variant,
+        test_variant_cache_answers_later_picks,
+        test_variant_cache_expiry,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
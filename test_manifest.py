@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Test script for resume-safe direct downloads
+Uses a local HTTP server that honors (or mishandles) Range requests
+"""
+
+import os
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cancellation import CancelToken, Cancelled
+from manifest import DownloadManifest, parse_content_range
+from transfer import advanced_download_with_progress
+from config import TRANSFER_PROGRESS_BYTES
+
+CONTENT = bytes(range(256)) * (14 * 1024)  # 3.5MB: three full 1MB blocks and a partial one
+BLOCK = 1024 * 1024
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    mode = "honor"  # honor | ignore | wrong
+    ranges = []
+
+    def do_POST(self):
+        header = self.headers.get("Range")
+        type(self).ranges.append(header)
+        start = int(header[len("bytes="):-1]) if header else 0
+        if not header or self.mode == "ignore":
+            self.send_response(200)
+            body = CONTENT
+        else:
+            self.send_response(206)
+            shown = start + 1 if self.mode == "wrong" else start
+            self.send_header("Content-Range", f"bytes {shown}-{len(CONTENT) - 1}/{len(CONTENT)}")
+            body = CONTENT[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(mode="honor"):
+    _RangeHandler.mode = mode
+    _RangeHandler.ranges = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, {"url": f"http://127.0.0.1:{server.server_address[1]}/file", "filename": "ep.mp4"}
+
+
+def _partial(directory, info, stop_after):
+    """Start a download and cancel it once stop_after bytes are in"""
+    token = CancelToken()
+
+    def on_progress(done, total):
+        if done >= stop_after:
+            token.cancel()
+
+    try:
+        advanced_download_with_progress(info, directory, cancel_token=token, on_progress=on_progress)
+        assert False, "expected Cancelled"
+    except Cancelled:
+        pass
+
+
+def _read(directory):
+    with open(os.path.join(directory, "ep.mp4"), "rb") as f:
+        return f.read()
+
+
+def test_parse_content_range():
+    """Content-Range headers are parsed, malformed ones rejected"""
+    print("🧪 Testing Content-Range parsing...")
+
+    assert parse_content_range("bytes 100-199/1000") == (100, 199, 1000)
+    assert parse_content_range("bytes 0-9/*") == (0, 9, None)
+    assert parse_content_range("items 0-9/10") is None
+    assert parse_content_range(None) is None
+
+    print("✅ Content-Range parsing test passed")
+
+
+def test_resume_and_skip_when_complete():
+    """An interrupted download resumes from the verified bytes; a finished one is not fetched again"""
+    print("🧪 Testing resume and skip...")
+
+    server, info = _serve()
+    directory = tempfile.mkdtemp(prefix="manifest_test_")
+    try:
+        _partial(directory, info, 2 * BLOCK + 100)
+        assert advanced_download_with_progress(info, directory)
+        assert _read(directory) == CONTENT
+        resumed_from = int(_RangeHandler.ranges[-1][len("bytes="):-1])
+        assert resumed_from >= 2 * BLOCK, _RangeHandler.ranges
+
+        requests_before = len(_RangeHandler.ranges)
+        assert advanced_download_with_progress(info, directory)
+        assert len(_RangeHandler.ranges) == requests_before
+    finally:
+        server.shutdown()
+
+    print("✅ Resume and skip test passed")
+
+
+def test_corrupt_block_is_refetched():
+    """A damaged block in the partial file is detected and downloaded again from there"""
+    print("🧪 Testing corruption detection...")
+
+    server, info = _serve()
+    directory = tempfile.mkdtemp(prefix="manifest_test_")
+    try:
+        _partial(directory, info, 3 * BLOCK)
+        with open(os.path.join(directory, "ep.mp4"), "r+b") as f:
+            f.seek(BLOCK + 10)
+            f.write(b"\xff\xff\xff")
+        assert advanced_download_with_progress(info, directory)
+        assert _RangeHandler.ranges[-1] == f"bytes={BLOCK}-"
+        assert _read(directory) == CONTENT
+    finally:
+        server.shutdown()
+
+    print("✅ Corruption detection test passed")
+
+
+def test_ignored_or_wrong_range_restarts_cleanly():
+    """A 200 reply to a Range request, or a mismatched Content-Range, never gets appended"""
+    print("🧪 Testing misbehaving servers...")
+
+    for mode in ("ignore", "wrong"):
+        server, info = _serve()
+        directory = tempfile.mkdtemp(prefix="manifest_test_")
+        try:
+            _partial(directory, info, BLOCK + 100)
+            _RangeHandler.mode = mode
+            assert advanced_download_with_progress(info, directory)
+            assert _read(directory) == CONTENT, mode
+        finally:
+            server.shutdown()
+
+    print("✅ Misbehaving server test passed")
+
+
+def test_legacy_partial_is_adopted():
+    """A partial file without a manifest resumes where it ends"""
+    print("🧪 Testing partial files without a manifest...")
+
+    server, info = _serve()
+    directory = tempfile.mkdtemp(prefix="manifest_test_")
+    try:
+        with open(os.path.join(directory, "ep.mp4"), "wb") as f:
+            f.write(CONTENT[:12345])
+        assert advanced_download_with_progress(info, directory)
+        assert _RangeHandler.ranges == ["bytes=12345-"]
+        assert _read(directory) == CONTENT
+
+        with open(DownloadManifest.load(os.path.join(directory, "ep.mp4")).manifest_path) as f:
+            saved = json.load(f)
+        assert saved["complete"] and saved["length"] == len(CONTENT) and saved["etag"] == '"v1"'
+        assert len(saved["blocks"]) == 4
+    finally:
+        server.shutdown()
+
+    print("✅ Partial file adoption test passed")
+
+
+def test_progress_is_rate_limited():
+    """on_progress is called every TRANSFER_PROGRESS_BYTES or so, not per chunk, and once at the end"""
+    print("🧪 Testing progress callback rate...")
+
+    server, info = _serve()
+    directory = tempfile.mkdtemp(prefix="manifest_test_")
+    calls = []
+    try:
+        assert advanced_download_with_progress(info, directory, on_progress=lambda done, total: calls.append(done))
+    finally:
+        server.shutdown()
+
+    assert calls[-1] == len(CONTENT)
+    assert calls == sorted(calls)
+    # 3.5MB in 256KB steps (a slow moment may add a few time-based calls)
+    assert 5 <= len(calls) <= len(CONTENT) // TRANSFER_PROGRESS_BYTES + 5, len(calls)
+
+    print("✅ Progress callback rate test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting download manifest tests...\n")
+
+    test_functions = [
+        test_parse_content_range,
+        test_resume_and_skip_when_complete,
+        test_corrupt_block_is_refetched,
+        test_ignored_or_wrong_range_restarts_cleanly,
+        test_legacy_partial_is_adopted,
+        test_progress_is_rate_limited,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics
+Uses a local HTTP server for segments and a stand-in subprocess for ffmpeg
+"""
+
+import sys
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cancellation import CancelToken
+import metrics
+from metrics import Counter, Gauge, Histogram, StepTimer
+from hls import _fetch_segment, _run_ffmpeg
+
+
+def test_text_format():
+    """Counters, gauges and histograms render in the Prometheus exposition format"""
+    print("🧪 Testing text format...")
+
+    requests_total = Counter("test_requests_total", "Requests", ["endpoint", "status"])
+    requests_total.inc(endpoint="search", status=200)
+    requests_total.inc(2, endpoint="search", status=200)
+    requests_total.inc(endpoint='we"ird', status=500)
+    depth = Gauge("test_depth", "Depth", ["status"])
+    depth.set_function(lambda: {("pending",): 3})
+    latency = Histogram("test_latency_seconds", "Latency", buckets=(0.5, 1))
+    for value in (0.2, 0.5, 0.7, 3):
+        latency.observe(value)
+
+    text = metrics.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{endpoint="search",status="200"} 3' in text
+    assert 'test_requests_total{endpoint="we\\"ird",status="500"} 1' in text
+    assert 'test_depth{status="pending"} 3' in text
+    assert 'test_latency_seconds_bucket{le="0.5"} 2' in text  # buckets are inclusive and cumulative
+    assert 'test_latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "test_latency_seconds_sum 4.4" in text and "test_latency_seconds_count 4" in text
+
+    try:
+        requests_total.inc(endpoint="search")
+        assert False, "missing label accepted"
+    except ValueError:
+        pass
+
+    print("✅ Text format test passed")
+
+
+def test_recording_from_many_threads():
+    """Concurrent records are not lost"""
+    print("🧪 Testing concurrent records...")
+
+    counter = Counter("test_concurrent_total", "Concurrent increments")
+    histogram = Histogram("test_concurrent_seconds", "Concurrent observations")
+    steps = Histogram("test_steps_seconds", "Steps", ["step"])
+
+    def record():
+        for _ in range(5000):
+            counter.inc()
+            histogram.observe(0.01)
+        timer = StepTimer(steps)
+        timer.lap("first")
+        timer.lap("second")
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value() == 40000 and histogram.count() == 40000
+    assert steps.count(step="first") == 8 and steps.count(step="second") == 8
+
+    print("✅ Concurrent record test passed")
+
+
+class _SegmentHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/missing.ts":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = b"\x47" * 188 * 100
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_hls_and_ffmpeg_are_instrumented():
+    """Segment latency, failures and bytes, and ffmpeg duration by outcome are recorded"""
+    print("🧪 Testing HLS instrumentation...")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SegmentHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    segments, failures = metrics.HLS_SEGMENT_SECONDS.count(), metrics.HLS_SEGMENT_FAILURES.value()
+    received = metrics.DOWNLOAD_BYTES.value(kind="hls")
+
+    assert len(_fetch_segment(f"{base}/seg0.ts", CancelToken())) == 18800
+    try:
+        _fetch_segment(f"{base}/missing.ts", CancelToken())
+        assert False, "404 segment accepted"
+    except Exception:
+        pass
+    server.shutdown()
+    assert metrics.HLS_SEGMENT_SECONDS.count() == segments + 1
+    assert metrics.HLS_SEGMENT_FAILURES.value() == failures + 1
+    assert metrics.DOWNLOAD_BYTES.value(kind="hls") == received + 18800
+
+    ok, failed = metrics.FFMPEG_SECONDS.count(outcome="ok"), metrics.FFMPEG_SECONDS.count(outcome="failed")
+    _run_ffmpeg([sys.executable, "-c", "pass"], CancelToken())
+    try:
+        _run_ffmpeg([sys.executable, "-c", "raise SystemExit(1)"], CancelToken())
+    except Exception:
+        pass
+    assert metrics.FFMPEG_SECONDS.count(outcome="ok") == ok + 1
+    assert metrics.FFMPEG_SECONDS.count(outcome="failed") == failed + 1
+
+    print("✅ HLS instrumentation test passed")
+
+
+def test_metrics_endpoint():
+    """GET /metrics includes the queue depth read at scrape time"""
+    print("🧪 Testing /metrics...")
+
+    import main
+    response = asyncio.run(main.get_metrics())
+    body = response.body.decode()
+    assert response.media_type.startswith("text/plain")
+    assert "# TYPE job_queue_depth gauge" in body
+    for status, n in main.job_queue.depth().items():
+        assert f'job_queue_depth{{status="{status}"}} {n}' in body
+    assert "# TYPE browser_launch_seconds histogram" in body
+
+    print("✅ /metrics test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting metrics tests...\n")
+
+    test_functions = [
+        test_text_format,
+        test_recording_from_many_threads,
+        test_hls_and_ffmpeg_are_instrumented,
+        test_metrics_endpoint,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the resolver prefetcher
+Stand-in work functions sleep instead of driving a browser
+"""
+
+import time
+import threading
+from prefetch import Prefetcher
+
+
+def test_resolving_overlaps_downloading():
+    """The next item is resolved while the current one is being used"""
+    print("🧪 Testing overlap...")
+
+    def resolve(n):
+        time.sleep(0.2)
+        return n * 10
+
+    started = time.monotonic()
+    with Prefetcher(resolve, range(5), lookahead=1) as prefetcher:
+        for n in range(5):
+            assert prefetcher.get(n) == n * 10
+            time.sleep(0.2)  # the "download"
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 1.6, elapsed  # 2.0s if resolving and downloading took turns
+    assert prefetcher.stats()["missed"] == 1 and prefetcher.stats()["ready"] + prefetcher.stats()["waited"] == 4
+
+    print("✅ Overlap test passed")
+
+
+def test_lookahead_bounds_concurrency():
+    """At most the current item plus `lookahead` items are resolved at once"""
+    print("🧪 Testing lookahead bound...")
+
+    running = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def resolve(n):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return n
+
+    with Prefetcher(resolve, range(8), lookahead=2) as prefetcher:
+        assert [prefetcher.get(n) for n in range(8)] == list(range(8))
+    assert peak[0] <= 3, peak[0]
+
+    print("✅ Lookahead bound test passed")
+
+
+def test_expired_and_failed_prefetches_are_redone():
+    """Stale results and prefetches that raised are computed again on hand-off"""
+    print("🧪 Testing expiry and failures...")
+
+    calls = []
+
+    def resolve(n):
+        calls.append(n)
+        if n == 2 and calls.count(2) == 1:
+            raise RuntimeError("browser crashed")
+        return f"link-{n}-{calls.count(n)}"
+
+    with Prefetcher(resolve, range(3), lookahead=1, ttl=0.1) as prefetcher:
+        assert prefetcher.get(0) == "link-0-1"
+        time.sleep(0.2)  # episode 1's prefetched link expires meanwhile
+        assert prefetcher.get(1) == "link-1-2"
+        assert prefetcher.get(2) == "link-2-2"
+    stats = prefetcher.stats()
+    assert stats["expired"] == 1 and stats["failed"] == 1
+
+    print("✅ Expiry and failure test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting prefetch tests...\n")
+
+    test_functions = [
+        test_resolving_overlaps_downloading,
+        test_lookahead_bounds_concurrency,
+        test_expired_and_failed_prefetches_are_redone,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
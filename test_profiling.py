@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Test script for opt-in profiling of requests and download tasks
+Profiles go to throwaway SQLite files; the profiled work is a CPU-bound stand-in
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+import profiling
+from profiling import Profile, ProfileStore, ProfilingMiddleware, profile, bind
+from job_queue import SQLiteJobQueue
+from task_store import SQLiteTaskStore
+from worker import Worker
+
+
+def _store():
+    return ProfileStore(os.path.join(tempfile.mkdtemp(prefix="profiling_test_"), "profiles.db"))
+
+
+def _hash_chunks(seconds=0.3):
+    """Busy work standing in for per-chunk Python overhead"""
+    deadline = time.perf_counter() + seconds
+    chunk = b"x" * 4096
+    while time.perf_counter() < deadline:
+        hashlib.sha256(chunk).digest()
+
+
+def _sampler_idle(timeout=1):
+    deadline = time.time() + timeout
+    while profiling._sampler._thread is not None and time.time() < deadline:
+        time.sleep(0.01)
+    return profiling._sampler._thread is None
+
+
+def test_profile_samples_the_thread():
+    """A profile records the work's stacks, is stored, and the sampler stops afterwards"""
+    print("🧪 Testing a profiled block...")
+
+    store = _store()
+    with profile("task", "task-1", store=store) as prof:
+        _hash_chunks()
+
+    saved = store.get(prof.id)
+    assert saved["kind"] == "task" and saved["target"] == "task-1"
+    assert saved["samples"] >= 10, saved["samples"]
+    busy = [f for f in saved["functions"] if f["function"].startswith("_hash_chunks ")]
+    assert busy and busy[0]["total_percent"] > 80, saved["functions"][:5]
+    assert any(";_hash_chunks (test_profiling.py:" in line for line in saved["folded"].splitlines())
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in saved["folded"].splitlines())
+    assert [p["id"] for p in store.list()] == [prof.id]
+    assert _sampler_idle()
+
+    print("✅ Profiled block test passed")
+
+
+def test_off_means_no_overhead():
+    """Without a profile, bind returns the function itself and no sampler runs"""
+    print("🧪 Testing that profiling is free when off...")
+
+    assert profiling.current_profile() is None
+    assert bind(_hash_chunks) is _hash_chunks
+    assert _sampler_idle()
+
+    print("✅ No-overhead test passed")
+
+
+def test_bound_work_on_other_threads_is_sampled():
+    """Work bound to a profile is sampled on the thread that runs it, other threads are not"""
+    print("🧪 Testing bound work...")
+
+    store = _store()
+    stop = threading.Event()
+    bystander = threading.Thread(target=lambda: [_hash_chunks(0.05) for _ in iter(stop.is_set, True)], daemon=True)
+    bystander.start()
+    try:
+        with profile("request", "POST /qualities", store=store, this_thread=False) as prof:
+            worker = threading.Thread(target=bind(_hash_chunks))
+            worker.start()
+            worker.join()
+    finally:
+        stop.set()
+    saved = store.get(prof.id)
+    assert saved["samples"] >= 10
+    # Only the bound thread was sampled, and it did nothing but _hash_chunks
+    assert all("_hash_chunks" in line for line in saved["folded"].splitlines())
+    assert not any("<lambda>" in line for line in saved["folded"].splitlines())
+
+    print("✅ Bound work test passed")
+
+
+def test_middleware_profiles_flagged_requests():
+    """?profile=1 or X-Profile: 1 profiles the request and returns X-Profile-Id; the admin token is enforced"""
+    print("🧪 Testing the profiling middleware...")
+
+    store = _store()
+    saved_store = profiling._store
+    profiling._store = store
+
+    async def app(scope, receive, send):
+        await asyncio.to_thread(bind(_hash_chunks), 0.2)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    def call(middleware, query=b"", headers=()):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/qualities", "query_string": query, "headers": list(headers)}
+        asyncio.run(middleware(scope, None, send))
+        return dict(sent[0]["headers"])
+
+    try:
+        open_middleware = ProfilingMiddleware(app)
+        assert b"x-profile-id" not in call(open_middleware)
+        profile_id = call(open_middleware, query=b"episode=1&profile=1")[b"x-profile-id"].decode()
+        saved = store.get(profile_id)
+        assert saved["target"] == "POST /qualities" and saved["samples"] >= 5
+        assert b"x-profile-id" in call(open_middleware, headers=[(b"x-profile", b"1")])
+
+        guarded = ProfilingMiddleware(app, admin_token="secret")
+        assert b"x-profile-id" not in call(guarded, query=b"profile=1")
+        assert b"x-profile-id" in call(guarded, query=b"profile=1", headers=[(b"x-admin-token", b"secret")])
+    finally:
+        profiling._store = saved_store
+
+    print("✅ Middleware test passed")
+
+
+def test_profiled_download_job():
+    """A job queued with profile=true runs under a profile whose id is recorded on the task"""
+    print("🧪 Testing a profiled job...")
+
+    directory = tempfile.mkdtemp(prefix="profiling_test_")
+    queue = SQLiteJobQueue(os.path.join(directory, "jobs.db"))
+    tasks = SQLiteTaskStore(os.path.join(directory, "tasks.db"))
+    store = ProfileStore(os.path.join(directory, "profiles.db"))
+    saved_store = profiling._store
+    profiling._store = store
+
+    def download(task_id, seconds, cancel_token=None):
+        _hash_chunks(seconds)
+        tasks.update(task_id, status="completed")
+
+    worker = Worker(queue=queue, store=tasks, handlers={"download": download})
+    try:
+        for job_id, payload in [("plain", {"seconds": 0.05}), ("profiled", {"seconds": 0.3, "profile": True})]:
+            tasks.create({"task_id": job_id, "status": "pending"})
+            queue.enqueue("download", payload, job_id=job_id)
+            worker.execute(queue.claim(worker.name, 30, job_id=job_id))
+    finally:
+        profiling._store = saved_store
+
+    assert tasks.get("plain")["status"] == "completed" and "profile_id" not in tasks.get("plain")
+    profiled = tasks.get("profiled")
+    assert profiled["status"] == "completed"
+    saved = store.get(profiled["profile_id"])
+    assert saved["kind"] == "task" and saved["target"] == "profiled" and saved["samples"] >= 10
+    assert any(f["function"].startswith("download ") for f in saved["functions"])
+    assert len(store.list()) == 1
+
+    print("✅ Profiled job test passed")
+
+
+def test_store_keeps_the_newest():
+    """Only the newest `keep` profiles are kept"""
+    print("🧪 Testing profile retention...")
+
+    store = ProfileStore(os.path.join(tempfile.mkdtemp(prefix="profiling_test_"), "profiles.db"), keep=3)
+    ids = []
+    for n in range(5):
+        prof = Profile("request", f"GET /{n}")
+        prof.started += n
+        prof.stop()
+        store.save(prof)
+        ids.append(prof.id)
+    assert [p["id"] for p in store.list()] == ids[:1:-1]
+    assert store.get(ids[0]) is None
+
+    print("✅ Retention test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting profiling tests...\n")
+
+    test_functions = [
+        test_profile_samples_the_thread,
+        test_off_means_no_overhead,
+        test_bound_work_on_other_threads_is_sampled,
+        test_middleware_profiles_flagged_requests,
+        test_profiled_download_job,
+        test_store_keeps_the_newest,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
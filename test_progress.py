@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for progress events
+Exercises the pub/sub bus and the job-side reporter without a server
+"""
+
+import time
+import asyncio
+import threading
+from progress import ProgressBus, ProgressReporter
+from task_store import MemoryTaskStore
+
+
+def test_stream_coalesces_to_bounded_rate():
+    """A burst of updates reaches a subscriber as a few coalesced snapshots"""
+    print("🧪 Testing coalescing...")
+
+    bus = ProgressBus()
+
+    async def scenario():
+        received = []
+
+        async def consume():
+            async for changed in bus.stream(task_id="t", since=bus.version, min_interval=0.1, keepalive=5):
+                received.extend(changed)
+                if changed[-1].get("status") == "completed":
+                    return
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+
+        def produce():
+            for n in range(1, 201):
+                bus.publish("t", bytes_done=n)
+                time.sleep(0.001)
+            bus.publish("t", status="completed")
+
+        await asyncio.get_running_loop().run_in_executor(None, produce)
+        await asyncio.wait_for(consumer, 3)
+        return received
+
+    received = asyncio.run(scenario())
+    assert 1 <= len(received) < 20, len(received)
+    assert received[-1]["bytes_done"] == 200 and received[-1]["status"] == "completed"
+    assert bus.stats()["subscribers"] == 0
+
+    print("✅ Coalescing test passed")
+
+
+def test_firehose_sees_every_task():
+    """The unfiltered stream reports changes from all tasks"""
+    print("🧪 Testing firehose...")
+
+    bus = ProgressBus()
+
+    async def scenario():
+        stream = bus.stream(since=bus.version, min_interval=0.01, keepalive=5)
+        seen = set()
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        bus.publish("a", stage="scraping")
+        bus.publish("b", stage="downloading")
+        seen.update(s["task_id"] for s in await first)
+        while seen != {"a", "b"}:
+            seen.update(s["task_id"] for s in await stream.__anext__())
+        await stream.aclose()
+        return seen
+
+    assert asyncio.run(scenario()) == {"a", "b"}
+
+    print("✅ Firehose test passed")
+
+
+def test_reporter_throttles_and_respects_store_status():
+    """Byte updates are persisted at a bounded rate; the store's cancel status wins"""
+    print("🧪 Testing progress reporter...")
+
+    store = MemoryTaskStore()
+    store.create({"task_id": "t", "status": "pending"})
+    bus = ProgressBus()
+    writes = []
+    original_update = store.update
+
+    def counting_update(task_id, **fields):
+        writes.append(fields)
+        return original_update(task_id, **fields)
+
+    store.update = counting_update
+    reporter = ProgressReporter("t", store, bus, publish_interval=0, persist_interval=60)
+
+    reporter.stage("downloading")
+    for n in range(1, 1001):
+        reporter.bytes(n * 1024, 1000 * 1024)
+    assert len(writes) == 1  # only the stage change
+    assert bus.snapshot("t")["bytes_done"] == 1000 * 1024
+
+    original_update("t", status="cancelled")
+    reporter.finish("completed", stage="done")
+    assert store.get("t")["status"] == "cancelled"
+    assert bus.snapshot("t")["status"] == "cancelled"
+    assert store.get("t")["bytes_done"] == 1000 * 1024
+
+    print("✅ Progress reporter test passed")
+
+
+def test_rate_and_eta():
+    """A steady transfer yields a rate near the true one and a matching ETA"""
+    print("🧪 Testing rate and ETA...")
+
+    bus = ProgressBus()
+    store = MemoryTaskStore()
+    store.create({"task_id": "t", "status": "running"})
+    reporter = ProgressReporter("t", store, bus, publish_interval=0, persist_interval=60)
+    reporter.stage("downloading")
+
+    started = time.monotonic()
+    while time.monotonic() - started < 1.6:
+        elapsed = time.monotonic() - started
+        reporter.bytes(int(elapsed * 100_000), 1_000_000)
+        time.sleep(0.02)
+
+    snapshot = bus.snapshot("t")
+    assert 70_000 < snapshot["rate"] < 130_000, snapshot["rate"]
+    assert 5 < snapshot["eta"] < 12, snapshot["eta"]
+
+    print("✅ Rate and ETA test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting progress event tests...\n")
+
+    test_functions = [
+        test_stream_coalesces_to_bounded_rate,
+        test_firehose_sees_every_task,
+        test_reporter_throttles_and_respects_store_status,
+        test_rate_and_eta,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
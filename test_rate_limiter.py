@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for the adaptive per-host rate limiter
+Uses throwaway SQLite files; no requests leave the machine
+"""
+
+import os
+import time
+import tempfile
+import threading
+from rate_limiter import HostRateLimiter, load_page, parse_retry_after
+
+API_URL = "https://animepahe.ru/api?m=search&q=frieren"
+
+
+def _limiter(**kwargs):
+    path = os.path.join(tempfile.mkdtemp(prefix="rate_limiter_test_"), "rates.db")
+    options = dict(hosts=["animepahe.*", "kwik.*"], initial_rate=20, min_rate=1, max_rate=40,
+                   increase=1, decrease=0.5, cooldown=0.2, max_cooldown=5)
+    options.update(kwargs)
+    return HostRateLimiter(path, **options)
+
+
+def test_requests_are_paced():
+    """Requests to a limited host are spaced at its rate; other hosts are not held back"""
+    print("🧪 Testing pacing...")
+
+    limiter = _limiter()
+    started = time.monotonic()
+    for _ in range(11):
+        limiter.wait(API_URL)
+    elapsed = time.monotonic() - started
+    assert 0.45 < elapsed < 0.9, elapsed
+
+    started = time.monotonic()
+    for _ in range(50):
+        limiter.wait("https://cdn.example.org/segment.ts")
+    assert time.monotonic() - started < 0.2
+
+    print("✅ Pacing test passed")
+
+
+def test_aimd_adjusts_rate():
+    """Healthy responses speed a host up; throttling halves its rate and pauses it"""
+    print("🧪 Testing AIMD...")
+
+    limiter = _limiter()
+    for _ in range(5):
+        assert not limiter.record(API_URL, 200)
+    assert limiter.stats()["animepahe.ru"]["rate"] == 25
+
+    assert limiter.record(API_URL, 429)
+    assert limiter.record(API_URL, 503)
+    stats = limiter.stats()["animepahe.ru"]
+    assert stats["rate"] == 6.25 and stats["failures"] == 2
+    assert 0.3 < stats["next_slot_in"] <= 0.4  # cooldown doubled on the second failure
+
+    started = time.monotonic()
+    limiter.wait(API_URL)
+    assert time.monotonic() - started > 0.3
+
+    limiter.record(API_URL, 200)
+    assert limiter.stats()["animepahe.ru"]["failures"] == 0
+
+    print("✅ AIMD test passed")
+
+
+def test_retry_after_and_ddos_pages():
+    """Retry-After sets the pause; a DDoS-Guard page counts as throttling"""
+    print("🧪 Testing Retry-After and DDoS-Guard...")
+
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None and parse_retry_after(None) is None
+
+    limiter = _limiter()
+    limiter.record("https://kwik.si/e/abc", 429, retry_after=1.5)
+    assert 1.3 < limiter.stats()["kwik.si"]["next_slot_in"] <= 1.5
+
+    class Page:
+        def __init__(self, html):
+            self.page_source = html
+            self.visited = []
+
+        def get(self, url):
+            self.visited.append(url)
+
+    driver = Page("<html><title>DDoS-Guard</title></html>")
+    load_page(driver, API_URL, limiter=limiter)
+    assert driver.visited == [API_URL]
+    assert limiter.stats()["animepahe.ru"]["failures"] == 1
+
+    print("✅ Retry-After and DDoS-Guard test passed")
+
+
+def test_pacing_is_shared_between_processes():
+    """Two limiters on one file (as in two processes) share each host's request slots"""
+    print("🧪 Testing shared pacing...")
+
+    first = _limiter()
+    second = HostRateLimiter(first.path, hosts=first.hosts, initial_rate=20)
+
+    def burst(limiter):
+        for _ in range(6):
+            limiter.wait(API_URL)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=burst, args=(l,)) for l in (first, second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - started > 0.45  # 12 slots at 20/s, not 6
+
+    print("✅ Shared pacing test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting rate limiter tests...\n")
+
+    test_functions = [
+        test_requests_are_paced,
+        test_aimd_adjusts_rate,
+        test_retry_after_and_ddos_pages,
+        test_pacing_is_shared_between_processes,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for the download task store
+Runs the same checks against the in-memory and SQLite backends
+"""
+
+import os
+import time
+import tempfile
+from task_store import TaskStore, MemoryTaskStore, SQLiteTaskStore
+
+
+def _stores():
+    path = os.path.join(tempfile.mkdtemp(prefix="task_store_test_"), "tasks.db")
+    return [MemoryTaskStore(), SQLiteTaskStore(path)]
+
+
+def _task(task_id, status="pending"):
+    return {
+        "task_id": task_id,
+        "status": status,
+        "progress": 0.0,
+        "total_episodes": 3,
+        "created_at": "2024-01-01T12:00:00",
+    }
+
+
+def test_create_get_update():
+    """Tasks round-trip and updates merge fields"""
+    print("🧪 Testing create/get/update...")
+
+    for store in _stores():
+        store.create(_task("a"))
+        assert store.get("a")["status"] == "pending"
+        assert store.get("missing") is None
+
+        updated = store.update("a", status="running", progress=50.0, current_episode=2)
+        assert updated["progress"] == 50.0
+        assert store.get("a")["current_episode"] == 2
+        assert store.get("a")["total_episodes"] == 3
+        assert store.update("missing", status="running") is None
+
+    print("✅ Create/get/update test passed")
+
+
+def test_list_pagination_and_status_filter():
+    """Listing is newest first, paginated and filterable by status"""
+    print("🧪 Testing pagination...")
+
+    for store in _stores():
+        for i in range(5):
+            store.create(_task(f"t{i}", status="completed" if i % 2 else "pending"))
+            time.sleep(0.01)
+
+        page, total = store.list(limit=2, offset=0)
+        assert total == 5
+        assert [t["task_id"] for t in page] == ["t4", "t3"]
+
+        page, total = store.list(limit=2, offset=4)
+        assert [t["task_id"] for t in page] == ["t0"]
+
+        page, total = store.list(status="completed")
+        assert total == 2
+        assert {t["task_id"] for t in page} == {"t1", "t3"}
+
+    print("✅ Pagination test passed")
+
+
+def test_compaction_keeps_active_tasks():
+    """Only finished tasks are compacted, by age and by count"""
+    print("🧪 Testing compaction...")
+
+    for store in _stores():
+        store.create(_task("running"))
+        store.update("running", status="running")
+        for i in range(4):
+            store.create(_task(f"done{i}"))
+            store.update(f"done{i}", status="completed")
+            time.sleep(0.01)
+
+        # Keep only the 2 newest finished tasks
+        assert store.compact(max_age_seconds=3600, max_finished=2) == 2
+        remaining = {t["task_id"] for t in store.list(limit=10)[0]}
+        assert remaining == {"running", "done2", "done3"}
+
+        # Everything finished is older than a negative max age
+        assert store.compact(max_age_seconds=-1, max_finished=100) == 2
+        assert [t["task_id"] for t in store.list(limit=10)[0]] == ["running"]
+
+    print("✅ Compaction test passed")
+
+
+def test_sqlite_shared_between_instances():
+    """Two store instances on one file (as two workers would) see the same tasks"""
+    print("🧪 Testing shared SQLite file...")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="task_store_test_"), "tasks.db")
+    worker_a = SQLiteTaskStore(path)
+    worker_b = SQLiteTaskStore(path)
+
+    worker_a.create(_task("shared"))
+    worker_b.update("shared", status="cancelled")
+    assert worker_a.get("shared")["status"] == "cancelled"
+
+    print("✅ Shared SQLite file test passed")
+
+
+def test_incomplete_backend_fails_on_creation():
+    """A backend missing a method cannot be instantiated"""
+    print("🧪 Testing an incomplete backend...")
+
+    class PartialStore(TaskStore):
+        def create(self, task):
+            pass
+
+        def get(self, task_id):
+            return None
+
+    try:
+        PartialStore()
+        assert False, "an incomplete backend was created"
+    except TypeError as e:
+        assert "update" in str(e) and "compact" in str(e)
+
+    print("✅ Incomplete backend test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting task store tests...\n")
+
+    test_functions = [
+        test_create_get_update,
+        test_list_pagination_and_status_filter,
+        test_compaction_keeps_active_tasks,
+        test_sqlite_shared_between_instances,
+        test_incomplete_backend_fails_on_creation,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for tracing spans and per-stage timings
+Spans go to a temporary OTLP/JSON file and timings to an in-memory task store
+"""
+
+import os
+import json
+import time
+import tempfile
+from datetime import datetime
+import tracing
+from tracing import Tracer, traced
+from metrics import Histogram, StepTimer
+from task_store import MemoryTaskStore
+
+
+def _task(store, task_id="task-1"):
+    store.create({"task_id": task_id, "status": "running", "progress": 0.0, "total_episodes": 1,
+                  "created_at": datetime.now().isoformat()})
+
+
+def test_spans_nest_and_export():
+    """Children share the trace, point at their parent, inherit the task and record errors"""
+    print("🧪 Testing span export...")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="tracing_test_"), "spans.jsonl")
+    tracer = Tracer(export_path=path, store=MemoryTaskStore())
+    with tracer.span("job", task_id="task-1", kind="download") as job:
+        with tracer.span("scrape", episode=3) as scrape:
+            tracer.record("scrape.page_load", time.time_ns() - 1_000_000)
+        try:
+            with tracer.span("transfer"):
+                raise ConnectionError("reset")
+        except ConnectionError:
+            pass
+
+    with open(path) as f:
+        spans = [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"][0] for line in f]
+    by_name = {s["name"]: s for s in spans}
+    assert [s["name"] for s in spans] == ["scrape.page_load", "scrape", "transfer", "job"]
+    assert len({s["traceId"] for s in spans}) == 1
+    assert "parentSpanId" not in by_name["job"]
+    assert by_name["scrape"]["parentSpanId"] == job.span_id
+    assert by_name["scrape.page_load"]["parentSpanId"] == scrape.span_id
+    assert {"key": "task_id", "value": {"stringValue": "task-1"}} in by_name["scrape.page_load"]["attributes"]
+    assert {"key": "episode", "value": {"intValue": "3"}} in by_name["scrape"]["attributes"]
+    assert by_name["transfer"]["status"] == {"code": 2, "message": "ConnectionError: reset"}
+    assert int(by_name["job"]["endTimeUnixNano"]) >= int(by_name["transfer"]["endTimeUnixNano"])
+
+    print("✅ Span export test passed")
+
+
+def test_stage_timings_reach_the_task():
+    """Step laps and decorated functions add up per stage in the task record, across runs"""
+    print("🧪 Testing stage timings...")
+
+    store = MemoryTaskStore()
+    _task(store)
+    saved = tracing.tracer._store
+    tracing.tracer._store = store
+    try:
+        @traced("resolve")
+        def resolve():
+            steps = StepTimer(Histogram("test_trace_steps_seconds", "Steps", ["step"]), span_prefix="resolve")
+            time.sleep(0.05)
+            steps.lap("redirect_wait")
+            steps.lap("form")
+
+        for _ in range(2):  # e.g. a job retried after a lost lease
+            with tracing.span("job", task_id="task-1"):
+                resolve()
+    finally:
+        tracing.tracer._store = saved
+
+    timings = store.get("task-1")["stage_timings"]
+    assert set(timings) == {"job", "resolve", "resolve.redirect_wait", "resolve.form"}
+    assert timings["resolve"]["count"] == 2 and timings["job"]["count"] == 2
+    assert 0.1 <= timings["resolve.redirect_wait"]["total_seconds"] < 1
+    assert timings["resolve.redirect_wait"]["max_seconds"] >= 0.05
+    assert timings["resolve.form"]["total_seconds"] < 0.05
+
+    print("✅ Stage timing test passed")
+
+
+def test_long_jobs_flush_while_running():
+    """Timings show up before the job ends, at most once per flush interval"""
+    print("🧪 Testing periodic flush...")
+
+    store = MemoryTaskStore()
+    _task(store)
+    tracer = Tracer(export_path=None, flush_interval=0.1, store=store)
+    with tracer.span("job", task_id="task-1"):
+        with tracer.span("transfer"):
+            pass
+        assert store.get("task-1")["stage_timings"]["transfer"]["count"] == 1
+        with tracer.span("transfer"):
+            pass
+        assert store.get("task-1")["stage_timings"]["transfer"]["count"] == 1  # within the interval
+        time.sleep(0.15)
+        with tracer.span("transfer"):
+            pass
+        assert store.get("task-1")["stage_timings"]["transfer"]["count"] == 3
+    assert store.get("task-1")["stage_timings"]["job"]["count"] == 1
+
+    # Spans outside any task are exported only
+    with tracer.span("search"):
+        pass
+    assert "search" not in store.get("task-1")["stage_timings"]
+
+    print("✅ Periodic flush test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting tracing tests...\n")
+
+    test_functions = [
+        test_spans_nest_and_export,
+        test_stage_timings_reach_the_task,
+        test_long_jobs_flush_while_running,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test script for the airing-show watcher
+A stand-in release API replaces the site; queue and watch list use throwaway SQLite files
+"""
+
+import os
+import time
+import tempfile
+from api_client import fetch_new_episodes
+from job_queue import SQLiteJobQueue
+from task_store import MemoryTaskStore
+from watcher import ShowWatcher
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class _ReleaseSite:
+    """Answers m=release&sort=episode_desc like the site, 3 episodes per page"""
+
+    def __init__(self, episodes, per_page=3):
+        self.episodes = episodes
+        self.per_page = per_page
+        self.requests = []
+
+    def release(self, count):
+        self.episodes += count
+
+    def get(self, url, **kwargs):
+        self.requests.append(url)
+        assert "sort=episode_desc" in url
+        page = int(url.rsplit("page=", 1)[1])
+        newest_first = [{"episode": n, "session": f"ep{n}"} for n in range(self.episodes, 0, -1)]
+        last_page = max((len(newest_first) + self.per_page - 1) // self.per_page, 1)
+        start = (page - 1) * self.per_page
+        return _Response({"data": newest_first[start:start + self.per_page], "last_page": last_page})
+
+
+def _watcher(site, **kwargs):
+    directory = tempfile.mkdtemp(prefix="watcher_test_")
+    queue = SQLiteJobQueue(os.path.join(directory, "jobs.db"))
+    store = MemoryTaskStore()
+    watcher = ShowWatcher(os.path.join(directory, "watch.db"), session_factory=lambda: site,
+                          queue=queue, store=store, **kwargs)
+    return watcher, queue, store
+
+
+def test_fetch_stops_at_cursor():
+    """Only pages down to the last seen episode are fetched"""
+    print("🧪 Testing incremental fetch...")
+
+    site = _ReleaseSite(20)
+    new = fetch_new_episodes(site, "show", after_episode=18)
+    assert [e["episode"] for e in new] == [19, 20]
+    assert len(site.requests) == 1
+
+    site.requests.clear()
+    new = fetch_new_episodes(site, "show", after_episode=13)
+    assert [e["episode"] for e in new] == list(range(14, 21))
+    assert len(site.requests) == 3
+
+    assert [e["episode"] for e in fetch_new_episodes(site, "show")] == [20]
+    assert len(fetch_new_episodes(site, "show", after_episode=0)) == 20
+
+    print("✅ Incremental fetch test passed")
+
+
+def test_poll_queues_only_new_episodes():
+    """A poll queues one download of the newly released episodes and moves the cursor"""
+    print("🧪 Testing polls...")
+
+    site = _ReleaseSite(10)
+    watcher, queue, store = _watcher(site)
+    show = watcher.watch("show", quality="1080", language="jpn", title="Show")
+    assert show["last_episode"] == 10
+
+    assert watcher.poll_now("show") is None
+    site.release(2)
+    task_id = watcher.poll_now("show")
+    job = queue.get(task_id)
+    assert [e["episode"] for e in job["payload"]["episodes"]] == [11, 12]
+    assert job["payload"]["quality"] == "1080" and job["payload"]["language"] == "jpn"
+    assert store.get(task_id)["status"] == "pending" and store.get(task_id)["total_episodes"] == 2
+    assert watcher.get("show")["last_episode"] == 12
+
+    site.requests.clear()
+    assert watcher.poll_now("show") is None
+    assert len(site.requests) == 1
+
+    print("✅ Poll test passed")
+
+
+def test_due_shows_are_claimed_once():
+    """Two watchers on one file split the due shows between them; next polls are jittered"""
+    print("🧪 Testing claims and scheduling...")
+
+    site = _ReleaseSite(5)
+    first, _, _ = _watcher(site, concurrency=2)
+    second = ShowWatcher(first.path, session_factory=lambda: site, queue=first.queue, store=first.store)
+    for n in range(5):
+        first.watch(f"show{n}", poll_interval=600, since_episode=5)
+    first._conn().execute("UPDATE watched_shows SET next_poll_ts = 0")
+
+    a = first.claim_due(2)
+    b = second.claim_due(10)
+    assert len(a) == 2 and len(b) == 3
+    assert not {s["anime_session"] for s in a} & {s["anime_session"] for s in b}
+    assert first.claim_due(10) == []
+
+    first._conn().execute("UPDATE watched_shows SET next_poll_ts = 0")
+    assert first.poll_due() == 5
+    now = time.time()
+    for show in first.shows():
+        assert now + 600 * 0.85 < show["next_poll_ts"] < now + 600 * 1.15
+    assert len({s["next_poll_ts"] for s in first.shows()}) == 5
+
+    print("✅ Claim and scheduling test passed")
+
+
+def test_failed_poll_is_retried_later():
+    """A failing poll records the error and keeps the cursor"""
+    print("🧪 Testing failed polls...")
+
+    site = _ReleaseSite(3)
+    watcher, queue, _ = _watcher(site)
+    watcher.watch("show", since_episode=3)
+
+    def broken(url, **kwargs):
+        raise ConnectionError("site down")
+
+    site.get = broken
+    assert watcher.poll_now("show") is None
+    show = watcher.get("show")
+    assert show["last_error"] == "site down" and show["last_episode"] == 3
+    assert queue.depth() == {}
+
+    print("✅ Failed poll test passed")
+
+
+def run_all_tests():
+    """Run all test functions"""
+    print("🚀 Starting watcher tests...\n")
+
+    test_functions = [
+        test_fetch_stops_at_cursor,
+        test_poll_queues_only_new_episodes,
+        test_due_shows_are_claimed_once,
+        test_failed_poll_is_retried_later,
+    ]
+
+    passed = 0
+    total = len(test_functions)
+
+    for test_func in test_functions:
+        try:
+            test_func()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test {test_func.__name__} failed: {e}")
+
+    print(f"\n📊 Test Results: {passed}/{total} tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,184 @@
+"""
+Lightweight tracing spans for an episode's lifecycle (scrape, resolve, transfer, HLS).
+
+Spans follow the OpenTelemetry data model (trace and span ids, parent, start/end in unix
+nanoseconds, attributes, status). Finished spans are appended to TRACE_EXPORT_PATH, if
+set, as OTLP/JSON lines (one ExportTraceServiceRequest per line, as the collector's file
+exporter writes them), and spans carrying a task_id are summed per span name into the
+task's `stage_timings`, shown by GET /download/{task_id}.
+
+The current span lives in a context variable, so spans nest within a thread; a job
+opens a root span with task_id and every span below it inherits the task.
+"""
+
+import os
+import json
+import logging
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from config import TRACE_EXPORT_PATH, TRACE_FLUSH_INTERVAL, TRACE_SERVICE_NAME
+
+# Not log.get_logger: log imports this module for the current span
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent=None, task_id=None, attributes=None, start_ns=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.task_id = task_id or (parent.task_id if parent else None)
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def seconds(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self):
+        attributes = dict(self.attributes, **({"task_id": self.task_id} if self.task_id else {}))
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Exports finished spans and keeps per-task stage timings, flushed to the task store"""
+
+    def __init__(self, export_path=TRACE_EXPORT_PATH, flush_interval=TRACE_FLUSH_INTERVAL, store=None):
+        self.export_path = export_path
+        self.flush_interval = flush_interval
+        self._store = store
+        self._pending = {}
+        self._last_flush = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            from task_store import get_task_store
+            self._store = get_task_store()
+        return self._store
+
+    @contextmanager
+    def span(self, name, task_id=None, **attributes):
+        """Time the block as a child of the current span (or a new trace); yields the span"""
+        span = Span(name, parent=_current.get(), task_id=task_id, attributes=attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            self.finish(span)
+
+    def record(self, name, start_ns, end_ns=None, **attributes):
+        """Add an already-timed child of the current span (e.g. one lap of a StepTimer)"""
+        span = Span(name, parent=_current.get(), attributes=attributes, start_ns=start_ns)
+        self.finish(span, end_ns)
+
+    def finish(self, span, end_ns=None):
+        span.end_ns = end_ns or time.time_ns()
+        if self.export_path:
+            self._export(span)
+        if span.task_id:
+            self._add_timing(span)
+
+    def _export(self, span):
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "anime-downloader"}, "spans": [span.to_otlp()]}],
+        }]})
+        try:
+            with self._lock, open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning("⚠️ Could not export span %s: %s", span.name, e)
+
+    def _add_timing(self, span):
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending.setdefault(span.task_id, {})
+            entry = pending.setdefault(span.name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["total_seconds"] += span.seconds
+            entry["max_seconds"] = max(entry["max_seconds"], span.seconds)
+            # A root span ending (job or slice) always flushes; otherwise at most every flush_interval
+            root = span.parent_span_id is None
+            if not root and now - self._last_flush.get(span.task_id, 0) < self.flush_interval:
+                return
+            self._pending.pop(span.task_id)
+            if root:
+                self._last_flush.pop(span.task_id, None)
+            else:
+                self._last_flush[span.task_id] = now
+        self._flush(span.task_id, pending)
+
+    def _flush(self, task_id, pending):
+        """Add timings to the task's stored ones; a resumed or sliced job keeps adding to them"""
+        try:
+            task = self.store.get(task_id)
+            if task is None:
+                return
+            timings = task.get("stage_timings") or {}
+            for name, entry in pending.items():
+                stored = timings.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                stored["count"] += entry["count"]
+                stored["total_seconds"] = round(stored["total_seconds"] + entry["total_seconds"], 3)
+                stored["max_seconds"] = round(max(stored["max_seconds"], entry["max_seconds"]), 3)
+            self.store.update(task_id, stage_timings=timings)
+        except Exception as e:
+            logger.warning("⚠️ Could not save stage timings for task %s: %s", task_id, e)
+
+
+def current_span():
+    return _current.get()
+
+
+def traced(name, **attributes):
+    """Decorator: run the function inside a span named name"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+tracer = Tracer()
+span = tracer.span
+record_span = tracer.record
@@ -5,6 +5,25 @@ import requests
 from time import sleep
 from tqdm import tqdm
 from http.client import IncompleteRead
+from cancellation import CancelToken, Cancelled
+from bandwidth import bandwidth_scheduler
+from rate_limiter import get_rate_limiter, parse_retry_after
+from manifest import DownloadManifest, ManifestMismatch
+from metrics import DOWNLOAD_BYTES, TRANSFER_SECONDS, TRANSFER_THROUGHPUT, TRANSFER_RETRIES
+from tracing import traced, record_span
+from config import TRANSFER_PROGRESS_BYTES, TRANSFER_PROGRESS_INTERVAL
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+def _record_transfer(received, started_ns, outcome):
+    seconds = (time.time_ns() - started_ns) / 1e9
+    DOWNLOAD_BYTES.inc(received, kind="direct")
+    TRANSFER_SECONDS.observe(seconds, outcome=outcome)
+    if received and seconds > 0:
+        TRANSFER_THROUGHPUT.observe(received / seconds, kind="direct")
+    record_span("transfer.attempt", started_ns, bytes=received, outcome=outcome)
 
 
 def download_with_progress(session, url: str, filename: str):
@@ -29,17 +48,26 @@ def download_with_progress(session, url: str, filename: str):
                     f"{speed:.2f}MB/s ETA {eta:.1f}s"
                 )
                 sys.stdout.flush()
-    print("\n✅ Download complete:", filename)
+    logger.info("✅ Download complete: %s", filename)
 
 
-def advanced_download_with_progress(download_info, download_directory="./"):
+@traced("transfer")
+def advanced_download_with_progress(download_info, download_directory="./", cancel_token=None, on_progress=None):
     """
     Advanced download function with POST support, resume capability, and retry logic.
     Takes download_info dict from resolve_download_info function.
+    Raises Cancelled when cancel_token is cancelled; the partial file is kept for resuming.
+    on_progress(bytes_done, bytes_total) is called every TRANSFER_PROGRESS_BYTES or
+    TRANSFER_PROGRESS_INTERVAL seconds, and once more when the body is written.
+
+    A <file>.manifest.json sidecar records the server's length, ETag/Last-Modified and
+    block checksums, so a finished file is skipped at once and a partial one resumes
+    only from bytes that verify, and only if the server's Content-Range matches.
     """
     if not download_info or not download_info.get('url'):
-        print("❌ Invalid download information provided")
+        logger.error("❌ Invalid download information provided")
         return False
+    cancel_token = cancel_token or CancelToken()
 
     # Use extracted filename or fallback to generic name
     if download_info.get('filename'):
@@ -58,19 +86,18 @@ def advanced_download_with_progress(download_info, download_directory="./"):
     download_url = download_info['url']
     form_data = download_info.get('form_data', {})
     headers = download_info.get('headers', {})
+    # kwik's download endpoint is paced with the rest of the site's traffic
+    rate_limiter = get_rate_limiter()
 
-    print(f"📥 Starting download: {filename}")
-    print(f"🔗 Download URL: {download_url}")
+    logger.info("📥 Starting download: %s", filename)
+    logger.debug("🔗 Download URL: %s", download_url)
     
-    # Check if a partial file exists and resume download if possible
-    resume_header = {}
-    mode = 'wb'  # Write mode for new download
-    if os.path.exists(full_file_path):
-        existing_size = os.path.getsize(full_file_path)
-        if existing_size > 0:
-            resume_header = {'Range': f"bytes={existing_size}-"}
-            mode = 'ab'  # Append mode for partial download
-            print(f"📄 Resuming download from {existing_size} bytes")
+    manifest = DownloadManifest.load(full_file_path)
+    if manifest.is_complete():
+        logger.info("✅ Already downloaded: %s", full_file_path)
+        if on_progress:
+            on_progress(manifest.size, manifest.size)
+        return True
 
     retries = 999  # Maximum number of retries for internet issues
     retry_delay = 10  # Time (in seconds) to wait before retrying
@@ -78,20 +105,33 @@ def advanced_download_with_progress(download_info, download_directory="./"):
 
     while not downloaded and retries > 0:
         try:
-            # Combine headers
-            request_headers = {**headers, **resume_header}
+            # Only bytes the manifest vouches for are kept; a corrupt or unrecorded tail is cut off
+            existing_size = manifest.prepare()
+            if manifest.complete:
+                # Intact, only its mtime changed
+                manifest.finish()
+                logger.info("✅ Already downloaded: %s", full_file_path)
+                return True
+            if existing_size > 0:
+                logger.info("📄 Resuming download from %s bytes", existing_size)
+            request_headers = {**headers, **manifest.resume_headers(existing_size)}
             
-            with session.post(download_url, data=form_data, headers=request_headers, stream=True, timeout=120) as response:
+            cancel_token.raise_if_cancelled()
+            rate_limiter.wait(download_url, cancel_token)
+            attempt_started = time.time_ns()
+            with session.post(download_url, data=form_data, headers=request_headers, stream=True, timeout=120) as response, \
+                    cancel_token.on_cancel(response.close):  # unblocks a read stalled on the socket
+                rate_limiter.record(download_url, response.status_code,
+                                    retry_after=parse_retry_after(response.headers.get('Retry-After')))
+                if response.status_code == 416:
+                    manifest.reset()
+                    raise ManifestMismatch(f"server cannot resume from byte {existing_size}")
                 response.raise_for_status()
-
-                remaining_size = int(response.headers.get('content-length', 0))
-                current_size = os.path.getsize(full_file_path) if os.path.exists(full_file_path) else 0
-                
-                # Calculate total size (current + remaining for resume, or just remaining for new download)
-                if mode == 'ab':  # Resume mode
-                    total_size = current_size + remaining_size
-                else:  # New download
-                    total_size = remaining_size
+                # Where this body goes: existing_size for a verified resume, 0 if the server sent it all
+                current_size = manifest.begin(response, existing_size)
+                # Shares bandwidth with every other transfer (global, per-host and per-job limits)
+                throttle = bandwidth_scheduler.throttle(download_url, cancel_token)
+                total_size = manifest.length or 0
                 
                 # Initialize progress bar with speed and ETA
                 progress = tqdm(
@@ -107,34 +147,76 @@ def advanced_download_with_progress(download_info, download_directory="./"):
                     bar_format='{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]'
                 )
 
-                with open(full_file_path, mode) as file:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            file.write(chunk)
-                            progress.update(len(chunk))
-                
-                progress.close()
+                received = 0
+                reported_bytes, reported_at = 0, time.monotonic()
+                finished = False
+                try:
+                    with open(full_file_path, 'r+b' if os.path.exists(full_file_path) else 'wb') as file:
+                        file.seek(current_size)
+                        file.truncate()
+                        for chunk in response.iter_content(chunk_size=1024):
+                            cancel_token.raise_if_cancelled()
+                            if chunk:
+                                file.write(chunk)
+                                received += len(chunk)
+                                manifest.add(chunk)
+                                manifest.checkpoint(file)
+                                progress.update(len(chunk))
+                                throttle.consume(len(chunk))
+                                # Rate-limited: the reporter takes a lock and reads the clock per call
+                                if on_progress and (received - reported_bytes >= TRANSFER_PROGRESS_BYTES
+                                                    or time.monotonic() - reported_at >= TRANSFER_PROGRESS_INTERVAL):
+                                    on_progress(progress.n, total_size or None)
+                                    reported_bytes, reported_at = received, time.monotonic()
+                    if on_progress and received != reported_bytes:
+                        on_progress(progress.n, total_size or None)
+                    finished = True
+                finally:
+                    progress.close()
+                    manifest.save()
+                    _record_transfer(received, attempt_started, "ok" if finished else "interrupted")
+                # Raises ManifestMismatch if the body ended short (or long)
+                manifest.finish()
                 downloaded = True  # Download completed successfully
-                print(f"✅ Downloaded successfully: {full_file_path}")
+                logger.info("✅ Downloaded successfully: %s", full_file_path)
                 return True
 
+        except Cancelled:
+            logger.info("🛑 Download cancelled: %s", filename)
+            raise
+
+        except ManifestMismatch as e:
+            # Not a connection problem; retry shortly from whatever still verifies
+            cancel_token.raise_if_cancelled()
+            retries -= 1
+            TRANSFER_RETRIES.inc(reason="mismatch")
+            logger.warning("⚠️ %s. Retrying... (%s retries left)", e, retries)
+            cancel_token.sleep(1)
+
         except (requests.exceptions.RequestException, requests.exceptions.ChunkedEncodingError) as e:
+            cancel_token.raise_if_cancelled()
             retries -= 1
-            print(f"⚠️ Network error: {e}. Retrying in {retry_delay} seconds... ({retries} retries left)")
-            sleep(retry_delay)
+            TRANSFER_RETRIES.inc(reason="network")
+            logger.warning("⚠️ Network error: %s. Retrying in %s seconds... (%s retries left)", e, retry_delay, retries)
+            cancel_token.sleep(retry_delay)
 
         except IncompleteRead as e:
-            print(f"⚠️ Incomplete download: {e}. Retrying...")
+            cancel_token.raise_if_cancelled()
+            logger.warning("⚠️ Incomplete download: %s. Retrying...", e)
             retries -= 1
-            sleep(retry_delay)
+            TRANSFER_RETRIES.inc(reason="incomplete")
+            cancel_token.sleep(retry_delay)
 
         except Exception as e:
-            print(f"❌ Unexpected error: {e}")
+            # Also where a response closed by a cancel ends up
+            cancel_token.raise_if_cancelled()
+            logger.error("❌ Unexpected error: %s", e)
             retries -= 1
-            sleep(retry_delay)
+            TRANSFER_RETRIES.inc(reason="error")
+            cancel_token.sleep(retry_delay)
 
     if not downloaded:
-        print(f"❌ Failed to download after multiple retries: {filename}")
+        logger.error("❌ Failed to download after multiple retries: %s", filename)
         return False
 
 
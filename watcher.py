@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Airing-show watcher: polls watched shows for new episodes and queues downloads for them.
+
+Runs inside the API (EMBEDDED_WATCHER=1) or on its own:
+    python watcher.py
+"""
+
+import os
+import time
+import uuid
+import random
+import signal
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from job_queue import get_job_queue
+from task_store import get_task_store
+from config import (
+    WATCH_STORE_PATH,
+    WATCH_POLL_INTERVAL,
+    WATCH_MIN_INTERVAL,
+    WATCH_JITTER,
+    WATCH_CONCURRENCY,
+    WATCH_TICK,
+    WATCH_CLAIM_SECONDS,
+    WATCH_PRIORITY,
+)
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class ShowWatcher:
+    """
+    Watched shows and their release cursor (newest episode seen), in SQLite.
+
+    Each poll walks the release list newest first and stops at the cursor, so it costs
+    one API page unless episodes came out. New episodes are queued as one download job.
+    Shows are claimed before polling, so several API or watcher processes can share the
+    file without polling a show twice; poll times are jittered so shows added together
+    do not stay in lockstep.
+    """
+
+    def __init__(self, path=WATCH_STORE_PATH, session_factory=None, queue=None, store=None,
+                 concurrency=WATCH_CONCURRENCY, tick=WATCH_TICK, jitter=WATCH_JITTER):
+        self.path = path
+        self.session_factory = session_factory or _default_session
+        self.queue = queue or get_job_queue()
+        self.store = store or get_task_store()
+        self.concurrency = concurrency
+        self.tick = tick
+        self.jitter = jitter
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"polls": 0, "errors": 0, "episodes_queued": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS watched_shows (
+                anime_session      TEXT PRIMARY KEY,
+                title              TEXT,
+                quality            TEXT NOT NULL,
+                language           TEXT NOT NULL,
+                download_directory TEXT NOT NULL,
+                poll_interval      REAL NOT NULL,
+                last_episode       REAL,
+                last_session       TEXT,
+                next_poll_ts       REAL NOT NULL,
+                last_checked_ts    REAL,
+                last_task_id       TEXT,
+                last_error         TEXT,
+                created_ts         REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_watched_due ON watched_shows (next_poll_ts);
+            """
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _jittered(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # ---- watched shows ------------------------------------------------------
+
+    def watch(self, anime_session: str, quality: str = "720", language: str = "eng",
+              download_directory: str = "./", poll_interval: float = WATCH_POLL_INTERVAL,
+              since_episode: Optional[float] = None, title: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Start watching a show. Episodes after since_episode are downloaded; by default
+        only episodes released from now on.
+        """
+        from api_client import fetch_new_episodes  # imported lazily, like the session: keeps the API's cold start light
+
+        last_session = None
+        if since_episode is None:
+            latest = fetch_new_episodes(self.session_factory(), anime_session)
+            # Nothing released yet: every episode will be new
+            since_episode, last_session = (latest[0]["episode"], latest[0]["session"]) if latest else (0, None)
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO watched_shows (anime_session, title, quality, language, download_directory, "
+            "poll_interval, last_episode, last_session, next_poll_ts, created_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (anime_session, title, quality, language, download_directory, max(poll_interval, WATCH_MIN_INTERVAL),
+             since_episode, last_session, now + self._jittered(max(poll_interval, WATCH_MIN_INTERVAL)), now),
+        )
+        logger.info("👀 Watching %s for episodes after %s", title or anime_session, since_episode)
+        return self.get(anime_session)
+
+    def unwatch(self, anime_session: str) -> bool:
+        cur = self._conn().execute("DELETE FROM watched_shows WHERE anime_session = ?", (anime_session,))
+        return cur.rowcount > 0
+
+    def get(self, anime_session: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM watched_shows WHERE anime_session = ?", (anime_session,)).fetchone()
+        return dict(row) if row else None
+
+    def shows(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._conn().execute("SELECT * FROM watched_shows ORDER BY next_poll_ts")]
+
+    # ---- polling ------------------------------------------------------------
+
+    def claim_due(self, limit: int, anime_session: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Take up to limit shows that are due (or one named show), pushing their next poll out meanwhile"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if anime_session is not None:
+                rows = conn.execute("SELECT * FROM watched_shows WHERE anime_session = ?", (anime_session,)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM watched_shows WHERE next_poll_ts <= ? ORDER BY next_poll_ts LIMIT ?", (now, limit)
+                ).fetchall()
+            for row in rows:
+                # If this process dies mid-poll, the show comes due again after the claim runs out
+                conn.execute("UPDATE watched_shows SET next_poll_ts = ? WHERE anime_session = ?",
+                             (now + WATCH_CLAIM_SECONDS, row["anime_session"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(row) for row in rows]
+
+    def poll(self, show: Dict[str, Any]) -> Optional[str]:
+        """Check one show for new episodes and queue them; returns the new task id, if any"""
+        from api_client import fetch_new_episodes
+
+        anime_session = show["anime_session"]
+        now = time.time()
+        self._stats["polls"] += 1
+        try:
+            new = fetch_new_episodes(self.session_factory(), anime_session,
+                                     show["last_episode"], show["last_session"])
+            task_id = None
+            if new:
+                # Queued before the cursor moves: a crash in between re-queues rather than loses
+                # episodes, and the library index skips any that were already downloaded
+                task_id = self._queue_download(show, new)
+                logger.info("🆕 %s: queued episodes %s as task %s", show['title'] or anime_session, ', '.join(str(e['episode']) for e in new), task_id)
+            latest = new[-1:]
+            self._conn().execute(
+                "UPDATE watched_shows SET last_episode = COALESCE(?, last_episode), last_session = COALESCE(?, last_session), "
+                "last_task_id = COALESCE(?, last_task_id), last_checked_ts = ?, last_error = NULL, next_poll_ts = ? "
+                "WHERE anime_session = ?",
+                (latest[0]["episode"] if latest else None, latest[0]["session"] if latest else None, task_id,
+                 now, now + self._jittered(show["poll_interval"]), anime_session),
+            )
+            return task_id
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning("⚠️ Watch poll failed for %s: %s", anime_session, e)
+            self._conn().execute(
+                "UPDATE watched_shows SET last_checked_ts = ?, last_error = ?, next_poll_ts = ? WHERE anime_session = ?",
+                (now, str(e), now + self._jittered(min(show["poll_interval"], WATCH_MIN_INTERVAL)), anime_session),
+            )
+            return None
+
+    def _queue_download(self, show, episodes):
+        """Create the task record and job exactly as POST /download does"""
+        task_id = str(uuid.uuid4())
+        self.store.create({
+            "task_id": task_id,
+            "status": "pending",
+            "progress": 0.0,
+            "total_episodes": len(episodes),
+            "created_at": datetime.now().isoformat(),
+        })
+        self.queue.enqueue("download", {
+            "anime_session": show["anime_session"],
+            "episodes": episodes,
+            "quality": show["quality"],
+            "language": show["language"],
+            "download_directory": show["download_directory"],
+        }, job_id=task_id, priority=WATCH_PRIORITY)
+        self._stats["episodes_queued"] += len(episodes)
+        return task_id
+
+    def poll_now(self, anime_session: str) -> Optional[str]:
+        """Poll one show immediately, whether or not it is due"""
+        shows = self.claim_due(1, anime_session=anime_session)
+        return self.poll(shows[0]) if shows else None
+
+    def poll_due(self, executor=None) -> int:
+        """Poll every show that is due, `concurrency` at a time; returns how many were polled"""
+        polled = 0
+        while not self._stop.is_set():
+            shows = self.claim_due(self.concurrency)
+            if not shows:
+                break
+            if executor is None:
+                for show in shows:
+                    self.poll(show)
+            else:
+                list(executor.map(self.poll, shows))
+            polled += len(shows)
+        return polled
+
+    # ---- background loop ----------------------------------------------------
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="show-watcher", daemon=True)
+        self._thread.start()
+        logger.info("👀 Show watcher started (%s shows, concurrency %s)", len(self.shows()), self.concurrency)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="watch-poll") as executor:
+            while not self._stop.is_set():
+                try:
+                    self.poll_due(executor)
+                except Exception as e:
+                    logger.warning("⚠️ Show watcher error: %s", e)
+                self._stop.wait(self.tick)
+
+    def stats(self):
+        shows = self.shows()
+        return dict(
+            self._stats,
+            shows=len(shows),
+            next_poll_in=round(max(min(s["next_poll_ts"] for s in shows) - time.time(), 0), 1) if shows else None,
+        )
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _default_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported lazily: opening a session starts a browser to pass DDoS-Guard
+            from session_mgr import SessionManager
+            _session = SessionManager()
+        return _session
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll watched shows and queue downloads of new episodes")
+    parser.add_argument("--once", action="store_true", help="Poll the shows that are due, then exit")
+    args = parser.parse_args()
+
+    watcher = ShowWatcher()
+    if args.once:
+        logger.info("👀 Polled %s shows", watcher.poll_due())
+        return
+
+    stopping = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopping.set()
+        logger.info("🛑 Received signal %s; stopping", signum)
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    watcher.start()
+    while not stopping.wait(60):
+        logger.info("📊 %s", watcher.stats())
+    watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
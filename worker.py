@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Download worker: claims jobs from the persistent queue and runs them.
+
+Run one or more of these next to the API (which then only enqueues):
+    EMBEDDED_WORKERS=0 uvicorn main:app
+    python worker.py --concurrency 2
+"""
+
+import os
+import time
+import uuid
+import signal
+import socket
+import argparse
+import threading
+from contextlib import contextmanager, nullcontext
+from job_queue import get_job_queue
+from task_store import get_task_store
+from cancellation import Cancelled, task_cancel_token
+from bandwidth import bandwidth_scheduler
+from metrics import JOB_QUEUE_DEPTH, serve_metrics
+from tracing import span
+from profiling import profile
+from config import JOB_LEASE_SECONDS, JOB_POLL_INTERVAL, WORKER_CONCURRENCY, WORKER_METRICS_PORT
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class Worker:
+    """Runs up to `concurrency` jobs at once, each under a lease kept alive by a heartbeat thread"""
+
+    def __init__(self, concurrency=WORKER_CONCURRENCY, lease_seconds=JOB_LEASE_SECONDS,
+                 poll_interval=JOB_POLL_INTERVAL, name=None, queue=None, store=None, handlers=None):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.queue = queue or get_job_queue()
+        self.store = store or get_task_store()
+        self._handlers = handlers
+        self._stop = threading.Event()
+        self._threads = []
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stats = {"completed": 0, "failed": 0, "cancelled": 0, "lost_leases": 0}
+
+    @property
+    def handlers(self):
+        if self._handlers is None:
+            # Imported lazily: it pulls in Selenium and the download stack
+            from jobs import JOB_HANDLERS
+            self._handlers = JOB_HANDLERS
+        return self._handlers
+
+    def start(self):
+        self._stop.clear()
+        for n in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("👷 Worker %s started with concurrency %s", self.name, self.concurrency)
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs and wait up to timeout for running ones to finish"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = [t for t in self._threads if t.is_alive()]
+        if self._threads:
+            logger.warning("⚠️ Worker %s stopped with %s jobs still running; their leases will expire", self.name, len(self._threads))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                for job_id in self.queue.fail_abandoned():
+                    self.store.update(job_id, status="failed", error_message="Download worker died repeatedly")
+                    logger.error("❌ Job %s failed: worker lease expired too many times", job_id)
+                job = self.queue.claim(self.name, self.lease_seconds, kinds=list(self.handlers))
+            except Exception as e:
+                logger.warning("⚠️ Job queue unavailable: %s", e)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.execute(job)
+
+    def _heartbeat(self, job_id, done, cancel_token):
+        interval = max(1.0, self.lease_seconds / 3)
+        while not done.wait(interval):
+            try:
+                if not self.queue.heartbeat(job_id, self.name, self.lease_seconds):
+                    # Cancelled, or another worker took over after our lease expired: stop either way
+                    with self._lock:
+                        self._stats["lost_leases"] += 1
+                    logger.warning("⚠️ Lost lease on job %s, stopping it", job_id)
+                    cancel_token.cancel()
+                    return
+            except Exception as e:
+                logger.warning("⚠️ Heartbeat for job %s failed: %s", job_id, e)
+
+    def execute(self, job):
+        """Run a claimed job in the calling thread, heartbeating its lease until it returns"""
+        job_id = job["job_id"]
+        task = self.store.get(job_id)
+        if task is not None and task.get("status") == "cancelled":
+            logger.info("⏭️ Skipping cancelled job %s", job_id)
+            self.queue.complete(job_id, self.name)
+            return
+
+        cancel_token = task_cancel_token(self.store, job_id)
+        done = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job_id, done, cancel_token), daemon=True)
+        beat.start()
+        with self._lock:
+            self._running[job_id] = {"kind": job["kind"], "attempt": job["attempts"], "started": time.time()}
+        logger.info("▶️ Job %s (%s) attempt %s/%s on %s", job_id, job['kind'], job['attempts'], job['max_attempts'], self.name)
+        try:
+            payload = dict(job["payload"])
+            weight = payload.pop("bandwidth_weight", 1.0)
+            profiled = payload.pop("profile", False)
+            with bandwidth_scheduler.job(job_id, weight=weight, priority=job["priority"]), \
+                    span("job", task_id=job_id, kind=job["kind"], attempt=job["attempts"]), \
+                    (self._profiled(job_id) if profiled else nullcontext()):
+                self.handlers[job["kind"]](job_id, cancel_token=cancel_token, **payload)
+            self.queue.complete(job_id, self.name)
+            outcome = "cancelled" if cancel_token.cancelled else "completed"
+        except Cancelled:
+            logger.info("🛑 Job %s cancelled", job_id)
+            self.queue.complete(job_id, self.name)
+            outcome = "cancelled"
+        except Exception as e:
+            logger.exception("❌ Job %s crashed", job_id)
+            self.queue.fail(job_id, self.name, str(e))
+            self.store.update(job_id, status="failed", error_message=str(e))
+            outcome = "failed"
+        finally:
+            done.set()
+            cancel_token.close()
+            with self._lock:
+                self._running.pop(job_id, None)
+        with self._lock:
+            self._stats[outcome] += 1
+
+    @contextmanager
+    def _profiled(self, job_id):
+        """Sample the job's thread; the task shows the profile's id for GET /debug/profiles/{id}"""
+        with profile("task", job_id) as prof:
+            self.store.update(job_id, profile_id=prof.id)
+            yield
+
+    def run_job_now(self, job_id):
+        """Claim and run one specific job in the calling thread (serverless deployments have no worker)"""
+        job = self.queue.claim(self.name, self.lease_seconds, job_id=job_id)
+        if job is None:
+            logger.warning("⚠️ Job %s is not runnable (already claimed or finished)", job_id)
+            return False
+        self.execute(job)
+        return True
+
+    def stats(self):
+        with self._lock:
+            running = {
+                job_id: dict(info, running_seconds=round(time.time() - info["started"], 1))
+                for job_id, info in self._running.items()
+            }
+        return dict(self._stats, name=self.name, concurrency=self.concurrency, running=running)
+
+
+def run_job_now(job_id):
+    """Run a queued job inline; used where no worker process can be kept alive"""
+    return Worker(concurrency=0).run_job_now(job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run download jobs from the persistent job queue")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Jobs to run at once")
+    parser.add_argument("--lease", type=float, default=JOB_LEASE_SECONDS, help="Lease length in seconds")
+    parser.add_argument("--name", help="Worker name recorded on claimed jobs")
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT,
+                        help="Serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args()
+
+    worker = Worker(concurrency=args.concurrency, lease_seconds=args.lease, name=args.name)
+    if args.metrics_port:
+        JOB_QUEUE_DEPTH.set_function(lambda: {(status,): n for status, n in worker.queue.depth().items()})
+        serve_metrics(args.metrics_port)
+    stopping = threading.Event()
+
+    def handle_signal(signum, frame):
+        if stopping.is_set():
+            # Second signal: exit now, unfinished jobs are re-queued when their leases expire
+            logger.info("🛑 Forced shutdown")
+            os._exit(1)
+        stopping.set()
+        logger.info("🛑 Received signal %s; finishing running jobs (send again to force)", signum)
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.start()
+    while not stopping.wait(60):
+        depth = worker.queue.depth()
+        logger.info("📊 queue %s | running %s", depth, list(worker.stats()['running']) or 'nothing')
+    worker.stop()
+    logger.info("👋 Worker %s exited", worker.name)
+
+
+if __name__ == "__main__":
+    main()